@@ -34,15 +34,134 @@ def create_app(config=None):
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
     app.config['JSON_SORT_KEYS'] = False
     
+    # Spark monitoring REST API
+    app.config['SPARK_UI_URL'] = os.environ.get('SPARK_UI_URL', 'http://localhost:4040')
+    app.config['SPARK_API_TIMEOUT'] = float(os.environ.get('SPARK_API_TIMEOUT', 2))
+    app.config['SPARK_API_CACHE_TTL'] = float(os.environ.get('SPARK_API_CACHE_TTL', 3))
+    app.config['SPARK_API_MAX_WORKERS'] = int(os.environ.get('SPARK_API_MAX_WORKERS', 8))
+    app.config['SPARK_CIRCUIT_FAILURE_THRESHOLD'] = int(os.environ.get('SPARK_CIRCUIT_FAILURE_THRESHOLD', 3))
+    app.config['SPARK_CIRCUIT_RESET_TIMEOUT'] = float(os.environ.get('SPARK_CIRCUIT_RESET_TIMEOUT', 30))
+    
+    # Transaction analytics engine: 'local' (pandas/NumPy) or 'spark'
+    app.config['ANALYTICS_BACKEND'] = os.environ.get('ANALYTICS_BACKEND', 'local')
+    app.config['ANALYTICS_CHUNK_SIZE'] = int(os.environ.get('ANALYTICS_CHUNK_SIZE', 50000))
+    
+    # Spark reads the database directly over JDBC (derived from DATABASE_URL unless set)
+    app.config['SPARK_JDBC_URL'] = os.environ.get('SPARK_JDBC_URL')
+    app.config['SPARK_JDBC_DRIVER'] = os.environ.get('SPARK_JDBC_DRIVER')
+    app.config['SPARK_JDBC_PARTITIONS'] = int(os.environ.get('SPARK_JDBC_PARTITIONS', 8))
+    
+    # Historical traffic baselines (plaza x day-of-week x hour)
+    app.config['BASELINE_WINDOW_DAYS'] = int(os.environ.get('BASELINE_WINDOW_DAYS', 30))
+    app.config['BASELINE_REFRESH_SECONDS'] = int(os.environ.get('BASELINE_REFRESH_SECONDS', 3600))
+    
+    # Traffic predictor model registry (versioned artifacts, hot reload)
+    app.config['MODEL_REGISTRY_DIR'] = os.environ.get(
+        'MODEL_REGISTRY_DIR',
+        os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'models'))
+    )
+    app.config['MODEL_REGISTRY_POLL_SECONDS'] = float(os.environ.get('MODEL_REGISTRY_POLL_SECONDS', 5))
+    app.config['MODEL_MMAP_ARRAYS'] = os.environ.get('MODEL_MMAP_ARRAYS', 'true').lower() == 'true'
+    
+    # Prediction cache (pre-warmed for the next N hours of every plaza)
+    app.config['PREDICTION_CACHE_TTL'] = int(os.environ.get('PREDICTION_CACHE_TTL', 3600))
+    app.config['PREDICTION_CACHE_WARM_HOURS'] = int(os.environ.get('PREDICTION_CACHE_WARM_HOURS', 24))
+    app.config['PREDICTION_CACHE_REFRESH_SECONDS'] = int(os.environ.get('PREDICTION_CACHE_REFRESH_SECONDS', 300))
+    
+    # Online (incremental) traffic model training after each rollup
+    app.config['ONLINE_TRAINING_ENABLED'] = os.environ.get('ONLINE_TRAINING_ENABLED', 'false').lower() == 'true'
+    app.config['ONLINE_TRAINING_BATCH_SIZE'] = int(os.environ.get('ONLINE_TRAINING_BATCH_SIZE', 10000))
+    app.config['ONLINE_CHECKPOINT_ROWS'] = int(os.environ.get('ONLINE_CHECKPOINT_ROWS', 50000))
+    app.config['ONLINE_HOLDOUT_DAYS'] = int(os.environ.get('ONLINE_HOLDOUT_DAYS', 14))
+    app.config['ONLINE_MIN_HOLDOUT_ROWS'] = int(os.environ.get('ONLINE_MIN_HOLDOUT_ROWS', 50))
+    app.config['ONLINE_PROMOTION_MARGIN'] = float(os.environ.get('ONLINE_PROMOTION_MARGIN', 0.02))
+    
+    # Feature store: holiday dates (comma separated YYYY-MM-DD)
+    app.config['HOLIDAYS'] = os.environ.get('HOLIDAYS', '')
+    
+    # Traffic anomaly detection (robust z-score against same weekday/hour history)
+    app.config['ANOMALY_BASELINE_WEEKS'] = int(os.environ.get('ANOMALY_BASELINE_WEEKS', 8))
+    app.config['ANOMALY_MIN_HISTORY'] = int(os.environ.get('ANOMALY_MIN_HISTORY', 4))
+    app.config['ANOMALY_Z_THRESHOLD'] = float(os.environ.get('ANOMALY_Z_THRESHOLD', 3.5))
+    
+    # Dynamic tariffs: multipliers published per plaza and hour from forecasts
+    app.config['TARIFF_MIN_MULTIPLIER'] = float(os.environ.get('TARIFF_MIN_MULTIPLIER', 0.8))
+    app.config['TARIFF_MAX_MULTIPLIER'] = float(os.environ.get('TARIFF_MAX_MULTIPLIER', 1.3))
+    app.config['TARIFF_LOW_TRAFFIC'] = float(os.environ.get('TARIFF_LOW_TRAFFIC', 75))
+    app.config['TARIFF_HIGH_TRAFFIC'] = float(os.environ.get('TARIFF_HIGH_TRAFFIC', 150))
+    app.config['TARIFF_MAX_HOURLY_STEP'] = float(os.environ.get('TARIFF_MAX_HOURLY_STEP', 0.1))
+    app.config['TARIFF_SMOOTHING'] = float(os.environ.get('TARIFF_SMOOTHING', 0.5))
+    app.config['TARIFF_REFRESH_SECONDS'] = int(os.environ.get('TARIFF_REFRESH_SECONDS', 60))
+    
+    # In-memory toll rate table (edits from other processes picked up after this)
+    app.config['RATE_CACHE_REFRESH_SECONDS'] = float(os.environ.get('RATE_CACHE_REFRESH_SECONDS', 30))
+    
+    # Live dashboard events (Server-Sent Events)
+    app.config['EVENT_FLUSH_SECONDS'] = float(os.environ.get('EVENT_FLUSH_SECONDS', 1))
+    app.config['EVENT_RECONCILE_SECONDS'] = float(os.environ.get('EVENT_RECONCILE_SECONDS', 60))
+    app.config['EVENT_MAX_CLIENTS'] = int(os.environ.get('EVENT_MAX_CLIENTS', 2))  # Per process, each holds a thread
+    app.config['EVENT_HEARTBEAT_SECONDS'] = float(os.environ.get('EVENT_HEARTBEAT_SECONDS', 15))
+    app.config['EVENT_CLIENT_BUFFER'] = int(os.environ.get('EVENT_CLIENT_BUFFER', 100))
+    
+    # Per-lane throughput ring buffers (minutes of history kept in memory)
+    app.config['LANE_METRICS_MINUTES'] = int(os.environ.get('LANE_METRICS_MINUTES', 180))
+    
+    # Lane opening recommendations (M/M/c queue per plaza)
+    app.config['LANE_TARGET_WAIT_SECONDS'] = float(os.environ.get('LANE_TARGET_WAIT_SECONDS', 60))
+    app.config['LANE_LIVE_MINUTES'] = int(os.environ.get('LANE_LIVE_MINUTES', 10))
+    app.config['LANE_LIVE_WEIGHT'] = float(os.environ.get('LANE_LIVE_WEIGHT', 0.6))
+    app.config['LANE_MIX_DAYS'] = int(os.environ.get('LANE_MIX_DAYS', 7))
+    app.config['LANE_MIX_TTL'] = int(os.environ.get('LANE_MIX_TTL', 3600))
+    app.config['LANE_PLAN_CACHE_SECONDS'] = float(os.environ.get('LANE_PLAN_CACHE_SECONDS', 2))
+    
+    # Request timing middleware and Prometheus /metrics endpoint
+    app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+    
+    # SQL statement counting and N+1 detection per request (development/CI)
+    app.config['QUERY_DEBUG'] = os.environ.get('QUERY_DEBUG', 'false').lower() == 'true'
+    app.config['QUERY_N_PLUS_ONE_THRESHOLD'] = int(os.environ.get('QUERY_N_PLUS_ONE_THRESHOLD', 5))
+    
+    # Sampling profiler for slow requests (collapsed stacks for flamegraphs)
+    app.config['PROFILER_ENABLED'] = os.environ.get('PROFILER_ENABLED', 'false').lower() == 'true'
+    app.config['PROFILER_SLOW_MS'] = float(os.environ.get('PROFILER_SLOW_MS', 500))
+    app.config['PROFILER_SAMPLE_RATE'] = float(os.environ.get('PROFILER_SAMPLE_RATE', 0.0))
+    app.config['PROFILER_INTERVAL_MS'] = float(os.environ.get('PROFILER_INTERVAL_MS', 10))
+    app.config['PROFILER_MAX_STACKS'] = int(os.environ.get('PROFILER_MAX_STACKS', 2000))
+    app.config['PROFILER_MAX_SAMPLES'] = int(os.environ.get('PROFILER_MAX_SAMPLES', 6000))
+    
+    # Async crossing ingestion API for lane controllers (asgi.py, uvicorn)
+    app.config['INGEST_DATABASE_URL'] = os.environ.get('INGEST_DATABASE_URL')  # Default: DATABASE_URL, async driver
+    app.config['INGEST_QUEUE_SIZE'] = int(os.environ.get('INGEST_QUEUE_SIZE', 10000))
+    app.config['INGEST_BATCH_SIZE'] = int(os.environ.get('INGEST_BATCH_SIZE', 500))
+    app.config['INGEST_BATCH_WAIT_MS'] = float(os.environ.get('INGEST_BATCH_WAIT_MS', 5))
+    app.config['INGEST_WRITERS'] = int(os.environ.get('INGEST_WRITERS', 1))
+    app.config['INGEST_DB_POOL_SIZE'] = int(os.environ.get('INGEST_DB_POOL_SIZE', 5))
+    app.config['INGEST_ACK_TIMEOUT_SECONDS'] = float(os.environ.get('INGEST_ACK_TIMEOUT_SECONDS', 10))
+    app.config['INGEST_MAX_CLOCK_SKEW_SECONDS'] = float(os.environ.get('INGEST_MAX_CLOCK_SKEW_SECONDS', 300))
+    app.config['INGEST_API_KEY'] = os.environ.get('INGEST_API_KEY')  # Required: X-Api-Key of the lane controllers
+    
+    # Background jobs (Spark analysis etc.)
+    app.config['JOB_MAX_WORKERS'] = int(os.environ.get('JOB_MAX_WORKERS', 2))
+    app.config['JOB_HISTORY_SIZE'] = int(os.environ.get('JOB_HISTORY_SIZE', 100))
+    
+    if config:
+        app.config.update(config)
+    
     # Initialize extensions
     db.init_app(app)
     login_manager.init_app(app)
     CORS(app)
     
-    # Create database tables
-    with app.app_context():
-        from app.models import User, Vehicle, TollPlaza, TollRate, Wallet, WalletTransaction, TollTransaction, TrafficLog
-        db.create_all()
+    # Request timing (registered before the blueprints so it wraps every request)
+    if app.config['METRICS_ENABLED']:
+        from app.services.request_metrics import RequestMetrics
+        RequestMetrics.init_app(app)
+    if app.config['QUERY_DEBUG']:
+        from app.services.query_inspector import QueryInspector
+        QueryInspector.init_app(app)
+    if app.config['PROFILER_ENABLED']:
+        from app.services.request_profiler import RequestProfiler
+        RequestProfiler.init_app(app)
     
     # Register blueprints
     from app.routes.auth import auth_bp
@@ -0,0 +1,128 @@
+"""
+Smart Toll Management System - Async crossing ingestion API (ASGI)
+A Starlette application for lane controllers, served by uvicorn from
+asgi.py next to the Flask app. Pricing and validation come from
+TollService; writes go through the IngestionPipeline queue, so an idle or
+waiting connection costs a coroutine, not a thread.
+
+    POST /ingest/crossings   one event object or a list of up to INGEST_BATCH_SIZE
+                             (event_id makes a retry idempotent)
+    GET  /ingest/health      liveness and queue depth
+    GET  /ingest/stats       pipeline counters
+"""
+
+import asyncio
+import contextlib
+import hmac
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from app import create_app
+from app.services.ingestion_service import IngestionPipeline, parse_event
+
+def create_ingest_app(config=None):
+    """
+    Application factory for the ingestion API
+    
+    Args:
+        config: Configuration dictionary (optional, as for create_app)
+    
+    Returns:
+        Starlette application instance
+    
+    Raises:
+        RuntimeError: When INGEST_API_KEY is not configured
+    """
+    flask_app = create_app(config)
+    settings = flask_app.config
+    api_key = settings['INGEST_API_KEY']
+    if not api_key:
+        # Posting crossings debits wallets: never serve it unauthenticated
+        raise RuntimeError('INGEST_API_KEY must be set to serve the ingestion API')
+    pipeline = IngestionPipeline(flask_app)
+    ack_timeout = settings['INGEST_ACK_TIMEOUT_SECONDS']
+    max_events = settings['INGEST_BATCH_SIZE']
+    max_skew = settings['INGEST_MAX_CLOCK_SKEW_SECONDS']
+    
+    def error(message, status_code, headers=None):
+        return JSONResponse({'success': False, 'message': message}, status_code=status_code, headers=headers)
+    
+    async def post_crossings(request):
+        """
+        Record crossings and answer with each one's committed result
+        
+        Events carrying an event_id are recorded at most once: repeating a
+        request (after a 202 or a lost response) returns the stored result
+        instead of charging again.
+        """
+        if not hmac.compare_digest(request.headers.get('X-Api-Key', '').encode(), api_key.encode()):
+            return error('Invalid API key', 401)
+        
+        try:
+            data = await request.json()
+        except ValueError:
+            return error('Invalid JSON body', 400)
+        
+        single = isinstance(data, dict)
+        items = [data] if single else data
+        if not isinstance(items, list) or not items:
+            return error('Expected a crossing event or a list of events', 400)
+        if len(items) > max_events:
+            return error(f'At most {max_events} events per request', 400)
+        
+        try:
+            events = [parse_event(item, max_skew) for item in items]
+        except ValueError as e:
+            return error(str(e), 400)
+        
+        try:
+            futures = pipeline.submit(events)
+        except asyncio.QueueFull:
+            return error('Ingestion queue full, retry later', 503, headers={'Retry-After': '1'})
+        
+        # Events not committed in time stay queued and are still written
+        await asyncio.wait(futures, timeout=ack_timeout)
+        results = []
+        for event, future in zip(events, futures):
+            if future.done():
+                result = dict(future.result())
+            elif event['event_id'] is not None:
+                result = {'success': None, 'transaction_id': None,
+                          'message': 'Accepted, not committed yet; repeat with the same event_id for the result'}
+            else:
+                result = {'success': None, 'message': 'Accepted, not committed yet', 'transaction_id': None}
+            if event['event_id'] is not None:
+                result['event_id'] = event['event_id']
+            results.append(result)
+        status_code = 202 if any(result['success'] is None for result in results) else 200
+        if single:
+            return JSONResponse(results[0], status_code=status_code)
+        return JSONResponse({
+            'success': all(result['success'] for result in results),
+            'results': results
+        }, status_code=status_code)
+    
+    async def health(request):
+        status = pipeline.get_status()
+        return JSONResponse({
+            'status': 'closing' if status['closing'] else 'ok',
+            'queue_depth': status['queue_depth'],
+            'queue_size': status['queue_size']
+        }, status_code=503 if status['closing'] else 200)
+    
+    async def stats(request):
+        return JSONResponse(pipeline.get_status())
+    
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        await pipeline.start()
+        yield
+        await pipeline.stop(ack_timeout)
+    
+    app = Starlette(routes=[
+        Route('/ingest/crossings', post_crossings, methods=['POST']),
+        Route('/ingest/health', health),
+        Route('/ingest/stats', stats)
+    ], lifespan=lifespan)
+    app.state.pipeline = pipeline
+    return app
@@ -211,6 +211,7 @@ class TollTransaction(db.Model):
     status = db.Column(db.Enum(TransactionStatus), default=TransactionStatus.COMPLETED, nullable=False)
     operator_id = db.Column(db.Integer, db.ForeignKey('user.user_id'), nullable=True)
     notes = db.Column(db.Text, nullable=True)
+    event_id = db.Column(db.String(64), unique=True, nullable=True)  # Lane controller idempotency key (/ingest)
     
     def __repr__(self):
         return f'<TollTransaction vehicle_id={self.vehicle_id} amount={self.amount}>'
@@ -234,6 +235,8 @@ class TrafficLog(db.Model):
     avg_speed = db.Column(db.Float, nullable=True)
     traffic_level = db.Column(db.String(20), default='normal', nullable=False)  # low, normal, high
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    # Last time the counts were written (online training watermark)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False, index=True)
     
     __table_args__ = (
         db.UniqueConstraint('plaza_id', 'date', 'hour', name='unique_traffic_log'),
@@ -242,3 +245,131 @@ class TrafficLog(db.Model):
     
     def __repr__(self):
         return f'<TrafficLog plaza={self.plaza_id} date={self.date} hour={self.hour}>'
+
+# ============================================================================
+# Analytics Summary Model
+# ============================================================================
+class AnalyticsSummary(db.Model):
+    """
+    Analytics Summary Model - Aggregates written back by Spark rollup jobs
+    One row per (run, metric, dimension), e.g. revenue for one plaza
+    """
+    __tablename__ = 'analytics_summary'
+    
+    summary_id = db.Column(db.Integer, primary_key=True)
+    run_id = db.Column(db.String(32), nullable=False, index=True)
+    metric = db.Column(db.String(30), nullable=False)  # plaza_revenue, vehicle_type, peak_hour
+    dimension = db.Column(db.String(100), nullable=False)
+    vehicle_count = db.Column(db.Integer, default=0, nullable=False)
+    total_revenue = db.Column(db.Float, default=0.0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f'<AnalyticsSummary {self.metric}={self.dimension} run={self.run_id}>'
+
+# ============================================================================
+# Traffic Feature Store Model
+# ============================================================================
+class TrafficFeature(db.Model):
+    """
+    Traffic Feature Model - Precomputed model features per plaza and hour
+    Lagged counts and rolling means for the target (plaza, date, hour),
+    derived from TrafficLog and maintained incrementally by the rollup
+    """
+    __tablename__ = 'traffic_feature'
+    
+    feature_id = db.Column(db.Integer, primary_key=True)
+    plaza_id = db.Column(db.Integer, db.ForeignKey('toll_plaza.plaza_id'), nullable=False)
+    date = db.Column(db.Date, nullable=False, index=True)
+    hour = db.Column(db.Integer, nullable=False)  # 0-23
+    lag_1 = db.Column(db.Float, nullable=True)  # Count one hour earlier
+    lag_24 = db.Column(db.Float, nullable=True)  # Same hour, previous day
+    lag_168 = db.Column(db.Float, nullable=True)  # Same hour, previous week
+    rolling_mean_7d = db.Column(db.Float, nullable=True)  # Same hour, mean of previous 7 days
+    is_holiday = db.Column(db.Boolean, default=False, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    __table_args__ = (
+        db.UniqueConstraint('plaza_id', 'date', 'hour', name='unique_traffic_feature'),
+    )
+    
+    def __repr__(self):
+        return f'<TrafficFeature plaza={self.plaza_id} date={self.date} hour={self.hour}>'
+
+# ============================================================================
+# Traffic Anomaly Model
+# ============================================================================
+class TrafficAnomaly(db.Model):
+    """
+    Traffic Anomaly Model - Plaza-hours whose vehicle count deviates from the
+    seasonal (same weekday and hour) baseline by more than the robust z-score
+    threshold; only anomalous hours are stored
+    """
+    __tablename__ = 'traffic_anomaly'
+    
+    anomaly_id = db.Column(db.Integer, primary_key=True)
+    plaza_id = db.Column(db.Integer, db.ForeignKey('toll_plaza.plaza_id'), nullable=False)
+    date = db.Column(db.Date, nullable=False, index=True)
+    hour = db.Column(db.Integer, nullable=False)  # 0-23
+    vehicle_count = db.Column(db.Integer, nullable=False)
+    expected_count = db.Column(db.Float, nullable=False)  # Seasonal median
+    score = db.Column(db.Float, nullable=False)  # Robust z-score (signed)
+    direction = db.Column(db.String(10), nullable=False)  # 'spike' or 'drop'
+    detected_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    __table_args__ = (
+        db.UniqueConstraint('plaza_id', 'date', 'hour', name='unique_traffic_anomaly'),
+    )
+    
+    def __repr__(self):
+        return f'<TrafficAnomaly plaza={self.plaza_id} date={self.date} hour={self.hour} z={self.score:.1f}>'
+
+# ============================================================================
+# Dynamic Tariff Models
+# ============================================================================
+class TariffSchedule(db.Model):
+    """
+    Tariff Schedule Model - One published set of dynamic pricing multipliers
+    Schedules are never edited; each publication is kept as audit history
+    and later schedules override earlier ones for the hours they cover
+    """
+    __tablename__ = 'tariff_schedule'
+    
+    schedule_id = db.Column(db.Integer, primary_key=True)
+    published_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    published_by = db.Column(db.Integer, db.ForeignKey('user.user_id'), nullable=True)  # None for CLI/scheduled runs
+    model_version = db.Column(db.String(40), nullable=True)  # None when forecast from baselines
+    starts_at = db.Column(db.DateTime, nullable=False)
+    ends_at = db.Column(db.DateTime, nullable=False)
+    settings = db.Column(db.Text, nullable=True)  # JSON caps/thresholds/smoothing used
+    notes = db.Column(db.String(255), nullable=True)
+    
+    # Relationships
+    multipliers = db.relationship('TariffMultiplier', backref='schedule', lazy=True)
+    
+    def __repr__(self):
+        return f'<TariffSchedule {self.schedule_id} published={self.published_at}>'
+
+class TariffMultiplier(db.Model):
+    """
+    Tariff Multiplier Model - Multiplier applied to TollRate.amount for one
+    plaza and hour of a published schedule
+    """
+    __tablename__ = 'tariff_multiplier'
+    
+    multiplier_id = db.Column(db.Integer, primary_key=True)
+    schedule_id = db.Column(db.Integer, db.ForeignKey('tariff_schedule.schedule_id'), nullable=False, index=True)
+    plaza_id = db.Column(db.Integer, db.ForeignKey('toll_plaza.plaza_id'), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    hour = db.Column(db.Integer, nullable=False)  # 0-23
+    predicted_vehicles = db.Column(db.Integer, nullable=False)
+    raw_multiplier = db.Column(db.Float, nullable=False)  # Before capping and smoothing
+    multiplier = db.Column(db.Float, nullable=False)
+    
+    __table_args__ = (
+        db.UniqueConstraint('schedule_id', 'plaza_id', 'date', 'hour', name='unique_tariff_multiplier'),
+        db.Index('idx_tariff_multiplier_date_hour', 'date', 'hour'),
+    )
+    
+    def __repr__(self):
+        return f'<TariffMultiplier plaza={self.plaza_id} date={self.date} hour={self.hour} x{self.multiplier}>'
@@ -2,9 +2,10 @@
 Admin Routes - Admin dashboard and management functions
 """
 
-from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for
+from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for, current_app, Response
 from flask_login import login_required, current_user
 from functools import wraps
+from sqlalchemy.orm import joinedload
 from app import db
 from app.models import User, TollPlaza, TollRate, Vehicle, UserRole, VehicleType, PaymentMode
 from app.services.analytics_service import AnalyticsService
@@ -154,6 +155,9 @@ def toll_rates():
             db.session.add(rate)
             db.session.commit()
             
+            from app.services.rate_cache import TollRateCache
+            TollRateCache.invalidate()
+            
             flash('Toll rate added successfully!', 'success')
         
         except Exception as e:
@@ -161,7 +165,7 @@ def toll_rates():
             flash(f'Error: {str(e)}', 'danger')
     
     plazas = TollPlaza.query.all()
-    rates = TollRate.query.all()
+    rates = TollRate.query.options(joinedload(TollRate.plaza)).all()
     
     return render_template('admin/rates.html',
                           plazas=plazas,
@@ -190,27 +194,29 @@ def analytics():
     end_date = datetime.utcnow().date()
     start_date = end_date - timedelta(days=30)
     
-    # Get overall summary
+    # Get overall summary (aggregated in the database)
     from app.models import TollTransaction
-    transactions = TollTransaction.query.filter(
+    total_transactions, total_revenue, total_vehicles = db.session.query(
+        db.func.count(TollTransaction.txn_id),
+        db.func.coalesce(db.func.sum(TollTransaction.amount), 0.0),
+        db.func.count(db.distinct(TollTransaction.vehicle_id))
+    ).filter(
         TollTransaction.timestamp >= start_date,
         TollTransaction.timestamp <= end_date
-    ).all()
+    ).one()
     
     summary = {
-        'total_transactions': len(transactions),
-        'total_revenue': sum(t.amount for t in transactions) if transactions else 0,
-        'total_vehicles': len(set(t.vehicle_id for t in transactions)) if transactions else 0,
-        'avg_toll': (sum(t.amount for t in transactions) / len(transactions)) if transactions else 0
+        'total_transactions': total_transactions,
+        'total_revenue': total_revenue,
+        'total_vehicles': total_vehicles,
+        'avg_toll': (total_revenue / total_transactions) if total_transactions else 0
     }
     
     revenue_per_plaza = AnalyticsService.get_revenue_per_plaza(start_date, end_date)
     plazas = TollPlaza.query.all()
     
     # Get peak hours per plaza
-    peak_hours_data = {}
-    for plaza in plazas:
-        peak_hours_data[plaza.plaza_id] = AnalyticsService.get_peak_hours(plaza.plaza_id)
+    peak_hours_data = AnalyticsService.get_peak_hours_bulk([plaza.plaza_id for plaza in plazas])
     
     return render_template('admin/analytics.html',
                           summary=summary,
@@ -248,6 +254,8 @@ def generate_traffic_logs():
     result = AnalyticsService.generate_traffic_logs()
     
     if result['success']:
+        from app.services.online_training_service import submit_online_training
+        submit_online_training()
         flash(result['message'], 'success')
     else:
         flash(result['message'], 'danger')
@@ -260,10 +268,9 @@ def generate_traffic_logs():
 def spark_analytics():
     """
     Spark Analytics Dashboard - Big data processing and analysis
+    Computed by the backend selected with ANALYTICS_BACKEND (local or spark)
     """
-    from ml_analytics.spark_analytics import SparkAnalytics
-    from app.models import TollTransaction
-    import json
+    from app.services.analytics_engine import get_analytics_backend, DatabaseTransactionSource
     
     spark_stats = {
         'status': 'not_run',
@@ -275,129 +282,197 @@ def spark_analytics():
     }
     
     try:
-        # Get transaction data for Spark processing
-        transactions = TollTransaction.query.all()
+        backend = get_analytics_backend()
+        source = DatabaseTransactionSource(chunk_size=current_app.config['ANALYTICS_CHUNK_SIZE'])
+        results = backend.run(source)
         
-        if transactions:
-            # Create sample data for Spark analytics
-            spark = SparkAnalytics()
-            
-            # Create sample DataFrame
+        if results['total_transactions']:
+            spark_stats.update(results)
             spark_stats['status'] = 'success'
-            spark_stats['total_transactions'] = len(transactions)
-            spark_stats['total_revenue'] = sum(t.amount for t in transactions)
-            
-            # Get plaza-wise revenue
-            plaza_revenue = {}
-            for txn in transactions:
-                plaza_name = txn.plaza.plaza_name
-                if plaza_name not in plaza_revenue:
-                    plaza_revenue[plaza_name] = {'count': 0, 'revenue': 0}
-                plaza_revenue[plaza_name]['count'] += 1
-                plaza_revenue[plaza_name]['revenue'] += txn.amount
-            
-            spark_stats['revenue_by_plaza'] = [
-                {'plaza': k, 'count': v['count'], 'revenue': round(v['revenue'], 2)}
-                for k, v in plaza_revenue.items()
-            ]
-            
-            # Vehicle type distribution
-            vehicle_dist = {}
-            for txn in transactions:
-                vtype = txn.vehicle.vehicle_type.value
-                vehicle_dist[vtype] = vehicle_dist.get(vtype, 0) + 1
-            
-            spark_stats['vehicle_distribution'] = [
-                {'type': k, 'count': v} for k, v in vehicle_dist.items()
-            ]
             
     except Exception as e:
         spark_stats['error'] = str(e)
         spark_stats['status'] = 'error'
     
-    return render_template('admin/spark_analytics.html', spark_stats=spark_stats)
+    return render_template('admin/spark_analytics.html',
+                          spark_stats=spark_stats,
+                          spark_ui_url=current_app.config['SPARK_UI_URL'])
 
 @admin_bp.route('/api/run-spark-analysis', methods=['POST'])
 @login_required
 @admin_required
 def run_spark_analysis():
     """
-    API endpoint to run Spark analysis and submit jobs to Spark cluster
+    API endpoint to submit the transaction analysis as a background job
+    Runs on the configured analytics backend; poll api_analysis_job for progress
     """
+    from app.services.job_service import JobService
+    from app.services.analytics_engine import run_analytics_job
+    
     try:
-        from ml_analytics.spark_analytics import SparkAnalytics
-        from app.models import TollTransaction
-        
-        # Initialize Spark in local mode (jobs will be visible in Web UI on port 4040)
-        spark = SparkAnalytics(app_name="SmartTollAnalysis", use_local=True)
-        
-        # Get all transactions
-        transactions = TollTransaction.query.all()
-        
-        if not transactions:
-            return jsonify({
-                'success': True,
-                'message': 'No transactions to analyze',
-                'job_count': 0
-            })
-        
-        # Prepare transaction data for Spark
-        txn_data = []
-        for txn in transactions:
-            txn_data.append({
-                'txn_id': txn.txn_id,
-                'vehicle_id': txn.vehicle_id,
-                'plaza_id': txn.plaza_id,
-                'amount': float(txn.amount),
-                'timestamp': txn.timestamp.isoformat() if txn.timestamp else None,
-                'vehicle_type': txn.vehicle.vehicle_type.value,
-                'plaza_name': txn.plaza.plaza_name
-            })
-        
-        # Create Spark DataFrame from transaction data
-        df = spark.spark.createDataFrame(txn_data)
-        print("[Spark] Created DataFrame with {} rows".format(len(txn_data)))
+        job, created = JobService.submit(
+            'transaction_analysis',
+            run_analytics_job,
+            key='transaction_analysis'
+        )
         
-        # Submit analysis jobs
-        job_count = 0
-        
-        # Job 1: Show DataFrame
-        print("\n[Spark] Job 1: DataFrame Preview")
-        df.show()
-        job_count += 1
-        
-        # Job 2: Revenue aggregation by plaza
-        print("\n[Spark] Job 2: Revenue Aggregation by Plaza")
-        df.groupBy('plaza_name').agg({'amount': 'sum'}).show()
-        job_count += 1
-        
-        # Job 3: Vehicle type distribution
-        print("\n[Spark] Job 3: Vehicle Type Distribution")
-        df.groupBy('vehicle_type').count().show()
-        job_count += 1
-        
-        # Job 4: Count and cache
-        print("\n[Spark] Job 4: Total Record Count")
-        total_count = df.count()
-        print(f"[Spark] Total transactions processed: {total_count}")
-        job_count += 1
+        return jsonify({
+            'success': True,
+            'message': 'Analysis submitted' if created else 'Analysis already in progress',
+            'backend': current_app.config['ANALYTICS_BACKEND'],
+            'job_id': job['job_id'],
+            'status': job['status'],
+            'coalesced': not created,
+            'status_url': url_for('admin.api_analysis_job', job_id=job['job_id']),
+            'spark_ui_url': current_app.config['SPARK_UI_URL']
+        }), 202
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error submitting analysis: {str(e)}'
+        }), 500
+
+@admin_bp.route('/api/run-spark-rollup', methods=['POST'])
+@login_required
+@admin_required
+def run_spark_rollup():
+    """
+    Submit the executor-side Spark rollup as a background job
+    Spark reads transactions itself (JDBC or exported files) and writes
+    hourly results into TrafficLog and AnalyticsSummary
+    """
+    from app.services.job_service import JobService
+    from app.services.spark_jobs import run_spark_rollup_job
+    
+    data = request.get_json(silent=True) or {}
+    source = data.get('source', 'jdbc')
+    
+    if source not in ('jdbc', 'files'):
+        return jsonify({'success': False, 'message': 'source must be jdbc or files'}), 400
+    
+    try:
+        job, created = JobService.submit(
+            'spark_rollup',
+            run_spark_rollup_job,
+            key='spark_rollup',
+            source=source,
+            path=data.get('path')
+        )
         
         return jsonify({
             'success': True,
-            'message': f'✓ Spark analysis completed successfully! {job_count} jobs executed.',
-            'job_count': job_count,
-            'spark_ui_url': 'http://DESKTOP-9Q68UBH:4040',
-            'transactions_processed': len(txn_data)
-        })
+            'message': 'Spark rollup submitted' if created else 'Spark rollup already in progress',
+            'job_id': job['job_id'],
+            'status': job['status'],
+            'coalesced': not created,
+            'status_url': url_for('admin.api_analysis_job', job_id=job['job_id'])
+        }), 202
     
     except Exception as e:
-        import traceback
-        print(f"[ERROR] Spark analysis failed: {str(e)}")
-        traceback.print_exc()
         return jsonify({
             'success': False,
-            'message': f'Error running Spark analysis: {str(e)}'
+            'message': f'Error submitting Spark rollup: {str(e)}'
+        }), 500
+
+@admin_bp.route('/api/analysis-jobs/<job_id>')
+@login_required
+@admin_required
+def api_analysis_job(job_id):
+    """
+    Get progress, results and timing of a background analysis job
+    """
+    from app.services.job_service import JobService
+    job = JobService.get_job(job_id)
+    
+    if not job:
+        return jsonify({'success': False, 'message': 'Job not found'}), 404
+    
+    return jsonify({'success': True, 'job': job})
+
+@admin_bp.route('/api/analysis-jobs')
+@login_required
+@admin_required
+def api_analysis_jobs():
+    """
+    List recently submitted background analysis jobs
+    """
+    from app.services.job_service import JobService
+    return jsonify({'success': True, 'jobs': JobService.list_jobs()})
+
+@admin_bp.route('/api/models')
+@login_required
+@admin_required
+def api_models():
+    """
+    List registered traffic predictor versions and the served one
+    """
+    from app.services.model_registry import ModelRegistry
+    
+    try:
+        return jsonify({
+            'success': True,
+            'status': ModelRegistry.get_status(),
+            'versions': ModelRegistry.list_versions()
         })
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
+
+@admin_bp.route('/api/models/<version>/activate', methods=['POST'])
+@login_required
+@admin_required
+def activate_model(version):
+    """
+    Hot-swap the served traffic predictor to a registered version
+    """
+    from app.services.model_registry import ModelRegistry
+    
+    try:
+        result = ModelRegistry.activate(version)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    if not result['success']:
+        return jsonify(result), 400
+    return jsonify(result)
+
+@admin_bp.route('/api/tariffs')
+@login_required
+@admin_required
+def api_tariffs():
+    """
+    Published tariff schedules (audit history) and the in-memory table state
+    """
+    from app.services.dynamic_pricing_service import DynamicPricingService
+    
+    try:
+        DynamicPricingService.ensure_loaded()
+        return jsonify({
+            'success': True,
+            'status': DynamicPricingService.get_status(),
+            'schedules': DynamicPricingService.list_schedules(request.args.get('limit', 20, type=int))
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
+
+@admin_bp.route('/api/tariffs/publish', methods=['POST'])
+@login_required
+@admin_required
+def publish_tariffs():
+    """
+    Compute and publish a tariff schedule from the current forecasts
+    """
+    from app.services.dynamic_pricing_service import DynamicPricingService
+    
+    data = request.get_json(silent=True) or {}
+    result = DynamicPricingService.publish(
+        int(data.get('hours_ahead', 24)),
+        published_by=current_user.user_id,
+        notes=data.get('notes')
+    )
+    if not result['success']:
+        return jsonify(result), 400
+    return jsonify(result)
 
 @admin_bp.route('/spark-ui')
 @login_required
@@ -406,9 +481,9 @@ def spark_ui():
     """
     Apache Spark UI - Real-time job monitoring and task execution tracking
     Shows cluster status, jobs, stages, tasks, executors, and data flow
-    Connected to external Spark Web UI at http://DESKTOP-9Q68UBH:4040
+    Connected to the external Spark Web UI configured by SPARK_UI_URL
     """
-    spark_ui_url = "http://DESKTOP-9Q68UBH:4040"
+    spark_ui_url = current_app.config['SPARK_UI_URL']
     return render_template('admin/spark_ui.html', spark_ui_url=spark_ui_url)
 
 @admin_bp.route('/spark-integration')
@@ -419,7 +494,8 @@ def spark_integration():
     Spark Integration Dashboard
     Real-time synchronization between Flask and Spark cluster
     """
-    return render_template('admin/spark_integration.html')
+    return render_template('admin/spark_integration.html',
+                          spark_ui_url=current_app.config['SPARK_UI_URL'])
 
 @admin_bp.route('/api/spark-status')
 @login_required
@@ -472,6 +548,76 @@ def api_realtime_metrics():
     metrics = SparkIntegrationService.get_realtime_metrics()
     return jsonify(metrics)
 
+@admin_bp.route('/api/events')
+@login_required
+@admin_required
+def api_events():
+    """
+    Server-Sent Events stream of live plaza counters, job updates and alerts
+    """
+    from app.services.event_hub import EventHub
+    
+    config = current_app.config
+    EventHub.start(current_app._get_current_object())
+    subscription = EventHub.subscribe(config['EVENT_CLIENT_BUFFER'], config['EVENT_MAX_CLIENTS'])
+    if subscription is None:
+        # Every stream holds a request thread; leave the rest for toll processing
+        return jsonify({
+            'success': False,
+            'message': 'Too many live dashboards connected, retry later'
+        }), 503, {'Retry-After': '30'}
+    
+    return Response(
+        EventHub.stream(subscription, config['EVENT_HEARTBEAT_SECONDS']),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@admin_bp.route('/api/profiles')
+@login_required
+@admin_required
+def api_profiles():
+    """
+    Sampled request profiles per endpoint (PROFILER_ENABLED)
+    """
+    from app.services.request_profiler import RequestProfiler
+    
+    if not current_app.config['PROFILER_ENABLED']:
+        return jsonify({'success': False, 'message': 'Profiler disabled (set PROFILER_ENABLED=true)'}), 404
+    return jsonify({'success': True, 'profiler': RequestProfiler.get_summary(request.args.get('top', 10, type=int))})
+
+@admin_bp.route('/api/profiles/collapsed')
+@login_required
+@admin_required
+def download_profile():
+    """
+    Download collapsed stacks for flamegraph tools (?endpoint= for one endpoint)
+    """
+    from app.services.request_profiler import RequestProfiler
+    
+    if not current_app.config['PROFILER_ENABLED']:
+        return jsonify({'success': False, 'message': 'Profiler disabled (set PROFILER_ENABLED=true)'}), 404
+    
+    endpoint = request.args.get('endpoint')
+    filename = f"{endpoint or 'all'}-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.collapsed"
+    return Response(
+        RequestProfiler.collapsed(endpoint),
+        mimetype='text/plain',
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+@admin_bp.route('/api/profiles/reset', methods=['POST'])
+@login_required
+@admin_required
+def reset_profiles():
+    """
+    Discard collected profiles
+    """
+    from app.services.request_profiler import RequestProfiler
+    
+    RequestProfiler.reset()
+    return jsonify({'success': True, 'message': 'Profiles cleared'})
+
 @admin_bp.route('/api/transaction-summary')
 @login_required
 @admin_required
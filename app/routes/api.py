@@ -5,35 +5,30 @@ API Routes - REST API endpoints for ML predictions and data
 from flask import Blueprint, request, jsonify
 from flask_login import login_required, current_user
 from app.models import UserRole, TollPlaza, TrafficLog
+from app.services.model_registry import ModelRegistry
+from app.services.prediction_cache import PredictionCache
+from app.services.prediction_service import PredictionService
+from app.services.dynamic_pricing_service import DynamicPricingService
+from app.services.event_hub import EventHub
 from datetime import datetime, timedelta
-import os
-import pickle
 import json
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
-# Load trained ML model (if available)
-ML_MODEL_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'models', 'traffic_predictor.pkl')
-ml_model = None
-
-try:
-    if os.path.exists(ML_MODEL_PATH):
-        with open(ML_MODEL_PATH, 'rb') as f:
-            ml_model = pickle.load(f)
-        print(f"[{datetime.now()}] ML Model loaded successfully from {ML_MODEL_PATH}")
-except Exception as e:
-    print(f"[{datetime.now()}] Warning: Could not load ML model - {str(e)}")
-
 @api_bp.route('/health', methods=['GET'])
 def health():
     """
     Health check endpoint
     """
-    return jsonify({
+    status = {
         'status': 'healthy',
-        'timestamp': datetime.utcnow().isoformat(),
-        'ml_model_loaded': ml_model is not None
-    })
+        'timestamp': datetime.utcnow().isoformat()
+    }
+    # Reports the active version without forcing the model to load
+    status.update(ModelRegistry.get_status())
+    status['prediction_cache'] = PredictionCache.get_stats()
+    status['event_hub'] = EventHub.get_stats()
+    return jsonify(status)
 
 @api_bp.route('/predict-traffic', methods=['GET', 'POST'])
 @login_required
@@ -67,12 +62,9 @@ def predict_traffic():
         if not plaza:
             return jsonify({'success': False, 'message': 'Plaza not found'}), 404
         
-        # If ML model is loaded, use it for predictions
-        if ml_model:
-            predictions = _get_ml_predictions(plaza_id, date, hours_ahead)
-        else:
-            # Fallback: Use historical data or simple heuristics
-            predictions = _get_historical_baseline(plaza_id, date, hours_ahead)
+        # One model snapshot per request, unaffected by concurrent swaps
+        model = ModelRegistry.get_active()
+        predictions = PredictionService.get_predictions([plaza_id], date, hours_ahead, model)[plaza_id]
         
         return jsonify({
             'success': True,
@@ -81,7 +73,8 @@ def predict_traffic():
             'date': str(date),
             'hours_ahead': hours_ahead,
             'predictions': predictions,
-            'ml_model_used': ml_model is not None
+            'ml_model_used': model is not None,
+            'model_version': model.version if model else None
         })
     
     except ValueError as e:
@@ -89,6 +82,88 @@ def predict_traffic():
     except Exception as e:
         return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
 
+@api_bp.route('/predict-traffic/network', methods=['GET'])
+@login_required
+def predict_traffic_network():
+    """
+    Predict traffic for every plaza (or a list of plazas) in one call
+    
+    Parameters:
+        plaza_ids: Comma separated plaza IDs (optional, default: all plazas)
+        hours_ahead: Number of hours ahead to predict (default: 6, max: 24)
+        date: Date to predict for (YYYY-MM-DD, default: today)
+        format: 'rows' (default) or 'columnar' for compact parallel arrays
+    
+    Returns:
+        JSON with predictions for all requested plazas
+    """
+    if current_user.role not in [UserRole.ADMIN, UserRole.TOLL_OPERATOR]:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+    try:
+        hours_ahead = int(request.args.get('hours_ahead', 6))
+        date_str = request.args.get('date', datetime.utcnow().strftime('%Y-%m-%d'))
+        output_format = request.args.get('format', 'rows')
+        plaza_ids_arg = request.args.get('plaza_ids')
+        
+        date = datetime.strptime(date_str, '%Y-%m-%d').date()
+        if not 1 <= hours_ahead <= 24:
+            raise ValueError('hours_ahead must be between 1 and 24')
+        if output_format not in ('rows', 'columnar'):
+            raise ValueError('format must be rows or columnar')
+        
+        # Validate all requested plazas with a single query
+        query = TollPlaza.query.with_entities(TollPlaza.plaza_id, TollPlaza.plaza_name)
+        if plaza_ids_arg:
+            requested = [int(p) for p in plaza_ids_arg.split(',') if p.strip()]
+            plazas = query.filter(TollPlaza.plaza_id.in_(requested)).all()
+            unknown = sorted(set(requested) - {p.plaza_id for p in plazas})
+            if unknown:
+                return jsonify({'success': False, 'message': f'Plaza not found: {unknown}'}), 404
+        else:
+            plazas = query.all()
+        plazas = sorted(plazas, key=lambda p: p.plaza_id)
+        plaza_ids = [p.plaza_id for p in plazas]
+        
+        model = ModelRegistry.get_active()
+        predictions = PredictionService.get_predictions(plaza_ids, date, hours_ahead, model) if plaza_ids else {}
+        
+        response = {
+            'success': True,
+            'date': str(date),
+            'hours_ahead': hours_ahead,
+            'ml_model_used': model is not None,
+            'model_version': model.version if model else None,
+            'format': output_format
+        }
+        
+        if output_format == 'columnar':
+            first = predictions[plaza_ids[0]] if plaza_ids else []
+            response.update({
+                'hours': [p['hour'] for p in first],
+                'plaza_ids': plaza_ids,
+                'plaza_names': [p.plaza_name for p in plazas],
+                'predicted_vehicles': [[p['predicted_vehicles'] for p in predictions[i]] for i in plaza_ids],
+                'traffic_level': [[p['traffic_level'] for p in predictions[i]] for i in plaza_ids],
+                'confidence': [[p['confidence'] for p in predictions[i]] for i in plaza_ids]
+            })
+        else:
+            response['plazas'] = [
+                {
+                    'plaza_id': plaza.plaza_id,
+                    'plaza_name': plaza.plaza_name,
+                    'predictions': predictions[plaza.plaza_id]
+                }
+                for plaza in plazas
+            ]
+        
+        return jsonify(response)
+    
+    except ValueError as e:
+        return jsonify({'success': False, 'message': f'Invalid parameter: {str(e)}'}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
+
 @api_bp.route('/traffic-summary/<int:plaza_id>', methods=['GET'])
 @login_required
 def traffic_summary(plaza_id):
@@ -151,6 +226,125 @@ def traffic_summary(plaza_id):
     except Exception as e:
         return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
 
+@api_bp.route('/anomalies', methods=['GET'])
+@login_required
+def traffic_anomalies():
+    """
+    Get detected traffic anomalies
+    
+    Parameters:
+        plaza_id: Only this plaza (optional)
+        hours: Look back this many hours from now (default: 24)
+        min_score: Minimum absolute robust z-score (optional)
+        limit: Maximum anomalies returned (default: 200)
+    """
+    if current_user.role not in [UserRole.ADMIN, UserRole.TOLL_OPERATOR]:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+    try:
+        from app.services.anomaly_service import AnomalyDetectionService
+        
+        plaza_id = request.args.get('plaza_id', type=int)
+        hours = int(request.args.get('hours', 24))
+        min_score = request.args.get('min_score', type=float)
+        limit = min(int(request.args.get('limit', 200)), 1000)
+        
+        since = datetime.utcnow() - timedelta(hours=hours)
+        anomalies = AnomalyDetectionService.get_anomalies(plaza_id, since, min_score, limit)
+        
+        return jsonify({
+            'success': True,
+            'since': since.isoformat(),
+            'count': len(anomalies),
+            'spikes': sum(1 for a in anomalies if a['direction'] == 'spike'),
+            'drops': sum(1 for a in anomalies if a['direction'] == 'drop'),
+            'anomalies': anomalies
+        })
+    
+    except ValueError as e:
+        return jsonify({'success': False, 'message': f'Invalid parameter: {str(e)}'}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
+
+@api_bp.route('/lanes', methods=['GET'])
+@login_required
+def lane_overview():
+    """
+    Get live throughput totals for every plaza with lane data
+    
+    Parameters:
+        minutes: Window length in minutes (default: 15)
+    """
+    from app.services.lane_metrics import LaneMetrics
+    
+    if current_user.role not in [UserRole.ADMIN, UserRole.TOLL_OPERATOR]:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+    try:
+        minutes = int(request.args.get('minutes', 15))
+        return jsonify({
+            'success': True,
+            'minutes': minutes,
+            'plazas': LaneMetrics.get_overview(minutes),
+            'timestamp': datetime.utcnow().isoformat()
+        })
+    except ValueError as e:
+        return jsonify({'success': False, 'message': f'Invalid parameter: {str(e)}'}), 400
+
+@api_bp.route('/lanes/<int:plaza_id>', methods=['GET'])
+@login_required
+def lane_metrics(plaza_id):
+    """
+    Get live per-lane throughput and processing latency for a plaza
+    
+    Served from in-memory ring buffers; no database access.
+    
+    Parameters:
+        minutes: Window length in minutes (default: 15)
+        series: Include per-minute series (true/false, default: false)
+    """
+    from app.services.lane_metrics import LaneMetrics
+    
+    if current_user.role not in [UserRole.ADMIN, UserRole.TOLL_OPERATOR]:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+    try:
+        minutes = int(request.args.get('minutes', 15))
+        series = request.args.get('series', 'false').lower() == 'true'
+        return jsonify({
+            'success': True,
+            'plaza_id': plaza_id,
+            'minutes': minutes,
+            'lanes': LaneMetrics.get_plaza_lanes(plaza_id, minutes, series),
+            'timestamp': datetime.utcnow().isoformat()
+        })
+    except ValueError as e:
+        return jsonify({'success': False, 'message': f'Invalid parameter: {str(e)}'}), 400
+
+@api_bp.route('/lane-plan', methods=['GET'])
+@login_required
+def lane_plan():
+    """
+    Get recommended open lanes and vehicle type lane assignments
+    
+    Combines live lane throughput, the traffic forecast and an M/M/c
+    queue model; the network plan is shared between callers for
+    LANE_PLAN_CACHE_SECONDS so signage controllers can poll it.
+    
+    Parameters:
+        plaza_id: Only this plaza (optional, default: whole network)
+    """
+    if current_user.role not in [UserRole.ADMIN, UserRole.TOLL_OPERATOR]:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+    try:
+        from app.services.lane_assignment_service import LaneAssignmentService
+        
+        plan = LaneAssignmentService.get_plan(request.args.get('plaza_id', type=int))
+        return jsonify(dict(plan, success=True))
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
+
 @api_bp.route('/pricing-recommendation/<int:plaza_id>', methods=['GET'])
 @login_required
 def pricing_recommendation(plaza_id):
@@ -168,11 +362,13 @@ def pricing_recommendation(plaza_id):
             return jsonify({'success': False, 'message': 'Plaza not found'}), 404
         
         # Get predictions for next few hours
-        predictions = _get_ml_predictions(
-            plaza_id,
+        model = ModelRegistry.get_active()
+        predictions = PredictionService.get_predictions(
+            [plaza_id],
             datetime.utcnow().date(),
-            hours_ahead=6
-        )
+            6,
+            model
+        )[plaza_id]
         
         # Calculate recommendation based on average predicted traffic
         avg_vehicle_count = sum(p['predicted_vehicles'] for p in predictions) / len(predictions) if predictions else 0
@@ -198,130 +394,10 @@ def pricing_recommendation(plaza_id):
             'tariff_multiplier': multiplier,
             'reason': reason,
             'avg_predicted_vehicles': round(avg_vehicle_count, 2),
-            'next_hours_predictions': predictions
+            'next_hours_predictions': predictions,
+            'published_multipliers': DynamicPricingService.get_plaza_schedule(plaza_id, 6),
+            'model_version': model.version if model else None
         })
     
     except Exception as e:
         return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
-
-# ============================================================================
-# Helper Functions for Predictions
-# ============================================================================
-
-def _get_ml_predictions(plaza_id, date, hours_ahead=6):
-    """
-    Get predictions using trained ML model
-    
-    Args:
-        plaza_id: ID of the toll plaza
-        date: Date to predict for
-        hours_ahead: Number of hours to predict
-    
-    Returns:
-        List of predictions
-    """
-    global ml_model
-    
-    if not ml_model:
-        return _get_historical_baseline(plaza_id, date, hours_ahead)
-    
-    try:
-        import numpy as np
-        
-        predictions = []
-        current_hour = datetime.utcnow().hour
-        
-        for i in range(hours_ahead):
-            hour = (current_hour + i + 1) % 24
-            
-            # Prepare features for ML model
-            # Assuming model expects: [plaza_id, hour, day_of_week, is_peak]
-            day_of_week = date.weekday()
-            is_peak = 1 if (7 <= hour < 10) or (17 <= hour < 20) else 0
-            
-            features = np.array([[plaza_id, hour, day_of_week, is_peak]])
-            
-            try:
-                predicted_vehicles = max(0, int(ml_model.predict(features)[0]))
-                traffic_level = _determine_traffic_level(predicted_vehicles)
-                
-                predictions.append({
-                    'hour': hour,
-                    'predicted_vehicles': predicted_vehicles,
-                    'traffic_level': traffic_level,
-                    'confidence': 0.75  # Placeholder confidence score
-                })
-            except:
-                # If prediction fails, use baseline
-                baseline = _get_hourly_baseline(plaza_id, hour)
-                traffic_level = _determine_traffic_level(baseline)
-                predictions.append({
-                    'hour': hour,
-                    'predicted_vehicles': baseline,
-                    'traffic_level': traffic_level,
-                    'confidence': 0.5
-                })
-        
-        return predictions
-    
-    except Exception as e:
-        print(f"ML prediction error: {str(e)}")
-        return _get_historical_baseline(plaza_id, date, hours_ahead)
-
-def _get_historical_baseline(plaza_id, date, hours_ahead=6):
-    """
-    Get baseline predictions from historical data
-    """
-    predictions = []
-    current_hour = datetime.utcnow().hour
-    
-    for i in range(hours_ahead):
-        hour = (current_hour + i + 1) % 24
-        baseline = _get_hourly_baseline(plaza_id, hour)
-        traffic_level = _determine_traffic_level(baseline)
-        
-        predictions.append({
-            'hour': hour,
-            'predicted_vehicles': baseline,
-            'traffic_level': traffic_level,
-            'confidence': 0.5
-        })
-    
-    return predictions
-
-def _get_hourly_baseline(plaza_id, hour):
-    """
-    Get average vehicle count for a specific hour from historical data
-    """
-    from app.models import TrafficLog
-    
-    # Get average for this hour from last 30 days
-    cutoff_date = datetime.utcnow().date() - timedelta(days=30)
-    
-    logs = TrafficLog.query.filter(
-        TrafficLog.plaza_id == plaza_id,
-        TrafficLog.hour == hour,
-        TrafficLog.date >= cutoff_date
-    ).all()
-    
-    if logs:
-        return int(sum(log.vehicle_count for log in logs) / len(logs))
-    
-    # Default baseline based on hour
-    if 7 <= hour < 10 or 17 <= hour < 20:
-        return 100  # Peak hours
-    elif 11 <= hour < 16:
-        return 50   # Off-peak
-    else:
-        return 20   # Night hours
-
-def _determine_traffic_level(vehicle_count):
-    """
-    Determine traffic level based on vehicle count
-    """
-    if vehicle_count > 150:
-        return 'high'
-    elif vehicle_count > 75:
-        return 'normal'
-    else:
-        return 'low'
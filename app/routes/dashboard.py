@@ -144,6 +144,7 @@ def toll_history():
     View toll transaction history for all user vehicles
     """
     from app.models import TollTransaction
+    from sqlalchemy.orm import joinedload
     
     vehicles = Vehicle.query.filter_by(user_id=current_user.user_id).all()
     vehicle_ids = [v.vehicle_id for v in vehicles]
@@ -152,7 +153,10 @@ def toll_history():
     per_page = 20
     
     if vehicle_ids:
-        pagination = TollTransaction.query.filter(
+        pagination = TollTransaction.query.options(
+            joinedload(TollTransaction.vehicle),
+            joinedload(TollTransaction.plaza)
+        ).filter(
             TollTransaction.vehicle_id.in_(vehicle_ids)
         ).order_by(TollTransaction.timestamp.desc()).paginate(page=page, per_page=per_page)
     else:
@@ -125,9 +125,14 @@ def get_receipt(txn_id):
     """
     Get transaction receipt
     """
-    from app.models import TollTransaction, TollPlaza
+    from app.models import TollTransaction
+    from sqlalchemy.orm import joinedload
     
-    txn = TollTransaction.query.get(txn_id)
+    # Vehicle and plaza are loaded in the same query
+    txn = TollTransaction.query.options(
+        joinedload(TollTransaction.vehicle),
+        joinedload(TollTransaction.plaza)
+    ).get(txn_id)
     
     if not txn:
         return jsonify({'success': False, 'message': 'Transaction not found'}), 404
@@ -0,0 +1,381 @@
+"""
+Analytics Engine - Pluggable backends for transaction analytics
+Computes hourly traffic, revenue by plaza, vehicle distribution and peak
+hours either locally with pandas/NumPy or on Spark, with identical output
+"""
+
+import time
+import numpy as np
+import pandas as pd
+from flask import current_app
+from app import db
+from app.models import TollTransaction, TollPlaza, Vehicle
+
+TRANSACTION_COLUMNS = ['txn_id', 'plaza_id', 'plaza_name', 'vehicle_type', 'amount', 'timestamp']
+PEAK_HOURS_LIMIT = 5
+
+def import_parquet():
+    """
+    Import pyarrow and pyarrow.parquet, which Parquet exports and file
+    sources need, with an actionable error when pyarrow is missing
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as exc:
+        raise ImportError('Parquet files need pyarrow: pip install pyarrow (see requirements.txt)') from exc
+    return pa, pq
+
+# ============================================================================
+# Transaction Sources
+# ============================================================================
+class TransactionSource:
+    """
+    Base class for transaction sources. Sources yield pandas DataFrames with
+    TRANSACTION_COLUMNS in bounded-size chunks so engines can stream them.
+    """
+    
+    def iter_chunks(self):
+        raise NotImplementedError
+    
+    def to_frame(self):
+        """Materialise the whole source as one DataFrame"""
+        chunks = list(self.iter_chunks())
+        if not chunks:
+            return pd.DataFrame(columns=TRANSACTION_COLUMNS)
+        return pd.concat(chunks, ignore_index=True)
+    
+    def to_spark(self, spark):
+        """
+        Create a Spark DataFrame for this source. The default ships the data
+        from the driver; database and file sources let Spark read directly.
+        """
+        return spark.createDataFrame(self.to_frame()[TRANSACTION_COLUMNS])
+    
+    def write_parquet(self, path):
+        """
+        Export the source to a Parquet file one chunk at a time
+        
+        Returns:
+            Number of rows written
+        """
+        pa, pq = import_parquet()
+        
+        writer = None
+        rows = 0
+        try:
+            for chunk in self.iter_chunks():
+                table = pa.Table.from_pandas(chunk[TRANSACTION_COLUMNS], preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema)
+                writer.write_table(table)
+                rows += len(chunk)
+        finally:
+            if writer is not None:
+                writer.close()
+        return rows
+
+class DatabaseTransactionSource(TransactionSource):
+    """
+    Streams transactions from the database using keyset pagination on txn_id
+    with a single joined column query per chunk (no ORM objects)
+    """
+    
+    def __init__(self, chunk_size=50000):
+        self.chunk_size = chunk_size
+    
+    def iter_chunks(self):
+        last_txn_id = 0
+        
+        while True:
+            rows = db.session.query(
+                TollTransaction.txn_id,
+                TollTransaction.plaza_id,
+                TollPlaza.plaza_name,
+                Vehicle.vehicle_type,
+                TollTransaction.amount,
+                TollTransaction.timestamp
+            ).join(
+                TollPlaza, TollTransaction.plaza_id == TollPlaza.plaza_id
+            ).join(
+                Vehicle, TollTransaction.vehicle_id == Vehicle.vehicle_id
+            ).filter(
+                TollTransaction.txn_id > last_txn_id
+            ).order_by(
+                TollTransaction.txn_id
+            ).limit(self.chunk_size).all()
+            
+            if not rows:
+                break
+            
+            frame = pd.DataFrame.from_records(rows, columns=TRANSACTION_COLUMNS)
+            frame['vehicle_type'] = frame['vehicle_type'].map(lambda v: v.value)
+            frame['timestamp'] = pd.to_datetime(frame['timestamp'])
+            last_txn_id = rows[-1][0]
+            yield frame
+            
+            if len(rows) < self.chunk_size:
+                break
+    
+    def to_spark(self, spark):
+        """Partitioned JDBC read on txn_id ranges, executed by Spark"""
+        from app.services.spark_jobs import read_transactions_jdbc
+        return read_transactions_jdbc(spark).select(*TRANSACTION_COLUMNS)
+
+class FrameTransactionSource(TransactionSource):
+    """
+    Wraps an in-memory DataFrame (benchmarks, exported data)
+    """
+    
+    def __init__(self, frame, chunk_size=None):
+        self.frame = frame
+        self.chunk_size = chunk_size
+    
+    def iter_chunks(self):
+        if not self.chunk_size:
+            yield self.frame
+            return
+        for start in range(0, len(self.frame), self.chunk_size):
+            yield self.frame.iloc[start:start + self.chunk_size]
+    
+    def to_frame(self):
+        return self.frame
+
+class ColumnarFileTransactionSource(TransactionSource):
+    """
+    Streams transactions from an exported Parquet or CSV file
+    """
+    
+    def __init__(self, path, chunk_size=50000):
+        self.path = path
+        self.chunk_size = chunk_size
+    
+    def iter_chunks(self):
+        if self.path.endswith('.parquet'):
+            _, pq = import_parquet()
+            parquet_file = pq.ParquetFile(self.path)
+            for batch in parquet_file.iter_batches(batch_size=self.chunk_size, columns=TRANSACTION_COLUMNS):
+                yield batch.to_pandas()
+        else:
+            for frame in pd.read_csv(self.path, usecols=TRANSACTION_COLUMNS,
+                                     parse_dates=['timestamp'], chunksize=self.chunk_size):
+                yield frame
+    
+    def to_spark(self, spark):
+        """Let Spark read the exported files directly"""
+        from app.services.spark_jobs import read_transactions_files
+        return read_transactions_files(spark, self.path).select(*TRANSACTION_COLUMNS)
+
+# ============================================================================
+# Analytics Backends
+# ============================================================================
+class AnalyticsBackend:
+    """
+    Base class for analytics backends
+    
+    Engines only compute the three small aggregates (hourly, per plaza, per
+    vehicle type); ordering, rounding and peak hours are derived here so every
+    backend returns exactly the same structure and values.
+    """
+    
+    name = None
+    
+    def aggregate(self, source):
+        """
+        Compute raw aggregates for a source
+        
+        Returns:
+            Tuple of (hourly, by_plaza, by_vehicle) DataFrames with columns
+            [hour, vehicle_count, total_revenue], [plaza, count, revenue]
+            and [type, count]
+        """
+        raise NotImplementedError
+    
+    def run(self, source, progress=None):
+        """
+        Run all analyses over a transaction source
+        
+        Args:
+            source: TransactionSource to read
+            progress: Optional callback(percent, message)
+        
+        Returns:
+            Dictionary with hourly_traffic, revenue_by_plaza,
+            vehicle_distribution, peak_hours and totals
+        """
+        started = time.perf_counter()
+        if progress:
+            progress(10, f'Aggregating transactions ({self.name})')
+        
+        hourly, by_plaza, by_vehicle = self.aggregate(source)
+        
+        if progress:
+            progress(90, 'Formatting results')
+        results = AnalyticsBackend.build_results(hourly, by_plaza, by_vehicle)
+        results['backend'] = self.name
+        results['elapsed_seconds'] = round(time.perf_counter() - started, 3)
+        return results
+    
+    @staticmethod
+    def build_results(hourly, by_plaza, by_vehicle):
+        """
+        Normalise raw aggregates into the canonical result structure
+        """
+        hourly = hourly.sort_values('hour')
+        hourly_traffic = [
+            {
+                'hour': int(r.hour),
+                'vehicle_count': int(r.vehicle_count),
+                'total_revenue': round(float(r.total_revenue), 2)
+            }
+            for r in hourly.itertuples()
+        ]
+        
+        by_plaza = by_plaza.assign(revenue=by_plaza['revenue'].astype(float).round(2))
+        by_plaza = by_plaza.sort_values(['revenue', 'plaza'], ascending=[False, True])
+        revenue_by_plaza = [
+            {'plaza': r.plaza, 'count': int(r.count), 'revenue': float(r.revenue)}
+            for r in by_plaza.itertuples()
+        ]
+        
+        by_vehicle = by_vehicle.sort_values(['count', 'type'], ascending=[False, True])
+        vehicle_distribution = [
+            {'type': r.type, 'count': int(r.count)} for r in by_vehicle.itertuples()
+        ]
+        
+        peak_hours = sorted(hourly_traffic, key=lambda h: (-h['vehicle_count'], h['hour']))
+        
+        return {
+            'total_transactions': int(sum(h['vehicle_count'] for h in hourly_traffic)),
+            'total_revenue': round(float(hourly['total_revenue'].sum()), 2),
+            'hourly_traffic': hourly_traffic,
+            'revenue_by_plaza': revenue_by_plaza,
+            'vehicle_distribution': vehicle_distribution,
+            'peak_hours': peak_hours[:PEAK_HOURS_LIMIT]
+        }
+
+class LocalAnalyticsBackend(AnalyticsBackend):
+    """
+    Pure pandas/NumPy engine. Streams chunks and merges partial aggregates,
+    so memory is bounded by the chunk size rather than the dataset.
+    """
+    
+    name = 'local'
+    
+    def aggregate(self, source):
+        hour_counts = np.zeros(24, dtype=np.int64)
+        hour_revenue = np.zeros(24, dtype=np.float64)
+        plaza_counts = pd.Series(dtype=np.int64)
+        plaza_revenue = pd.Series(dtype=np.float64)
+        vehicle_counts = pd.Series(dtype=np.int64)
+        
+        for chunk in source.iter_chunks():
+            if chunk.empty:
+                continue
+            hours = pd.to_datetime(chunk['timestamp']).dt.hour.to_numpy()
+            amounts = chunk['amount'].to_numpy(dtype=np.float64)
+            hour_counts += np.bincount(hours, minlength=24)
+            hour_revenue += np.bincount(hours, weights=amounts, minlength=24)
+            
+            grouped = chunk.groupby('plaza_name', sort=False)['amount']
+            plaza_counts = plaza_counts.add(grouped.size(), fill_value=0)
+            plaza_revenue = plaza_revenue.add(grouped.sum(), fill_value=0)
+            vehicle_counts = vehicle_counts.add(chunk['vehicle_type'].value_counts(sort=False), fill_value=0)
+        
+        observed = hour_counts > 0
+        hourly = pd.DataFrame({
+            'hour': np.arange(24)[observed],
+            'vehicle_count': hour_counts[observed],
+            'total_revenue': hour_revenue[observed]
+        })
+        by_plaza = pd.DataFrame({
+            'plaza': plaza_counts.index,
+            'count': plaza_counts.to_numpy(dtype=np.int64),
+            'revenue': plaza_revenue.reindex(plaza_counts.index).to_numpy()
+        })
+        by_vehicle = pd.DataFrame({
+            'type': vehicle_counts.index,
+            'count': vehicle_counts.to_numpy(dtype=np.int64)
+        })
+        return hourly, by_plaza, by_vehicle
+
+class SparkAnalyticsBackend(AnalyticsBackend):
+    """
+    Spark engine. Uses the long-lived session from SparkAnalysisService
+    unless a session is passed explicitly.
+    """
+    
+    name = 'spark'
+    
+    def __init__(self, spark=None):
+        self._spark = spark
+    
+    @property
+    def spark(self):
+        if self._spark is None:
+            from app.services.spark_analysis_service import SparkAnalysisService
+            self._spark = SparkAnalysisService.get_spark_analytics().spark
+        return self._spark
+    
+    def load_dataframe(self, source):
+        """Create a Spark DataFrame from a transaction source"""
+        return source.to_spark(self.spark)
+    
+    def aggregate(self, source):
+        from pyspark.sql import functions as F
+        
+        df = self.load_dataframe(source).cache()
+        try:
+            hourly = df.groupBy(F.hour('timestamp').alias('hour')).agg(
+                F.count('*').alias('vehicle_count'),
+                F.sum('amount').alias('total_revenue')
+            ).toPandas()
+            by_plaza = df.groupBy(F.col('plaza_name').alias('plaza')).agg(
+                F.count('*').alias('count'),
+                F.sum('amount').alias('revenue')
+            ).toPandas()
+            by_vehicle = df.groupBy(F.col('vehicle_type').alias('type')).agg(
+                F.count('*').alias('count')
+            ).toPandas()
+        finally:
+            df.unpersist()
+        return hourly, by_plaza, by_vehicle
+
+ANALYTICS_BACKENDS = {
+    LocalAnalyticsBackend.name: LocalAnalyticsBackend,
+    SparkAnalyticsBackend.name: SparkAnalyticsBackend
+}
+
+def get_analytics_backend(name=None):
+    """
+    Get the analytics backend selected by ANALYTICS_BACKEND (or by name)
+    
+    Args:
+        name: Optional backend name overriding configuration
+    
+    Returns:
+        AnalyticsBackend instance
+    """
+    name = name or current_app.config['ANALYTICS_BACKEND']
+    if name not in ANALYTICS_BACKENDS:
+        raise ValueError(f'Unknown analytics backend: {name}')
+    return ANALYTICS_BACKENDS[name]()
+
+def run_analytics_job(job):
+    """
+    Background job entry point: run the configured backend over the database
+    
+    Args:
+        job: Job record used to report progress
+    
+    Returns:
+        Analytics result dictionary
+    """
+    backend = get_analytics_backend()
+    source = DatabaseTransactionSource(chunk_size=current_app.config['ANALYTICS_CHUNK_SIZE'])
+    results = backend.run(source, progress=job.update_progress)
+    results['message'] = (
+        f"{backend.name.title()} analysis completed: "
+        f"{results['total_transactions']} transactions processed in {results['elapsed_seconds']}s"
+    )
+    return results
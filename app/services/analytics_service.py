@@ -58,6 +58,7 @@ class AnalyticsService:
             # Get all toll plazas
             plazas = TollPlaza.query.all()
             logs_created = 0
+            baseline_changes = []
             
             for plaza in plazas:
                 # Get last 24 hours of transactions
@@ -104,9 +105,14 @@ class AnalyticsService:
                     ).first()
                     
                     if existing_log:
+                        baseline_changes.append((plaza.plaza_id, date, hour, existing_log.vehicle_count, data['count']))
                         existing_log.vehicle_count = data['count']
                         existing_log.total_revenue = data['revenue']
                         existing_log.traffic_level = traffic_level
+                        # First write since the hour closed: the count is final even if unchanged
+                        hour_end = dt + timedelta(hours=1)
+                        if existing_log.updated_at < hour_end <= datetime.utcnow():
+                            existing_log.updated_at = datetime.utcnow()
                     else:
                         new_log = TrafficLog(
                             plaza_id=plaza.plaza_id,
@@ -117,9 +123,28 @@ class AnalyticsService:
                             traffic_level=traffic_level
                         )
                         db.session.add(new_log)
+                        baseline_changes.append((plaza.plaza_id, date, hour, None, data['count']))
                         logs_created += 1
             
             db.session.commit()
+            
+            # Keep the in-memory baseline matrix in step with TrafficLog
+            from app.services.baseline_service import TrafficBaselineService
+            for change in baseline_changes:
+                TrafficBaselineService.apply_change(*change)
+            
+            # Refresh lag/rolling features that depend on the changed hours
+            from app.services.feature_store_service import FeatureStoreService
+            FeatureStoreService.refresh_for_cells(
+                (plaza_id, date, hour) for plaza_id, date, hour, _, _ in baseline_changes
+            )
+            
+            # Score the changed hours against their seasonal baseline
+            from app.services.anomaly_service import AnomalyDetectionService
+            AnomalyDetectionService.score_cells(
+                (plaza_id, date, hour) for plaza_id, date, hour, _, _ in baseline_changes
+            )
+            
             return {
                 'success': True,
                 'message': f'Generated/updated traffic logs for {logs_created} entries',
@@ -279,3 +304,36 @@ class AnalyticsService:
             {'hour': int(r[0]), 'vehicle_count': r[1]}
             for r in results
         ]
+    
+    @staticmethod
+    def get_peak_hours_bulk(plaza_ids, days=7):
+        """
+        Get peak traffic hours for several plazas with one grouped query
+        
+        Args:
+            plaza_ids: List of toll plaza IDs
+            days: Number of days to analyze
+        
+        Returns:
+            Dictionary of plaza_id -> hours sorted by vehicle count (descending)
+        """
+        cutoff_date = datetime.utcnow() - timedelta(days=days)
+        hour = func.strftime('%H', TollTransaction.timestamp)
+        
+        results = db.session.query(
+            TollTransaction.plaza_id,
+            hour.label('hour'),
+            func.count(TollTransaction.txn_id).label('vehicle_count')
+        ).filter(
+            and_(
+                TollTransaction.plaza_id.in_(plaza_ids),
+                TollTransaction.timestamp >= cutoff_date
+            )
+        ).group_by(
+            TollTransaction.plaza_id, hour
+        ).order_by(db.desc('vehicle_count')).all()
+        
+        peak_hours = {plaza_id: [] for plaza_id in plaza_ids}
+        for plaza_id, hour_value, vehicle_count in results:
+            peak_hours[plaza_id].append({'hour': int(hour_value), 'vehicle_count': vehicle_count})
+        return peak_hours
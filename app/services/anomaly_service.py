@@ -0,0 +1,253 @@
+"""
+Anomaly Detection Service - Seasonal robust z-scores over TrafficLog
+Every plaza-hour is compared with the same weekday and hour of the previous
+ANOMALY_BASELINE_WEEKS weeks: the median is the expected count and the
+median absolute deviation (floored at Poisson noise) the scale. Scores are
+computed for all plazas at once on an hours x plazas matrix, using only
+history strictly before each hour, so a backfill and incremental scoring
+of new hours give the same results. Only closed hours (before the current
+UTC hour) are scored: the hour in progress holds a partial count. Anomalous
+hours go to TrafficAnomaly.
+"""
+
+import warnings
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+from flask import current_app
+from app import db
+from app.models import TrafficLog, TrafficAnomaly
+
+# Scales the MAD to a standard deviation for normally distributed counts
+MAD_TO_STD = 1.4826
+
+class AnomalyDetectionService:
+    """
+    Service class scoring TrafficLog hours and storing anomalies
+    """
+    
+    @staticmethod
+    def score_matrix(matrix, weeks, min_history):
+        """
+        Robust z-scores for an hours x plazas matrix of counts
+        
+        Args:
+            matrix: DataFrame indexed by consecutive hours, one column per
+                plaza, NaN where no count is known
+            weeks: Number of previous same-weekday hours forming the baseline
+            min_history: Minimum known baseline hours needed to score
+        
+        Returns:
+            Tuple of (expected, z) arrays shaped like matrix; z is NaN
+            where there is no count or not enough history
+        """
+        values = matrix.to_numpy(dtype=np.float64)
+        history = np.stack([matrix.shift(168 * k).to_numpy(dtype=np.float64) for k in range(1, weeks + 1)])
+        
+        # Hours without any history produce all-NaN slices; they are masked below
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            expected = np.nanmedian(history, axis=0)
+            mad = np.nanmedian(np.abs(history - expected), axis=0)
+        
+        scale = np.maximum(MAD_TO_STD * mad, np.sqrt(np.maximum(expected, 1.0)))
+        known = np.sum(~np.isnan(history), axis=0)
+        with np.errstate(invalid='ignore'):
+            z = np.where(known >= min_history, (values - expected) / scale, np.nan)
+        return expected, z
+    
+    @staticmethod
+    def score_range(plaza_ids, start, end):
+        """
+        Score every hour of [start, end] for the given plazas and replace
+        their stored anomalies
+        
+        Long ranges are processed a month at a time to bound memory.
+        
+        Args:
+            plaza_ids: Plazas to score
+            start: First date to score
+            end: Last date to score (inclusive)
+        
+        Returns:
+            Dictionary with hours scored, anomalies found and how many of
+            those were not stored before
+        """
+        plaza_ids = sorted(set(plaza_ids))
+        result = {'hours_scored': 0, 'anomalies': 0, 'new_anomalies': 0}
+        if not plaza_ids:
+            return result
+        
+        chunk_start = start
+        while chunk_start <= end:
+            chunk_end = min(end, chunk_start + timedelta(days=30))
+            scored, anomalies, new = AnomalyDetectionService._score_chunk(plaza_ids, chunk_start, chunk_end)
+            result['hours_scored'] += scored
+            result['anomalies'] += anomalies
+            result['new_anomalies'] += new
+            chunk_start = chunk_end + timedelta(days=1)
+        return result
+    
+    @staticmethod
+    def _score_chunk(plaza_ids, start, end):
+        config = current_app.config
+        weeks = config['ANOMALY_BASELINE_WEEKS']
+        first = start - timedelta(weeks=weeks)
+        
+        rows = db.session.query(
+            TrafficLog.plaza_id,
+            TrafficLog.date,
+            TrafficLog.hour,
+            TrafficLog.vehicle_count
+        ).filter(
+            TrafficLog.plaza_id.in_(plaza_ids),
+            TrafficLog.date >= first,
+            TrafficLog.date <= end
+        ).all()
+        
+        index = pd.date_range(pd.Timestamp(first), pd.Timestamp(end) + pd.Timedelta(hours=23), freq='h')
+        if rows:
+            counts = pd.DataFrame.from_records(rows, columns=['plaza_id', 'date', 'hour', 'vehicle_count'])
+            timestamps = pd.to_datetime(counts['date']) + pd.to_timedelta(counts['hour'], unit='h')
+            matrix = pd.Series(
+                counts['vehicle_count'].to_numpy(dtype=np.float64),
+                index=pd.MultiIndex.from_arrays([timestamps, counts['plaza_id'].to_numpy()])
+            ).unstack()
+        else:
+            matrix = pd.DataFrame(index=index)
+        matrix = matrix.reindex(index=index, columns=plaza_ids)
+        
+        expected, z = AnomalyDetectionService.score_matrix(matrix, weeks, config['ANOMALY_MIN_HISTORY'])
+        values = matrix.to_numpy()
+        # Transactions are stamped in UTC; the current hour is still filling up
+        closed_before = pd.Timestamp(datetime.utcnow()).floor('h')
+        targets = np.asarray((index >= pd.Timestamp(start)) & (index < closed_before))
+        scored = int(np.sum(~np.isnan(z[targets])))
+        
+        with np.errstate(invalid='ignore'):
+            flagged = targets[:, None] & (np.abs(z) >= config['ANOMALY_Z_THRESHOLD'])
+        hour_rows, plaza_columns = np.nonzero(flagged)
+        
+        detected_at = datetime.utcnow()
+        records = [
+            {
+                'plaza_id': plaza_ids[p],
+                'date': index[h].date(),
+                'hour': int(index[h].hour),
+                'vehicle_count': int(values[h, p]),
+                'expected_count': round(float(expected[h, p]), 2),
+                'score': round(float(z[h, p]), 3),
+                'direction': 'spike' if z[h, p] > 0 else 'drop',
+                'detected_at': detected_at
+            }
+            for h, p in zip(hour_rows, plaza_columns)
+        ]
+        
+        stored = TrafficAnomaly.query.filter(
+            TrafficAnomaly.plaza_id.in_(plaza_ids),
+            TrafficAnomaly.date >= start,
+            TrafficAnomaly.date <= end
+        )
+        known = set(stored.with_entities(
+            TrafficAnomaly.plaza_id, TrafficAnomaly.date, TrafficAnomaly.hour, TrafficAnomaly.direction
+        ))
+        new = sum(
+            (record['plaza_id'], record['date'], record['hour'], record['direction']) not in known
+            for record in records
+        )
+        
+        stored.delete(synchronize_session=False)
+        if records:
+            db.session.execute(TrafficAnomaly.__table__.insert(), records)
+        db.session.commit()
+        return scored, len(records), new
+    
+    @staticmethod
+    def score_cells(cells):
+        """
+        Incrementally score the days containing changed TrafficLog cells
+        
+        Args:
+            cells: Iterable of (plaza_id, date, hour) whose counts changed
+        
+        Returns:
+            Dictionary with hours scored, anomalies found and new anomalies
+        """
+        cells = list(cells)
+        if not cells:
+            return {'hours_scored': 0, 'anomalies': 0, 'new_anomalies': 0}
+        
+        result = AnomalyDetectionService.score_range(
+            [plaza_id for plaza_id, _, _ in cells],
+            min(date for _, date, _ in cells),
+            max(date for _, date, _ in cells)
+        )
+        
+        # Re-scored days return their earlier anomalies too; alert on the new ones
+        if result['new_anomalies']:
+            from app.services.event_hub import EventHub
+            EventHub.record_alert('danger', f"{result['new_anomalies']} new traffic anomalies detected",
+                                  anomalies=result['new_anomalies'])
+        return result
+    
+    @staticmethod
+    def backfill(days=None):
+        """
+        Score the TrafficLog history for all plazas
+        
+        Args:
+            days: Only score the last N days (default: full history)
+        
+        Returns:
+            Dictionary with hours scored and anomalies found
+        """
+        first, last = db.session.query(db.func.min(TrafficLog.date), db.func.max(TrafficLog.date)).one()
+        if first is None:
+            return {'hours_scored': 0, 'anomalies': 0}
+        
+        start = max(first, last - timedelta(days=days - 1)) if days else first
+        plaza_ids = [row.plaza_id for row in db.session.query(TrafficLog.plaza_id).distinct()]
+        return AnomalyDetectionService.score_range(plaza_ids, start, last)
+    
+    @staticmethod
+    def get_anomalies(plaza_id=None, since=None, min_score=None, limit=200):
+        """
+        Stored anomalies, most recent first
+        
+        Args:
+            plaza_id: Only this plaza (default: all)
+            since: Only hours at or after this datetime
+            min_score: Only anomalies with |score| at or above this value
+            limit: Maximum number of anomalies returned
+        
+        Returns:
+            List of anomaly dictionaries
+        """
+        query = TrafficAnomaly.query
+        if plaza_id:
+            query = query.filter(TrafficAnomaly.plaza_id == plaza_id)
+        if since:
+            query = query.filter(db.or_(
+                TrafficAnomaly.date > since.date(),
+                db.and_(TrafficAnomaly.date == since.date(), TrafficAnomaly.hour >= since.hour)
+            ))
+        if min_score:
+            query = query.filter(db.func.abs(TrafficAnomaly.score) >= min_score)
+        
+        anomalies = query.order_by(
+            TrafficAnomaly.date.desc(), TrafficAnomaly.hour.desc(), TrafficAnomaly.plaza_id
+        ).limit(limit).all()
+        
+        return [
+            {
+                'plaza_id': a.plaza_id,
+                'date': a.date.isoformat(),
+                'hour': a.hour,
+                'vehicle_count': a.vehicle_count,
+                'expected_count': a.expected_count,
+                'score': a.score,
+                'direction': a.direction,
+                'detected_at': a.detected_at.isoformat()
+            }
+            for a in anomalies
+        ]
@@ -0,0 +1,203 @@
+"""
+Traffic Baseline Service - Precomputed plaza x day-of-week x hour baselines
+Holds the mean, standard deviation and sample count of hourly vehicle
+counts over a rolling window as NumPy arrays, so baseline forecasts and
+confidence scores are array lookups instead of TrafficLog queries
+"""
+
+import threading
+import time
+import numpy as np
+from datetime import datetime, timedelta
+from flask import current_app
+from app import db
+from app.models import TrafficLog
+
+class TrafficBaselineService:
+    """
+    Service class maintaining the in-memory baseline matrix
+    
+    Sums, sums of squares and counts are stored per (plaza, day_of_week, hour)
+    so single TrafficLog changes can be applied incrementally. The matrix is
+    rebuilt when the rolling window moves to a new day or after
+    BASELINE_REFRESH_SECONDS (changes made by other processes).
+    """
+    
+    _plaza_index = {}
+    _sums = None
+    _sums_sq = None
+    _counts = None
+    _window_start = None
+    _built_at = None
+    _lock = threading.RLock()
+    
+    @staticmethod
+    def _window_start_for_today():
+        return datetime.utcnow().date() - timedelta(days=current_app.config['BASELINE_WINDOW_DAYS'])
+    
+    @staticmethod
+    def ensure_loaded():
+        """
+        Build the matrix on first use or when it has gone stale
+        """
+        cls = TrafficBaselineService
+        stale = (
+            cls._counts is None
+            or cls._window_start != cls._window_start_for_today()
+            or time.monotonic() - cls._built_at > current_app.config['BASELINE_REFRESH_SECONDS']
+        )
+        if stale:
+            cls.rebuild()
+    
+    @staticmethod
+    def rebuild():
+        """
+        Rebuild the whole matrix from TrafficLog over the rolling window
+        """
+        cls = TrafficBaselineService
+        window_start = cls._window_start_for_today()
+        
+        rows = db.session.query(
+            TrafficLog.plaza_id,
+            TrafficLog.date,
+            TrafficLog.hour,
+            TrafficLog.vehicle_count
+        ).filter(TrafficLog.date >= window_start).all()
+        
+        plaza_ids = sorted({r.plaza_id for r in rows})
+        plaza_index = {plaza_id: i for i, plaza_id in enumerate(plaza_ids)}
+        shape = (len(plaza_ids), 7, 24)
+        sums = np.zeros(shape)
+        sums_sq = np.zeros(shape)
+        counts = np.zeros(shape, dtype=np.int64)
+        
+        if rows:
+            plaza_rows = np.fromiter((plaza_index[r.plaza_id] for r in rows), dtype=np.int64, count=len(rows))
+            days = np.fromiter((r.date.weekday() for r in rows), dtype=np.int64, count=len(rows))
+            hours = np.fromiter((r.hour for r in rows), dtype=np.int64, count=len(rows))
+            values = np.fromiter((r.vehicle_count for r in rows), dtype=np.float64, count=len(rows))
+            np.add.at(sums, (plaza_rows, days, hours), values)
+            np.add.at(sums_sq, (plaza_rows, days, hours), values ** 2)
+            np.add.at(counts, (plaza_rows, days, hours), 1)
+        
+        with cls._lock:
+            cls._plaza_index = plaza_index
+            cls._sums = sums
+            cls._sums_sq = sums_sq
+            cls._counts = counts
+            cls._window_start = window_start
+            cls._built_at = time.monotonic()
+    
+    @staticmethod
+    def invalidate():
+        """
+        Force a rebuild on next use (after bulk TrafficLog changes)
+        """
+        from app.services.prediction_cache import PredictionCache
+        
+        with TrafficBaselineService._lock:
+            TrafficBaselineService._counts = None
+        PredictionCache.clear()
+    
+    @staticmethod
+    def apply_change(plaza_id, date, hour, old_count, new_count):
+        """
+        Apply one inserted or updated TrafficLog row incrementally
+        
+        Args:
+            plaza_id: ID of the toll plaza
+            date: Date of the log row
+            hour: Hour of the log row
+            old_count: Previous vehicle_count, or None for a new row
+            new_count: New vehicle_count
+        """
+        from app.services.prediction_cache import PredictionCache
+        
+        cls = TrafficBaselineService
+        with cls._lock:
+            if cls._counts is None or date < cls._window_start:
+                # Rebuilt before the next read, or outside the window
+                pass
+            elif plaza_id not in cls._plaza_index:
+                # New plaza: cheaper to rebuild than to grow every array
+                cls._counts = None
+            else:
+                cell = (cls._plaza_index[plaza_id], date.weekday(), hour)
+                if old_count is None:
+                    cls._counts[cell] += 1
+                    old_count = 0
+                cls._sums[cell] += new_count - old_count
+                cls._sums_sq[cell] += new_count ** 2 - old_count ** 2
+        
+        # Cached baseline predictions of the plaza were built from the old counts
+        PredictionCache.invalidate_plazas([plaza_id])
+    
+    @staticmethod
+    def lookup(plaza_ids, date, hours):
+        """
+        Look up baselines for every (plaza, hour) pair on a given date
+        
+        Cells without samples for that weekday fall back to the plaza's
+        all-week statistics for the hour, then to the default profile.
+        
+        Args:
+            plaza_ids: List of toll plaza IDs
+            date: Date whose weekday selects the baseline
+            hours: List or array of hours of day
+        
+        Returns:
+            Tuple of (mean, stddev, count, confidence) arrays shaped
+            (len(plaza_ids), len(hours))
+        """
+        cls = TrafficBaselineService
+        cls.ensure_loaded()
+        hours = np.asarray(hours, dtype=np.int64)
+        day = date.weekday()
+        
+        with cls._lock:
+            if cls._counts is None:
+                # Invalidated (or a new plaza applied) since ensure_loaded
+                cls.rebuild()
+            rows = np.array([cls._plaza_index.get(p, -1) for p in plaza_ids], dtype=np.int64)
+            known = rows >= 0
+            shape = (len(plaza_ids), len(hours))
+            sums = np.zeros(shape)
+            sums_sq = np.zeros(shape)
+            counts = np.zeros(shape, dtype=np.int64)
+            week_sums = np.zeros(shape)
+            week_counts = np.zeros(shape, dtype=np.int64)
+            
+            if known.any():
+                index = np.ix_(rows[known], hours)
+                sums[known] = cls._sums[:, day, :][index]
+                sums_sq[known] = cls._sums_sq[:, day, :][index]
+                counts[known] = cls._counts[:, day, :][index]
+                week_sums[known] = cls._sums.sum(axis=1)[index]
+                week_counts[known] = cls._counts.sum(axis=1)[index]
+        
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(counts > 0, sums / counts, np.nan)
+            variance = np.where(counts > 0, sums_sq / counts - mean ** 2, np.nan)
+            week_mean = np.where(week_counts > 0, week_sums / week_counts, np.nan)
+        std = np.sqrt(np.clip(variance, 0, None))
+        
+        default = TrafficBaselineService.default_profile(hours)
+        mean = np.where(counts > 0, mean, np.where(week_counts > 0, week_mean, default))
+        std = np.where(counts > 0, std, 0.0)
+        
+        # Confidence grows with sample count and shrinks with dispersion
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cv = np.where(mean > 0, std / mean, 1.0)
+        confidence = 0.5 + 0.4 * (1 - np.minimum(cv, 1.0)) * counts / (counts + 4)
+        
+        return mean, std, counts, np.round(confidence, 2)
+    
+    @staticmethod
+    def default_profile(hours):
+        """
+        Default hourly baseline when no history exists
+        """
+        hours = np.asarray(hours)
+        peak = ((hours >= 7) & (hours < 10)) | ((hours >= 17) & (hours < 20))
+        off_peak = (hours >= 11) & (hours < 16)
+        return np.where(peak, 100, np.where(off_peak, 50, 20)).astype(np.float64)
@@ -0,0 +1,305 @@
+"""
+Dynamic Pricing Service - Forecast-driven tariff multipliers per plaza and hour
+Schedules are computed ahead from traffic forecasts: predicted volume maps
+linearly from [TARIFF_LOW_TRAFFIC, TARIFF_HIGH_TRAFFIC] onto
+[TARIFF_MIN_MULTIPLIER, TARIFF_MAX_MULTIPLIER], then each plaza's hourly
+sequence is exponentially smoothed and limited to TARIFF_MAX_HOURLY_STEP so
+tariffs never jump. Published schedules are kept as audit history and the
+multipliers in effect are held in an in-memory table, so the toll crossing
+path applies them with a dictionary lookup instead of a query.
+"""
+
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from app import db
+from app.models import TollPlaza, TariffSchedule, TariffMultiplier
+from app.services.model_registry import ModelRegistry
+from app.services.prediction_service import PredictionService
+
+DEFAULT_MULTIPLIER = 1.0
+
+class DynamicPricingService:
+    """
+    Service class computing, publishing and serving tariff schedules
+    """
+    
+    # (plaza_id, date, hour) -> multiplier from the latest schedule covering it
+    _table = {}
+    _schedule_id = None
+    _checked_at = None
+    _lock = threading.Lock()
+    
+    @staticmethod
+    def raw_multipliers(predicted, config):
+        """
+        Map predicted vehicle counts onto the multiplier range
+        """
+        import numpy as np
+        
+        return np.interp(
+            predicted,
+            [config['TARIFF_LOW_TRAFFIC'], config['TARIFF_HIGH_TRAFFIC']],
+            [config['TARIFF_MIN_MULTIPLIER'], config['TARIFF_MAX_MULTIPLIER']]
+        )
+    
+    @staticmethod
+    def smooth(raw, start, config):
+        """
+        Smooth multiplier sequences hour by hour for all plazas at once
+        
+        Args:
+            raw: Array of shape (plazas, hours) with raw multipliers
+            start: Array of shape (plazas,) with the multipliers in effect now
+            config: Application config with the TARIFF_* settings
+        
+        Returns:
+            Array of shape (plazas, hours) rounded to two decimals
+        """
+        import numpy as np
+        
+        alpha = config['TARIFF_SMOOTHING']
+        max_step = config['TARIFF_MAX_HOURLY_STEP']
+        smoothed = np.empty_like(raw)
+        previous = np.asarray(start, dtype=np.float64)
+        
+        for hour in range(raw.shape[1]):
+            value = alpha * raw[:, hour] + (1 - alpha) * previous
+            value = np.clip(value, previous - max_step, previous + max_step)
+            value = np.clip(value, config['TARIFF_MIN_MULTIPLIER'], config['TARIFF_MAX_MULTIPLIER'])
+            smoothed[:, hour] = previous = np.round(value, 2)
+        
+        return smoothed
+    
+    @staticmethod
+    def compute_schedule(hours_ahead=24, plaza_ids=None):
+        """
+        Compute multipliers for the next hours of every plaza
+        
+        Args:
+            hours_ahead: Number of hours after the current one to cover (1-24)
+            plaza_ids: Plazas to price (default: all)
+        
+        Returns:
+            Dictionary with the covered window, model version and entries
+        """
+        import numpy as np
+        
+        config = current_app.config
+        if plaza_ids is None:
+            plaza_ids = [row.plaza_id for row in db.session.query(TollPlaza.plaza_id).order_by(TollPlaza.plaza_id)]
+        
+        now = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+        slots = [now + timedelta(hours=offset) for offset in range(1, hours_ahead + 1)]
+        
+        # Slots past midnight are forecast for the next day (its weekday and cache keys)
+        model = ModelRegistry.get_active()
+        predicted = np.zeros((len(plaza_ids), hours_ahead), dtype=np.float64)
+        column = 0
+        for date, hours in PredictionService.forecast_slots(hours_ahead, now) if plaza_ids else []:
+            predictions = PredictionService.get_predictions(plaza_ids, date, len(hours), model, hours=hours)
+            predicted[:, column:column + len(hours)] = [
+                [p['predicted_vehicles'] for p in predictions[plaza_id]] for plaza_id in plaza_ids
+            ]
+            column += len(hours)
+        
+        DynamicPricingService.ensure_loaded()
+        start = [DynamicPricingService.get_multiplier(plaza_id, now) for plaza_id in plaza_ids]
+        raw = DynamicPricingService.raw_multipliers(predicted, config)
+        smoothed = DynamicPricingService.smooth(raw, start, config)
+        
+        entries = [
+            {
+                'plaza_id': plaza_id,
+                'date': slot.date(),
+                'hour': slot.hour,
+                'predicted_vehicles': int(predicted[i, j]),
+                'raw_multiplier': round(float(raw[i, j]), 3),
+                'multiplier': float(smoothed[i, j])
+            }
+            for i, plaza_id in enumerate(plaza_ids)
+            for j, slot in enumerate(slots)
+        ]
+        
+        return {
+            'starts_at': slots[0],
+            'ends_at': slots[-1] + timedelta(hours=1),
+            'model_version': model.version if model else None,
+            'entries': entries
+        }
+    
+    @staticmethod
+    def publish(hours_ahead=24, published_by=None, notes=None):
+        """
+        Compute and store a new schedule, then serve it from memory
+        
+        Args:
+            hours_ahead: Number of hours to cover (1-24)
+            published_by: ID of the publishing admin (None for CLI runs)
+            notes: Optional free-text note kept with the schedule
+        
+        Returns:
+            Dictionary with success status, message and schedule summary
+        """
+        if not 1 <= hours_ahead <= 24:
+            return {'success': False, 'message': 'hours_ahead must be between 1 and 24'}
+        
+        try:
+            computed = DynamicPricingService.compute_schedule(hours_ahead)
+            if not computed['entries']:
+                return {'success': False, 'message': 'No toll plazas to price'}
+            
+            config = current_app.config
+            schedule = TariffSchedule(
+                published_by=published_by,
+                model_version=computed['model_version'],
+                starts_at=computed['starts_at'],
+                ends_at=computed['ends_at'],
+                settings=json.dumps({
+                    name: config[name] for name in (
+                        'TARIFF_MIN_MULTIPLIER', 'TARIFF_MAX_MULTIPLIER', 'TARIFF_LOW_TRAFFIC',
+                        'TARIFF_HIGH_TRAFFIC', 'TARIFF_MAX_HOURLY_STEP', 'TARIFF_SMOOTHING'
+                    )
+                }),
+                notes=notes
+            )
+            db.session.add(schedule)
+            db.session.flush()
+            
+            db.session.execute(
+                TariffMultiplier.__table__.insert(),
+                [dict(entry, schedule_id=schedule.schedule_id) for entry in computed['entries']]
+            )
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            return {'success': False, 'message': f'Error publishing tariffs: {str(e)}'}
+        
+        DynamicPricingService.load()
+        multipliers = [entry['multiplier'] for entry in computed['entries']]
+        print(f"[{datetime.now()}] Tariff schedule {schedule.schedule_id} published "
+              f"({len(multipliers)} entries, x{min(multipliers)}-x{max(multipliers)})")
+        
+        return {
+            'success': True,
+            'message': f'Tariff schedule {schedule.schedule_id} published',
+            'schedule': DynamicPricingService.schedule_to_dict(schedule, len(multipliers)),
+            'min_multiplier': min(multipliers),
+            'max_multiplier': max(multipliers)
+        }
+    
+    @staticmethod
+    def load():
+        """
+        Rebuild the in-memory table from schedules covering today onwards
+        
+        Rows are applied in publication order, so the latest schedule wins
+        for every (plaza, date, hour) it covers.
+        """
+        cls = DynamicPricingService
+        today = datetime.utcnow().date()
+        rows = db.session.query(
+            TariffMultiplier.schedule_id,
+            TariffMultiplier.plaza_id,
+            TariffMultiplier.date,
+            TariffMultiplier.hour,
+            TariffMultiplier.multiplier
+        ).filter(
+            TariffMultiplier.date >= today
+        ).order_by(TariffMultiplier.schedule_id).all()
+        latest = db.session.query(db.func.max(TariffSchedule.schedule_id)).scalar()
+        
+        table = {(row.plaza_id, row.date, row.hour): row.multiplier for row in rows}
+        with cls._lock:
+            cls._table = table
+            cls._schedule_id = latest
+            cls._checked_at = time.monotonic()
+    
+    @staticmethod
+    def ensure_loaded():
+        """
+        Load the table on first use and pick up schedules published by other
+        processes, checking at most every TARIFF_REFRESH_SECONDS
+        """
+        cls = DynamicPricingService
+        checked_at = cls._checked_at
+        if checked_at is not None and time.monotonic() - checked_at < current_app.config['TARIFF_REFRESH_SECONDS']:
+            return
+        
+        try:
+            latest = db.session.query(db.func.max(TariffSchedule.schedule_id)).scalar()
+            if checked_at is None or latest != cls._schedule_id:
+                cls.load()
+            else:
+                cls._checked_at = time.monotonic()
+        except Exception as e:
+            print(f"[{datetime.now()}] Tariff table refresh error: {str(e)}")
+            cls._checked_at = time.monotonic()
+    
+    @staticmethod
+    def get_multiplier(plaza_id, timestamp=None):
+        """
+        Multiplier in effect for a plaza at a time (1.0 when none is published)
+        """
+        if timestamp is None:
+            timestamp = datetime.utcnow()
+        return DynamicPricingService._table.get((plaza_id, timestamp.date(), timestamp.hour), DEFAULT_MULTIPLIER)
+    
+    @staticmethod
+    def get_plaza_schedule(plaza_id, hours_ahead=24):
+        """
+        Multipliers in effect for the current and next hours of a plaza
+        """
+        DynamicPricingService.ensure_loaded()
+        now = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+        slots = [now + timedelta(hours=offset) for offset in range(hours_ahead + 1)]
+        return [
+            {
+                'date': slot.date().isoformat(),
+                'hour': slot.hour,
+                'multiplier': DynamicPricingService.get_multiplier(plaza_id, slot)
+            }
+            for slot in slots
+        ]
+    
+    @staticmethod
+    def schedule_to_dict(schedule, entries=None):
+        return {
+            'schedule_id': schedule.schedule_id,
+            'published_at': schedule.published_at.isoformat() if schedule.published_at else None,
+            'published_by': schedule.published_by,
+            'model_version': schedule.model_version,
+            'starts_at': schedule.starts_at.isoformat(),
+            'ends_at': schedule.ends_at.isoformat(),
+            'settings': json.loads(schedule.settings) if schedule.settings else None,
+            'notes': schedule.notes,
+            'entries': entries
+        }
+    
+    @staticmethod
+    def list_schedules(limit=20):
+        """
+        Most recent published schedules with their entry counts (audit view)
+        """
+        schedules = TariffSchedule.query.order_by(TariffSchedule.schedule_id.desc()).limit(limit).all()
+        counts = dict(db.session.query(
+            TariffMultiplier.schedule_id,
+            db.func.count(TariffMultiplier.multiplier_id)
+        ).filter(
+            TariffMultiplier.schedule_id.in_([s.schedule_id for s in schedules])
+        ).group_by(TariffMultiplier.schedule_id).all()) if schedules else {}
+        return [DynamicPricingService.schedule_to_dict(s, counts.get(s.schedule_id, 0)) for s in schedules]
+    
+    @staticmethod
+    def get_status():
+        """
+        Size and source of the in-memory tariff table
+        """
+        cls = DynamicPricingService
+        return {
+            'schedule_id': cls._schedule_id,
+            'entries': len(cls._table),
+            'loaded': cls._checked_at is not None
+        }
@@ -0,0 +1,344 @@
+"""
+Event Hub - Fan-out of live dashboard events over Server-Sent Events
+Per-plaza counters for today are read from the database, so crossings made
+by every worker process and by the ingestion API are counted: one flusher
+thread per process picks up new transactions by id every
+EVENT_FLUSH_SECONDS (one indexed query), reconciles the full day every
+EVENT_RECONCILE_SECONDS and turns the plazas that changed into a single
+'plaza_stats' event. Each event is serialized once and queued to every
+connected client, so server work does not grow with the number of open
+dashboards. Client queues are bounded (EVENT_CLIENT_BUFFER); a client that
+falls behind is dropped and reconnects to a fresh snapshot.
+
+Each client holds a request thread for as long as it is connected, so at
+most EVENT_MAX_CLIENTS streams are served per process (kept below the
+gunicorn thread count, see gunicorn.conf.py). Alerts and job events are
+published by the process that raised them.
+"""
+
+import json
+import queue
+import threading
+import time
+from datetime import datetime
+from app import db
+from app.models import TollTransaction, TransactionStatus
+
+class Subscription:
+    """
+    One connected client: a bounded queue of serialized events
+    """
+    
+    def __init__(self, max_buffer):
+        self.queue = queue.Queue(maxsize=max_buffer)
+        self.dropped = False
+        self.connected_at = datetime.utcnow()
+    
+    def get(self, timeout):
+        """
+        Next serialized event, or None when nothing arrived within timeout
+        """
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+class EventHub:
+    """
+    Service class holding live counters and connected clients
+    """
+    
+    _subscribers = set()
+    _lock = threading.Lock()
+    _stats = {'published': 0, 'dropped_clients': 0, 'refused_clients': 0}
+    
+    # Today's crossings and revenue per plaza, read from the database
+    _day = None
+    _plazas = {}
+    _dirty = set()
+    _last_txn_id = 0
+    _reconciled_at = None
+    
+    _flusher = None
+    _stop_event = threading.Event()
+    
+    @staticmethod
+    def format_event(event_type, data):
+        """
+        Serialize an event in the text/event-stream format
+        """
+        return f"event: {event_type}\ndata: {json.dumps(data, default=str)}\n\n"
+    
+    @staticmethod
+    def publish(event_type, data):
+        """
+        Queue an event to every connected client, dropping full clients
+        """
+        cls = EventHub
+        message = cls.format_event(event_type, data)
+        
+        with cls._lock:
+            slow = []
+            for subscription in cls._subscribers:
+                try:
+                    subscription.queue.put_nowait(message)
+                except queue.Full:
+                    subscription.dropped = True
+                    slow.append(subscription)
+            for subscription in slow:
+                cls._subscribers.discard(subscription)
+            cls._stats['published'] += 1
+            cls._stats['dropped_clients'] += len(slow)
+    
+    @staticmethod
+    def subscribe(max_buffer, max_clients):
+        """
+        Register a client
+        
+        Args:
+            max_buffer: Events queued for the client before it is dropped
+            max_clients: Most clients connected to this process at once
+        
+        Returns:
+            Subscription to read events from, or None when the process
+            already serves max_clients streams
+        """
+        subscription = Subscription(max_buffer)
+        with EventHub._lock:
+            if len(EventHub._subscribers) >= max_clients:
+                EventHub._stats['refused_clients'] += 1
+                return None
+            EventHub._subscribers.add(subscription)
+        return subscription
+    
+    @staticmethod
+    def unsubscribe(subscription):
+        with EventHub._lock:
+            EventHub._subscribers.discard(subscription)
+    
+    @staticmethod
+    def stream(subscription, heartbeat_seconds):
+        """
+        Generator of event-stream text for one client
+        
+        Starts with a snapshot, sends a heartbeat whenever no event arrived
+        for heartbeat_seconds and ends when the client was dropped.
+        """
+        cls = EventHub
+        try:
+            yield "retry: 3000\n\n"
+            yield cls.format_event('snapshot', cls.snapshot())
+            while True:
+                message = subscription.get(heartbeat_seconds)
+                if message is not None:
+                    yield message
+                elif subscription.dropped:
+                    yield cls.format_event('dropped', {'reason': 'Client too slow, reconnect for a snapshot'})
+                    return
+                else:
+                    yield cls.format_event('heartbeat', {'timestamp': datetime.utcnow().isoformat()})
+        finally:
+            cls.unsubscribe(subscription)
+    
+    # ========================================================================
+    # Event sources
+    # ========================================================================
+    
+    @staticmethod
+    def record_alert(level, message, plaza_id=None, **details):
+        """
+        Publish an alert immediately
+        
+        Args:
+            level: 'info', 'warning' or 'danger'
+            message: Text shown on dashboards
+            plaza_id: Plaza the alert concerns (optional)
+        """
+        if not EventHub._subscribers:
+            return
+        EventHub.publish('alert', dict(
+            details,
+            level=level,
+            message=message,
+            plaza_id=plaza_id,
+            timestamp=datetime.utcnow().isoformat()
+        ))
+    
+    @staticmethod
+    def snapshot():
+        """
+        Today's per-plaza counters and totals
+        """
+        cls = EventHub
+        with cls._lock:
+            plazas = {plaza_id: dict(stats, revenue=round(stats['revenue'], 2))
+                      for plaza_id, stats in cls._plazas.items()}
+            day = cls._day
+        return {
+            'date': day.isoformat() if day else None,
+            'plazas': plazas,
+            'totals': {
+                'crossings': sum(s['crossings'] for s in plazas.values()),
+                'revenue': round(sum(s['revenue'] for s in plazas.values()), 2)
+            },
+            'timestamp': datetime.utcnow().isoformat()
+        }
+    
+    @staticmethod
+    def get_stats():
+        """
+        Connected clients and publication counters
+        """
+        cls = EventHub
+        with cls._lock:
+            return dict(cls._stats, clients=len(cls._subscribers), started=cls._day is not None)
+    
+    # ========================================================================
+    # Seeding and flushing
+    # ========================================================================
+    
+    @staticmethod
+    def start(app):
+        """
+        Seed today's counters and start the flusher thread once per process
+        
+        Args:
+            app: Flask application (the thread runs in its app context)
+        """
+        cls = EventHub
+        if cls._flusher is not None and cls._flusher.is_alive():
+            return
+        
+        with cls._lock:
+            if cls._flusher is not None and cls._flusher.is_alive():
+                return
+            cls._apply_counts(*cls._read_day())
+            cls._stop_event.clear()
+            cls._flusher = threading.Thread(
+                target=cls._flush_loop,
+                args=(app, app.config['EVENT_FLUSH_SECONDS'], app.config['EVENT_RECONCILE_SECONDS']),
+                name='event-hub-flusher',
+                daemon=True
+            )
+            cls._flusher.start()
+    
+    @staticmethod
+    def stop():
+        """
+        Stop the flusher thread
+        """
+        EventHub._stop_event.set()
+    
+    @staticmethod
+    def _count_completed(day, after_id, up_to_id):
+        """
+        Completed crossings and revenue per plaza on day with
+        after_id < txn_id <= up_to_id (one grouped query)
+        """
+        rows = db.session.query(
+            TollTransaction.plaza_id,
+            db.func.count(TollTransaction.txn_id),
+            db.func.coalesce(db.func.sum(TollTransaction.amount), 0.0)
+        ).filter(
+            TollTransaction.txn_id > after_id,
+            TollTransaction.txn_id <= up_to_id,
+            TollTransaction.timestamp >= datetime.combine(day, datetime.min.time()),
+            TollTransaction.status == TransactionStatus.COMPLETED
+        ).group_by(TollTransaction.plaza_id).all()
+        return {plaza_id: {'crossings': count, 'revenue': float(revenue)} for plaza_id, count, revenue in rows}
+    
+    @staticmethod
+    def _read_day():
+        """
+        Today's per-plaza counts up to the newest transaction id
+        
+        Returns:
+            Tuple of (day, counts, newest txn_id)
+        """
+        day = datetime.utcnow().date()
+        newest = db.session.query(db.func.max(TollTransaction.txn_id)).scalar() or 0
+        return day, EventHub._count_completed(day, 0, newest), newest
+    
+    @staticmethod
+    def _apply_counts(day, counts, newest):
+        """
+        Replace the counters with a full read, marking plazas that changed
+        (caller holds the lock)
+        """
+        cls = EventHub
+        if day == cls._day:
+            cls._dirty |= {plaza_id for plaza_id in set(counts) | set(cls._plazas)
+                           if counts.get(plaza_id) != cls._plazas.get(plaza_id)}
+        else:
+            cls._dirty = set(counts)
+        cls._day = day
+        cls._plazas = counts
+        cls._last_txn_id = newest
+        cls._reconciled_at = time.monotonic()
+    
+    @staticmethod
+    def poll(reconcile_seconds):
+        """
+        Fold transactions committed since the last poll into the counters
+        
+        Ids committed out of order (concurrent writers) can be skipped by the
+        incremental read; the periodic full read corrects them.
+        """
+        cls = EventHub
+        day = datetime.utcnow().date()
+        if (day != cls._day or cls._reconciled_at is None
+                or time.monotonic() - cls._reconciled_at >= reconcile_seconds):
+            full = cls._read_day()
+            with cls._lock:
+                cls._apply_counts(*full)
+            return
+        
+        after_id = cls._last_txn_id
+        newest = db.session.query(db.func.max(TollTransaction.txn_id)).scalar() or 0
+        if newest <= after_id:
+            return
+        counts = cls._count_completed(day, after_id, newest)
+        
+        with cls._lock:
+            if cls._day != day or cls._last_txn_id != after_id:
+                return
+            for plaza_id, new in counts.items():
+                stats = cls._plazas.setdefault(plaza_id, {'crossings': 0, 'revenue': 0.0})
+                stats['crossings'] += new['crossings']
+                stats['revenue'] += new['revenue']
+                cls._dirty.add(plaza_id)
+            cls._last_txn_id = newest
+    
+    @staticmethod
+    def _flush_loop(app, interval, reconcile_seconds):
+        cls = EventHub
+        while not cls._stop_event.wait(interval):
+            with app.app_context():
+                try:
+                    cls.poll(reconcile_seconds)
+                except Exception as e:
+                    print(f"[{datetime.now()}] Event hub poll error: {str(e)}")
+                finally:
+                    db.session.remove()
+            
+            with cls._lock:
+                if not cls._dirty:
+                    continue
+                changed = {plaza_id: dict(cls._plazas[plaza_id], revenue=round(cls._plazas[plaza_id]['revenue'], 2))
+                           for plaza_id in cls._dirty if plaza_id in cls._plazas}
+                cls._dirty = set()
+                totals = {
+                    'crossings': sum(s['crossings'] for s in cls._plazas.values()),
+                    'revenue': round(sum(s['revenue'] for s in cls._plazas.values()), 2)
+                }
+                day = cls._day
+            
+            try:
+                cls.publish('plaza_stats', {
+                    'date': day.isoformat(),
+                    'plazas': changed,
+                    'totals': totals,
+                    'timestamp': datetime.utcnow().isoformat()
+                })
+            except Exception as e:
+                print(f"[{datetime.now()}] Event hub flush error: {str(e)}")
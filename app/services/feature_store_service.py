@@ -0,0 +1,296 @@
+"""
+Feature Store Service - Lagged and rolling traffic features per plaza and hour
+Features for a target (plaza, date, hour) are derived from TrafficLog counts
+strictly before it and stored in TrafficFeature, so training and prediction
+read them instead of recomputing from raw data. When the count of hour s
+changes, only targets s+1h and s+24h*k (k = 1..7) depend on it; those day
+ranges are recomputed with vectorized pandas and replaced in one transaction.
+"""
+
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+from flask import current_app
+from app import db
+from app.models import TrafficLog, TrafficFeature
+
+LAG_FEATURES = ['lag_1', 'lag_24', 'lag_168', 'rolling_mean_7d', 'is_holiday']
+ROLLING_DAYS = 7
+
+# Lookback needed to compute every feature of a target hour
+LOOKBACK = timedelta(hours=168)
+
+# Hours after a changed count whose features depend on it
+DEPENDENT_OFFSETS = [1] + [24 * k for k in range(1, ROLLING_DAYS + 1)]
+
+# Fallback order for features missing at prediction time (e.g. lag_1 of an
+# hour more than one hour ahead)
+FILL_ORDER = {
+    'lag_1': ['lag_24', 'rolling_mean_7d'],
+    'lag_24': ['rolling_mean_7d', 'lag_168'],
+    'lag_168': ['rolling_mean_7d', 'lag_24'],
+    'rolling_mean_7d': ['lag_24', 'lag_168']
+}
+
+class FeatureStoreService:
+    """
+    Service class maintaining and reading the TrafficFeature table
+    """
+    
+    @staticmethod
+    def get_holidays():
+        """
+        Holiday dates from the HOLIDAYS setting (comma separated YYYY-MM-DD)
+        """
+        return {
+            datetime.strptime(value.strip(), '%Y-%m-%d').date()
+            for value in current_app.config['HOLIDAYS'].split(',')
+            if value.strip()
+        }
+    
+    @staticmethod
+    def compute_features(counts, plaza_ids, start, end, holidays=()):
+        """
+        Compute features for every hour of [start, end] for the given plazas
+        
+        Args:
+            counts: DataFrame with plaza_id, date, hour, vehicle_count covering
+                at least LOOKBACK before start
+            plaza_ids: Plazas to compute
+            start: First target date
+            end: Last target date (inclusive)
+            holidays: Set of holiday dates
+        
+        Returns:
+            DataFrame with plaza_id, date, hour and LAG_FEATURES
+        """
+        first = pd.Timestamp(start) - LOOKBACK
+        index = pd.date_range(first, pd.Timestamp(end) + pd.Timedelta(hours=23), freq='h')
+        
+        # Hours x plazas matrix of counts; hours without a log row are unknown
+        if len(counts):
+            timestamps = pd.to_datetime(counts['date']) + pd.to_timedelta(counts['hour'], unit='h')
+            matrix = pd.Series(
+                counts['vehicle_count'].to_numpy(dtype=np.float64),
+                index=pd.MultiIndex.from_arrays([timestamps, counts['plaza_id'].to_numpy()])
+            ).unstack()
+        else:
+            matrix = pd.DataFrame(index=index)
+        matrix = matrix.reindex(index=index, columns=plaza_ids)
+        
+        same_hour = np.stack([matrix.shift(24 * k).to_numpy() for k in range(1, ROLLING_DAYS + 1)])
+        with np.errstate(invalid='ignore'):
+            valid = np.sum(~np.isnan(same_hour), axis=0)
+            rolling = np.where(valid > 0, np.nansum(same_hour, axis=0) / np.maximum(valid, 1), np.nan)
+        
+        targets = index >= pd.Timestamp(start)
+        features = {
+            'lag_1': matrix.shift(1).to_numpy()[targets],
+            'lag_24': matrix.shift(24).to_numpy()[targets],
+            'lag_168': matrix.shift(168).to_numpy()[targets],
+            'rolling_mean_7d': rolling[targets]
+        }
+        
+        target_index = index[targets]
+        num_hours, num_plazas = len(target_index), len(plaza_ids)
+        dates = target_index.normalize()
+        frame = pd.DataFrame({
+            'plaza_id': np.tile(np.asarray(plaza_ids), num_hours),
+            'date': np.repeat(dates.date, num_plazas),
+            'hour': np.repeat(target_index.hour, num_plazas),
+            **{name: values.reshape(-1) for name, values in features.items()}
+        })
+        frame['is_holiday'] = frame['date'].isin(holidays)
+        return frame
+    
+    @staticmethod
+    def refresh_range(plaza_ids, start, end):
+        """
+        Recompute and replace features for plazas over [start, end]
+        
+        Long ranges are processed a month at a time to bound memory.
+        
+        Args:
+            plaza_ids: Plazas to refresh
+            start: First target date
+            end: Last target date (inclusive)
+        
+        Returns:
+            Number of feature rows written
+        """
+        plaza_ids = sorted(set(plaza_ids))
+        if not plaza_ids:
+            return 0
+        
+        from app.services.prediction_cache import PredictionCache
+        
+        written = 0
+        chunk_start = start
+        while chunk_start <= end:
+            chunk_end = min(end, chunk_start + timedelta(days=30))
+            written += FeatureStoreService._refresh_chunk(plaza_ids, chunk_start, chunk_end)
+            chunk_start = chunk_end + timedelta(days=1)
+        
+        # Predictions cached for these plazas were made from the old features
+        PredictionCache.invalidate_plazas(plaza_ids)
+        return written
+    
+    @staticmethod
+    def _refresh_chunk(plaza_ids, start, end):
+        rows = db.session.query(
+            TrafficLog.plaza_id,
+            TrafficLog.date,
+            TrafficLog.hour,
+            TrafficLog.vehicle_count
+        ).filter(
+            TrafficLog.plaza_id.in_(plaza_ids),
+            TrafficLog.date >= start - timedelta(days=LOOKBACK.days),
+            TrafficLog.date <= end
+        ).all()
+        counts = pd.DataFrame.from_records(rows, columns=['plaza_id', 'date', 'hour', 'vehicle_count'])
+        
+        frame = FeatureStoreService.compute_features(
+            counts, plaza_ids, start, end, FeatureStoreService.get_holidays()
+        )
+        # Targets without any history carry no information
+        frame = frame.dropna(subset=['lag_1', 'lag_24', 'lag_168', 'rolling_mean_7d'], how='all')
+        
+        updated_at = datetime.utcnow()
+        records = [
+            {
+                'plaza_id': int(row.plaza_id),
+                'date': row.date,
+                'hour': int(row.hour),
+                'lag_1': None if np.isnan(row.lag_1) else float(row.lag_1),
+                'lag_24': None if np.isnan(row.lag_24) else float(row.lag_24),
+                'lag_168': None if np.isnan(row.lag_168) else float(row.lag_168),
+                'rolling_mean_7d': None if np.isnan(row.rolling_mean_7d) else float(row.rolling_mean_7d),
+                'is_holiday': bool(row.is_holiday),
+                'updated_at': updated_at
+            }
+            for row in frame.itertuples(index=False)
+        ]
+        
+        TrafficFeature.query.filter(
+            TrafficFeature.plaza_id.in_(plaza_ids),
+            TrafficFeature.date >= start,
+            TrafficFeature.date <= end
+        ).delete(synchronize_session=False)
+        if records:
+            db.session.execute(TrafficFeature.__table__.insert(), records)
+        db.session.commit()
+        return len(records)
+    
+    @staticmethod
+    def refresh_for_cells(cells):
+        """
+        Refresh the features that depend on changed TrafficLog cells
+        
+        Args:
+            cells: Iterable of (plaza_id, date, hour) whose counts changed
+        
+        Returns:
+            Number of feature rows written
+        """
+        cells = list(cells)
+        if not cells:
+            return 0
+        
+        targets = [
+            datetime.combine(date, datetime.min.time()) + timedelta(hours=hour + offset)
+            for _, date, hour in cells
+            for offset in DEPENDENT_OFFSETS
+        ]
+        return FeatureStoreService.refresh_range(
+            [plaza_id for plaza_id, _, _ in cells],
+            min(targets).date(),
+            max(targets).date()
+        )
+    
+    @staticmethod
+    def rebuild(days=None):
+        """
+        Recompute the feature table for all plazas (backfill)
+        
+        Args:
+            days: Only rebuild the last N days (default: full history)
+        
+        Returns:
+            Number of feature rows written
+        """
+        first, last = db.session.query(db.func.min(TrafficLog.date), db.func.max(TrafficLog.date)).one()
+        if first is None:
+            return 0
+        
+        end = last + timedelta(days=ROLLING_DAYS)
+        start = max(first, end - timedelta(days=days)) if days else first
+        plaza_ids = [row.plaza_id for row in db.session.query(TrafficLog.plaza_id).distinct()]
+        return FeatureStoreService.refresh_range(plaza_ids, start, end)
+    
+    @staticmethod
+    def fill_missing(frame):
+        """
+        Fill unknown lag features from related ones, then with zero
+        """
+        frame = frame.copy()
+        for name, fallbacks in FILL_ORDER.items():
+            for fallback in fallbacks:
+                frame[name] = frame[name].fillna(frame[fallback])
+        frame[list(FILL_ORDER)] = frame[list(FILL_ORDER)].fillna(0.0)
+        return frame
+    
+    @staticmethod
+    def lookup(plaza_ids, date, hours):
+        """
+        Read stored features for every (plaza, hour) pair with one query
+        
+        Missing rows are computed on the fly from TrafficLog (one more
+        query), so predictions never depend on the rollup having run.
+        
+        Args:
+            plaza_ids: List of toll plaza IDs
+            date: Target date
+            hours: List of target hours
+        
+        Returns:
+            DataFrame indexed by (plaza_id, hour) with LAG_FEATURES
+        """
+        hours = [int(h) for h in hours]
+        rows = db.session.query(
+            TrafficFeature.plaza_id,
+            TrafficFeature.hour,
+            TrafficFeature.lag_1,
+            TrafficFeature.lag_24,
+            TrafficFeature.lag_168,
+            TrafficFeature.rolling_mean_7d,
+            TrafficFeature.is_holiday
+        ).filter(
+            TrafficFeature.plaza_id.in_(plaza_ids),
+            TrafficFeature.date == date,
+            TrafficFeature.hour.in_(hours)
+        ).all()
+        stored = pd.DataFrame.from_records(rows, columns=['plaza_id', 'hour'] + LAG_FEATURES)
+        stored = stored.set_index(['plaza_id', 'hour'])
+        
+        wanted = pd.MultiIndex.from_product([plaza_ids, hours], names=['plaza_id', 'hour'])
+        missing_plazas = sorted({p for p, h in wanted.difference(stored.index)})
+        if missing_plazas:
+            counts_rows = db.session.query(
+                TrafficLog.plaza_id,
+                TrafficLog.date,
+                TrafficLog.hour,
+                TrafficLog.vehicle_count
+            ).filter(
+                TrafficLog.plaza_id.in_(missing_plazas),
+                TrafficLog.date >= date - timedelta(days=LOOKBACK.days),
+                TrafficLog.date <= date
+            ).all()
+            counts = pd.DataFrame.from_records(counts_rows, columns=['plaza_id', 'date', 'hour', 'vehicle_count'])
+            computed = FeatureStoreService.compute_features(
+                counts, missing_plazas, date, date, FeatureStoreService.get_holidays()
+            ).set_index(['plaza_id', 'hour'])[LAG_FEATURES]
+            stored = stored.combine_first(computed)
+        
+        frame = stored.reindex(wanted)
+        frame['is_holiday'] = frame['is_holiday'].fillna(date in FeatureStoreService.get_holidays())
+        return FeatureStoreService.fill_missing(frame.astype(np.float64))
@@ -0,0 +1,162 @@
+"""
+Flat Forest - Tree ensembles exported as plain NumPy arrays
+Unpickling a scikit-learn forest copies every tree's node arrays into the
+process heap, so each worker holds its own copy. Here all trees are
+concatenated into a handful of .npy files that are opened with
+np.load(mmap_mode='r'): loading is near-instant and every worker on a host
+shares the same page-cache pages.
+"""
+
+import os
+import json
+import numpy as np
+
+ARRAY_NAMES = ('feature', 'threshold', 'left', 'right', 'value')
+MANIFEST_FILE = 'forest.json'
+# Estimators whose predict() is the mean leaf value of their trees
+SUPPORTED_MODELS = ('RandomForestRegressor', 'ExtraTreesRegressor', 'DecisionTreeRegressor', 'ExtraTreeRegressor')
+
+def supports(model):
+    """
+    Check whether a fitted model can be exported as a flat forest
+    
+    Only single-output SUPPORTED_MODELS qualify, matched by exact class:
+    other ensembles of trees (AdaBoost's weighted median, Bagging's
+    per-estimator feature subsets) do not predict the mean leaf value.
+    """
+    model_type = type(model)
+    if model_type.__name__ not in SUPPORTED_MODELS or not model_type.__module__.startswith('sklearn.'):
+        return False
+    
+    estimators = getattr(model, 'estimators_', None)
+    if estimators is None:
+        estimators = [model]
+    try:
+        return all(
+            hasattr(tree, 'tree_') and tree.tree_.n_outputs == 1 and tree.tree_.value.shape[2] == 1
+            for tree in estimators
+        )
+    except (AttributeError, TypeError):
+        return False
+
+class FlatForest:
+    """
+    Vectorized predictor over concatenated tree arrays
+    
+    Node indices are global across trees. Leaves point to themselves, so a
+    fixed number of steps (the maximum depth) walks every sample down every
+    tree at once without per-node Python loops.
+    """
+    
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth, n_features):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.max_depth = max_depth
+        self.n_features_in_ = n_features
+    
+    @staticmethod
+    def from_model(model):
+        """
+        Build a flat forest from a fitted scikit-learn tree regressor/forest
+        """
+        if not supports(model):
+            raise ValueError(f'Cannot export {type(model).__name__} as a flat forest')
+        
+        estimators = getattr(model, 'estimators_', None) or [model]
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        
+        for estimator in estimators:
+            tree = estimator.tree_
+            nodes = np.arange(tree.node_count, dtype=np.int32)
+            is_leaf = tree.children_left < 0
+            
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.int32))
+            thresholds.append(tree.threshold.astype(np.float64))
+            lefts.append(np.where(is_leaf, nodes, tree.children_left).astype(np.int32) + offset)
+            rights.append(np.where(is_leaf, nodes, tree.children_right).astype(np.int32) + offset)
+            values.append(tree.value[:, 0, 0].astype(np.float64))
+            roots.append(offset)
+            
+            offset += tree.node_count
+            max_depth = max(max_depth, tree.max_depth)
+        
+        return FlatForest(
+            np.concatenate(features),
+            np.concatenate(thresholds),
+            np.concatenate(lefts),
+            np.concatenate(rights),
+            np.concatenate(values),
+            np.asarray(roots, dtype=np.int32),
+            int(max_depth),
+            int(model.n_features_in_)
+        )
+    
+    def save(self, path):
+        """
+        Write the arrays and a small manifest to a directory
+        """
+        os.makedirs(path, exist_ok=True)
+        for name in ARRAY_NAMES:
+            np.save(os.path.join(path, f'{name}.npy'), getattr(self, name))
+        np.save(os.path.join(path, 'roots.npy'), self.roots)
+        
+        with open(os.path.join(path, MANIFEST_FILE), 'w') as f:
+            json.dump({
+                'n_trees': len(self.roots),
+                'n_nodes': len(self.feature),
+                'max_depth': self.max_depth,
+                'n_features': self.n_features_in_
+            }, f, indent=2)
+    
+    @staticmethod
+    def load(path, mmap_mode='r'):
+        """
+        Open an exported forest; arrays are memory-mapped read-only by default
+        """
+        with open(os.path.join(path, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+        
+        arrays = {
+            name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode)
+            for name in ARRAY_NAMES
+        }
+        return FlatForest(
+            roots=np.load(os.path.join(path, 'roots.npy')),
+            max_depth=manifest['max_depth'],
+            n_features=manifest['n_features'],
+            **arrays
+        )
+    
+    @staticmethod
+    def exists(path):
+        return os.path.isfile(os.path.join(path, MANIFEST_FILE))
+    
+    def predict(self, X):
+        """
+        Predict the mean leaf value across trees
+        
+        Args:
+            X: 2-D array-like of shape (n_samples, n_features)
+        
+        Returns:
+            Array of predictions, matching the source model's predict()
+        """
+        # scikit-learn compares float32 features against float64 thresholds
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f'Expected {self.n_features_in_} features, got shape {X.shape}')
+        
+        rows = np.arange(len(X))[:, None]
+        nodes = np.broadcast_to(self.roots, (len(X), len(self.roots)))
+        
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        
+        return self.value[nodes].mean(axis=1)
@@ -0,0 +1,478 @@
+"""
+Crossing Ingestion - Async write pipeline for lane controller events
+Events are checked for shape on arrival and put on a bounded asyncio queue;
+when the queue is full new events are refused (HTTP 503 with Retry-After)
+instead of piling up in memory. INGEST_WRITERS writer tasks take batches of
+up to INGEST_BATCH_SIZE events and, in one transaction on an async
+connection pool, load the batch's vehicles and wallets, price each crossing
+with TollService.price_toll (the in-memory rate and tariff tables, refreshed
+in a thread), debit wallets with conditional updates and insert the
+transactions. Every caller awaits the result of its own events, so a lane
+gets a committed transaction id or the rejection reason while thousands of
+connections wait on one event loop.
+
+Unlike TollService.process_toll_transaction, nothing here reaches the Flask
+workers' memory: ingested crossings are not counted in LaneMetrics (so the
+live lane views and the lane plan's live rates leave them out) and declined
+wallet payments raise no dashboard alert. Declines are logged and counted
+in the pipeline stats instead; the event stream's crossing counters read
+the database and do include these crossings.
+"""
+
+import asyncio
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from sqlalchemy import insert, select, update
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from app import db
+from app.models import Vehicle, Wallet, WalletTransaction, TollTransaction, PaymentMode, TransactionStatus
+from app.services.toll_service import (
+    TollService, VEHICLE_REJECTED, RATE_NOT_CONFIGURED, WALLET_NOT_FOUND, INSUFFICIENT_BALANCE
+)
+
+# Async driver used for each backend when the configured URL names a sync one
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+    'mysql': 'mysql+aiomysql'
+}
+ASYNC_DRIVER_NAMES = {'aiosqlite', 'asyncpg', 'aiomysql', 'asyncmy', 'psycopg'}
+
+# Length of the toll_transaction.event_id column
+EVENT_ID_MAX_LENGTH = 64
+
+def async_database_url(url):
+    """
+    The database URL with an async driver (sqlite:///x.db -> sqlite+aiosqlite:///x.db)
+    """
+    parsed = make_url(url)
+    if parsed.get_driver_name() in ASYNC_DRIVER_NAMES:
+        return url
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f'No async driver known for {backend}; set INGEST_DATABASE_URL')
+    return parsed.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+def parse_event(data, max_skew_seconds):
+    """
+    Validate one crossing event from a lane controller
+    
+    The timestamp selects the peak/normal rate and the tariff multiplier, so
+    one further than max_skew_seconds from the server clock is refused
+    rather than trusted.
+    
+    Args:
+        data: Dictionary with vehicle_id, plaza_id and optionally lane_no (1),
+            payment_mode ('wallet'), timestamp (ISO 8601, default now),
+            operator_id and event_id (the controller's idempotency key)
+        max_skew_seconds: Largest accepted distance of timestamp from now
+    
+    Returns:
+        Normalized event dictionary
+    
+    Raises:
+        ValueError: With the reason the event is malformed
+    """
+    if not isinstance(data, dict):
+        raise ValueError('Each event must be a JSON object')
+    try:
+        event = {
+            'vehicle_id': int(data['vehicle_id']),
+            'plaza_id': int(data['plaza_id']),
+            'lane_no': int(data.get('lane_no', 1)),
+            'payment_mode': PaymentMode(data.get('payment_mode', 'wallet')),
+            'operator_id': int(data['operator_id']) if data.get('operator_id') is not None else None
+        }
+    except KeyError as e:
+        raise ValueError(f'Missing field: {e.args[0]}')
+    except (TypeError, ValueError):
+        raise ValueError('Invalid vehicle_id, plaza_id, lane_no, payment_mode or operator_id')
+    
+    event_id = data.get('event_id')
+    if event_id is not None:
+        event_id = str(event_id)
+        if not 0 < len(event_id) <= EVENT_ID_MAX_LENGTH:
+            raise ValueError(f'event_id must be 1 to {EVENT_ID_MAX_LENGTH} characters')
+    event['event_id'] = event_id
+    
+    now = datetime.utcnow()
+    timestamp = data.get('timestamp')
+    if timestamp is None:
+        event['timestamp'] = now
+    else:
+        try:
+            parsed = datetime.fromisoformat(str(timestamp).replace('Z', '+00:00'))
+        except ValueError:
+            raise ValueError('Invalid timestamp (expected ISO 8601)')
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        if abs((parsed - now).total_seconds()) > max_skew_seconds:
+            raise ValueError(f'Timestamp more than {max_skew_seconds:g}s from server time')
+        event['timestamp'] = parsed
+    return event
+
+def _rejected(message):
+    return {'success': False, 'message': message, 'transaction_id': None}
+
+def _already_recorded(row):
+    return {
+        'success': True,
+        'message': 'Toll transaction already recorded',
+        'transaction_id': row.txn_id,
+        'amount': row.amount,
+        'timestamp': row.timestamp.isoformat(),
+        'payment_mode': row.payment_mode.value
+    }
+
+class IngestionPipeline:
+    """
+    Bounded queue, batch writers and table refresher of one ingestion process
+    """
+    
+    def __init__(self, flask_app):
+        config = flask_app.config
+        self.flask_app = flask_app
+        self.database_url = config['INGEST_DATABASE_URL'] or async_database_url(config['SQLALCHEMY_DATABASE_URI'])
+        self.queue_size = config['INGEST_QUEUE_SIZE']
+        self.batch_size = config['INGEST_BATCH_SIZE']
+        self.batch_wait = config['INGEST_BATCH_WAIT_MS'] / 1000.0
+        self.writers = config['INGEST_WRITERS']
+        self.pool_size = config['INGEST_DB_POOL_SIZE']
+        self.refresh_seconds = min(config['RATE_CACHE_REFRESH_SECONDS'], config['TARIFF_REFRESH_SECONDS'])
+        
+        self.queue = None
+        self.engine = None
+        self.closing = False
+        self._tasks = []
+        self._pending = {}  # event_id -> future of the queued event
+        self.stats = {
+            'accepted': 0, 'refused_queue_full': 0, 'committed': 0, 'rejected': 0, 'declined_payments': 0,
+            'duplicates': 0, 'failed': 0, 'batches': 0, 'largest_batch': 0, 'batch_seconds': 0.0
+        }
+    
+    # ========================================================================
+    # Lifecycle
+    # ========================================================================
+    
+    async def start(self):
+        """
+        Open the connection pool, load the pricing tables and start the writers
+        """
+        self.queue = asyncio.Queue(self.queue_size)
+        if make_url(self.database_url).get_backend_name() == 'sqlite':
+            # SQLite takes one writer at a time; the default pool suits it
+            self.engine = create_async_engine(self.database_url)
+        else:
+            self.engine = create_async_engine(
+                self.database_url, pool_size=self.pool_size, max_overflow=0, pool_pre_ping=True
+            )
+        await asyncio.to_thread(self._refresh_tables)
+        
+        self._tasks = [asyncio.create_task(self._writer()) for _ in range(self.writers)]
+        self._tasks.append(asyncio.create_task(self._refresher()))
+        print(f"[{datetime.now()}] Ingestion pipeline started: {self.writers} writer(s), "
+              f"queue {self.queue_size}, batches of {self.batch_size}")
+    
+    async def stop(self, timeout=10):
+        """
+        Refuse new events, let the writers drain the queue, close the pool
+        """
+        self.closing = True
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            print(f"[{datetime.now()}] Ingestion stopped with {self.queue.qsize()} events unwritten")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self.engine.dispose()
+    
+    def _refresh_tables(self):
+        """
+        Reload the rate and tariff tables if they changed (runs in a thread)
+        """
+        from app.services.rate_cache import TollRateCache
+        from app.services.dynamic_pricing_service import DynamicPricingService
+        
+        with self.flask_app.app_context():
+            try:
+                TollRateCache.ensure_loaded()
+                DynamicPricingService.ensure_loaded()
+            finally:
+                db.session.remove()
+    
+    async def _refresher(self):
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            await asyncio.to_thread(self._refresh_tables)
+    
+    # ========================================================================
+    # Queue
+    # ========================================================================
+    
+    def submit(self, events):
+        """
+        Queue events for writing, all or none
+        
+        A retry of an event_id that is still queued shares the queued
+        event's future instead of being queued again.
+        
+        Returns:
+            One future per event, resolved with its result after commit
+        
+        Raises:
+            asyncio.QueueFull: The queue cannot take all events (backpressure)
+        """
+        keys = [event['event_id'] for event in events if event['event_id'] is not None]
+        new = len(events) - len(keys) + len(set(keys) - self._pending.keys())
+        if self.closing or self.queue.maxsize - self.queue.qsize() < new:
+            self.stats['refused_queue_full'] += len(events)
+            raise asyncio.QueueFull()
+        
+        loop = asyncio.get_running_loop()
+        futures = []
+        for event in events:
+            key = event['event_id']
+            if key is not None and key in self._pending:
+                futures.append(self._pending[key])
+                continue
+            future = loop.create_future()
+            self.queue.put_nowait((event, future))
+            if key is not None:
+                self._pending[key] = future
+            futures.append(future)
+        self.stats['accepted'] += new
+        self.stats['duplicates'] += len(events) - new
+        return futures
+    
+    async def _next_batch(self):
+        """
+        Wait for an event, then collect more for up to INGEST_BATCH_WAIT_MS
+        """
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.batch_wait
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+    
+    async def _writer(self):
+        while True:
+            batch = await self._next_batch()
+            started = time.perf_counter()
+            events = [event for event, _ in batch]
+            try:
+                results = await self.write_batch(events)
+            except Exception as e:
+                print(f"[{datetime.now()}] Ingestion batch of {len(batch)} failed: {str(e)}")
+                # One event at a time, so a single bad event does not fail the others
+                results = [await self._write_one(event) for event in events]
+            
+            self.stats['batches'] += 1
+            self.stats['largest_batch'] = max(self.stats['largest_batch'], len(batch))
+            self.stats['batch_seconds'] += time.perf_counter() - started
+            for (event, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+                if self._pending.get(event['event_id']) is future:
+                    del self._pending[event['event_id']]
+                self.queue.task_done()
+    
+    async def _write_one(self, event):
+        try:
+            return (await self.write_batch([event]))[0]
+        except Exception as e:
+            self.stats['failed'] += 1
+            return _rejected(f'Error processing toll: {str(e)}')
+    
+    # ========================================================================
+    # Batch write
+    # ========================================================================
+    
+    async def write_batch(self, events):
+        """
+        Price, validate and store a batch of crossings in one transaction
+        
+        An event whose event_id is already stored is answered with that
+        transaction instead of being charged again; the unique event_id
+        column fails a batch racing another writer on the same key, and the
+        per-event retry then finds the stored transaction.
+        
+        Args:
+            events: Events from parse_event
+        
+        Returns:
+            One TollService-style result dictionary per event
+        """
+        results = [None] * len(events)
+        now = datetime.utcnow()
+        
+        async with self.engine.begin() as conn:
+            keys = {event['event_id'] for event in events if event['event_id'] is not None}
+            recorded = {}
+            if keys:
+                recorded = {row.event_id: row for row in (await conn.execute(
+                    select(
+                        TollTransaction.event_id, TollTransaction.txn_id, TollTransaction.amount,
+                        TollTransaction.timestamp, TollTransaction.payment_mode
+                    ).where(TollTransaction.event_id.in_(keys))
+                )).all()}
+            
+            rows = (await conn.execute(
+                select(
+                    Vehicle.vehicle_id, Vehicle.vehicle_number, Vehicle.vehicle_type, Vehicle.status,
+                    Wallet.wallet_id, Wallet.balance
+                ).outerjoin(
+                    Wallet, Wallet.user_id == Vehicle.user_id
+                ).where(Vehicle.vehicle_id.in_({event['vehicle_id'] for event in events}))
+            )).all()
+            vehicles = {row.vehicle_id: row for row in rows}
+            
+            # Same checks and messages as TollService.process_toll_transaction;
+            # balances are tracked across the batch so repeat crossings add up
+            accepted = []
+            balances = {}
+            debits = defaultdict(float)
+            first_of_key = {}
+            repeats = []
+            for i, event in enumerate(events):
+                key = event['event_id']
+                if key in recorded:
+                    results[i] = _already_recorded(recorded[key])
+                    continue
+                if key is not None:
+                    if key in first_of_key:
+                        repeats.append((i, first_of_key[key]))
+                        continue
+                    first_of_key[key] = i
+                vehicle = vehicles.get(event['vehicle_id'])
+                if vehicle is None or vehicle.status != 'active':
+                    results[i] = _rejected(VEHICLE_REJECTED)
+                    continue
+                toll_details = TollService.price_toll(event['plaza_id'], vehicle.vehicle_type, event['timestamp'])
+                if not toll_details:
+                    results[i] = _rejected(RATE_NOT_CONFIGURED)
+                    continue
+                amount = toll_details['amount']
+                if event['payment_mode'] == PaymentMode.WALLET:
+                    if vehicle.wallet_id is None:
+                        results[i] = _rejected(WALLET_NOT_FOUND)
+                        continue
+                    balance = balances.get(vehicle.wallet_id, vehicle.balance)
+                    if balance < amount:
+                        results[i] = _rejected(INSUFFICIENT_BALANCE)
+                        continue
+                    balances[vehicle.wallet_id] = balance - amount
+                    debits[vehicle.wallet_id] += amount
+                accepted.append((i, event, vehicle, toll_details))
+            
+            # Conditional debits: a balance spent elsewhere since it was read
+            # declines that wallet's crossings instead of going negative
+            declined = set()
+            for wallet_id, total in debits.items():
+                updated = await conn.execute(
+                    update(Wallet).where(
+                        Wallet.wallet_id == wallet_id, Wallet.balance >= total
+                    ).values(balance=Wallet.balance - total, last_updated=now)
+                )
+                if updated.rowcount == 0:
+                    declined.add(wallet_id)
+            
+            written = []
+            for i, event, vehicle, toll_details in accepted:
+                if event['payment_mode'] == PaymentMode.WALLET and vehicle.wallet_id in declined:
+                    results[i] = _rejected(INSUFFICIENT_BALANCE)
+                else:
+                    written.append((i, event, vehicle, toll_details))
+            
+            if written:
+                txn_ids = (await conn.execute(
+                    insert(TollTransaction).returning(TollTransaction.txn_id, sort_by_parameter_order=True),
+                    [
+                        {
+                            'vehicle_id': event['vehicle_id'],
+                            'plaza_id': event['plaza_id'],
+                            'lane_no': event['lane_no'],
+                            'amount': toll_details['amount'],
+                            'payment_mode': event['payment_mode'],
+                            'status': TransactionStatus.COMPLETED,
+                            'operator_id': event['operator_id'],
+                            'timestamp': event['timestamp'],
+                            'event_id': event['event_id']
+                        }
+                        for _, event, _, toll_details in written
+                    ]
+                )).scalars().all()
+                
+                wallet_rows = [
+                    {
+                        'wallet_id': vehicle.wallet_id,
+                        'txn_type': 'deduction',
+                        'amount': toll_details['amount'],
+                        'timestamp': now,
+                        'reference_txn_id': str(txn_id),
+                        'description': f"Toll deduction at plaza {event['plaza_id']}"
+                    }
+                    for (_, event, vehicle, toll_details), txn_id in zip(written, txn_ids)
+                    if event['payment_mode'] == PaymentMode.WALLET
+                ]
+                if wallet_rows:
+                    await conn.execute(insert(WalletTransaction), wallet_rows)
+                
+                for (i, event, vehicle, toll_details), txn_id in zip(written, txn_ids):
+                    results[i] = {
+                        'success': True,
+                        'message': 'Toll transaction completed successfully',
+                        'transaction_id': txn_id,
+                        'amount': toll_details['amount'],
+                        'vehicle_number': vehicle.vehicle_number,
+                        'vehicle_type': vehicle.vehicle_type.value,
+                        'timestamp': event['timestamp'].isoformat(),
+                        'payment_mode': event['payment_mode'].value,
+                        'toll_details': toll_details
+                    }
+        
+        # No dashboard alert can be raised from this process (see module docstring)
+        for event, result in zip(events, results):
+            if result is not None and result['message'] in (WALLET_NOT_FOUND, INSUFFICIENT_BALANCE):
+                self.stats['declined_payments'] += 1
+                print(f"[{datetime.now()}] Payment declined for vehicle {event['vehicle_id']} at plaza "
+                      f"{event['plaza_id']} lane {event['lane_no']}: {result['message']}")
+        
+        # The same key twice in one batch: charged once, both get its result
+        for i, first in repeats:
+            results[i] = results[first]
+        
+        duplicates = len(repeats) + sum(event['event_id'] in recorded for event in events)
+        self.stats['committed'] += len(written)
+        self.stats['duplicates'] += duplicates
+        self.stats['rejected'] += len(events) - len(written) - duplicates
+        return results
+    
+    def get_status(self):
+        """
+        Queue depth and pipeline counters
+        """
+        batches = self.stats['batches']
+        return dict(
+            self.stats,
+            batch_seconds=round(self.stats['batch_seconds'], 3),
+            avg_batch_ms=round(self.stats['batch_seconds'] / batches * 1000, 2) if batches else 0.0,
+            queue_depth=self.queue.qsize() if self.queue else 0,
+            queue_size=self.queue_size,
+            writers=self.writers,
+            closing=self.closing
+        )
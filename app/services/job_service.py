@@ -0,0 +1,197 @@
+"""
+Background Job Service - Runs long analysis tasks off the request thread
+Jobs execute on a bounded worker pool and record progress, results and
+timing so clients can poll for completion
+"""
+
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from flask import current_app
+
+class JobStatus:
+    """Lifecycle states of a background job"""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+
+class Job:
+    """
+    In-memory record of one background job
+    """
+    
+    def __init__(self, name, key=None):
+        self.job_id = uuid.uuid4().hex
+        self.name = name
+        self.key = key
+        self.status = JobStatus.QUEUED
+        self.progress = 0
+        self.message = 'Queued'
+        self.result = None
+        self.error = None
+        self.submitted_at = datetime.utcnow()
+        self.started_at = None
+        self.finished_at = None
+        self.duration_seconds = None
+    
+    @property
+    def is_active(self):
+        return self.status in (JobStatus.QUEUED, JobStatus.RUNNING)
+    
+    def update_progress(self, progress, message=None):
+        """Progress callback handed to the job function (0-100)"""
+        self.progress = max(0, min(100, int(progress)))
+        if message:
+            self.message = message
+    
+    def to_dict(self):
+        return {
+            'job_id': self.job_id,
+            'name': self.name,
+            'status': self.status,
+            'progress': self.progress,
+            'message': self.message,
+            'result': self.result,
+            'error': self.error,
+            'submitted_at': self.submitted_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'duration_seconds': self.duration_seconds
+        }
+
+class JobService:
+    """
+    Service class to submit and track background jobs
+    
+    Jobs submitted with the same key while an earlier one is still queued or
+    running are coalesced onto the existing job instead of running twice.
+    """
+    
+    _executor = None
+    _jobs = OrderedDict()
+    _active_keys = {}
+    _lock = threading.Lock()
+    
+    @staticmethod
+    def _get_executor():
+        """
+        Lazily create the bounded worker pool (size: JOB_MAX_WORKERS)
+        """
+        if JobService._executor is None:
+            JobService._executor = ThreadPoolExecutor(
+                max_workers=current_app.config['JOB_MAX_WORKERS'],
+                thread_name_prefix='toll-job'
+            )
+        return JobService._executor
+    
+    @staticmethod
+    def submit(name, func, key=None, **kwargs):
+        """
+        Queue a job for background execution
+        
+        Args:
+            name: Human readable job name
+            func: Callable invoked as func(job, **kwargs) inside an app context
+            key: Optional coalescing key; duplicates of an active job are merged
+            **kwargs: Extra keyword arguments passed to func
+        
+        Returns:
+            Tuple of (job dict, created) where created is False when coalesced
+        """
+        app = current_app._get_current_object()
+        
+        with JobService._lock:
+            if key is not None:
+                active_id = JobService._active_keys.get(key)
+                active_job = JobService._jobs.get(active_id)
+                if active_job is not None and active_job.is_active:
+                    return active_job.to_dict(), False
+            
+            job = Job(name, key=key)
+            JobService._jobs[job.job_id] = job
+            if key is not None:
+                JobService._active_keys[key] = job.job_id
+            JobService._trim_history(app.config['JOB_HISTORY_SIZE'])
+            JobService._get_executor().submit(JobService._run, app, job, func, kwargs)
+        
+        return job.to_dict(), True
+    
+    @staticmethod
+    def _run(app, job, func, kwargs):
+        """
+        Execute a job on a worker thread and record its outcome
+        """
+        job.status = JobStatus.RUNNING
+        job.started_at = datetime.utcnow()
+        job.message = 'Running'
+        started = time.perf_counter()
+        
+        try:
+            with app.app_context():
+                job.result = func(job, **kwargs)
+            job.status = JobStatus.COMPLETED
+            job.progress = 100
+            job.message = 'Completed'
+        except Exception as e:
+            print(f"[{datetime.now()}] Job {job.name} ({job.job_id}) failed: {str(e)}")
+            traceback.print_exc()
+            job.status = JobStatus.FAILED
+            job.error = str(e)
+            job.message = 'Failed'
+        finally:
+            job.finished_at = datetime.utcnow()
+            job.duration_seconds = round(time.perf_counter() - started, 3)
+            with JobService._lock:
+                if job.key is not None and JobService._active_keys.get(job.key) == job.job_id:
+                    del JobService._active_keys[job.key]
+            
+            from app.services.event_hub import EventHub
+            EventHub.publish('job', {
+                'job_id': job.job_id,
+                'name': job.name,
+                'status': job.status,
+                'message': job.result.get('message') if isinstance(job.result, dict) else job.error,
+                'duration_seconds': job.duration_seconds
+            })
+    
+    @staticmethod
+    def _trim_history(max_jobs):
+        """
+        Drop the oldest finished jobs beyond max_jobs (caller holds the lock)
+        """
+        excess = len(JobService._jobs) - max_jobs
+        if excess <= 0:
+            return
+        for job_id in list(JobService._jobs):
+            if excess <= 0:
+                break
+            if not JobService._jobs[job_id].is_active:
+                del JobService._jobs[job_id]
+                excess -= 1
+    
+    @staticmethod
+    def get_job(job_id):
+        """
+        Get the current state of a job
+        
+        Args:
+            job_id: ID returned by submit()
+        
+        Returns:
+            Job dictionary or None if unknown
+        """
+        job = JobService._jobs.get(job_id)
+        return job.to_dict() if job else None
+    
+    @staticmethod
+    def list_jobs(limit=20):
+        """
+        Get the most recently submitted jobs, newest first
+        """
+        jobs = list(JobService._jobs.values())[-limit:]
+        return [job.to_dict() for job in reversed(jobs)]
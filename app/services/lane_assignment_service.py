@@ -0,0 +1,301 @@
+"""
+Lane Assignment Service - Congestion-aware lane opening recommendations
+Arrival rates blend live lane throughput (LaneMetrics) with the short-term
+traffic forecast; service rates come from each plaza's vehicle type and
+payment mode mix. An M/M/c (Erlang C) queue is evaluated for every plaza
+and every possible number of open lanes in one NumPy pass, and the fewest
+lanes meeting LANE_TARGET_WAIT_SECONDS are recommended. Heavy vehicles get
+dedicated lanes in proportion to their share of the service workload.
+"""
+
+import threading
+import time
+import numpy as np
+from datetime import datetime, timedelta
+from flask import current_app
+from app import db
+from app.models import TollPlaza, TollTransaction, Vehicle
+from app.services.lane_metrics import LaneMetrics
+from app.services.model_registry import ModelRegistry
+from app.services.prediction_service import PredictionService
+
+# Mean booth service time per vehicle type for wallet (tag) payments, seconds
+SERVICE_SECONDS = {
+    'bike': 6.0,
+    'car': 8.0,
+    'bus': 14.0,
+    'truck': 16.0,
+    'heavy_vehicle': 20.0
+}
+
+# Service time multiplier per payment mode
+PAYMENT_SERVICE_FACTOR = {
+    'wallet': 1.0,
+    'upi': 1.8,
+    'cash': 3.0
+}
+
+HEAVY_TYPES = ['truck', 'bus', 'heavy_vehicle']
+LIGHT_TYPES = ['bike', 'car']
+
+# Mix assumed for plazas without recent transactions: (vehicle type, payment mode) -> share
+DEFAULT_MIX = {
+    ('car', 'wallet'): 0.55,
+    ('car', 'upi'): 0.1,
+    ('car', 'cash'): 0.05,
+    ('bike', 'wallet'): 0.1,
+    ('truck', 'wallet'): 0.12,
+    ('bus', 'wallet'): 0.05,
+    ('heavy_vehicle', 'wallet'): 0.03
+}
+
+def service_profile(mix):
+    """
+    Mean service time and heavy vehicle workload share of a traffic mix
+    
+    Args:
+        mix: Dictionary (vehicle type, payment mode) -> share of vehicles
+    
+    Returns:
+        Tuple of (mean service seconds, heavy workload share, type shares)
+    """
+    total = sum(mix.values())
+    workload = {
+        key: share / total * SERVICE_SECONDS[key[0]] * PAYMENT_SERVICE_FACTOR[key[1]]
+        for key, share in mix.items()
+    }
+    mean_service = sum(workload.values())
+    heavy = sum(value for (vehicle_type, _), value in workload.items() if vehicle_type in HEAVY_TYPES)
+    
+    type_shares = {}
+    for (vehicle_type, _), share in mix.items():
+        type_shares[vehicle_type] = type_shares.get(vehicle_type, 0.0) + share / total
+    return mean_service, heavy / mean_service, type_shares
+
+def erlang_c(arrival_rate, service_rate, max_servers):
+    """
+    M/M/c waiting probability and mean wait for c = 1..max_servers
+    
+    Erlang B is computed with its stable recursion for all queues at once,
+    then converted to Erlang C.
+    
+    Args:
+        arrival_rate: Array of arrival rates (vehicles per second), one per queue
+        service_rate: Array of service rates per server (vehicles per second)
+        max_servers: Largest number of servers evaluated
+    
+    Returns:
+        Tuple of (wait probability, mean wait in seconds) arrays of shape
+        (queues, max_servers); unstable configurations have wait inf
+    """
+    arrival_rate = np.asarray(arrival_rate, dtype=np.float64)
+    service_rate = np.asarray(service_rate, dtype=np.float64)
+    load = arrival_rate / service_rate
+    servers = np.arange(1, max_servers + 1)
+    
+    erlang_b = np.empty((len(load), max_servers))
+    blocking = np.ones_like(load)
+    for k in servers:
+        blocking = load * blocking / (k + load * blocking)
+        erlang_b[:, k - 1] = blocking
+    
+    utilization = load[:, None] / servers[None, :]
+    stable = utilization < 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        wait_probability = np.where(stable, erlang_b / (1 - utilization * (1 - erlang_b)), 1.0)
+        capacity = servers[None, :] * service_rate[:, None] - arrival_rate[:, None]
+        mean_wait = np.where(stable, wait_probability / capacity, np.inf)
+    return wait_probability, mean_wait
+
+class LaneAssignmentService:
+    """
+    Service class computing network-wide lane plans
+    """
+    
+    _plan = None
+    _plan_at = None
+    _plazas = None
+    _plazas_at = None
+    _mix = {}
+    _mix_at = None
+    _lock = threading.Lock()
+    
+    @staticmethod
+    def get_plazas():
+        """
+        (plaza_id, plaza_name, num_lanes) for every plaza, cached for a minute
+        """
+        cls = LaneAssignmentService
+        if cls._plazas is None or time.monotonic() - cls._plazas_at > 60:
+            cls._plazas = [
+                (row.plaza_id, row.plaza_name, row.num_lanes)
+                for row in db.session.query(
+                    TollPlaza.plaza_id, TollPlaza.plaza_name, TollPlaza.num_lanes
+                ).order_by(TollPlaza.plaza_id)
+            ]
+            cls._plazas_at = time.monotonic()
+        return cls._plazas
+    
+    @staticmethod
+    def get_mixes():
+        """
+        Vehicle type and payment mode mix per plaza over the last
+        LANE_MIX_DAYS days (one grouped query, cached for LANE_MIX_TTL)
+        """
+        cls = LaneAssignmentService
+        config = current_app.config
+        if cls._mix_at is not None and time.monotonic() - cls._mix_at < config['LANE_MIX_TTL']:
+            return cls._mix
+        
+        since = datetime.utcnow() - timedelta(days=config['LANE_MIX_DAYS'])
+        rows = db.session.query(
+            TollTransaction.plaza_id,
+            Vehicle.vehicle_type,
+            TollTransaction.payment_mode,
+            db.func.count(TollTransaction.txn_id)
+        ).join(
+            Vehicle, Vehicle.vehicle_id == TollTransaction.vehicle_id
+        ).filter(
+            TollTransaction.timestamp >= since
+        ).group_by(
+            TollTransaction.plaza_id, Vehicle.vehicle_type, TollTransaction.payment_mode
+        ).all()
+        
+        mixes = {}
+        for plaza_id, vehicle_type, payment_mode, count in rows:
+            key = (vehicle_type.value, payment_mode.value)
+            mixes.setdefault(plaza_id, {})[key] = count
+        
+        cls._mix = mixes
+        cls._mix_at = time.monotonic()
+        return mixes
+    
+    @staticmethod
+    def assign_lanes(open_lanes, heavy_share):
+        """
+        Split open lanes between light and heavy vehicle types
+        
+        Heavy vehicles get the highest numbered lanes, in proportion to
+        their share of the service workload, once two or more lanes are open.
+        """
+        if open_lanes < 2 or heavy_share <= 0:
+            return [{'lane_no': lane, 'vehicle_types': LIGHT_TYPES + HEAVY_TYPES} for lane in range(1, open_lanes + 1)]
+        
+        heavy_lanes = int(min(max(round(open_lanes * heavy_share), 1), open_lanes - 1))
+        return [
+            {
+                'lane_no': lane,
+                'vehicle_types': LIGHT_TYPES if lane <= open_lanes - heavy_lanes else HEAVY_TYPES
+            }
+            for lane in range(1, open_lanes + 1)
+        ]
+    
+    @staticmethod
+    def compute_plan():
+        """
+        Recommend open lanes for every plaza now and for the next hour
+        
+        Returns:
+            Dictionary with per-plaza recommendations
+        """
+        config = current_app.config
+        plazas = LaneAssignmentService.get_plazas()
+        if not plazas:
+            return {'plazas': [], 'generated_at': datetime.utcnow().isoformat()}
+        
+        plaza_ids = [plaza_id for plaza_id, _, _ in plazas]
+        num_lanes = np.array([max(lanes, 1) for _, _, lanes in plazas])
+        max_lanes = int(num_lanes.max())
+        
+        # Arrival rates (vehicles per minute): live throughput and forecasts
+        live = LaneMetrics.get_overview(config['LANE_LIVE_MINUTES'])
+        live_rate = np.array([live[p]['vehicles_per_minute'] if p in live else 0.0 for p in plaza_ids])
+        has_live = np.array([p in live for p in plaza_ids])
+        
+        # Forecast the current hour and the next one, starting the slots an
+        # hour back so hours past midnight use the next day's date
+        model = ModelRegistry.get_active()
+        hour_start = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+        slots = PredictionService.forecast_slots(2, hour_start - timedelta(hours=1))
+        forecasts = PredictionService.get_slot_predictions(plaza_ids, slots, model)
+        forecast_now = np.array([forecasts[p][0]['predicted_vehicles'] for p in plaza_ids]) / 60.0
+        forecast_next = np.array([forecasts[p][1]['predicted_vehicles'] for p in plaza_ids]) / 60.0
+        
+        weight = config['LANE_LIVE_WEIGHT']
+        arrivals_now = np.where(has_live, weight * live_rate + (1 - weight) * forecast_now, forecast_now)
+        
+        # Service rates from each plaza's mix
+        mixes = LaneAssignmentService.get_mixes()
+        profiles = [service_profile(mixes.get(p) or DEFAULT_MIX) for p in plaza_ids]
+        service_seconds = np.array([profile[0] for profile in profiles])
+        
+        # Evaluate both horizons for all plazas in one pass
+        arrivals = np.concatenate([arrivals_now, forecast_next]) / 60.0
+        wait_probability, mean_wait = erlang_c(arrivals, np.tile(1.0 / service_seconds, 2), max_lanes)
+        
+        lane_counts = np.arange(1, max_lanes + 1)
+        allowed = lane_counts[None, :] <= np.tile(num_lanes, 2)[:, None]
+        meets = allowed & (mean_wait <= config['LANE_TARGET_WAIT_SECONDS'])
+        recommended = np.where(meets.any(axis=1), meets.argmax(axis=1) + 1, np.tile(num_lanes, 2))
+        rows = np.arange(len(arrivals))
+        expected_wait = mean_wait[rows, recommended - 1]
+        utilization = arrivals * np.tile(service_seconds, 2) / recommended
+        
+        count = len(plaza_ids)
+        results = []
+        for i, (plaza_id, plaza_name, lanes) in enumerate(plazas):
+            now, nxt = i, count + i
+            results.append({
+                'plaza_id': plaza_id,
+                'plaza_name': plaza_name,
+                'num_lanes': lanes,
+                'arrivals_per_minute': round(float(arrivals_now[i]), 2),
+                'live_per_minute': round(float(live_rate[i]), 2) if has_live[i] else None,
+                'forecast_per_minute': round(float(forecast_now[i]), 2),
+                'mean_service_seconds': round(float(service_seconds[i]), 2),
+                'vehicle_mix': {name: round(share, 3) for name, share in profiles[i][2].items()},
+                'recommended_lanes': int(recommended[now]),
+                'expected_wait_seconds': round(float(expected_wait[now]), 1) if np.isfinite(expected_wait[now]) else None,
+                'wait_probability': round(float(wait_probability[now, recommended[now] - 1]), 3),
+                'utilization': round(float(utilization[now]), 3),
+                'over_capacity': not bool(meets[now].any()),
+                'lanes': LaneAssignmentService.assign_lanes(int(recommended[now]), profiles[i][1]),
+                'next_hour': {
+                    'arrivals_per_minute': round(float(forecast_next[i]), 2),
+                    'recommended_lanes': int(recommended[nxt]),
+                    'expected_wait_seconds': round(float(expected_wait[nxt]), 1) if np.isfinite(expected_wait[nxt]) else None,
+                    'over_capacity': not bool(meets[nxt].any())
+                }
+            })
+        
+        return {
+            'plazas': results,
+            'target_wait_seconds': config['LANE_TARGET_WAIT_SECONDS'],
+            'model_version': model.version if model else None,
+            'generated_at': datetime.utcnow().isoformat()
+        }
+    
+    @staticmethod
+    def get_plan(plaza_id=None):
+        """
+        Network lane plan, recomputed at most every LANE_PLAN_CACHE_SECONDS
+        
+        Args:
+            plaza_id: Only return this plaza (optional)
+        
+        Returns:
+            Plan dictionary (see compute_plan)
+        """
+        cls = LaneAssignmentService
+        max_age = current_app.config['LANE_PLAN_CACHE_SECONDS']
+        plan = cls._plan
+        if plan is None or time.monotonic() - cls._plan_at > max_age:
+            with cls._lock:
+                if cls._plan is None or time.monotonic() - cls._plan_at > max_age:
+                    cls._plan = cls.compute_plan()
+                    cls._plan_at = time.monotonic()
+                plan = cls._plan
+        
+        if plaza_id is not None:
+            plan = dict(plan, plazas=[p for p in plan['plazas'] if p['plaza_id'] == plaza_id])
+        return plan
@@ -0,0 +1,172 @@
+"""
+Lane Metrics - Per-minute ring buffers of lane throughput held in memory
+Each (plaza, lane) owns fixed-size NumPy arrays with one slot per minute for
+the last LANE_METRICS_MINUTES minutes: vehicles, revenue and processing
+latency. A crossing updates one slot in O(1); a slot is reset when its
+minute comes round again, so memory never grows and reads never touch the
+database. Counters are per process and count the crossings processed by
+TollService in that process; the async ingestion API (app/ingest.py) does
+not feed them.
+"""
+
+import threading
+import time
+import numpy as np
+from datetime import datetime
+from flask import current_app
+
+class LaneBuffer:
+    """
+    Ring buffer of per-minute counters for one lane
+    """
+    
+    def __init__(self, size):
+        self.size = size
+        self.minutes = np.full(size, -1, dtype=np.int64)  # Minute stored in each slot
+        self.vehicles = np.zeros(size, dtype=np.int32)
+        self.revenue = np.zeros(size, dtype=np.float64)
+        self.latency_sum = np.zeros(size, dtype=np.float64)
+        self.latency_max = np.zeros(size, dtype=np.float64)
+        self.last_crossing = None
+    
+    def add(self, minute, amount, latency_ms, timestamp):
+        slot = minute % self.size
+        if minute < self.minutes[slot]:
+            return  # Older than the ring holds
+        if self.minutes[slot] != minute:
+            self.minutes[slot] = minute
+            self.vehicles[slot] = 0
+            self.revenue[slot] = 0.0
+            self.latency_sum[slot] = 0.0
+            self.latency_max[slot] = 0.0
+        self.vehicles[slot] += 1
+        self.revenue[slot] += amount
+        self.latency_sum[slot] += latency_ms
+        if latency_ms > self.latency_max[slot]:
+            self.latency_max[slot] = latency_ms
+        self.last_crossing = timestamp
+    
+    def window(self, now_minute, minutes):
+        """
+        Counters for the last `minutes` minutes, oldest first, zero where a
+        slot holds an older minute
+        """
+        expected = np.arange(now_minute - minutes + 1, now_minute + 1)
+        slots = expected % self.size
+        valid = self.minutes[slots] == expected
+        return {
+            'minutes': expected,
+            'vehicles': np.where(valid, self.vehicles[slots], 0),
+            'revenue': np.where(valid, self.revenue[slots], 0.0),
+            'latency_sum': np.where(valid, self.latency_sum[slots], 0.0),
+            'latency_max': np.where(valid, self.latency_max[slots], 0.0)
+        }
+
+class LaneMetrics:
+    """
+    Service class holding the lane ring buffers
+    """
+    
+    _buffers = {}
+    _lock = threading.Lock()
+    
+    @staticmethod
+    def record(plaza_id, lane_no, amount, latency_ms, timestamp=None):
+        """
+        Count one crossing in the current minute of its lane (O(1))
+        
+        Args:
+            plaza_id: ID of the toll plaza
+            lane_no: Lane the vehicle used
+            amount: Toll charged
+            latency_ms: Time taken to process the crossing
+            timestamp: Epoch seconds of the crossing (default: now)
+        """
+        cls = LaneMetrics
+        timestamp = timestamp if timestamp is not None else time.time()
+        key = (plaza_id, lane_no)
+        
+        with cls._lock:
+            buffer = cls._buffers.get(key)
+            if buffer is None:
+                buffer = cls._buffers[key] = LaneBuffer(current_app.config['LANE_METRICS_MINUTES'])
+            buffer.add(int(timestamp // 60), amount, latency_ms, timestamp)
+    
+    @staticmethod
+    def _summarize(buffer, now_minute, minutes, series):
+        data = buffer.window(now_minute, minutes)
+        vehicles = int(data['vehicles'].sum())
+        summary = {
+            'vehicles': vehicles,
+            'revenue': round(float(data['revenue'].sum()), 2),
+            'vehicles_per_minute': round(vehicles / minutes, 2),
+            'current_minute_vehicles': int(data['vehicles'][-1]),
+            'peak_minute_vehicles': int(data['vehicles'].max()),
+            'avg_latency_ms': round(float(data['latency_sum'].sum()) / vehicles, 2) if vehicles else None,
+            'max_latency_ms': round(float(data['latency_max'].max()), 2) if vehicles else None,
+            'last_crossing_at': datetime.utcfromtimestamp(buffer.last_crossing).isoformat() if buffer.last_crossing else None
+        }
+        if series:
+            summary['series'] = {
+                'minute_start': (data['minutes'] * 60).tolist(),
+                'vehicles': data['vehicles'].tolist(),
+                'revenue': np.round(data['revenue'], 2).tolist(),
+                'avg_latency_ms': np.round(
+                    np.divide(data['latency_sum'], data['vehicles'],
+                              out=np.zeros(minutes), where=data['vehicles'] > 0), 2
+                ).tolist()
+            }
+        return summary
+    
+    @staticmethod
+    def get_plaza_lanes(plaza_id, minutes=15, series=False):
+        """
+        Per-lane throughput of a plaza over the last minutes
+        
+        Args:
+            plaza_id: ID of the toll plaza
+            minutes: Window length (capped at LANE_METRICS_MINUTES)
+            series: Include per-minute series for each lane
+        
+        Returns:
+            List of lane dictionaries ordered by lane number, each with its
+            share of the plaza's vehicles in the window
+        """
+        cls = LaneMetrics
+        now_minute = int(time.time() // 60)
+        minutes = max(1, min(minutes, current_app.config['LANE_METRICS_MINUTES']))
+        
+        with cls._lock:
+            lanes = [
+                dict(cls._summarize(buffer, now_minute, minutes, series), lane_no=lane_no)
+                for (buffer_plaza, lane_no), buffer in sorted(cls._buffers.items())
+                if buffer_plaza == plaza_id
+            ]
+        
+        total = sum(lane['vehicles'] for lane in lanes)
+        for lane in lanes:
+            lane['share'] = round(lane['vehicles'] / total, 3) if total else 0.0
+        return lanes
+    
+    @staticmethod
+    def get_overview(minutes=15):
+        """
+        Plaza totals over the last minutes for every plaza with lane data
+        """
+        cls = LaneMetrics
+        minutes = max(1, min(minutes, current_app.config['LANE_METRICS_MINUTES']))
+        with cls._lock:
+            plaza_ids = sorted({plaza_id for plaza_id, _ in cls._buffers})
+        
+        overview = {}
+        for plaza_id in plaza_ids:
+            lanes = cls.get_plaza_lanes(plaza_id, minutes)
+            vehicles = sum(lane['vehicles'] for lane in lanes)
+            overview[plaza_id] = {
+                'lanes': len(lanes),
+                'vehicles': vehicles,
+                'revenue': round(sum(lane['revenue'] for lane in lanes), 2),
+                'vehicles_per_minute': round(vehicles / minutes, 2),
+                'busiest_lane': max(lanes, key=lambda lane: lane['vehicles'])['lane_no'] if vehicles else None
+            }
+        return overview
@@ -0,0 +1,484 @@
+"""
+Model Registry - Versioned traffic predictor artifacts with lazy loading
+Each version lives in its own directory with the pickled model and a
+metadata.json (features, training window, metrics). An ACTIVE pointer file
+selects the served version; switching it hot-swaps the in-memory model
+without restarting the server.
+
+Layout under MODEL_REGISTRY_DIR:
+    traffic_predictor.pkl               legacy single artifact ('legacy' version)
+    traffic_predictor/ACTIVE            name of the active version
+    traffic_predictor/<version>/model.pkl
+    traffic_predictor/<version>/metadata.json
+    traffic_predictor/<version>/arrays/      flat tree arrays (memory-mapped)
+"""
+
+import os
+import json
+import pickle
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime
+from flask import current_app
+
+MODEL_NAME = 'traffic_predictor'
+LEGACY_VERSION = 'legacy'
+ACTIVE_POINTER = 'ACTIVE'
+MODEL_FILE = 'model.pkl'
+METADATA_FILE = 'metadata.json'
+ARRAYS_DIR = 'arrays'
+
+# Feature order of the original model: [plaza_id, hour, day_of_week, is_peak]
+DEFAULT_FEATURES = ['plaza_id', 'hour', 'day_of_week', 'is_peak']
+
+class LoadedModel:
+    """
+    Immutable snapshot of a loaded model version
+    
+    Callers take one snapshot per request, so a concurrent swap never mixes
+    the model of one version with the metadata of another.
+    """
+    
+    def __init__(self, version, model, metadata):
+        self.version = version
+        self.model = model
+        self.metadata = metadata
+        self.loaded_at = datetime.utcnow()
+    
+    @property
+    def features(self):
+        return self.metadata.get('features', DEFAULT_FEATURES)
+    
+    def predict(self, features):
+        return self.model.predict(features)
+    
+    def to_dict(self):
+        return {
+            'version': self.version,
+            'loaded_at': self.loaded_at.isoformat(),
+            'metadata': self.metadata
+        }
+
+class ModelRegistry:
+    """
+    Service class for registering, activating and serving model versions
+    
+    The model is unpickled on first use rather than at import time. The
+    ACTIVE pointer is re-checked at most every MODEL_REGISTRY_POLL_SECONDS,
+    so activating a version from another process (CLI, other workers) is
+    picked up without a restart. The new model is fully loaded before the
+    reference is swapped; in-flight requests finish on the old snapshot.
+    
+    _load_lock lets one thread check the pointer and load a version; while
+    it does, requests keep being served by the current model. _lock only
+    guards the reference swap itself.
+    """
+    
+    _active = None
+    _pointer_mtime = None
+    _checked_at = None
+    _load_error = None
+    _swap_listeners = []
+    _lock = threading.Lock()
+    _load_lock = threading.Lock()
+    
+    @staticmethod
+    def get_registry_dir():
+        """
+        Get the directory holding the model artifacts
+        """
+        return current_app.config['MODEL_REGISTRY_DIR']
+    
+    @staticmethod
+    def _versions_dir():
+        return os.path.join(ModelRegistry.get_registry_dir(), MODEL_NAME)
+    
+    @staticmethod
+    def _legacy_path():
+        return os.path.join(ModelRegistry.get_registry_dir(), f'{MODEL_NAME}.pkl')
+    
+    @staticmethod
+    def _pointer_path():
+        return os.path.join(ModelRegistry._versions_dir(), ACTIVE_POINTER)
+    
+    @staticmethod
+    def _version_dir(version):
+        if not version or os.path.basename(version) != version or version.startswith('.'):
+            raise ValueError(f'Invalid model version: {version}')
+        return os.path.join(ModelRegistry._versions_dir(), version)
+    
+    # ========================================================================
+    # Serving
+    # ========================================================================
+    
+    @staticmethod
+    def get_active():
+        """
+        Get the active model, loading or hot-swapping it if needed
+        
+        Returns:
+            LoadedModel snapshot, or None when no model is available
+        """
+        cls = ModelRegistry
+        now = time.monotonic()
+        poll_seconds = current_app.config['MODEL_REGISTRY_POLL_SECONDS']
+        
+        if cls._checked_at is not None and now - cls._checked_at < poll_seconds:
+            return cls._active
+        
+        # Only a process with nothing to serve yet waits for a load in progress
+        if not cls._load_lock.acquire(blocking=cls._active is None):
+            return cls._active
+        try:
+            if cls._checked_at is not None and now - cls._checked_at < poll_seconds:
+                return cls._active
+            
+            mtime = cls._get_pointer_mtime()
+            if cls._checked_at is None or mtime != cls._pointer_mtime:
+                cls._swap_to(cls.get_active_version())
+                cls._pointer_mtime = mtime
+            cls._checked_at = now
+        finally:
+            cls._load_lock.release()
+        
+        return cls._active
+    
+    @staticmethod
+    def _get_pointer_mtime():
+        try:
+            return os.stat(ModelRegistry._pointer_path()).st_mtime_ns
+        except OSError:
+            return None
+    
+    @staticmethod
+    def _swap_to(version):
+        """
+        Load a version, then atomically replace the served model
+        (_load_lock held, _lock taken only for the swap)
+        """
+        cls = ModelRegistry
+        
+        if version is None:
+            with cls._lock:
+                cls._active = None
+            return
+        if cls._active is not None and cls._active.version == version:
+            return
+        
+        try:
+            loaded = cls.load_version(version)
+        except Exception as e:
+            # Keep serving the previous model if the new one cannot be loaded
+            cls._load_error = f'{version}: {str(e)}'
+            print(f"[{datetime.now()}] Warning: Could not load ML model {version} - {str(e)}")
+            return
+        
+        with cls._lock:
+            cls._install(loaded)
+    
+    @staticmethod
+    def _install(loaded):
+        """
+        Replace the served model reference and notify listeners (_lock held)
+        """
+        cls = ModelRegistry
+        previous = cls._active
+        cls._active = loaded
+        cls._load_error = None
+        print(f"[{datetime.now()}] ML model {loaded.version} loaded"
+              + (f" (replacing {previous.version})" if previous else ""))
+        
+        for listener in list(cls._swap_listeners):
+            try:
+                listener(previous, loaded)
+            except Exception as e:
+                print(f"[{datetime.now()}] Model swap listener error: {str(e)}")
+    
+    @staticmethod
+    def add_swap_listener(callback):
+        """
+        Register callback(previous, current) invoked after each model swap
+        """
+        ModelRegistry._swap_listeners.append(callback)
+    
+    @staticmethod
+    def get_status():
+        """
+        Describe the served model without triggering a load
+        """
+        cls = ModelRegistry
+        active = cls._active
+        return {
+            'ml_model_loaded': active is not None,
+            'model_version': active.version if active else cls.get_active_version(),
+            'model_loaded_at': active.loaded_at.isoformat() if active else None,
+            'model_load_error': cls._load_error
+        }
+    
+    # ========================================================================
+    # Versions
+    # ========================================================================
+    
+    @staticmethod
+    def get_active_version():
+        """
+        Read the ACTIVE pointer (falls back to the legacy artifact)
+        
+        Returns:
+            Version name or None
+        """
+        try:
+            with open(ModelRegistry._pointer_path()) as f:
+                version = f.read().strip()
+            if version:
+                return version
+        except OSError:
+            pass
+        
+        if os.path.exists(ModelRegistry._legacy_path()):
+            return LEGACY_VERSION
+        return None
+    
+    @staticmethod
+    def load_version(version, use_arrays=True):
+        """
+        Load a version and its metadata
+        
+        Versions exported as flat tree arrays are memory-mapped read-only
+        (shared by every worker on the host) when MODEL_MMAP_ARRAYS is set;
+        otherwise the pickled model is loaded.
+        
+        Args:
+            version: Version name
+            use_arrays: Prefer the flat array export when present
+        
+        Returns:
+            LoadedModel
+        """
+        if version == LEGACY_VERSION:
+            model_path = ModelRegistry._legacy_path()
+            metadata = {'features': DEFAULT_FEATURES}
+        else:
+            version_dir = ModelRegistry._version_dir(version)
+            model_path = os.path.join(version_dir, MODEL_FILE)
+            metadata = ModelRegistry.get_metadata(version)
+            
+            from app.services.flat_forest import FlatForest, SUPPORTED_MODELS
+            
+            # Arrays exported for other estimators by older releases predict wrongly
+            arrays_path = os.path.join(version_dir, ARRAYS_DIR)
+            if (use_arrays and current_app.config['MODEL_MMAP_ARRAYS'] and FlatForest.exists(arrays_path)
+                    and metadata.get('model_class') in SUPPORTED_MODELS):
+                return LoadedModel(version, FlatForest.load(arrays_path, mmap_mode='r'), metadata)
+        
+        with open(model_path, 'rb') as f:
+            model = pickle.load(f)
+        return LoadedModel(version, model, metadata)
+    
+    @staticmethod
+    def get_metadata(version):
+        """
+        Read a version's metadata.json
+        """
+        if version == LEGACY_VERSION:
+            return {'features': DEFAULT_FEATURES}
+        
+        with open(os.path.join(ModelRegistry._version_dir(version), METADATA_FILE)) as f:
+            return json.load(f)
+    
+    @staticmethod
+    def list_versions():
+        """
+        List registered versions, newest first
+        
+        Returns:
+            List of metadata dictionaries with version and active flag
+        """
+        active_version = ModelRegistry.get_active_version()
+        versions = []
+        versions_dir = ModelRegistry._versions_dir()
+        
+        if os.path.isdir(versions_dir):
+            for name in os.listdir(versions_dir):
+                if not os.path.isfile(os.path.join(versions_dir, name, METADATA_FILE)):
+                    continue
+                try:
+                    metadata = ModelRegistry.get_metadata(name)
+                except (OSError, ValueError):
+                    continue
+                metadata['version'] = name
+                metadata['active'] = name == active_version
+                versions.append(metadata)
+        
+        versions.sort(key=lambda m: m.get('created_at', ''), reverse=True)
+        
+        if os.path.exists(ModelRegistry._legacy_path()):
+            versions.append({
+                'version': LEGACY_VERSION,
+                'features': DEFAULT_FEATURES,
+                'active': active_version == LEGACY_VERSION
+            })
+        return versions
+    
+    @staticmethod
+    def register(model, features=None, training_window=None, metrics=None, version=None, activate=False, extra=None):
+        """
+        Store a trained model as a new version
+        
+        The artifact is written to a temporary directory and renamed into
+        place, so readers never see a partially written version.
+        
+        Args:
+            model: Fitted model exposing predict()
+            features: Ordered feature names the model expects
+            training_window: Dictionary with start/end of the training data
+            metrics: Dictionary of evaluation metrics
+            version: Version name (default: UTC timestamp)
+            activate: Make this the active version
+            extra: Additional metadata fields
+        
+        Returns:
+            Metadata dictionary of the registered version
+        """
+        version = version or datetime.utcnow().strftime('%Y%m%d%H%M%S%f')
+        version_dir = ModelRegistry._version_dir(version)
+        if os.path.exists(version_dir):
+            raise ValueError(f'Model version already exists: {version}')
+        
+        metadata = dict(extra or {})
+        metadata.update({
+            'version': version,
+            'model_class': type(model).__name__,
+            'features': list(features or DEFAULT_FEATURES),
+            'training_window': training_window or {},
+            'metrics': metrics or {},
+            'created_at': datetime.utcnow().isoformat()
+        })
+        
+        from app.services import flat_forest
+        from app.services.flat_forest import FlatForest
+        
+        os.makedirs(ModelRegistry._versions_dir(), exist_ok=True)
+        # Tree ensembles are also exported as flat arrays for memory mapping
+        staging_dir = tempfile.mkdtemp(prefix=f'.{version}-', dir=ModelRegistry._versions_dir())
+        try:
+            with open(os.path.join(staging_dir, MODEL_FILE), 'wb') as f:
+                pickle.dump(model, f, protocol=pickle.HIGHEST_PROTOCOL)
+            if flat_forest.supports(model):
+                FlatForest.from_model(model).save(os.path.join(staging_dir, ARRAYS_DIR))
+                metadata['artifact_format'] = 'flat_forest'
+            with open(os.path.join(staging_dir, METADATA_FILE), 'w') as f:
+                json.dump(metadata, f, indent=2, default=str)
+            os.rename(staging_dir, version_dir)
+        except Exception:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            raise
+        
+        if activate:
+            ModelRegistry.activate(version)
+        return metadata
+    
+    @staticmethod
+    def activate(version):
+        """
+        Point ACTIVE at a version and swap it in for this process
+        
+        Other processes pick the change up on their next poll.
+        
+        Returns:
+            Dictionary with success status and message
+        """
+        if version != LEGACY_VERSION:
+            if not os.path.isfile(os.path.join(ModelRegistry._version_dir(version), MODEL_FILE)):
+                return {'success': False, 'message': f'Model version not found: {version}'}
+        elif not os.path.exists(ModelRegistry._legacy_path()):
+            return {'success': False, 'message': 'Legacy model not found'}
+        
+        cls = ModelRegistry
+        with cls._load_lock:
+            try:
+                loaded = cls.load_version(version)
+            except Exception as e:
+                return {'success': False, 'message': f'Could not load model {version}: {str(e)}'}
+            
+            os.makedirs(cls._versions_dir(), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(prefix='.active-', dir=cls._versions_dir())
+            with os.fdopen(fd, 'w') as f:
+                f.write(version)
+            os.replace(tmp_path, cls._pointer_path())
+            
+            # Reuse the model just loaded instead of unpickling it twice
+            with cls._lock:
+                if cls._active is None or cls._active.version != version:
+                    cls._install(loaded)
+            cls._pointer_mtime = cls._get_pointer_mtime()
+            cls._checked_at = time.monotonic()
+        
+        return {'success': True, 'message': f'Model version {version} activated'}
+    
+    @staticmethod
+    def export_arrays(version=None):
+        """
+        Export an existing version as memory-mappable flat tree arrays
+        
+        The legacy artifact is registered as a new version (and activated if
+        it was the active one), since it has no version directory of its own.
+        
+        Args:
+            version: Version to export (default: the active version)
+        
+        Returns:
+            Dictionary with success status, message and version
+        """
+        from app.services import flat_forest
+        from app.services.flat_forest import FlatForest
+        
+        version = version or ModelRegistry.get_active_version()
+        if version is None:
+            return {'success': False, 'message': 'No model registered'}
+        
+        try:
+            loaded = ModelRegistry.load_version(version, use_arrays=False)
+        except (OSError, ValueError) as e:
+            return {'success': False, 'message': f'Could not load model {version}: {str(e)}'}
+        
+        if not flat_forest.supports(loaded.model):
+            return {
+                'success': False,
+                'message': f'{type(loaded.model).__name__} cannot be exported as flat tree arrays'
+            }
+        
+        if version == LEGACY_VERSION:
+            metadata = ModelRegistry.register(
+                loaded.model,
+                features=DEFAULT_FEATURES,
+                activate=ModelRegistry.get_active_version() == LEGACY_VERSION,
+                extra={'source': LEGACY_VERSION}
+            )
+            return {
+                'success': True,
+                'message': f"Legacy model exported as version {metadata['version']}",
+                'version': metadata['version']
+            }
+        
+        version_dir = ModelRegistry._version_dir(version)
+        if FlatForest.exists(os.path.join(version_dir, ARRAYS_DIR)):
+            return {'success': True, 'message': f'Model version {version} already exported', 'version': version}
+        
+        staging_dir = tempfile.mkdtemp(prefix=f'.{ARRAYS_DIR}-', dir=version_dir)
+        try:
+            FlatForest.from_model(loaded.model).save(staging_dir)
+            os.rename(staging_dir, os.path.join(version_dir, ARRAYS_DIR))
+        except Exception:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            raise
+        
+        metadata = dict(loaded.metadata, artifact_format='flat_forest')
+        fd, tmp_path = tempfile.mkstemp(prefix='.metadata-', dir=version_dir)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(metadata, f, indent=2, default=str)
+        os.replace(tmp_path, os.path.join(version_dir, METADATA_FILE))
+        
+        return {'success': True, 'message': f'Model version {version} exported', 'version': version}
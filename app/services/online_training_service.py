@@ -0,0 +1,346 @@
+"""
+Online Training Service - Incremental traffic model updates from TrafficLog
+Instead of refitting on the full history, an SGD regressor is updated with
+partial_fit on TrafficLog rows written since its last checkpoint, so each
+update costs time proportional to the new data. The model is checkpointed
+next to the registry and promoted to a registry version only when it beats
+the serving model on held-out rows.
+"""
+
+import os
+import json
+import pickle
+import tempfile
+import numpy as np
+from datetime import datetime, timedelta
+from flask import current_app
+from app import db
+from app.models import TrafficLog
+from app.services.model_registry import ModelRegistry, DEFAULT_FEATURES
+
+CHECKPOINT_DIR = 'traffic_predictor_online'
+CHECKPOINT_MODEL_FILE = 'checkpoint.pkl'
+CHECKPOINT_STATE_FILE = 'checkpoint.json'
+
+# Every HOLDOUT_MODULUS-th log row is never trained on and used for evaluation
+HOLDOUT_MODULUS = 5
+
+# Rows written this recently may still be committing; the next pass takes them
+SETTLE_SECONDS = 60
+
+class OnlineTrafficModel:
+    """
+    Incremental regressor taking the same [plaza_id, hour, day_of_week,
+    is_peak] rows as the batch model
+    
+    Features are one-hot encoded internally (plaza IDs hashed into a fixed
+    number of buckets so the feature space never grows) and the target is
+    learned on a log scale to keep SGD steps stable across busy and quiet
+    hours.
+    """
+    
+    def __init__(self, plaza_buckets=128, random_state=42):
+        from sklearn.linear_model import SGDRegressor
+        
+        self.plaza_buckets = plaza_buckets
+        self.rows_seen = 0
+        self.regressor = SGDRegressor(
+            penalty='l2',
+            alpha=1e-5,
+            learning_rate='invscaling',
+            eta0=0.05,
+            random_state=random_state
+        )
+    
+    @property
+    def n_features_in_(self):
+        return len(DEFAULT_FEATURES)
+    
+    def encode(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        rows = np.arange(len(X))
+        plaza = X[:, 0].astype(np.int64) % self.plaza_buckets
+        hour = X[:, 1].astype(np.int64) % 24
+        day = X[:, 2].astype(np.int64) % 7
+        
+        encoded = np.zeros((len(X), self.plaza_buckets + 24 + 7 + 1))
+        encoded[rows, plaza] = 1
+        encoded[rows, self.plaza_buckets + hour] = 1
+        encoded[rows, self.plaza_buckets + 24 + day] = 1
+        encoded[:, -1] = X[:, 3]
+        return encoded
+    
+    def partial_fit(self, X, y):
+        self.regressor.partial_fit(self.encode(X), np.log1p(np.maximum(np.asarray(y, dtype=np.float64), 0)))
+        self.rows_seen += len(X)
+        return self
+    
+    def predict(self, X):
+        return np.expm1(self.regressor.predict(self.encode(X)))
+
+def build_features(rows):
+    """
+    Build [plaza_id, hour, day_of_week, is_peak] features and targets
+    
+    Args:
+        rows: Sequence of (plaza_id, date, hour, vehicle_count) rows
+    
+    Returns:
+        Tuple of (X, y) NumPy arrays
+    """
+    count = len(rows)
+    hours = np.fromiter((r[2] for r in rows), dtype=np.float64, count=count)
+    is_peak = ((hours >= 7) & (hours < 10)) | ((hours >= 17) & (hours < 20))
+    X = np.column_stack([
+        np.fromiter((r[0] for r in rows), dtype=np.float64, count=count),
+        hours,
+        np.fromiter((r[1].weekday() for r in rows), dtype=np.float64, count=count),
+        is_peak
+    ])
+    y = np.fromiter((r[3] for r in rows), dtype=np.float64, count=count)
+    return X, y
+
+class OnlineTrainingService:
+    """
+    Service class for incremental training, checkpointing and promotion
+    """
+    
+    @staticmethod
+    def _checkpoint_dir():
+        return os.path.join(ModelRegistry.get_registry_dir(), CHECKPOINT_DIR)
+    
+    @staticmethod
+    def load_checkpoint():
+        """
+        Load the online model and its state (cursor, counters)
+        
+        Returns:
+            Tuple of (OnlineTrafficModel, state dictionary)
+        """
+        checkpoint_dir = OnlineTrainingService._checkpoint_dir()
+        try:
+            with open(os.path.join(checkpoint_dir, CHECKPOINT_MODEL_FILE), 'rb') as f:
+                model = pickle.load(f)
+            with open(os.path.join(checkpoint_dir, CHECKPOINT_STATE_FILE)) as f:
+                state = json.load(f)
+            return model, state
+        except OSError:
+            return OnlineTrafficModel(), {'updated_after': None, 'last_log_id': 0, 'rows_trained': 0}
+    
+    @staticmethod
+    def save_checkpoint(model, state):
+        """
+        Atomically write the online model and its state
+        """
+        checkpoint_dir = OnlineTrainingService._checkpoint_dir()
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        state = dict(state, checkpointed_at=datetime.utcnow().isoformat())
+        
+        for filename, write in (
+            (CHECKPOINT_MODEL_FILE, lambda f: pickle.dump(model, f, protocol=pickle.HIGHEST_PROTOCOL)),
+            (CHECKPOINT_STATE_FILE, lambda f: f.write(json.dumps(state, indent=2).encode()))
+        ):
+            fd, tmp_path = tempfile.mkstemp(prefix=f'.{filename}-', dir=checkpoint_dir)
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            os.replace(tmp_path, os.path.join(checkpoint_dir, filename))
+    
+    @staticmethod
+    def _cursor_filter(updated_after, last_log_id):
+        """
+        Rows after the (updated_at, log_id) watermark
+        """
+        if updated_after is None:
+            return db.true()
+        return db.or_(
+            TrafficLog.updated_at > updated_after,
+            db.and_(TrafficLog.updated_at == updated_after, TrafficLog.log_id > last_log_id)
+        )
+    
+    @staticmethod
+    def update(progress=None):
+        """
+        Train on TrafficLog rows written since the last checkpoint
+        
+        Rows are rewritten in place (hourly aggregation of the last 24 hours,
+        Spark merges), so the cursor is an (updated_at, log_id) watermark
+        rather than log_id: a corrected count is trained on again. Rows last
+        written before their hour closed hold a partial count and are
+        skipped; the aggregation rewrites them once the hour is over. Rows
+        are streamed in ONLINE_TRAINING_BATCH_SIZE chunks; the checkpoint
+        (including the watermark) is written every ONLINE_CHECKPOINT_ROWS
+        trained rows and at the end.
+        
+        Args:
+            progress: Optional callback(percent, message)
+        
+        Returns:
+            Dictionary with rows trained, watermark and promotion result
+        """
+        config = current_app.config
+        batch_size = config['ONLINE_TRAINING_BATCH_SIZE']
+        checkpoint_rows = config['ONLINE_CHECKPOINT_ROWS']
+        
+        model, state = OnlineTrainingService.load_checkpoint()
+        # Checkpoints from the log_id cursor: rows written since then are new
+        updated_after = state.get('updated_after') or state.get('checkpointed_at')
+        updated_after = datetime.fromisoformat(updated_after) if updated_after else None
+        last_log_id = state['last_log_id'] if 'updated_after' in state else 0
+        
+        # Leave rows still being committed by a concurrent writer for the next pass
+        written_before = datetime.utcnow() - timedelta(seconds=SETTLE_SECONDS)
+        pending = db.session.query(db.func.count(TrafficLog.log_id)).filter(
+            TrafficLog.updated_at < written_before,
+            OnlineTrainingService._cursor_filter(updated_after, last_log_id)
+        ).scalar()
+        
+        trained = 0
+        since_checkpoint = 0
+        processed = 0
+        
+        while True:
+            rows = db.session.query(
+                TrafficLog.log_id,
+                TrafficLog.updated_at,
+                TrafficLog.plaza_id,
+                TrafficLog.date,
+                TrafficLog.hour,
+                TrafficLog.vehicle_count
+            ).filter(
+                TrafficLog.updated_at < written_before,
+                OnlineTrainingService._cursor_filter(updated_after, last_log_id)
+            ).order_by(TrafficLog.updated_at, TrafficLog.log_id).limit(batch_size).all()
+            
+            if not rows:
+                break
+            
+            training_rows = [
+                r[2:] for r in rows
+                if r.log_id % HOLDOUT_MODULUS != 0
+                and r.updated_at >= datetime.combine(r.date, datetime.min.time()) + timedelta(hours=r.hour + 1)
+            ]
+            if training_rows:
+                X, y = build_features(training_rows)
+                model.partial_fit(X, y)
+                trained += len(training_rows)
+                since_checkpoint += len(training_rows)
+            
+            updated_after, last_log_id = rows[-1].updated_at, rows[-1].log_id
+            processed += len(rows)
+            state['updated_after'] = updated_after.isoformat()
+            state['last_log_id'] = last_log_id
+            state['rows_trained'] += len(training_rows)
+            
+            if since_checkpoint >= checkpoint_rows:
+                OnlineTrainingService.save_checkpoint(model, state)
+                since_checkpoint = 0
+            
+            if progress and pending:
+                progress(min(80, 10 + int(70 * processed / pending)), f'Trained on {trained} new rows')
+        
+        if processed:
+            OnlineTrainingService.save_checkpoint(model, state)
+        
+        result = {
+            'rows_trained': trained,
+            'total_rows_trained': state['rows_trained'],
+            'updated_after': state.get('updated_after')
+        }
+        
+        if not trained:
+            result.update({'promoted': False, 'reason': 'No new rows'})
+            return result
+        
+        if progress:
+            progress(90, 'Evaluating against the serving model')
+        result.update(OnlineTrainingService.evaluate_and_promote(model, state))
+        return result
+    
+    @staticmethod
+    def holdout_set():
+        """
+        Held-out rows from the last ONLINE_HOLDOUT_DAYS days
+        
+        Returns:
+            Tuple of (X, y) NumPy arrays
+        """
+        since = datetime.utcnow().date() - timedelta(days=current_app.config['ONLINE_HOLDOUT_DAYS'])
+        rows = db.session.query(
+            TrafficLog.plaza_id,
+            TrafficLog.date,
+            TrafficLog.hour,
+            TrafficLog.vehicle_count
+        ).filter(
+            TrafficLog.date >= since,
+            TrafficLog.log_id % HOLDOUT_MODULUS == 0
+        ).all()
+        return build_features(rows)
+    
+    @staticmethod
+    def evaluate_and_promote(model, state):
+        """
+        Promote the online model if it beats the serving model on holdout
+        
+        The online model must improve MAE by ONLINE_PROMOTION_MARGIN (a
+        fraction) to be registered and activated.
+        
+        Returns:
+            Dictionary with holdout metrics and promotion outcome
+        """
+        X, y = OnlineTrainingService.holdout_set()
+        if len(y) < current_app.config['ONLINE_MIN_HOLDOUT_ROWS'] or model.rows_seen == 0:
+            return {'promoted': False, 'reason': 'Not enough data to evaluate', 'holdout_rows': len(y)}
+        
+        online_mae = float(np.mean(np.abs(model.predict(X) - y)))
+        result = {'holdout_rows': len(y), 'online_mae': round(online_mae, 3)}
+        
+        serving = ModelRegistry.get_active()
+        if serving is not None:
+            try:
+                serving_mae = float(np.mean(np.abs(np.asarray(serving.predict(X), dtype=np.float64) - y)))
+            except Exception as e:
+                print(f"[{datetime.now()}] Could not evaluate serving model: {str(e)}")
+                serving_mae = float('inf')
+            result['serving_mae'] = round(serving_mae, 3)
+            result['serving_version'] = serving.version
+            
+            if online_mae >= serving_mae * (1 - current_app.config['ONLINE_PROMOTION_MARGIN']):
+                result.update({'promoted': False, 'reason': 'Serving model is as good or better'})
+                return result
+        
+        metadata = ModelRegistry.register(
+            model,
+            features=DEFAULT_FEATURES,
+            training_window={'updated_after': state['updated_after'], 'rows_trained': state['rows_trained']},
+            metrics={'holdout_mae': online_mae, 'holdout_rows': len(y)},
+            activate=True,
+            extra={'training_mode': 'online'}
+        )
+        result.update({'promoted': True, 'version': metadata['version']})
+        return result
+
+def submit_online_training():
+    """
+    Queue an incremental training pass if online training is enabled
+    
+    Returns:
+        Job dictionary, or None when ONLINE_TRAINING_ENABLED is off
+    """
+    if not current_app.config['ONLINE_TRAINING_ENABLED']:
+        return None
+    
+    from app.services.job_service import JobService
+    job, _ = JobService.submit('online_training', run_online_training_job, key='online_training')
+    return job
+
+def run_online_training_job(job):
+    """
+    Background job entry point for an incremental training pass
+    """
+    job.update_progress(5, 'Loading online model checkpoint')
+    result = OnlineTrainingService.update(progress=job.update_progress)
+    result['message'] = (
+        f"Online training: {result['rows_trained']} new rows, "
+        + (f"promoted as {result['version']}" if result.get('promoted') else f"not promoted ({result.get('reason')})")
+    )
+    return result
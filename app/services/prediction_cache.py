@@ -0,0 +1,195 @@
+"""
+Prediction Cache - In-memory forecasts keyed by plaza, date, hour and model
+Forecast inputs only change hourly, so predictions are cached per
+(plaza_id, date, hour, model_version). A background refresher pre-warms the
+next PREDICTION_CACHE_WARM_HOURS hours for every plaza, so prediction
+endpoints are mostly memory reads. A model swap clears the cache; traffic
+baseline changes and feature store refreshes drop the affected plazas.
+"""
+
+import threading
+import time
+from datetime import datetime
+from app.services.model_registry import ModelRegistry
+
+# Cache key version used for baseline (no model) predictions
+BASELINE_VERSION = 'baseline'
+
+class PredictionCache:
+    """
+    Service class holding cached predictions and the pre-warm thread
+    """
+    
+    # plaza_id -> {(date, hour, model_version): (prediction, expires_at)}
+    _entries = {}
+    _lock = threading.Lock()
+    _refresher = None
+    _stop_event = threading.Event()
+    _stats = {'hits': 0, 'misses': 0, 'warm_runs': 0, 'last_warm': None}
+    
+    @staticmethod
+    def _key(date, hour, model_version):
+        return (date, hour, model_version or BASELINE_VERSION)
+    
+    @staticmethod
+    def get_many(plaza_ids, date, hours, model_version):
+        """
+        Look up predictions for several plazas
+        
+        Args:
+            plaza_ids: List of toll plaza IDs
+            date: Date of the forecast
+            hours: Ordered list of forecast hours
+            model_version: Version of the serving model (None for baseline)
+        
+        Returns:
+            Tuple of (dict plaza_id -> list of predictions for fully cached
+            plazas, list of plaza IDs with at least one missing hour)
+        """
+        cls = PredictionCache
+        now = time.monotonic()
+        found = {}
+        missing = []
+        
+        with cls._lock:
+            for plaza_id in plaza_ids:
+                plaza_entries = cls._entries.get(plaza_id, {})
+                predictions = []
+                for hour in hours:
+                    entry = plaza_entries.get(cls._key(date, hour, model_version))
+                    if entry is None or entry[1] < now:
+                        predictions = None
+                        break
+                    predictions.append(entry[0])
+                
+                if predictions is None:
+                    missing.append(plaza_id)
+                else:
+                    found[plaza_id] = predictions
+            
+            cls._stats['hits'] += len(found)
+            cls._stats['misses'] += len(missing)
+        
+        return found, missing
+    
+    @staticmethod
+    def put_many(date, model_version, predictions, ttl):
+        """
+        Store predictions
+        
+        Args:
+            date: Date of the forecast
+            model_version: Version of the model that produced them
+            predictions: Dictionary of plaza_id -> list of prediction dicts
+            ttl: Seconds before the entries expire
+        """
+        cls = PredictionCache
+        expires_at = time.monotonic() + ttl
+        
+        with cls._lock:
+            for plaza_id, plaza_predictions in predictions.items():
+                plaza_entries = cls._entries.setdefault(plaza_id, {})
+                for prediction in plaza_predictions:
+                    plaza_entries[cls._key(date, prediction['hour'], model_version)] = (prediction, expires_at)
+    
+    @staticmethod
+    def clear(*args):
+        """
+        Drop every cached prediction (also used as the model swap listener)
+        """
+        with PredictionCache._lock:
+            PredictionCache._entries = {}
+    
+    @staticmethod
+    def invalidate_plazas(plaza_ids):
+        """
+        Drop the cached predictions of plazas whose inputs changed
+        
+        Args:
+            plaza_ids: Iterable of toll plaza IDs
+        """
+        with PredictionCache._lock:
+            for plaza_id in set(plaza_ids):
+                PredictionCache._entries.pop(plaza_id, None)
+    
+    @staticmethod
+    def purge_expired():
+        """
+        Remove expired entries so past hours do not accumulate
+        """
+        cls = PredictionCache
+        now = time.monotonic()
+        with cls._lock:
+            entries = {}
+            for plaza_id, plaza_entries in cls._entries.items():
+                kept = {key: entry for key, entry in plaza_entries.items() if entry[1] >= now}
+                if kept:
+                    entries[plaza_id] = kept
+            cls._entries = entries
+    
+    @staticmethod
+    def get_stats():
+        """
+        Get cache size, hit/miss counters and refresher state
+        """
+        cls = PredictionCache
+        with cls._lock:
+            stats = dict(cls._stats, entries=sum(len(plaza_entries) for plaza_entries in cls._entries.values()))
+        stats['refresher_running'] = cls._refresher is not None and cls._refresher.is_alive()
+        return stats
+    
+    # ========================================================================
+    # Background pre-warming
+    # ========================================================================
+    
+    @staticmethod
+    def start_refresher(app, warm):
+        """
+        Start the pre-warm thread once per process
+        
+        Args:
+            app: Flask application (the thread runs in its app context)
+            warm: Callable performing one pre-warm pass
+        """
+        cls = PredictionCache
+        interval = app.config['PREDICTION_CACHE_REFRESH_SECONDS']
+        if interval <= 0 or (cls._refresher is not None and cls._refresher.is_alive()):
+            return
+        
+        with cls._lock:
+            if cls._refresher is not None and cls._refresher.is_alive():
+                return
+            cls._stop_event.clear()
+            cls._refresher = threading.Thread(
+                target=cls._refresh_loop,
+                args=(app, warm, interval),
+                name='prediction-cache-refresher',
+                daemon=True
+            )
+            cls._refresher.start()
+    
+    @staticmethod
+    def stop_refresher():
+        """
+        Stop the pre-warm thread
+        """
+        PredictionCache._stop_event.set()
+    
+    @staticmethod
+    def _refresh_loop(app, warm, interval):
+        cls = PredictionCache
+        while not cls._stop_event.is_set():
+            with app.app_context():
+                try:
+                    cls.purge_expired()
+                    warm()
+                    cls._stats['warm_runs'] += 1
+                    cls._stats['last_warm'] = datetime.utcnow().isoformat()
+                except Exception as e:
+                    print(f"[{datetime.now()}] Prediction cache warm error: {str(e)}")
+                finally:
+                    from app import db
+                    db.session.remove()
+            cls._stop_event.wait(interval)
+
+ModelRegistry.add_swap_listener(PredictionCache.clear)
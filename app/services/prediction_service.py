@@ -0,0 +1,320 @@
+"""
+Prediction Service - Traffic forecasts from the active model or baselines
+Builds feature matrices for many (plaza, hour) pairs at once, serves them
+through the prediction cache and falls back to the historical baseline
+matrix when no model is available.
+"""
+
+from flask import current_app
+from datetime import datetime, timedelta
+from app import db
+from app.models import TollPlaza
+from app.services.model_registry import ModelRegistry
+from app.services.prediction_cache import PredictionCache
+
+class PredictionService:
+    """
+    Service class for traffic forecasts
+    """
+    
+    @staticmethod
+    def get_predictions(plaza_ids, date, hours_ahead, model, hours=None):
+        """
+        Get predictions from the prediction cache, computing only missing plazas
+        
+        Uses the model when one is active, otherwise the historical baseline.
+        Starts the cache pre-warm thread on first use.
+        
+        Args:
+            plaza_ids: List of toll plaza IDs
+            date: Date to predict for
+            hours_ahead: Number of hours to predict
+            model: LoadedModel snapshot or None
+            hours: Hours of day on date to predict (default: the hours_ahead
+                hours after the current one; for today, hours past midnight
+                are predicted for the next day, as warm_cache stores them)
+        
+        Returns:
+            Dictionary of plaza_id -> list of predictions
+        """
+        if hours is None and date == datetime.utcnow().date():
+            slots = PredictionService.forecast_slots(hours_ahead)
+        else:
+            slots = [(date, PredictionService.resolve_hours(hours_ahead, hours))]
+        return PredictionService.get_slot_predictions(plaza_ids, slots, model)
+    
+    @staticmethod
+    def get_slot_predictions(plaza_ids, slots, model):
+        """
+        Predictions for (date, hours) slots, concatenated per plaza in slot order
+        
+        Args:
+            plaza_ids: List of toll plaza IDs
+            slots: List of (date, list of hours), e.g. from forecast_slots
+            model: LoadedModel snapshot or None
+        
+        Returns:
+            Dictionary of plaza_id -> list of predictions
+        """
+        predictions = {plaza_id: [] for plaza_id in plaza_ids}
+        for date, hours in slots:
+            for plaza_id, plaza_predictions in PredictionService._predict_date(plaza_ids, date, hours, model).items():
+                predictions[plaza_id].extend(plaza_predictions)
+        return predictions
+    
+    @staticmethod
+    def _predict_date(plaza_ids, date, hours, model):
+        """
+        Cached predictions for hours of one date, computing missing plazas
+        """
+        PredictionCache.start_refresher(current_app._get_current_object(), PredictionService.warm_cache)
+        
+        version = model.version if model else None
+        hours = [int(hour) for hour in hours]
+        hours_ahead = len(hours)
+        predictions, missing = PredictionCache.get_many(plaza_ids, date, hours, version)
+        
+        if missing:
+            if model:
+                computed = PredictionService.get_ml_predictions_bulk(missing, date, hours_ahead, model=model, hours=hours)
+            else:
+                computed = PredictionService.get_historical_baseline_bulk(missing, date, hours_ahead, hours=hours)
+            PredictionCache.put_many(date, version, computed, current_app.config['PREDICTION_CACHE_TTL'])
+            predictions.update(computed)
+        
+        return predictions
+    
+    @staticmethod
+    def warm_cache():
+        """
+        Pre-compute the next PREDICTION_CACHE_WARM_HOURS hours for every plaza
+        """
+        plaza_ids = [row.plaza_id for row in db.session.query(TollPlaza.plaza_id).all()]
+        if not plaza_ids:
+            return
+        
+        model = ModelRegistry.get_active()
+        hours_ahead = current_app.config['PREDICTION_CACHE_WARM_HOURS']
+        
+        for date, hours in PredictionService.forecast_slots(hours_ahead):
+            if model:
+                predictions = PredictionService.get_ml_predictions_bulk(plaza_ids, date, len(hours), model=model,
+                                                                        hours=hours)
+            else:
+                predictions = PredictionService.get_historical_baseline_bulk(plaza_ids, date, len(hours), hours=hours)
+            PredictionCache.put_many(date, model.version if model else None, predictions,
+                                     current_app.config['PREDICTION_CACHE_TTL'])
+    
+    @staticmethod
+    def get_ml_predictions(plaza_id, date, hours_ahead=6, model=None):
+        """
+        Get predictions using trained ML model
+        
+        Args:
+            plaza_id: ID of the toll plaza
+            date: Date to predict for
+            hours_ahead: Number of hours to predict
+            model: LoadedModel snapshot (default: active registry model)
+        
+        Returns:
+            List of predictions
+        """
+        return PredictionService.get_ml_predictions_bulk([plaza_id], date, hours_ahead, model=model)[plaza_id]
+    
+    @staticmethod
+    def get_ml_predictions_bulk(plaza_ids, date, hours_ahead=6, model=None, hours=None):
+        """
+        Get predictions for several plazas with a single model call
+        
+        The feature matrix for every (plaza, hour) pair is built in one
+        vectorized step; rows the model cannot score fall back to the
+        historical baseline, resolved with one query.
+        
+        Args:
+            plaza_ids: List of toll plaza IDs
+            date: Date to predict for
+            hours_ahead: Number of hours to predict
+            model: LoadedModel snapshot (default: active registry model)
+            hours: Hours of day to predict (default: from hours_ahead)
+        
+        Returns:
+            Dictionary of plaza_id -> list of predictions
+        """
+        model = model or ModelRegistry.get_active()
+        
+        if not model:
+            return PredictionService.get_historical_baseline_bulk(plaza_ids, date, hours_ahead, hours=hours)
+        
+        try:
+            import numpy as np
+            
+            hours = np.asarray(PredictionService.resolve_hours(hours_ahead, hours), dtype=np.int64)
+            num_plazas = len(plaza_ids)
+            
+            # Prepare features for ML model, one row per (plaza, hour)
+            # Assuming model expects: [plaza_id, hour, day_of_week, is_peak]
+            plaza_column = np.repeat(np.asarray(plaza_ids, dtype=np.float64), len(hours))
+            hour_column = np.tile(hours, num_plazas)
+            is_peak = ((hour_column >= 7) & (hour_column < 10)) | ((hour_column >= 17) & (hour_column < 20))
+            columns = {
+                'plaza_id': plaza_column,
+                'hour': hour_column,
+                'day_of_week': np.full(len(hour_column), date.weekday()),
+                'is_peak': is_peak
+            }
+            
+            # Richer models read lag/rolling features from the feature store
+            stored_features = [name for name in model.features if name not in columns]
+            if stored_features:
+                from app.services.feature_store_service import FeatureStoreService
+                stored = FeatureStoreService.lookup(plaza_ids, date, hours)
+                for name in stored_features:
+                    columns[name] = stored[name].to_numpy()
+            
+            features = np.column_stack([columns[name] for name in model.features]).astype(np.float64)
+            
+            try:
+                predicted = np.asarray(model.predict(features), dtype=np.float64)
+                scored = np.isfinite(predicted)
+            except Exception as e:
+                print(f"ML prediction error: {str(e)}")
+                predicted = np.zeros(len(features))
+                scored = np.zeros(len(features), dtype=bool)
+            
+            # Resolve every row the model could not score from the baseline matrix
+            baselines = {}
+            if not scored.all():
+                baselines = PredictionService.get_hourly_baselines(plaza_ids, hours, date)
+            
+            predicted = np.maximum(np.where(scored, predicted, 0), 0).astype(np.int64)
+            predictions = {plaza_id: [] for plaza_id in plaza_ids}
+            
+            for row in range(len(features)):
+                plaza_id = plaza_ids[row // len(hours)]
+                hour = int(hour_column[row])
+                if scored[row]:
+                    vehicles = int(predicted[row])
+                    confidence = 0.75  # Placeholder confidence score
+                else:
+                    vehicles, confidence = baselines[(plaza_id, hour)]
+                
+                predictions[plaza_id].append({
+                    'hour': hour,
+                    'predicted_vehicles': vehicles,
+                    'traffic_level': PredictionService.determine_traffic_level(vehicles),
+                    'confidence': confidence
+                })
+            
+            return predictions
+        
+        except Exception as e:
+            print(f"ML prediction error: {str(e)}")
+            return PredictionService.get_historical_baseline_bulk(plaza_ids, date, hours_ahead, hours=hours)
+    
+    @staticmethod
+    def forecast_hours(hours_ahead):
+        """
+        Hours of day covered by a forecast starting after the current hour
+        """
+        import numpy as np
+        
+        current_hour = datetime.utcnow().hour
+        return (current_hour + np.arange(1, hours_ahead + 1)) % 24
+    
+    @staticmethod
+    def resolve_hours(hours_ahead, hours=None):
+        """
+        Explicit forecast hours as ints, or the hours_ahead hours after the current one
+        """
+        if hours is None:
+            hours = PredictionService.forecast_hours(hours_ahead)
+        return [int(h) for h in hours]
+    
+    @staticmethod
+    def forecast_slots(hours_ahead, now=None):
+        """
+        The hours_ahead hours after the current one, grouped by date, so hours
+        past midnight are forecast with the next day's weekday and cache keys
+        
+        Args:
+            hours_ahead: Number of hours to cover
+            now: Start of the current hour (default: now, UTC)
+        
+        Returns:
+            List of (date, list of hours) in time order
+        """
+        now = now or datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+        slots = {}
+        for offset in range(1, hours_ahead + 1):
+            slot = now + timedelta(hours=offset)
+            slots.setdefault(slot.date(), []).append(slot.hour)
+        return list(slots.items())
+    
+    @staticmethod
+    def get_historical_baseline(plaza_id, date, hours_ahead=6):
+        """
+        Get baseline predictions from historical data
+        """
+        return PredictionService.get_historical_baseline_bulk([plaza_id], date, hours_ahead)[plaza_id]
+    
+    @staticmethod
+    def get_historical_baseline_bulk(plaza_ids, date, hours_ahead=6, hours=None):
+        """
+        Get baseline predictions for several plazas from historical data
+        (for the given hours of day, default: from hours_ahead)
+        """
+        hours = PredictionService.resolve_hours(hours_ahead, hours)
+        baselines = PredictionService.get_hourly_baselines(plaza_ids, hours, date)
+        
+        predictions = {}
+        for plaza_id in plaza_ids:
+            predictions[plaza_id] = []
+            for hour in hours:
+                baseline, confidence = baselines[(plaza_id, hour)]
+                predictions[plaza_id].append({
+                    'hour': hour,
+                    'predicted_vehicles': baseline,
+                    'traffic_level': PredictionService.determine_traffic_level(baseline),
+                    'confidence': confidence
+                })
+        
+        return predictions
+    
+    @staticmethod
+    def get_hourly_baseline(plaza_id, hour, date=None):
+        """
+        Get average vehicle count for a specific hour from historical data
+        """
+        date = date or datetime.utcnow().date()
+        return PredictionService.get_hourly_baselines([plaza_id], [hour], date)[(plaza_id, hour)][0]
+    
+    @staticmethod
+    def get_hourly_baselines(plaza_ids, hours, date):
+        """
+        Look up baselines for every (plaza, hour) pair in the precomputed
+        plaza x day-of-week x hour matrix
+        
+        Returns:
+            Dictionary of (plaza_id, hour) -> (baseline vehicle count, confidence)
+        """
+        from app.services.baseline_service import TrafficBaselineService
+        
+        mean, _, _, confidence = TrafficBaselineService.lookup(plaza_ids, date, hours)
+        
+        return {
+            (plaza_id, int(hour)): (int(mean[i, j]), float(confidence[i, j]))
+            for i, plaza_id in enumerate(plaza_ids)
+            for j, hour in enumerate(hours)
+        }
+    
+    @staticmethod
+    def determine_traffic_level(vehicle_count):
+        """
+        Determine traffic level based on vehicle count
+        """
+        if vehicle_count > 150:
+            return 'high'
+        elif vehicle_count > 75:
+            return 'normal'
+        else:
+            return 'low'
@@ -0,0 +1,153 @@
+"""
+Query Inspector - Statement counting and N+1 detection for development and CI
+While a QueryLog is active on a thread, every statement executed on that
+thread is recorded with its parameters and literals stripped, so the lazy
+loads of a relationship touched in a loop collapse into one template repeated
+N times. Templates repeated QUERY_N_PLUS_ONE_THRESHOLD times or more are
+reported as probable N+1 patterns. Opt-in: with QUERY_DEBUG set every request
+gets X-Query-Count headers and a log line per pattern; tests use the
+query_budget fixture from app.testing.
+"""
+
+import re
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from flask import request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Literals and bound parameters replaced by ? when normalizing statements
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%\(\w+\)s|:\w+|\$\d+")
+_PARAMETER_LISTS = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+def normalize_statement(statement):
+    """
+    Statement template with literals, bound parameters and IN lists collapsed
+    """
+    template = _LITERALS.sub('?', statement)
+    template = _PARAMETER_LISTS.sub('(?)', template)
+    return _WHITESPACE.sub(' ', template).strip()
+
+class QueryLog:
+    """
+    Statements executed while the log was active
+    """
+    
+    def __init__(self):
+        self.statements = []
+        self.templates = Counter()
+    
+    @property
+    def count(self):
+        return len(self.statements)
+    
+    def record(self, statement):
+        self.statements.append(statement)
+        self.templates[normalize_statement(statement)] += 1
+    
+    def n_plus_one(self, threshold):
+        """
+        (template, count) pairs repeated at least threshold times, most first
+        """
+        return [(template, count) for template, count in self.templates.most_common() if count >= threshold]
+    
+    def report(self, threshold=None):
+        """
+        Human readable summary of the statements, for assertion messages
+        """
+        lines = [f"{self.count} queries, {len(self.templates)} distinct"]
+        for template, count in self.templates.most_common():
+            marker = ' <- probable N+1' if threshold and count >= threshold else ''
+            lines.append(f"  {count:>4}x {template[:300]}{marker}")
+        return '\n'.join(lines)
+
+class QueryInspector:
+    """
+    Service class installing the statement listener and the request hooks
+    """
+    
+    _local = threading.local()
+    _lock = threading.Lock()
+    _installed = False
+    
+    @staticmethod
+    def install():
+        """
+        Listen to statements on every engine (once per process)
+        """
+        cls = QueryInspector
+        with cls._lock:
+            if not cls._installed:
+                event.listen(Engine, 'after_cursor_execute', cls._after_cursor_execute)
+                cls._installed = True
+    
+    @staticmethod
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        log = getattr(QueryInspector._local, 'log', None)
+        if log is not None:
+            log.record(statement)
+    
+    @staticmethod
+    @contextmanager
+    def track():
+        """
+        Record the statements executed on this thread inside the block
+        
+        Yields:
+            QueryLog filled in as statements run
+        """
+        cls = QueryInspector
+        cls.install()
+        previous = getattr(cls._local, 'log', None)
+        log = cls._local.log = QueryLog()
+        try:
+            yield log
+        finally:
+            cls._local.log = previous
+            if previous is not None:
+                for statement in log.statements:
+                    previous.record(statement)
+    
+    # ========================================================================
+    # Per-request instrumentation (QUERY_DEBUG)
+    # ========================================================================
+    
+    @staticmethod
+    def init_app(app):
+        """
+        Count statements per request and report probable N+1 patterns
+        """
+        cls = QueryInspector
+        cls.install()
+        threshold = app.config['QUERY_N_PLUS_ONE_THRESHOLD']
+        
+        @app.before_request
+        def start_query_log():
+            cls._local.parent = getattr(cls._local, 'log', None)
+            cls._local.log = QueryLog()
+        
+        @app.after_request
+        def report_query_log(response):
+            log = getattr(cls._local, 'log', None)
+            if log is None:
+                return response
+            
+            patterns = log.n_plus_one(threshold)
+            response.headers['X-Query-Count'] = str(log.count)
+            response.headers['X-Query-N-Plus-One'] = str(len(patterns))
+            for template, count in patterns:
+                print(f"[{datetime.now()}] Probable N+1 in {request.endpoint}: {count}x {template[:200]}")
+            return response
+        
+        @app.teardown_request
+        def stop_query_log(exc):
+            # Hand the statements to an enclosing track() (query_budget)
+            log, parent = getattr(cls._local, 'log', None), getattr(cls._local, 'parent', None)
+            cls._local.log = cls._local.parent = None
+            if parent is not None:
+                cls._local.log = parent
+                for statement in log.statements if log else ():
+                    parent.record(statement)
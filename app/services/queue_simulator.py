@@ -0,0 +1,320 @@
+"""
+Queue Simulator - Vectorized lane queue simulation for capacity planning
+Arrivals are replayed from TollTransaction or generated from hourly volumes
+(TrafficLog history or forecasts) with NumPy, then pushed through a plaza
+configuration: number of lanes, dedicated heavy vehicle lanes, service time
+scale and payment mode mix. Vehicles are dealt round-robin to the lanes
+open to their type, and each lane is a FIFO single-server queue solved in
+closed form with the Lindley recursion as a cumulative maximum, so no
+per-vehicle Python loop is needed. Scenarios run in parallel on a process
+pool that receives the arrivals once per worker.
+"""
+
+import itertools
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from app.services.lane_assignment_service import (
+    SERVICE_SECONDS, PAYMENT_SERVICE_FACTOR, HEAVY_TYPES, DEFAULT_MIX
+)
+
+VEHICLE_TYPES = list(SERVICE_SECONDS)
+PAYMENT_MODES = list(PAYMENT_SERVICE_FACTOR)
+
+# Numeric codes used in the arrival arrays
+TYPE_SERVICE = np.array([SERVICE_SECONDS[name] for name in VEHICLE_TYPES])
+PAYMENT_FACTOR = np.array([PAYMENT_SERVICE_FACTOR[name] for name in PAYMENT_MODES])
+HEAVY_CODES = np.array([VEHICLE_TYPES.index(name) for name in HEAVY_TYPES])
+
+# Arrival times are seconds since this (naive UTC) epoch
+EPOCH = datetime(1970, 1, 1)
+
+DEFAULT_SCENARIO = {
+    'lanes': 4,
+    'heavy_lanes': 0,
+    'service_scale': 1.0,
+    'service_cv': 0.5,
+    'arrival_scale': 1.0,
+    'payment_mix': None,
+    'target_wait_seconds': 60.0,
+    'seed': 42
+}
+
+def synthetic_arrivals(hour_starts, hourly_counts, mix=None, seed=0):
+    """
+    Poisson arrivals for a sequence of hours
+    
+    Args:
+        hour_starts: Seconds since EPOCH of the start of each hour
+        hourly_counts: Expected vehicles in each hour
+        mix: Dictionary (vehicle type, payment mode) -> share (default mix)
+        seed: Random seed
+    
+    Returns:
+        Dictionary of sorted arrays: time (seconds since EPOCH), vehicle_type and
+        payment_mode codes
+    """
+    rng = np.random.default_rng(seed)
+    counts = rng.poisson(np.maximum(np.asarray(hourly_counts, dtype=np.float64), 0))
+    times = np.repeat(np.asarray(hour_starts, dtype=np.float64), counts) + rng.uniform(0, 3600, counts.sum())
+    
+    mix = mix or DEFAULT_MIX
+    keys = list(mix)
+    shares = np.array([mix[key] for key in keys], dtype=np.float64)
+    picks = rng.choice(len(keys), size=len(times), p=shares / shares.sum())
+    type_codes = np.array([VEHICLE_TYPES.index(key[0]) for key in keys])
+    mode_codes = np.array([PAYMENT_MODES.index(key[1]) for key in keys])
+    
+    order = np.argsort(times, kind='stable')
+    return {
+        'time': times[order],
+        'vehicle_type': type_codes[picks][order].astype(np.int8),
+        'payment_mode': mode_codes[picks][order].astype(np.int8)
+    }
+
+def scale_arrivals(arrivals, scale, rng):
+    """
+    Thin (scale < 1) or replicate with jitter (scale > 1) an arrival stream
+    """
+    if scale == 1.0:
+        return arrivals
+    
+    count = len(arrivals['time'])
+    copies = int(np.floor(scale))
+    repeats = copies + (rng.random(count) < scale - copies)
+    times = np.repeat(arrivals['time'], repeats)
+    if scale > 1:
+        times = times + rng.uniform(-30, 30, len(times))
+    
+    order = np.argsort(times, kind='stable')
+    return {
+        'time': times[order],
+        'vehicle_type': np.repeat(arrivals['vehicle_type'], repeats)[order],
+        'payment_mode': np.repeat(arrivals['payment_mode'], repeats)[order]
+    }
+
+def lindley_departures(arrival_times, service_times):
+    """
+    Departure times of a FIFO single-server queue
+    
+    D_n = max(A_n, D_{n-1}) + S_n unrolls to
+    D_n = C_n + max_{k<=n}(A_k - C_{k-1}) with C the cumulative service
+    time, i.e. a cumulative sum and a cumulative maximum.
+    """
+    cumulative = np.cumsum(service_times)
+    return cumulative + np.maximum.accumulate(arrival_times - (cumulative - service_times))
+
+def assign_lanes(vehicle_types, lanes, heavy_lanes):
+    """
+    Deal vehicles round-robin to lanes, heavy types to the last
+    heavy_lanes lanes when dedicated lanes are configured
+    """
+    lane = np.empty(len(vehicle_types), dtype=np.int32)
+    if heavy_lanes <= 0 or heavy_lanes >= lanes:
+        lane[:] = np.arange(len(vehicle_types)) % lanes
+        return lane
+    
+    heavy = np.isin(vehicle_types, HEAVY_CODES)
+    light_lanes = lanes - heavy_lanes
+    lane[~heavy] = np.arange(int((~heavy).sum())) % light_lanes
+    lane[heavy] = light_lanes + np.arange(int(heavy.sum())) % heavy_lanes
+    return lane
+
+def simulate(arrivals, scenario):
+    """
+    Simulate one plaza configuration
+    
+    Args:
+        arrivals: Arrival arrays (see synthetic_arrivals)
+        scenario: Dictionary overriding DEFAULT_SCENARIO keys
+    
+    Returns:
+        Dictionary with wait time, queue length and utilization statistics
+    """
+    scenario = dict(DEFAULT_SCENARIO, **scenario)
+    rng = np.random.default_rng(scenario['seed'])
+    arrivals = scale_arrivals(arrivals, scenario['arrival_scale'], rng)
+    times = arrivals['time']
+    count = len(times)
+    result = {'scenario': scenario, 'vehicles': count}
+    if count == 0:
+        return result
+    
+    payment_modes = arrivals['payment_mode']
+    if scenario['payment_mix']:
+        shares = np.array([scenario['payment_mix'].get(name, 0.0) for name in PAYMENT_MODES])
+        payment_modes = rng.choice(len(PAYMENT_MODES), size=count, p=shares / shares.sum())
+    
+    # Gamma service times with the configured mean and coefficient of variation
+    mean_service = TYPE_SERVICE[arrivals['vehicle_type']] * PAYMENT_FACTOR[payment_modes] * scenario['service_scale']
+    shape = 1.0 / scenario['service_cv'] ** 2
+    service = rng.gamma(shape, mean_service / shape)
+    
+    lane = assign_lanes(arrivals['vehicle_type'], scenario['lanes'], scenario['heavy_lanes'])
+    wait = np.empty(count)
+    queue_length = np.empty(count, dtype=np.int64)
+    busy = np.zeros(scenario['lanes'])
+    
+    for lane_no in range(scenario['lanes']):
+        index = np.flatnonzero(lane == lane_no)
+        if not len(index):
+            continue
+        lane_arrivals, lane_service = times[index], service[index]
+        departures = lindley_departures(lane_arrivals, lane_service)
+        wait[index] = departures - lane_service - lane_arrivals
+        # Vehicles ahead in the lane: predecessors not yet departed
+        queue_length[index] = np.arange(len(index)) - np.searchsorted(departures, lane_arrivals, side='right')
+        busy[lane_no] = lane_service.sum()
+    
+    span = max(times[-1] - times[0], 1.0)
+    first_hour = times[0] // 3600
+    hours = (times // 3600 - first_hour).astype(np.int64)
+    hourly_wait = np.bincount(hours, weights=wait) / np.maximum(np.bincount(hours), 1)
+    worst_hour = int(hourly_wait.argmax())
+    
+    p50, p95, p99 = np.percentile(wait, [50, 95, 99])
+    
+    result.update({
+        'mean_wait_seconds': round(float(wait.mean()), 2),
+        'p50_wait_seconds': round(float(p50), 2),
+        'p95_wait_seconds': round(float(p95), 2),
+        'p99_wait_seconds': round(float(p99), 2),
+        'max_wait_seconds': round(float(wait.max()), 2),
+        'over_target_share': round(float(np.mean(wait > scenario['target_wait_seconds'])), 4),
+        'mean_queue_length': round(float(queue_length.mean()), 2),
+        'max_queue_length': int(queue_length.max()),
+        'lane_utilization': [round(float(value / span), 3) for value in busy],
+        'worst_hour': {
+            'start': (EPOCH + timedelta(hours=float(first_hour + worst_hour))).isoformat(),
+            'mean_wait_seconds': round(float(hourly_wait[worst_hour]), 2)
+        }
+    })
+    return result
+
+# Arrivals shared by the scenarios of a pool worker
+_worker_arrivals = None
+
+def _init_worker(arrivals):
+    global _worker_arrivals
+    _worker_arrivals = arrivals
+
+def _simulate_in_worker(scenario):
+    return simulate(_worker_arrivals, scenario)
+
+def run_scenarios(arrivals, scenarios, workers=None):
+    """
+    Simulate several scenarios, in parallel when workers > 1
+    
+    Args:
+        arrivals: Arrival arrays shared by all scenarios
+        scenarios: List of scenario dictionaries
+        workers: Process pool size (None or 1: run in this process)
+    
+    Returns:
+        List of results in scenario order
+    """
+    if not workers or workers <= 1 or len(scenarios) <= 1:
+        return [simulate(arrivals, scenario) for scenario in scenarios]
+    
+    with ProcessPoolExecutor(max_workers=min(workers, len(scenarios)),
+                             initializer=_init_worker, initargs=(arrivals,)) as pool:
+        return list(pool.map(_simulate_in_worker, scenarios))
+
+def scenario_grid(**options):
+    """
+    Cartesian product of scenario options given as lists
+    
+    Example: scenario_grid(lanes=[3, 4], heavy_lanes=[0, 1])
+    """
+    names = list(options)
+    return [dict(zip(names, values)) for values in itertools.product(*(options[name] for name in names))]
+
+class QueueSimulatorService:
+    """
+    Service class loading arrivals for a plaza from the database
+    """
+    
+    @staticmethod
+    def load_transaction_arrivals(plaza_id, start, end, chunk_size=50000):
+        """
+        Replay recorded crossings (keyset-paginated on txn_id)
+        
+        Returns:
+            Arrival arrays (see synthetic_arrivals)
+        """
+        from app import db
+        from app.models import TollTransaction, Vehicle
+        
+        times, types, modes = [], [], []
+        last_txn_id = 0
+        while True:
+            rows = db.session.query(
+                TollTransaction.txn_id,
+                TollTransaction.timestamp,
+                Vehicle.vehicle_type,
+                TollTransaction.payment_mode
+            ).join(
+                Vehicle, Vehicle.vehicle_id == TollTransaction.vehicle_id
+            ).filter(
+                TollTransaction.plaza_id == plaza_id,
+                TollTransaction.timestamp >= start,
+                TollTransaction.timestamp < end,
+                TollTransaction.txn_id > last_txn_id
+            ).order_by(TollTransaction.txn_id).limit(chunk_size).all()
+            
+            if not rows:
+                break
+            
+            times.append(np.fromiter(((r.timestamp - EPOCH).total_seconds() for r in rows), dtype=np.float64, count=len(rows)))
+            types.append(np.fromiter((VEHICLE_TYPES.index(r.vehicle_type.value) for r in rows), dtype=np.int8, count=len(rows)))
+            modes.append(np.fromiter((PAYMENT_MODES.index(r.payment_mode.value) for r in rows), dtype=np.int8, count=len(rows)))
+            last_txn_id = rows[-1].txn_id
+            
+            if len(rows) < chunk_size:
+                break
+        
+        if not times:
+            return {'time': np.empty(0), 'vehicle_type': np.empty(0, np.int8), 'payment_mode': np.empty(0, np.int8)}
+        
+        time_values = np.concatenate(times)
+        order = np.argsort(time_values, kind='stable')
+        return {
+            'time': time_values[order],
+            'vehicle_type': np.concatenate(types)[order],
+            'payment_mode': np.concatenate(modes)[order]
+        }
+    
+    @staticmethod
+    def load_traffic_log_arrivals(plaza_id, start, end, seed=0):
+        """
+        Poisson arrivals from recorded hourly volumes in TrafficLog
+        """
+        from app import db
+        from app.models import TrafficLog
+        from app.services.lane_assignment_service import LaneAssignmentService
+        
+        rows = db.session.query(TrafficLog.date, TrafficLog.hour, TrafficLog.vehicle_count).filter(
+            TrafficLog.plaza_id == plaza_id,
+            TrafficLog.date >= start.date(),
+            TrafficLog.date < end.date()
+        ).all()
+        hour_starts = [(datetime.combine(r.date, datetime.min.time()) - EPOCH).total_seconds() + r.hour * 3600 for r in rows]
+        counts = [r.vehicle_count for r in rows]
+        return synthetic_arrivals(hour_starts, counts, LaneAssignmentService.get_mixes().get(plaza_id), seed)
+    
+    @staticmethod
+    def load_forecast_arrivals(plaza_id, hours_ahead=24, seed=0):
+        """
+        Poisson arrivals for the next hours from the traffic forecast
+        """
+        from app.services.lane_assignment_service import LaneAssignmentService
+        from app.services.model_registry import ModelRegistry
+        from app.services.prediction_service import PredictionService
+        
+        now = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+        predictions = PredictionService.get_predictions(
+            [plaza_id], now.date(), hours_ahead, ModelRegistry.get_active()
+        )[plaza_id]
+        hour_starts = [(now + timedelta(hours=offset) - EPOCH).total_seconds() for offset in range(1, hours_ahead + 1)]
+        counts = [p['predicted_vehicles'] for p in predictions]
+        return synthetic_arrivals(hour_starts, counts, LaneAssignmentService.get_mixes().get(plaza_id), seed)
@@ -0,0 +1,126 @@
+"""
+Toll Rate Cache - In-memory toll rate table for the crossing path
+Rates change rarely but are read on every crossing, so they are held in a
+dictionary keyed by (plaza_id, vehicle_type, time_slot) instead of being
+queried per transaction. Edits made in this process invalidate the table
+immediately; edits from other processes are picked up by a cheap version
+query at most every RATE_CACHE_REFRESH_SECONDS. Loaded before fork under
+gunicorn (see gunicorn.conf.py), so workers start warm.
+"""
+
+import threading
+import time
+from datetime import datetime
+from flask import current_app
+from app import db
+from app.models import TollRate, VehicleType
+
+class TollRateCache:
+    """
+    Service class holding the in-memory toll rate table
+    """
+    
+    # (plaza_id, vehicle_type, time_slot) -> rate dictionary (lowest rate_id wins)
+    _table = {}
+    _version = None
+    _checked_at = None
+    _lock = threading.Lock()
+    
+    @staticmethod
+    def _current_version():
+        """
+        Row count, highest id and latest update of the rate table
+        """
+        count, max_id, updated = db.session.query(
+            db.func.count(TollRate.rate_id),
+            db.func.max(TollRate.rate_id),
+            db.func.max(TollRate.updated_at)
+        ).one()
+        return (count, max_id, updated)
+    
+    @staticmethod
+    def load():
+        """
+        Rebuild the table from the toll_rate rows
+        """
+        cls = TollRateCache
+        version = cls._current_version()
+        rows = db.session.query(
+            TollRate.rate_id,
+            TollRate.plaza_id,
+            TollRate.vehicle_type,
+            TollRate.time_slot,
+            TollRate.amount,
+            TollRate.from_time,
+            TollRate.to_time
+        ).order_by(TollRate.rate_id).all()
+        
+        table = {}
+        for row in rows:
+            table.setdefault((row.plaza_id, row.vehicle_type, row.time_slot), {
+                'rate_id': row.rate_id,
+                'amount': row.amount,
+                'time_slot': row.time_slot,
+                'from_time': row.from_time,
+                'to_time': row.to_time
+            })
+        with cls._lock:
+            cls._table = table
+            cls._version = version
+            cls._checked_at = time.monotonic()
+    
+    @staticmethod
+    def ensure_loaded():
+        """
+        Load the table on first use and pick up rate edits made by other
+        processes, checking at most every RATE_CACHE_REFRESH_SECONDS
+        """
+        cls = TollRateCache
+        checked_at = cls._checked_at
+        if checked_at is not None and time.monotonic() - checked_at < current_app.config['RATE_CACHE_REFRESH_SECONDS']:
+            return
+        
+        try:
+            if checked_at is None or cls._current_version() != cls._version:
+                cls.load()
+            else:
+                cls._checked_at = time.monotonic()
+        except Exception as e:
+            print(f"[{datetime.now()}] Toll rate table refresh error: {str(e)}")
+            cls._checked_at = time.monotonic()
+    
+    @staticmethod
+    def invalidate():
+        """
+        Reload on next use (call after editing rates)
+        """
+        TollRateCache._checked_at = None
+    
+    @staticmethod
+    def get_rate(plaza_id, vehicle_type, time_slot):
+        """
+        Rate for a plaza, vehicle type and time slot, falling back to the
+        normal slot when no peak rate is configured (call ensure_loaded first)
+        
+        Returns:
+            Rate dictionary or None
+        """
+        if not isinstance(vehicle_type, VehicleType):
+            vehicle_type = VehicleType(vehicle_type)
+        table = TollRateCache._table
+        rate = table.get((plaza_id, vehicle_type, time_slot))
+        if rate is None and time_slot != 'normal':
+            rate = table.get((plaza_id, vehicle_type, 'normal'))
+        return rate
+    
+    @staticmethod
+    def get_status():
+        """
+        Size and freshness of the in-memory rate table
+        """
+        cls = TollRateCache
+        return {
+            'entries': len(cls._table),
+            'loaded': cls._checked_at is not None,
+            'rows': cls._version[0] if cls._version else 0
+        }
@@ -0,0 +1,200 @@
+"""
+Request Metrics - Per-endpoint request timing exposed in Prometheus format
+Flask request hooks time every request and SQLAlchemy cursor events add up
+the database time and query count spent inside it. Counters live in plain
+per-process dictionaries keyed by (endpoint, method): a request costs one
+lock acquisition and a bisect into fixed histogram buckets, and the text
+exposition is only built when /metrics is scraped. With several worker
+processes each one reports its own counters (like LaneMetrics).
+"""
+
+import bisect
+import threading
+import time
+from flask import Response, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Request latency histogram bucket upper bounds, seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Requests not matched to an endpoint (404s) share one label
+UNMATCHED = 'unmatched'
+
+# Per-endpoint counter list: bucket counts (last one +Inf), then these totals
+LATENCY_SUM, ERRORS, DB_SECONDS, QUERIES = range(len(LATENCY_BUCKETS) + 1, len(LATENCY_BUCKETS) + 5)
+
+class RequestMetrics:
+    """
+    Service class holding request counters and the /metrics view
+    """
+    
+    _lock = threading.Lock()
+    _local = threading.local()  # Timing state of the request on this thread
+    
+    _endpoints = {}  # (endpoint, method) -> counter list
+    _statuses = {}   # (endpoint, method, status) -> requests
+    _in_flight = 0
+    _db = {'queries': 0, 'seconds': 0.0}  # All queries, including background threads
+    _started_at = time.time()
+    _installed = False
+    
+    @staticmethod
+    def init_app(app):
+        """
+        Register the request hooks, the database listeners and /metrics
+        """
+        cls = RequestMetrics
+        app.before_request(cls._before_request)
+        app.after_request(cls._after_request)
+        app.teardown_request(cls._teardown_request)
+        app.add_url_rule('/metrics', 'metrics', cls.metrics_view)
+        
+        # Engine-wide listeners, installed once per process
+        with cls._lock:
+            if not cls._installed:
+                event.listen(Engine, 'before_cursor_execute', cls._before_cursor_execute)
+                event.listen(Engine, 'after_cursor_execute', cls._after_cursor_execute)
+                cls._installed = True
+    
+    # ========================================================================
+    # Request hooks
+    # ========================================================================
+    
+    @staticmethod
+    def _before_request():
+        cls = RequestMetrics
+        state = cls._local
+        state.status = None
+        state.db_seconds = 0.0
+        state.queries = 0
+        state.request = request._get_current_object()
+        with cls._lock:
+            cls._in_flight += 1
+        state.started = time.perf_counter()
+    
+    @staticmethod
+    def _after_request(response):
+        RequestMetrics._local.status = response.status_code
+        return response
+    
+    @staticmethod
+    def _teardown_request(exc):
+        cls = RequestMetrics
+        state = cls._local
+        started = getattr(state, 'started', None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        state.started = None
+        
+        status = state.status if state.status is not None else 500
+        key = (state.request.endpoint or UNMATCHED, state.request.method)
+        state.request = None
+        bucket = bisect.bisect_left(LATENCY_BUCKETS, elapsed)
+        
+        with cls._lock:
+            cls._in_flight -= 1
+            counters = cls._endpoints.get(key)
+            if counters is None:
+                counters = cls._endpoints[key] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0, 0, 0.0, 0]
+            counters[bucket] += 1
+            counters[LATENCY_SUM] += elapsed
+            if exc is not None or status >= 500:
+                counters[ERRORS] += 1
+            counters[DB_SECONDS] += state.db_seconds
+            counters[QUERIES] += state.queries
+            status_key = key + (status,)
+            cls._statuses[status_key] = cls._statuses.get(status_key, 0) + 1
+    
+    # ========================================================================
+    # Database listeners
+    # ========================================================================
+    
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+    
+    @staticmethod
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        cls = RequestMetrics
+        elapsed = time.perf_counter() - conn.info['query_started'].pop()
+        state = cls._local
+        if getattr(state, 'started', None) is not None:
+            state.db_seconds += elapsed
+            state.queries += 1
+        with cls._lock:
+            cls._db['queries'] += 1
+            cls._db['seconds'] += elapsed
+    
+    # ========================================================================
+    # Exposition
+    # ========================================================================
+    
+    @staticmethod
+    def render():
+        """
+        All metrics in the Prometheus text exposition format (version 0.0.4)
+        """
+        cls = RequestMetrics
+        with cls._lock:
+            endpoints = {key: list(counters) for key, counters in cls._endpoints.items()}
+            statuses = dict(cls._statuses)
+            in_flight = cls._in_flight
+            db = dict(cls._db)
+        
+        def labels(endpoint, method, **extra):
+            pairs = [('endpoint', endpoint), ('method', method)] + list(extra.items())
+            return ','.join(f'{name}="{value}"' for name, value in pairs)
+        
+        bounds = [str(bound) for bound in LATENCY_BUCKETS] + ['+Inf']
+        lines = [
+            '# HELP toll_http_request_duration_seconds Request latency by endpoint',
+            '# TYPE toll_http_request_duration_seconds histogram'
+        ]
+        for (endpoint, method), counters in sorted(endpoints.items()):
+            cumulative = 0
+            for bound, count in zip(bounds, counters):
+                cumulative += count
+                lines.append(f'toll_http_request_duration_seconds_bucket{{{labels(endpoint, method, le=bound)}}} {cumulative}')
+            lines.append(f'toll_http_request_duration_seconds_sum{{{labels(endpoint, method)}}} {counters[LATENCY_SUM]:.6f}')
+            lines.append(f'toll_http_request_duration_seconds_count{{{labels(endpoint, method)}}} {cumulative}')
+        
+        lines += [
+            '# HELP toll_http_requests_total Requests by endpoint and status code',
+            '# TYPE toll_http_requests_total counter'
+        ]
+        for (endpoint, method, status), count in sorted(statuses.items()):
+            lines.append(f'toll_http_requests_total{{{labels(endpoint, method, status=status)}}} {count}')
+        
+        for name, index, help_text, fmt in (
+            ('toll_http_request_errors_total', ERRORS, 'Requests failing with a 5xx status or an exception', '{}'),
+            ('toll_http_request_db_seconds_total', DB_SECONDS, 'Database time spent inside requests', '{:.6f}'),
+            ('toll_http_request_db_queries_total', QUERIES, 'Database queries issued inside requests', '{}')
+        ):
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+            for (endpoint, method), counters in sorted(endpoints.items()):
+                lines.append(f'{name}{{{labels(endpoint, method)}}} {fmt.format(counters[index])}')
+        
+        lines += [
+            '# HELP toll_http_requests_in_flight Requests currently being processed',
+            '# TYPE toll_http_requests_in_flight gauge',
+            f'toll_http_requests_in_flight {in_flight}',
+            '# HELP toll_db_queries_total Database queries issued by this process',
+            '# TYPE toll_db_queries_total counter',
+            f"toll_db_queries_total {db['queries']}",
+            '# HELP toll_db_query_seconds_total Database time spent by this process',
+            '# TYPE toll_db_query_seconds_total counter',
+            f"toll_db_query_seconds_total {db['seconds']:.6f}",
+            '# HELP toll_process_start_time_seconds Start time of the process since the epoch',
+            '# TYPE toll_process_start_time_seconds gauge',
+            f'toll_process_start_time_seconds {cls._started_at:.3f}'
+        ]
+        return '\n'.join(lines) + '\n'
+    
+    @staticmethod
+    def metrics_view():
+        """
+        Prometheus scrape endpoint
+        """
+        return Response(RequestMetrics.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,306 @@
+"""
+Request Profiler - Sampling stack profiler for slow requests
+One sampler thread wakes every PROFILER_INTERVAL_MS and records the stack
+of each in-flight request that has been running longer than
+PROFILER_SLOW_MS, or that was picked for profiling (PROFILER_SAMPLE_RATE).
+Fast requests are never walked: they only enter and leave a dictionary.
+Samples are aggregated per endpoint into collapsed stacks
+('frame;frame;frame count'), the input format of flamegraph.pl, speedscope
+and similar tools. Distinct stacks per endpoint are capped at
+PROFILER_MAX_STACKS and samples per request at PROFILER_MAX_SAMPLES, so
+memory and sampler work stay bounded. Profiles are per process.
+"""
+
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from flask import request
+
+# Deepest stack recorded (frames nearest the root are dropped beyond this)
+MAX_DEPTH = 128
+
+# Stack recorded in place of new stacks once an endpoint holds PROFILER_MAX_STACKS
+OVERFLOW_STACK = '[other stacks]'
+
+class ActiveRequest:
+    """
+    A request in flight on one thread and the stacks sampled from it
+    """
+    
+    __slots__ = ('endpoint', 'started', 'sampled', 'samples')
+    
+    def __init__(self, endpoint, started, sampled):
+        self.endpoint = endpoint
+        self.started = started
+        self.sampled = sampled
+        self.samples = []
+
+class RequestProfiler:
+    """
+    Service class holding in-flight requests, the sampler thread and the
+    per-endpoint profiles
+    """
+    
+    _lock = threading.Lock()
+    _active = {}     # thread ident -> ActiveRequest
+    _profiles = {}   # endpoint -> profile dictionary (stacks Counter and totals)
+    _labels = {}     # code object -> frame label
+    _settings = {}
+    _stats = {'sampler_seconds': 0.0, 'samples': 0}
+    
+    _sampler = None
+    _sampler_pid = None
+    _started_at = None
+    _stop_event = threading.Event()
+    
+    @staticmethod
+    def init_app(app):
+        """
+        Register the request hooks (the sampler starts with the first request)
+        """
+        cls = RequestProfiler
+        config = app.config
+        cls._settings = {
+            'slow_seconds': config['PROFILER_SLOW_MS'] / 1000.0,
+            'sample_rate': config['PROFILER_SAMPLE_RATE'],
+            'interval_seconds': config['PROFILER_INTERVAL_MS'] / 1000.0,
+            'max_stacks': config['PROFILER_MAX_STACKS'],
+            'max_samples': config['PROFILER_MAX_SAMPLES']
+        }
+        app.before_request(cls._before_request)
+        app.teardown_request(cls._teardown_request)
+    
+    # ========================================================================
+    # Request hooks
+    # ========================================================================
+    
+    @staticmethod
+    def _before_request():
+        cls = RequestProfiler
+        if cls._sampler_pid != os.getpid():
+            cls.start()
+        
+        rate = cls._settings['sample_rate']
+        active = ActiveRequest(request.endpoint or 'unmatched', time.perf_counter(),
+                               rate > 0 and random.random() < rate)
+        with cls._lock:
+            cls._active[threading.get_ident()] = active
+    
+    @staticmethod
+    def _teardown_request(exc):
+        cls = RequestProfiler
+        with cls._lock:
+            active = cls._active.pop(threading.get_ident(), None)
+        if active is None or not active.samples:
+            return
+        
+        duration = time.perf_counter() - active.started
+        max_stacks = cls._settings['max_stacks']
+        with cls._lock:
+            profile = cls._profiles.get(active.endpoint)
+            if profile is None:
+                profile = cls._profiles[active.endpoint] = {
+                    'requests': 0, 'slow_requests': 0, 'samples': 0,
+                    'total_seconds': 0.0, 'max_seconds': 0.0, 'stacks': Counter()
+                }
+            profile['requests'] += 1
+            if duration >= cls._settings['slow_seconds']:
+                profile['slow_requests'] += 1
+            profile['samples'] += len(active.samples)
+            profile['total_seconds'] += duration
+            profile['max_seconds'] = max(profile['max_seconds'], duration)
+            
+            stacks = profile['stacks']
+            for stack in active.samples:
+                if stack in stacks or len(stacks) < max_stacks:
+                    stacks[stack] += 1
+                else:
+                    stacks[OVERFLOW_STACK] += 1
+    
+    # ========================================================================
+    # Sampler
+    # ========================================================================
+    
+    @staticmethod
+    def start():
+        """
+        Start the sampler thread once per process (also after a fork)
+        """
+        cls = RequestProfiler
+        with cls._lock:
+            if cls._sampler_pid == os.getpid():
+                return
+            # A forked child inherits requests of threads that do not exist here
+            cls._active = {}
+            cls._stop_event = threading.Event()
+            cls._sampler = threading.Thread(
+                target=cls._sample_loop,
+                args=(cls._stop_event,),
+                name='request-profiler',
+                daemon=True
+            )
+            cls._sampler_pid = os.getpid()
+            cls._started_at = datetime.utcnow()
+            cls._sampler.start()
+    
+    @staticmethod
+    def stop():
+        """
+        Stop the sampler thread
+        """
+        cls = RequestProfiler
+        cls._stop_event.set()
+        cls._sampler_pid = None
+    
+    @staticmethod
+    def _label(frame):
+        """
+        'module:function' for a frame, cached per code object
+        
+        Frames without a module name (Jinja templates) use their file name.
+        """
+        code = frame.f_code
+        label = RequestProfiler._labels.get(code)
+        if label is None:
+            module = frame.f_globals.get('__name__') or os.path.basename(code.co_filename)
+            label = RequestProfiler._labels[code] = f"{module}:{code.co_name}".replace(';', ',').replace(' ', '_')
+        return label
+    
+    @staticmethod
+    def _collapse(frame):
+        """
+        Collapsed stack of a frame, root first
+        """
+        labels = []
+        label = RequestProfiler._label
+        while frame is not None and len(labels) < MAX_DEPTH:
+            labels.append(label(frame))
+            frame = frame.f_back
+        labels.reverse()
+        return ';'.join(labels)
+    
+    @staticmethod
+    def _sample_loop(stop_event):
+        cls = RequestProfiler
+        settings = cls._settings
+        while not stop_event.wait(settings['interval_seconds']):
+            started = time.perf_counter()
+            with cls._lock:
+                targets = [
+                    (ident, active) for ident, active in cls._active.items()
+                    if active.sampled or started - active.started >= settings['slow_seconds']
+                ]
+            if not targets:
+                continue
+            
+            frames = sys._current_frames()
+            taken = 0
+            for ident, active in targets:
+                frame = frames.get(ident)
+                if frame is not None and len(active.samples) < settings['max_samples']:
+                    active.samples.append(cls._collapse(frame))
+                    taken += 1
+            del frames
+            
+            with cls._lock:
+                cls._stats['samples'] += taken
+                cls._stats['sampler_seconds'] += time.perf_counter() - started
+    
+    # ========================================================================
+    # Reports
+    # ========================================================================
+    
+    @staticmethod
+    def get_summary(top=10):
+        """
+        Per-endpoint profile totals and the functions most often on top of
+        the stack
+        
+        Args:
+            top: Number of leaf functions listed per endpoint
+        
+        Returns:
+            Dictionary with sampler settings, overhead and endpoint summaries
+        """
+        cls = RequestProfiler
+        with cls._lock:
+            profiles = {endpoint: dict(profile, stacks=Counter(profile['stacks']))
+                        for endpoint, profile in cls._profiles.items()}
+            stats = dict(cls._stats)
+            in_flight = len(cls._active)
+        
+        endpoints = []
+        for endpoint, profile in profiles.items():
+            leaves = Counter()
+            for stack, count in profile['stacks'].items():
+                leaves[stack.rsplit(';', 1)[-1]] += count
+            endpoints.append({
+                'endpoint': endpoint,
+                'requests': profile['requests'],
+                'slow_requests': profile['slow_requests'],
+                'samples': profile['samples'],
+                'distinct_stacks': len(profile['stacks']),
+                'avg_ms': round(profile['total_seconds'] / profile['requests'] * 1000, 1),
+                'max_ms': round(profile['max_seconds'] * 1000, 1),
+                'top_functions': [
+                    {'function': name, 'samples': count, 'share': round(count / profile['samples'], 3)}
+                    for name, count in leaves.most_common(top)
+                ]
+            })
+        endpoints.sort(key=lambda item: item['samples'], reverse=True)
+        
+        uptime = (datetime.utcnow() - cls._started_at).total_seconds() if cls._started_at else 0.0
+        return {
+            'running': cls._sampler_pid == os.getpid(),
+            'settings': {
+                'slow_ms': cls._settings.get('slow_seconds', 0) * 1000,
+                'sample_rate': cls._settings.get('sample_rate'),
+                'interval_ms': cls._settings.get('interval_seconds', 0) * 1000,
+                'max_stacks': cls._settings.get('max_stacks'),
+                'max_samples': cls._settings.get('max_samples')
+            },
+            'in_flight': in_flight,
+            'samples': stats['samples'],
+            'sampler_seconds': round(stats['sampler_seconds'], 4),
+            'sampler_cpu_share': round(stats['sampler_seconds'] / uptime, 6) if uptime else 0.0,
+            'endpoints': endpoints
+        }
+    
+    @staticmethod
+    def collapsed(endpoint=None):
+        """
+        Collapsed stacks for flamegraph tools
+        
+        Args:
+            endpoint: Only this endpoint (default: all, each stack rooted at
+                its endpoint name)
+        
+        Returns:
+            Text with one 'frame;frame;frame count' line per stack
+        """
+        cls = RequestProfiler
+        with cls._lock:
+            if endpoint is not None:
+                profile = cls._profiles.get(endpoint)
+                stacks = [(stack, count) for stack, count in profile['stacks'].items()] if profile else []
+            else:
+                stacks = [
+                    (f"{name};{stack}", count)
+                    for name, profile in cls._profiles.items()
+                    for stack, count in profile['stacks'].items()
+                ]
+        return ''.join(f"{stack} {count}\n" for stack, count in sorted(stacks))
+    
+    @staticmethod
+    def reset():
+        """
+        Discard all collected profiles
+        """
+        cls = RequestProfiler
+        with cls._lock:
+            cls._profiles = {}
+            cls._stats = {'sampler_seconds': 0.0, 'samples': 0}
@@ -0,0 +1,36 @@
+"""
+Spark Analysis Service - Owns the SparkSession used by analytics jobs
+Keeps one long-lived SparkSession per process so background jobs do not
+pay JVM and session start-up on every run
+"""
+
+import threading
+from datetime import datetime
+
+class SparkAnalysisService:
+    """
+    Service class that owns the shared SparkSession
+    """
+    
+    _spark_analytics = None
+    _lock = threading.Lock()
+    
+    @staticmethod
+    def get_spark_analytics():
+        """
+        Get the process-wide SparkAnalytics wrapper, creating it on first use
+        
+        Returns:
+            SparkAnalytics instance whose .spark session is reused across jobs
+        """
+        if SparkAnalysisService._spark_analytics is None:
+            with SparkAnalysisService._lock:
+                if SparkAnalysisService._spark_analytics is None:
+                    from ml_analytics.spark_analytics import SparkAnalytics
+                    
+                    # Local mode: jobs stay visible in the Web UI on port 4040
+                    SparkAnalysisService._spark_analytics = SparkAnalytics(
+                        app_name="SmartTollAnalysis", use_local=True
+                    )
+                    print(f"[{datetime.now()}] Spark session started for analysis jobs")
+        return SparkAnalysisService._spark_analytics
@@ -5,42 +5,240 @@ Handles job submission, monitoring, and data sync
 """
 
 import requests
-import json
+from requests.adapters import HTTPAdapter
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from flask import current_app
 from app import db
 from app.models import TollTransaction, TollPlaza, Vehicle, Wallet
 
+
+class SparkCircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised without touching the network while the Spark circuit is open"""
+
+
+class _TTLCache:
+    """
+    Small thread-safe cache of Spark REST responses keyed by URL.
+    Shared by every endpoint so one dashboard refresh hits each URL once.
+    """
+    
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            return value
+    
+    def set(self, key, value, ttl):
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class _CircuitBreaker:
+    """
+    Fails fast after repeated connection errors to the Spark REST API.
+    
+    closed    -> requests flow normally, consecutive failures are counted
+    open      -> requests are rejected until reset_timeout has elapsed
+    half-open -> a single trial request decides whether to close or re-open
+    """
+    
+    def __init__(self):
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+    
+    def allow_request(self, reset_timeout):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < reset_timeout or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+    
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+    
+    def record_failure(self, threshold):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= threshold:
+                self._opened_at = time.monotonic()
+    
+    def release_trial(self):
+        """Let another request try again without changing the state"""
+        with self._lock:
+            self._trial_in_flight = False
+    
+    @property
+    def is_open(self):
+        with self._lock:
+            return self._opened_at is not None
+    
+    def reset(self):
+        self.record_success()
+
+
 class SparkIntegrationService:
     """
     Service to integrate Flask with Apache Spark
     Submits jobs, monitors execution, and syncs data
+    
+    All REST calls share one pooled HTTP session, a short-TTL response cache
+    and a circuit breaker. Per-application requests fan out on a thread pool.
     """
     
-    SPARK_UI_URL = "http://DESKTOP-9Q68UBH:4040"
-    SPARK_API_URL = "http://DESKTOP-9Q68UBH:4040/api"
+    _session = None
+    _executor = None
+    _init_lock = threading.Lock()
+    _cache = _TTLCache()
+    _breaker = _CircuitBreaker()
+    
+    @staticmethod
+    def get_spark_ui_url():
+        """
+        Base URL of the Spark Web UI (configured via SPARK_UI_URL)
+        """
+        return current_app.config['SPARK_UI_URL'].rstrip('/')
+    
+    @staticmethod
+    def get_spark_api_url():
+        """
+        Base URL of the Spark monitoring REST API
+        """
+        return f"{SparkIntegrationService.get_spark_ui_url()}/api"
+    
+    @staticmethod
+    def _get_session():
+        """
+        Lazily create the pooled HTTP session and the fan-out thread pool
+        """
+        cls = SparkIntegrationService
+        if cls._session is None:
+            with cls._init_lock:
+                if cls._session is None:
+                    max_workers = current_app.config['SPARK_API_MAX_WORKERS']
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_workers, max_retries=0)
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    cls._executor = ThreadPoolExecutor(
+                        max_workers=max_workers,
+                        thread_name_prefix='spark-api'
+                    )
+                    cls._session = session
+        return cls._session
+    
+    @staticmethod
+    def _request_options():
+        """
+        Snapshot the settings needed by _fetch_json so that pool threads
+        never need an application context
+        """
+        config = current_app.config
+        return {
+            'session': SparkIntegrationService._get_session(),
+            'timeout': config['SPARK_API_TIMEOUT'],
+            'cache_ttl': config['SPARK_API_CACHE_TTL'],
+            'failure_threshold': config['SPARK_CIRCUIT_FAILURE_THRESHOLD'],
+            'reset_timeout': config['SPARK_CIRCUIT_RESET_TIMEOUT']
+        }
+    
+    @staticmethod
+    def _fetch_json(url, options):
+        """
+        GET a Spark REST URL through the cache and circuit breaker
+        
+        Args:
+            url: Absolute URL to fetch
+            options: Settings returned by _request_options()
+        
+        Returns:
+            Decoded JSON body
+        
+        Raises:
+            requests.exceptions.ConnectionError: Spark unreachable or circuit open
+            requests.exceptions.RequestException: Any other transport failure
+            requests.exceptions.HTTPError: Spark answered with an error status
+            ValueError: The body is not valid JSON
+        """
+        cls = SparkIntegrationService
+        cached = cls._cache.get(url)
+        if cached is not None:
+            return cached
+        
+        if not cls._breaker.allow_request(options['reset_timeout']):
+            raise SparkCircuitOpenError(f'Spark API circuit open, skipping {url}')
+        
+        healthy = False
+        try:
+            response = options['session'].get(url, timeout=options['timeout'])
+            if 400 <= response.status_code < 500:
+                # A client error (e.g. no storage for an application) still proves Spark is up
+                healthy = True
+            response.raise_for_status()
+            data = response.json()
+            healthy = True
+        except (requests.exceptions.RequestException, ValueError):
+            if not healthy:
+                cls._breaker.record_failure(options['failure_threshold'])
+            raise
+        finally:
+            # Settle the breaker on every path so a half-open trial never stays in flight
+            if healthy:
+                cls._breaker.record_success()
+            else:
+                cls._breaker.release_trial()
+        
+        cls._cache.set(url, data, options['cache_ttl'])
+        return data
     
     @staticmethod
     def get_spark_status():
         """
         Get current Spark cluster status and job information
         """
+        spark_ui_url = SparkIntegrationService.get_spark_ui_url()
         try:
             # Get Spark API status
-            response = requests.get(f"{SparkIntegrationService.SPARK_API_URL}/v1/applications", timeout=5)
-            
-            if response.status_code == 200:
-                applications = response.json()
-                return {
-                    'status': 'connected',
-                    'url': SparkIntegrationService.SPARK_UI_URL,
-                    'applications': applications,
-                    'timestamp': datetime.utcnow().isoformat()
-                }
-        except requests.exceptions.ConnectionError:
+            applications = SparkIntegrationService._fetch_json(
+                f"{SparkIntegrationService.get_spark_api_url()}/v1/applications",
+                SparkIntegrationService._request_options()
+            )
+            return {
+                'status': 'connected',
+                'url': spark_ui_url,
+                'applications': applications,
+                'timestamp': datetime.utcnow().isoformat()
+            }
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
             return {
                 'status': 'disconnected',
-                'message': f'Cannot connect to Spark at {SparkIntegrationService.SPARK_UI_URL}',
-                'url': SparkIntegrationService.SPARK_UI_URL,
+                'message': f'Cannot connect to Spark at {spark_ui_url}',
+                'url': spark_ui_url,
                 'timestamp': datetime.utcnow().isoformat()
             }
         except Exception as e:
@@ -50,6 +248,62 @@ class SparkIntegrationService:
                 'timestamp': datetime.utcnow().isoformat()
             }
     
+    @staticmethod
+    def _fetch_app_details(api_url, app, options):
+        """
+        Fetch jobs and RDD storage for one Spark application.
+        Runs on the fan-out pool; failures of either call are ignored.
+        """
+        app_id = app.get('id')
+        app_name = app.get('name')
+        jobs_info = []
+        storage_info = []
+        
+        # Get Jobs
+        try:
+            jobs = SparkIntegrationService._fetch_json(
+                f"{api_url}/v1/applications/{app_id}/jobs", options
+            )
+            jobs_info = [
+                {
+                    'job_id': job.get('jobId'),
+                    'app_id': app_id,
+                    'app_name': app_name,
+                    'status': job.get('status'),
+                    'submitted_time': job.get('submissionTime'),
+                    'completion_time': job.get('completionTime'),
+                    'stage_ids': job.get('stageIds', []),
+                    'num_tasks': job.get('numTasks', 0),
+                    'completed_tasks': job.get('numCompletedTasks', 0)
+                }
+                for job in jobs
+            ]
+        except Exception:
+            pass
+        
+        # Get RDD Storage (if available)
+        try:
+            rdds = SparkIntegrationService._fetch_json(
+                f"{api_url}/v1/applications/{app_id}/storage/rdd", options
+            )
+            storage_info = [
+                {
+                    'rdd_id': rdd.get('id'),
+                    'app_id': app_id,
+                    'app_name': app_name,
+                    'name': rdd.get('name', 'RDD'),
+                    'num_partitions': rdd.get('numPartitions', 0),
+                    'memory_used': rdd.get('memoryUsed', 0),
+                    'disk_used': rdd.get('diskUsed', 0),
+                    'cache_level': rdd.get('cacheLevel', 'NONE')
+                }
+                for rdd in rdds
+            ]
+        except Exception:
+            pass
+        
+        return jobs_info, storage_info
+    
     @staticmethod
     def get_spark_jobs():
         """
@@ -57,77 +311,33 @@ class SparkIntegrationService:
         Also includes RDD/DataFrame information as storage data
         """
         try:
-            response = requests.get(
-                f"{SparkIntegrationService.SPARK_API_URL}/v1/applications",
-                timeout=5
-            )
+            api_url = SparkIntegrationService.get_spark_api_url()
+            options = SparkIntegrationService._request_options()
+            apps = SparkIntegrationService._fetch_json(f"{api_url}/v1/applications", options)
             
-            if response.status_code == 200:
-                apps = response.json()
-                jobs_info = []
-                storage_info = []
-                
-                for app in apps:
-                    app_id = app.get('id')
-                    app_name = app.get('name')
-                    
-                    # Get Jobs
-                    try:
-                        jobs_response = requests.get(
-                            f"{SparkIntegrationService.SPARK_API_URL}/v1/applications/{app_id}/jobs",
-                            timeout=5
-                        )
-                        if jobs_response.status_code == 200:
-                            jobs = jobs_response.json()
-                            jobs_info.extend([
-                                {
-                                    'job_id': job.get('jobId'),
-                                    'app_id': app_id,
-                                    'app_name': app_name,
-                                    'status': job.get('status'),
-                                    'submitted_time': job.get('submissionTime'),
-                                    'completion_time': job.get('completionTime'),
-                                    'stage_ids': job.get('stageIds', []),
-                                    'num_tasks': job.get('numTasks', 0),
-                                    'completed_tasks': job.get('numCompletedTasks', 0)
-                                }
-                                for job in jobs
-                            ])
-                    except:
-                        pass
-                    
-                    # Get RDD Storage (if available)
-                    try:
-                        storage_response = requests.get(
-                            f"{SparkIntegrationService.SPARK_API_URL}/v1/applications/{app_id}/storage/rdd",
-                            timeout=5
-                        )
-                        if storage_response.status_code == 200:
-                            rdds = storage_response.json()
-                            storage_info.extend([
-                                {
-                                    'rdd_id': rdd.get('id'),
-                                    'app_id': app_id,
-                                    'app_name': app_name,
-                                    'name': rdd.get('name', 'RDD'),
-                                    'num_partitions': rdd.get('numPartitions', 0),
-                                    'memory_used': rdd.get('memoryUsed', 0),
-                                    'disk_used': rdd.get('diskUsed', 0),
-                                    'cache_level': rdd.get('cacheLevel', 'NONE')
-                                }
-                                for rdd in rdds
-                            ])
-                    except:
-                        pass
-                
-                return {
-                    'success': True,
-                    'jobs': jobs_info,
-                    'storage': storage_info,
-                    'total_jobs': len(jobs_info),
-                    'total_rdds': len(storage_info),
-                    'timestamp': datetime.utcnow().isoformat()
-                }
+            # Fan out the per-application requests on the shared pool
+            futures = [
+                SparkIntegrationService._executor.submit(
+                    SparkIntegrationService._fetch_app_details, api_url, app, options
+                )
+                for app in apps
+            ]
+            
+            jobs_info = []
+            storage_info = []
+            for future in futures:
+                app_jobs, app_storage = future.result()
+                jobs_info.extend(app_jobs)
+                storage_info.extend(app_storage)
+            
+            return {
+                'success': True,
+                'jobs': jobs_info,
+                'storage': storage_info,
+                'total_jobs': len(jobs_info),
+                'total_rdds': len(storage_info),
+                'timestamp': datetime.utcnow().isoformat()
+            }
         except Exception as e:
             return {
                 'success': False,
@@ -143,43 +353,46 @@ class SparkIntegrationService:
         Get transaction summary data for Spark processing
         """
         try:
-            transactions = TollTransaction.query.all()
+            count = db.func.count(TollTransaction.txn_id)
+            revenue = db.func.coalesce(db.func.sum(TollTransaction.amount), 0)
+            
+            total, total_revenue, start, end = db.session.query(
+                count, revenue,
+                db.func.min(TollTransaction.timestamp),
+                db.func.max(TollTransaction.timestamp)
+            ).one()
             
             summary = {
-                'total_transactions': len(transactions),
-                'total_revenue': sum(t.amount for t in transactions) if transactions else 0,
+                'total_transactions': total,
+                'total_revenue': total_revenue,
                 'date_range': {
-                    'start': min(t.timestamp for t in transactions).isoformat() if transactions else None,
-                    'end': max(t.timestamp for t in transactions).isoformat() if transactions else None
+                    'start': start.isoformat() if start else None,
+                    'end': end.isoformat() if end else None
                 },
                 'by_plaza': {},
                 'by_vehicle_type': {},
                 'by_payment_mode': {}
             }
             
-            # Group by plaza
-            for txn in transactions:
-                plaza_name = txn.plaza.plaza_name
-                if plaza_name not in summary['by_plaza']:
-                    summary['by_plaza'][plaza_name] = {'count': 0, 'revenue': 0}
-                summary['by_plaza'][plaza_name]['count'] += 1
-                summary['by_plaza'][plaza_name]['revenue'] += txn.amount
+            # Group by plaza, vehicle type and payment mode in the database
+            by_plaza = db.session.query(TollPlaza.plaza_name, count, revenue).join(
+                TollPlaza, TollTransaction.plaza_id == TollPlaza.plaza_id
+            ).group_by(TollPlaza.plaza_id, TollPlaza.plaza_name)
+            
+            by_vehicle_type = db.session.query(Vehicle.vehicle_type, count, revenue).join(
+                Vehicle, TollTransaction.vehicle_id == Vehicle.vehicle_id
+            ).group_by(Vehicle.vehicle_type)
             
-            # Group by vehicle type
-            for txn in transactions:
-                vtype = txn.vehicle.vehicle_type.value
-                if vtype not in summary['by_vehicle_type']:
-                    summary['by_vehicle_type'][vtype] = {'count': 0, 'revenue': 0}
-                summary['by_vehicle_type'][vtype]['count'] += 1
-                summary['by_vehicle_type'][vtype]['revenue'] += txn.amount
+            by_payment_mode = db.session.query(
+                TollTransaction.payment_mode, count, revenue
+            ).group_by(TollTransaction.payment_mode)
             
-            # Group by payment mode
-            for txn in transactions:
-                pmode = txn.payment_mode.value
-                if pmode not in summary['by_payment_mode']:
-                    summary['by_payment_mode'][pmode] = {'count': 0, 'revenue': 0}
-                summary['by_payment_mode'][pmode]['count'] += 1
-                summary['by_payment_mode'][pmode]['revenue'] += txn.amount
+            for plaza_name, txn_count, txn_revenue in by_plaza:
+                summary['by_plaza'][plaza_name] = {'count': txn_count, 'revenue': txn_revenue}
+            for vtype, txn_count, txn_revenue in by_vehicle_type:
+                summary['by_vehicle_type'][vtype.value] = {'count': txn_count, 'revenue': txn_revenue}
+            for pmode, txn_count, txn_revenue in by_payment_mode:
+                summary['by_payment_mode'][pmode.value] = {'count': txn_count, 'revenue': txn_revenue}
             
             return {
                 'success': True,
@@ -198,9 +411,12 @@ class SparkIntegrationService:
         Get real-time metrics combining Flask DB and Spark cluster
         """
         try:
-            # Get database metrics
-            transactions = TollTransaction.query.all()
-            users = db.session.query(db.func.count(db.distinct('user_id'))).scalar() or 0
+            # Get database metrics (aggregated, no rows loaded)
+            total_transactions, total_revenue = db.session.query(
+                db.func.count(TollTransaction.txn_id),
+                db.func.coalesce(db.func.sum(TollTransaction.amount), 0)
+            ).one()
+            users = db.session.query(db.func.count(db.distinct(Vehicle.user_id))).scalar() or 0
             plazas = TollPlaza.query.count()
             vehicles = Vehicle.query.count()
             
@@ -210,24 +426,27 @@ class SparkIntegrationService:
             
             # Calculate additional metrics
             today = datetime.utcnow().date()
-            today_transactions = TollTransaction.query.filter(
-                db.func.date(TollTransaction.timestamp) == today
-            ).all()
+            today_transactions, today_revenue = db.session.query(
+                db.func.count(TollTransaction.txn_id),
+                db.func.coalesce(db.func.sum(TollTransaction.amount), 0)
+            ).filter(
+                TollTransaction.timestamp >= datetime.combine(today, datetime.min.time())
+            ).one()
             
             return {
                 'success': True,
                 'database': {
-                    'total_transactions': len(transactions),
-                    'today_transactions': len(today_transactions),
-                    'total_revenue': sum(t.amount for t in transactions) if transactions else 0,
-                    'today_revenue': sum(t.amount for t in today_transactions) if today_transactions else 0,
+                    'total_transactions': total_transactions,
+                    'today_transactions': today_transactions,
+                    'total_revenue': total_revenue,
+                    'today_revenue': today_revenue,
                     'unique_users': users,
                     'total_plazas': plazas,
                     'total_vehicles': vehicles
                 },
                 'spark': {
                     'cluster_status': spark_status.get('status'),
-                    'cluster_url': SparkIntegrationService.SPARK_UI_URL,
+                    'cluster_url': SparkIntegrationService.get_spark_ui_url(),
                     'active_jobs': spark_jobs.get('total_jobs', 0) if spark_jobs.get('success') else 0,
                     'jobs': spark_jobs.get('jobs', []) if spark_jobs.get('success') else []
                 },
@@ -248,21 +467,36 @@ class SparkIntegrationService:
         """
         try:
             start_date = datetime.utcnow().date() - timedelta(days=days)
-            transactions = TollTransaction.query.filter(
-                db.func.date(TollTransaction.timestamp) >= start_date
+            
+            # One joined column query instead of lazy vehicle/plaza loads per row
+            rows = db.session.query(
+                TollTransaction.txn_id,
+                TollTransaction.vehicle_id,
+                TollTransaction.plaza_id,
+                TollTransaction.amount,
+                TollTransaction.timestamp,
+                Vehicle.vehicle_type,
+                TollPlaza.plaza_name,
+                TollTransaction.payment_mode
+            ).join(
+                Vehicle, TollTransaction.vehicle_id == Vehicle.vehicle_id
+            ).join(
+                TollPlaza, TollTransaction.plaza_id == TollPlaza.plaza_id
+            ).filter(
+                TollTransaction.timestamp >= datetime.combine(start_date, datetime.min.time())
             ).all()
             
             data = []
-            for txn in transactions:
+            for row in rows:
                 data.append({
-                    'txn_id': txn.txn_id,
-                    'vehicle_id': txn.vehicle_id,
-                    'plaza_id': txn.plaza_id,
-                    'amount': float(txn.amount),
-                    'timestamp': txn.timestamp.isoformat(),
-                    'vehicle_type': txn.vehicle.vehicle_type.value,
-                    'plaza_name': txn.plaza.plaza_name,
-                    'payment_mode': txn.payment_mode.value
+                    'txn_id': row.txn_id,
+                    'vehicle_id': row.vehicle_id,
+                    'plaza_id': row.plaza_id,
+                    'amount': float(row.amount),
+                    'timestamp': row.timestamp.isoformat(),
+                    'vehicle_type': row.vehicle_type.value,
+                    'plaza_name': row.plaza_name,
+                    'payment_mode': row.payment_mode.value
                 })
             
             return {
@@ -0,0 +1,357 @@
+"""
+Spark Jobs - Executor-side transaction analytics and write-back
+Spark reads transactions itself (partitioned JDBC on txn_id ranges or
+exported columnar files), runs the aggregations in parallel on executors
+and writes hourly results into TrafficLog and AnalyticsSummary. The Flask
+process only issues small control queries and never holds the dataset.
+"""
+
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import text
+from app import db
+from app.models import TollTransaction, TollPlaza, Vehicle, TrafficLog, AnalyticsSummary
+
+TRAFFIC_LOG_STAGING_TABLE = 'traffic_log_staging'
+
+JDBC_DRIVERS = {
+    'sqlite': ('jdbc:sqlite:{database}', 'org.sqlite.JDBC'),
+    'postgresql': ('jdbc:postgresql://{host}:{port}/{database}', 'org.postgresql.Driver'),
+    'mysql': ('jdbc:mysql://{host}:{port}/{database}', 'com.mysql.cj.jdbc.Driver')
+}
+
+DEFAULT_PORTS = {'postgresql': 5432, 'mysql': 3306}
+
+def jdbc_connection_options():
+    """
+    Build Spark JDBC options for the application database
+    
+    SPARK_JDBC_URL / SPARK_JDBC_DRIVER override the values derived from the
+    SQLAlchemy engine URL.
+    
+    Returns:
+        Dictionary with url, driver and optional user/password
+    """
+    config = current_app.config
+    url = db.engine.url
+    backend = url.get_backend_name()
+    
+    if config.get('SPARK_JDBC_URL'):
+        options = {'url': config['SPARK_JDBC_URL'], 'driver': config['SPARK_JDBC_DRIVER']}
+    else:
+        if backend not in JDBC_DRIVERS:
+            raise ValueError(f'No JDBC mapping for database backend: {backend}')
+        template, driver = JDBC_DRIVERS[backend]
+        options = {
+            'url': template.format(
+                host=url.host,
+                port=url.port or DEFAULT_PORTS.get(backend),
+                database=url.database
+            ),
+            'driver': config.get('SPARK_JDBC_DRIVER') or driver
+        }
+    
+    if url.username:
+        options['user'] = url.username
+    if url.password:
+        options['password'] = url.password
+    return options
+
+def transaction_query():
+    """
+    SQL subquery Spark pushes down to the database for each partition
+    """
+    txn = TollTransaction.__tablename__
+    vehicle = Vehicle.__tablename__
+    plaza = TollPlaza.__tablename__
+    return (
+        f"(SELECT t.txn_id, t.plaza_id, p.plaza_name, v.vehicle_type, t.amount, t.timestamp "
+        f"FROM {txn} t "
+        f"JOIN {vehicle} v ON t.vehicle_id = v.vehicle_id "
+        f"JOIN {plaza} p ON t.plaza_id = p.plaza_id) AS txn"
+    )
+
+def read_transactions_jdbc(spark, num_partitions=None):
+    """
+    Read transactions with a partitioned JDBC scan on txn_id ranges
+    
+    Args:
+        spark: SparkSession
+        num_partitions: Number of parallel JDBC reads (default: SPARK_JDBC_PARTITIONS)
+    
+    Returns:
+        Spark DataFrame with TRANSACTION_COLUMNS
+    """
+    from pyspark.sql import functions as F
+    
+    num_partitions = num_partitions or current_app.config['SPARK_JDBC_PARTITIONS']
+    lower, upper = db.session.query(
+        db.func.min(TollTransaction.txn_id),
+        db.func.max(TollTransaction.txn_id)
+    ).one()
+    
+    reader = spark.read.format('jdbc').option('dbtable', transaction_query())
+    for key, value in jdbc_connection_options().items():
+        reader = reader.option(key, value)
+    
+    if lower is not None:
+        reader = reader \
+            .option('partitionColumn', 'txn_id') \
+            .option('lowerBound', lower) \
+            .option('upperBound', upper + 1) \
+            .option('numPartitions', num_partitions)
+    
+    df = reader.load()
+    
+    # SQLAlchemy stores enum names (CAR); analytics use enum values (car)
+    return df \
+        .withColumn('vehicle_type', F.lower(F.col('vehicle_type'))) \
+        .withColumn('timestamp', F.to_timestamp(F.col('timestamp')))
+
+def read_transactions_files(spark, path):
+    """
+    Read transactions exported as Parquet (or CSV) files
+    
+    Args:
+        spark: SparkSession
+        path: File or directory path
+    
+    Returns:
+        Spark DataFrame with TRANSACTION_COLUMNS
+    """
+    from pyspark.sql import functions as F
+    
+    if path.endswith('.csv'):
+        df = spark.read.option('header', True).option('inferSchema', True).csv(path)
+    else:
+        df = spark.read.parquet(path)
+    return df.withColumn('timestamp', F.to_timestamp(F.col('timestamp')))
+
+class SparkRollupJob:
+    """
+    Hourly, plaza, vehicle-type and peak-hour aggregations over a Spark
+    DataFrame, executed concurrently and written back to the database
+    """
+    
+    def __init__(self, spark, df):
+        self.spark = spark
+        self.df = df
+        self.run_id = uuid.uuid4().hex
+        self.jdbc_options = jdbc_connection_options()
+    
+    def hourly_by_plaza(self):
+        from pyspark.sql import functions as F
+        
+        return self.df.groupBy(
+            'plaza_id',
+            F.date_format('timestamp', 'yyyy-MM-dd').alias('date'),
+            F.hour('timestamp').alias('hour')
+        ).agg(
+            F.count('*').alias('vehicle_count'),
+            F.sum('amount').alias('total_revenue')
+        ).withColumn(
+            # Same thresholds as AnalyticsService.generate_traffic_logs
+            'traffic_level',
+            F.when(F.col('vehicle_count') > 100, 'high')
+             .when(F.col('vehicle_count') > 50, 'normal')
+             .otherwise('low')
+        )
+    
+    def by_plaza(self):
+        from pyspark.sql import functions as F
+        
+        return self.df.groupBy(F.col('plaza_name').alias('dimension')).agg(
+            F.count('*').alias('vehicle_count'),
+            F.sum('amount').alias('total_revenue')
+        )
+    
+    def by_vehicle_type(self):
+        from pyspark.sql import functions as F
+        
+        return self.df.groupBy(F.col('vehicle_type').alias('dimension')).agg(
+            F.count('*').alias('vehicle_count'),
+            F.sum('amount').alias('total_revenue')
+        )
+    
+    def peak_hours(self, limit=5):
+        from pyspark.sql import functions as F
+        
+        return self.df.groupBy(F.hour('timestamp').cast('string').alias('dimension')).agg(
+            F.count('*').alias('vehicle_count'),
+            F.sum('amount').alias('total_revenue')
+        ).orderBy(F.desc('vehicle_count'), 'dimension').limit(limit)
+    
+    def write_hourly_staging(self):
+        """
+        Executors write hourly aggregates straight into the staging table
+        """
+        writer = self.hourly_by_plaza().write.format('jdbc') \
+            .option('dbtable', TRAFFIC_LOG_STAGING_TABLE) \
+            .option('truncate', True) \
+            .mode('overwrite')
+        for key, value in self.jdbc_options.items():
+            writer = writer.option(key, value)
+        writer.save()
+    
+    def run(self, progress=None):
+        """
+        Run all aggregations in parallel and persist the results
+        
+        Args:
+            progress: Optional callback(percent, message)
+        
+        Returns:
+            Dictionary with run_id and row counts
+        """
+        self.df.cache()
+        
+        if progress:
+            progress(20, 'Running aggregations on executors')
+        
+        # Spark schedules actions submitted from separate threads concurrently
+        with ThreadPoolExecutor(max_workers=4, thread_name_prefix='spark-rollup') as pool:
+            hourly_future = pool.submit(self.write_hourly_staging)
+            summary_futures = {
+                'plaza_revenue': pool.submit(lambda: self.by_plaza().collect()),
+                'vehicle_type': pool.submit(lambda: self.by_vehicle_type().collect()),
+                'peak_hour': pool.submit(lambda: self.peak_hours().collect())
+            }
+            hourly_future.result()
+            summaries = {metric: future.result() for metric, future in summary_futures.items()}
+        
+        self.df.unpersist()
+        
+        if progress:
+            progress(80, 'Merging hourly results into traffic_log')
+        merged = SparkRollupJob.merge_staging_into_traffic_log()
+        stored = self.store_summaries(summaries)
+        
+        return {
+            'run_id': self.run_id,
+            'traffic_log_rows': merged,
+            'summary_rows': stored
+        }
+    
+    @staticmethod
+    def merge_staging_into_traffic_log():
+        """
+        Upsert staged hourly aggregates into traffic_log with one statement
+        (ON CONFLICT on SQLite/PostgreSQL, ON DUPLICATE KEY UPDATE on MySQL)
+        
+        Returns:
+            Number of staged rows merged
+        """
+        dialect = db.engine.dialect.name
+        date_expr = 'date' if dialect == 'sqlite' else 'CAST(date AS DATE)'
+        traffic_log = TrafficLog.__tablename__
+        
+        staged_cells = db.session.execute(
+            text(f"SELECT plaza_id, date, hour FROM {TRAFFIC_LOG_STAGING_TABLE}")
+        ).all()
+        merged = len(staged_cells)
+        columns = '(plaza_id, date, hour, vehicle_count, total_revenue, traffic_level, created_at, updated_at)'
+        # updated_at moves only when the counts change, so online training
+        # does not relearn every re-merged cell
+        if dialect in ('mysql', 'mariadb'):
+            # No ON CONFLICT here: the derived table names the new values for ON DUPLICATE KEY.
+            # Assignments apply left to right, so updated_at is compared before the counts change
+            upsert = (
+                f"INSERT INTO {traffic_log} {columns} "
+                f"SELECT * FROM (SELECT plaza_id, {date_expr} AS staged_date, hour, "
+                f"vehicle_count AS new_vehicle_count, total_revenue AS new_total_revenue, "
+                f"traffic_level AS new_traffic_level, CURRENT_TIMESTAMP AS staged_at, :now AS staged_updated_at "
+                f"FROM {TRAFFIC_LOG_STAGING_TABLE}) AS staged "
+                f"ON DUPLICATE KEY UPDATE "
+                f"updated_at = IF(vehicle_count <> new_vehicle_count OR total_revenue <> new_total_revenue, "
+                f"staged_updated_at, updated_at), "
+                f"vehicle_count = new_vehicle_count, "
+                f"total_revenue = new_total_revenue, "
+                f"traffic_level = new_traffic_level"
+            )
+        else:
+            upsert = (
+                f"INSERT INTO {traffic_log} {columns} "
+                f"SELECT plaza_id, {date_expr}, hour, vehicle_count, total_revenue, traffic_level, CURRENT_TIMESTAMP, :now "
+                f"FROM {TRAFFIC_LOG_STAGING_TABLE} WHERE true "
+                f"ON CONFLICT (plaza_id, date, hour) DO UPDATE SET "
+                f"vehicle_count = excluded.vehicle_count, "
+                f"total_revenue = excluded.total_revenue, "
+                f"traffic_level = excluded.traffic_level, "
+                f"updated_at = excluded.updated_at "
+                f"WHERE {traffic_log}.vehicle_count <> excluded.vehicle_count "
+                f"OR {traffic_log}.total_revenue <> excluded.total_revenue"
+            )
+        # Bound from Python so it compares with ORM-written utcnow() stamps
+        db.session.execute(text(upsert), {'now': datetime.utcnow()})
+        db.session.commit()
+        
+        from app.services.baseline_service import TrafficBaselineService
+        from app.services.feature_store_service import FeatureStoreService
+        from app.services.anomaly_service import AnomalyDetectionService
+        TrafficBaselineService.invalidate()
+        cells = [
+            (plaza_id, datetime.strptime(str(date)[:10], '%Y-%m-%d').date(), hour)
+            for plaza_id, date, hour in staged_cells
+        ]
+        FeatureStoreService.refresh_for_cells(cells)
+        AnomalyDetectionService.score_cells(cells)
+        return merged
+    
+    def store_summaries(self, summaries):
+        """
+        Store the (small) collected summary aggregates for this run
+        """
+        created_at = datetime.utcnow()
+        rows = [
+            AnalyticsSummary(
+                run_id=self.run_id,
+                metric=metric,
+                dimension=str(row['dimension']),
+                vehicle_count=row['vehicle_count'],
+                total_revenue=round(float(row['total_revenue'] or 0), 2),
+                created_at=created_at
+            )
+            for metric, metric_rows in summaries.items()
+            for row in metric_rows
+        ]
+        db.session.add_all(rows)
+        db.session.commit()
+        return len(rows)
+
+def run_spark_rollup_job(job, source='jdbc', path=None):
+    """
+    Background job entry point for the executor-side rollup
+    
+    Args:
+        job: Job record used to report progress
+        source: 'jdbc' for a partitioned database read or 'files' for exports
+        path: Export path when source is 'files'
+    
+    Returns:
+        Rollup result dictionary
+    """
+    from app.services.spark_analysis_service import SparkAnalysisService
+    
+    job.update_progress(5, 'Starting Spark session')
+    spark = SparkAnalysisService.get_spark_analytics().spark
+    
+    if source == 'files':
+        if not path:
+            raise ValueError('An export path is required for the files source')
+        df = read_transactions_files(spark, path)
+    else:
+        df = read_transactions_jdbc(spark)
+    
+    result = SparkRollupJob(spark, df).run(progress=job.update_progress)
+    
+    # New hourly rows feed the incremental model
+    from app.services.online_training_service import submit_online_training
+    submit_online_training()
+    
+    result['message'] = (
+        f"Spark rollup completed: {result['traffic_log_rows']} hourly rows merged, "
+        f"{result['summary_rows']} summary rows stored"
+    )
+    return result
@@ -4,12 +4,22 @@ Toll Processing Service - Core business logic for toll transactions
 
 from app import db
 from app.models import (
-    TollTransaction, TollRate, Vehicle, Wallet, WalletTransaction, 
+    TollTransaction, Vehicle, Wallet, WalletTransaction, 
     PaymentMode, TransactionStatus, VehicleType
 )
+from app.services.dynamic_pricing_service import DynamicPricingService
+from app.services.rate_cache import TollRateCache
+from app.services.event_hub import EventHub
 from datetime import datetime
+import time
 import json
 
+# Rejection messages shared with the async ingestion service
+VEHICLE_REJECTED = 'Vehicle not found or inactive'
+RATE_NOT_CONFIGURED = 'Toll rate not configured for this vehicle type'
+WALLET_NOT_FOUND = 'Wallet not found'
+INSUFFICIENT_BALANCE = 'Insufficient wallet balance'
+
 class TollService:
     """
     Service class to handle toll processing and calculations
@@ -38,6 +48,9 @@ class TollService:
         """
         Calculate toll amount based on vehicle type, plaza, and time of day
         
+        The base TollRate amount (from the in-memory rate table) is scaled by
+        the published dynamic tariff multiplier for the plaza and hour.
+        
         Args:
             plaza_id: ID of the toll plaza
             vehicle_type: Type of vehicle (bike, car, truck, bus, heavy_vehicle)
@@ -49,40 +62,45 @@ class TollService:
         if timestamp is None:
             timestamp = datetime.utcnow()
         
-        current_time = timestamp.strftime('%H:%M')
-        
-        # Determine time slot (peak: 7-10 AM, 5-8 PM; normal: rest)
-        hour = int(timestamp.strftime('%H'))
+        TollRateCache.ensure_loaded()
+        DynamicPricingService.ensure_loaded()
+        return TollService.price_toll(plaza_id, vehicle_type, timestamp)
+    
+    @staticmethod
+    def get_time_slot(timestamp):
+        """
+        Rate time slot of a crossing (peak: 7-10 AM, 5-8 PM; normal: rest)
+        """
+        hour = timestamp.hour
         if (7 <= hour < 10) or (17 <= hour < 20):
-            time_slot = 'peak'
-        else:
-            time_slot = 'normal'
-        
-        # Query toll rate - find a rate that covers the current time
-        toll_rate = TollRate.query.filter(
-            TollRate.plaza_id == plaza_id,
-            TollRate.vehicle_type == vehicle_type,
-            TollRate.time_slot == time_slot
-        ).first()
+            return 'peak'
+        return 'normal'
+    
+    @staticmethod
+    def price_toll(plaza_id, vehicle_type, timestamp):
+        """
+        Toll details from the in-memory rate and tariff tables, without
+        queries (the caller keeps the tables loaded)
         
+        Returns:
+            Dictionary with toll details or None if rate not found
+        """
+        # Toll rate for the slot (falls back to the normal rate if peak not found)
+        toll_rate = TollRateCache.get_rate(plaza_id, vehicle_type, TollService.get_time_slot(timestamp))
         if not toll_rate:
-            # Fallback to normal rate if peak not found
-            toll_rate = TollRate.query.filter(
-                TollRate.plaza_id == plaza_id,
-                TollRate.vehicle_type == vehicle_type,
-                TollRate.time_slot == 'normal'
-            ).first()
-        
-        if toll_rate:
-            return {
-                'amount': toll_rate.amount,
-                'time_slot': toll_rate.time_slot,
-                'rate_id': toll_rate.rate_id,
-                'from_time': toll_rate.from_time,
-                'to_time': toll_rate.to_time
-            }
+            return None
         
-        return None
+        # Published dynamic tariff for this plaza and hour (1.0 if none)
+        multiplier = DynamicPricingService.get_multiplier(plaza_id, timestamp)
+        return {
+            'amount': round(toll_rate['amount'] * multiplier, 2),
+            'base_amount': toll_rate['amount'],
+            'multiplier': multiplier,
+            'time_slot': toll_rate['time_slot'],
+            'rate_id': toll_rate['rate_id'],
+            'from_time': toll_rate['from_time'],
+            'to_time': toll_rate['to_time']
+        }
     
     @staticmethod
     def process_toll_transaction(vehicle_id, plaza_id, payment_mode, operator_id=None, lane_no=1):
@@ -99,13 +117,14 @@ class TollService:
         Returns:
             Dictionary with transaction result (success, message, transaction details)
         """
+        started = time.perf_counter()
         try:
             # Fetch vehicle and validate
             vehicle = Vehicle.query.get(vehicle_id)
             if not vehicle or vehicle.status != 'active':
                 return {
                     'success': False,
-                    'message': 'Vehicle not found or inactive',
+                    'message': VEHICLE_REJECTED,
                     'transaction_id': None
                 }
             
@@ -114,7 +133,7 @@ class TollService:
             if not toll_details:
                 return {
                     'success': False,
-                    'message': 'Toll rate not configured for this vehicle type',
+                    'message': RATE_NOT_CONFIGURED,
                     'transaction_id': None
                 }
             
@@ -126,6 +145,8 @@ class TollService:
                     vehicle.user_id, toll_amount
                 )
                 if not payment_result['success']:
+                    EventHub.record_alert('warning', f"Payment declined for {vehicle.vehicle_number}: "
+                                          f"{payment_result['message']}", plaza_id, lane_no=lane_no)
                     return {
                         'success': False,
                         'message': payment_result['message'],
@@ -147,6 +168,9 @@ class TollService:
             db.session.add(toll_txn)
             db.session.commit()
             
+            from app.services.lane_metrics import LaneMetrics
+            LaneMetrics.record(plaza_id, lane_no, toll_amount, (time.perf_counter() - started) * 1000)
+            
             return {
                 'success': True,
                 'message': 'Toll transaction completed successfully',
@@ -183,10 +207,10 @@ class TollService:
             wallet = Wallet.query.filter_by(user_id=user_id).first()
             
             if not wallet:
-                return {'success': False, 'message': 'Wallet not found'}
+                return {'success': False, 'message': WALLET_NOT_FOUND}
             
             if wallet.balance < amount:
-                return {'success': False, 'message': 'Insufficient wallet balance'}
+                return {'success': False, 'message': INSUFFICIENT_BALANCE}
             
             # Deduct from wallet
             wallet.balance -= amount
@@ -264,9 +288,13 @@ class TollService:
             limit: Number of records to fetch
         
         Returns:
-            List of toll transactions
+            List of toll transactions (plaza eagerly loaded)
         """
-        return TollTransaction.query.filter_by(vehicle_id=vehicle_id).order_by(
+        from sqlalchemy.orm import joinedload
+        
+        return TollTransaction.query.options(
+            joinedload(TollTransaction.plaza)
+        ).filter_by(vehicle_id=vehicle_id).order_by(
             TollTransaction.timestamp.desc()
         ).limit(limit).all()
     
@@ -0,0 +1,337 @@
+"""
+Training Service - Offline traffic model training from the production database
+Hourly vehicle counts are streamed from TrafficLog (or aggregated on the fly
+from TollTransaction) in keyset-paginated chunks with compact dtypes, so
+memory is bounded by the number of (plaza, date, hour) cells rather than the
+number of transactions. Features are built with vectorized pandas, the model
+is trained with parallel jobs, evaluated on the most recent days and stored
+as a new model registry version.
+"""
+
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+from app import db
+from app.models import TrafficLog, TollTransaction, TrafficFeature
+from app.services.model_registry import ModelRegistry, DEFAULT_FEATURES
+from app.services.feature_store_service import FeatureStoreService, LAG_FEATURES
+
+FEATURE_SETS = {
+    'basic': DEFAULT_FEATURES,
+    'extended': DEFAULT_FEATURES + LAG_FEATURES
+}
+
+HOURLY_COLUMNS = ['plaza_id', 'date', 'hour', 'vehicle_count']
+
+def _downcast(frame):
+    """
+    Store hourly counts in the smallest dtypes that hold them
+    """
+    return frame.astype({
+        'plaza_id': np.int32,
+        'hour': np.int8,
+        'vehicle_count': np.int32
+    })
+
+class TrainingService:
+    """
+    Service class for the offline (batch) training pipeline
+    """
+    
+    @staticmethod
+    def iter_traffic_log_chunks(chunk_size=50000, since=None):
+        """
+        Stream TrafficLog rows with keyset pagination on log_id
+        
+        Yields:
+            DataFrames with HOURLY_COLUMNS
+        """
+        last_log_id = 0
+        
+        while True:
+            query = db.session.query(
+                TrafficLog.log_id,
+                TrafficLog.plaza_id,
+                TrafficLog.date,
+                TrafficLog.hour,
+                TrafficLog.vehicle_count
+            ).filter(TrafficLog.log_id > last_log_id)
+            if since:
+                query = query.filter(TrafficLog.date >= since)
+            rows = query.order_by(TrafficLog.log_id).limit(chunk_size).all()
+            
+            if not rows:
+                break
+            
+            frame = pd.DataFrame.from_records(rows, columns=['log_id'] + HOURLY_COLUMNS)
+            frame['date'] = pd.to_datetime(frame['date'])
+            last_log_id = rows[-1][0]
+            yield _downcast(frame[HOURLY_COLUMNS])
+            
+            if len(rows) < chunk_size:
+                break
+    
+    @staticmethod
+    def iter_transaction_chunks(chunk_size=50000, since=None):
+        """
+        Stream TollTransaction rows with keyset pagination on txn_id and
+        aggregate each chunk to hourly counts
+        
+        Yields:
+            DataFrames with HOURLY_COLUMNS (partial counts per chunk)
+        """
+        last_txn_id = 0
+        
+        while True:
+            query = db.session.query(
+                TollTransaction.txn_id,
+                TollTransaction.plaza_id,
+                TollTransaction.timestamp
+            ).filter(TollTransaction.txn_id > last_txn_id)
+            if since:
+                query = query.filter(TollTransaction.timestamp >= datetime.combine(since, datetime.min.time()))
+            rows = query.order_by(TollTransaction.txn_id).limit(chunk_size).all()
+            
+            if not rows:
+                break
+            
+            frame = pd.DataFrame.from_records(rows, columns=['txn_id', 'plaza_id', 'timestamp'])
+            timestamps = pd.to_datetime(frame['timestamp'])
+            hourly = frame.assign(
+                date=timestamps.dt.normalize(),
+                hour=timestamps.dt.hour
+            ).groupby(['plaza_id', 'date', 'hour']).size().rename('vehicle_count').reset_index()
+            last_txn_id = rows[-1][0]
+            yield _downcast(hourly)
+            
+            if len(rows) < chunk_size:
+                break
+    
+    @staticmethod
+    def load_hourly_counts(source='traffic_log', chunk_size=50000, since=None):
+        """
+        Load hourly counts for training from the chosen source
+        
+        Args:
+            source: 'traffic_log' or 'transactions'
+            chunk_size: Rows fetched per database round trip
+            since: Optional first date of the training window
+        
+        Returns:
+            DataFrame with HOURLY_COLUMNS, one row per (plaza, date, hour)
+        """
+        if source == 'transactions':
+            totals = None
+            pending = []
+            for chunk in TrainingService.iter_transaction_chunks(chunk_size, since):
+                pending.append(chunk)
+                # Fold partial counts regularly so memory tracks distinct cells
+                if len(pending) >= 20:
+                    totals = TrainingService._merge_counts(totals, pending)
+                    pending = []
+            if pending:
+                totals = TrainingService._merge_counts(totals, pending)
+            return totals if totals is not None else pd.DataFrame(columns=HOURLY_COLUMNS)
+        
+        chunks = list(TrainingService.iter_traffic_log_chunks(chunk_size, since))
+        if not chunks:
+            return pd.DataFrame(columns=HOURLY_COLUMNS)
+        return pd.concat(chunks, ignore_index=True)
+    
+    @staticmethod
+    def _merge_counts(totals, chunks):
+        frames = chunks if totals is None else [totals] + chunks
+        merged = pd.concat(frames, ignore_index=True).groupby(
+            ['plaza_id', 'date', 'hour'], as_index=False
+        )['vehicle_count'].sum()
+        return _downcast(merged)
+    
+    @staticmethod
+    def attach_stored_features(counts, chunk_size=50000, since=None):
+        """
+        Join feature store rows onto hourly counts
+        
+        TrafficFeature is streamed with keyset pagination on feature_id;
+        hours without a stored row get the prediction-time fallbacks.
+        
+        Returns:
+            counts with LAG_FEATURES columns added
+        """
+        chunks = []
+        last_feature_id = 0
+        
+        while True:
+            query = db.session.query(
+                TrafficFeature.feature_id,
+                TrafficFeature.plaza_id,
+                TrafficFeature.date,
+                TrafficFeature.hour,
+                *[getattr(TrafficFeature, name) for name in LAG_FEATURES]
+            ).filter(TrafficFeature.feature_id > last_feature_id)
+            if since:
+                query = query.filter(TrafficFeature.date >= since)
+            rows = query.order_by(TrafficFeature.feature_id).limit(chunk_size).all()
+            
+            if not rows:
+                break
+            
+            frame = pd.DataFrame.from_records(rows, columns=['feature_id', 'plaza_id', 'date', 'hour'] + LAG_FEATURES)
+            frame['date'] = pd.to_datetime(frame['date'])
+            chunks.append(frame.drop(columns='feature_id').astype({
+                'plaza_id': np.int32,
+                'hour': np.int8,
+                **{name: np.float32 for name in LAG_FEATURES}
+            }))
+            last_feature_id = rows[-1][0]
+            
+            if len(rows) < chunk_size:
+                break
+        
+        if chunks:
+            stored = pd.concat(chunks, ignore_index=True)
+        else:
+            stored = pd.DataFrame(columns=['plaza_id', 'date', 'hour'] + LAG_FEATURES)
+        
+        merged = counts.merge(stored, on=['plaza_id', 'date', 'hour'], how='left')
+        merged['is_holiday'] = merged['is_holiday'].fillna(0.0)
+        return FeatureStoreService.fill_missing(merged)
+    
+    @staticmethod
+    def build_features(counts, features=DEFAULT_FEATURES):
+        """
+        Build the model feature matrix with vectorized pandas
+        
+        Args:
+            counts: DataFrame with HOURLY_COLUMNS (plus any stored features)
+            features: Ordered feature names
+        
+        Returns:
+            Tuple of (X float32 array ordered as features, y array)
+        """
+        hours = counts['hour'].to_numpy()
+        columns = {
+            'plaza_id': counts['plaza_id'].to_numpy(),
+            'hour': hours,
+            'day_of_week': counts['date'].dt.dayofweek.to_numpy(),
+            'is_peak': ((hours >= 7) & (hours < 10)) | ((hours >= 17) & (hours < 20))
+        }
+        X = np.column_stack([
+            columns[name] if name in columns else counts[name].to_numpy()
+            for name in features
+        ]).astype(np.float32)
+        return X, counts['vehicle_count'].to_numpy(dtype=np.float32)
+    
+    @staticmethod
+    def evaluate(model, X, y):
+        """
+        Regression metrics on a held-out set
+        """
+        predicted = model.predict(X)
+        errors = predicted - y
+        total = np.sum((y - y.mean()) ** 2)
+        return {
+            'mae': round(float(np.mean(np.abs(errors))), 3),
+            'rmse': round(float(np.sqrt(np.mean(errors ** 2))), 3),
+            'r2': round(float(1 - np.sum(errors ** 2) / total), 4) if total > 0 else None,
+            'test_rows': int(len(y))
+        }
+    
+    @staticmethod
+    def train(source='traffic_log', chunk_size=50000, since_days=None, test_days=14,
+              n_estimators=100, max_depth=20, min_samples_leaf=2, n_jobs=-1,
+              max_rows=None, feature_set='basic', activate=True, progress=None):
+        """
+        Train, evaluate and register a RandomForest traffic model
+        
+        The most recent test_days days are held out for evaluation, so
+        metrics reflect forecasting forward in time.
+        
+        Args:
+            source: 'traffic_log' or 'transactions'
+            chunk_size: Rows fetched per database round trip
+            since_days: Only use the last N days of history (default: all)
+            test_days: Days held out for evaluation
+            n_estimators, max_depth, min_samples_leaf: Forest parameters
+            n_jobs: Parallel jobs for training (-1: all cores)
+            max_rows: Randomly sample at most this many training rows
+            feature_set: 'basic' or 'extended' (adds feature store columns)
+            activate: Serve the new version once registered
+            progress: Optional callback(percent, message)
+        
+        Returns:
+            Dictionary with success status, message, version and metrics
+        """
+        from sklearn.ensemble import RandomForestRegressor
+        
+        since = datetime.utcnow().date() - timedelta(days=since_days) if since_days else None
+        
+        if progress:
+            progress(5, f'Loading hourly counts from {source}')
+        counts = TrainingService.load_hourly_counts(source, chunk_size, since)
+        if len(counts) < 100:
+            return {'success': False, 'message': f'Not enough training data ({len(counts)} hourly rows)'}
+        
+        features = FEATURE_SETS[feature_set]
+        if feature_set != 'basic':
+            if progress:
+                progress(20, 'Joining feature store rows')
+            counts = TrainingService.attach_stored_features(counts, chunk_size, since)
+        
+        last_date = counts['date'].max()
+        is_test = (counts['date'] > last_date - pd.Timedelta(days=test_days)).to_numpy()
+        X, y = TrainingService.build_features(counts, features)
+        X_train, y_train = X[~is_test], y[~is_test]
+        X_test, y_test = X[is_test], y[is_test]
+        
+        if len(y_train) == 0 or len(y_test) == 0:
+            return {'success': False, 'message': 'History too short for the requested test window'}
+        
+        if max_rows and len(y_train) > max_rows:
+            sample = np.random.default_rng(42).choice(len(y_train), size=max_rows, replace=False)
+            X_train, y_train = X_train[sample], y_train[sample]
+        
+        if progress:
+            progress(30, f'Training on {len(y_train)} rows')
+        model = RandomForestRegressor(
+            n_estimators=n_estimators,
+            max_depth=max_depth,
+            min_samples_leaf=min_samples_leaf,
+            n_jobs=n_jobs,
+            random_state=42
+        )
+        model.fit(X_train, y_train)
+        
+        if progress:
+            progress(80, 'Evaluating on held-out days')
+        metrics = TrainingService.evaluate(model, X_test, y_test)
+        metrics['train_rows'] = int(len(y_train))
+        
+        metadata = ModelRegistry.register(
+            model,
+            features=features,
+            training_window={
+                'source': source,
+                'start': str(counts['date'].min().date()),
+                'end': str(last_date.date()),
+                'test_days': test_days
+            },
+            metrics=metrics,
+            activate=activate,
+            extra={
+                'training_mode': 'batch',
+                'feature_set': feature_set,
+                'params': {
+                    'n_estimators': n_estimators,
+                    'max_depth': max_depth,
+                    'min_samples_leaf': min_samples_leaf
+                }
+            }
+        )
+        
+        return {
+            'success': True,
+            'message': f"Model {metadata['version']} trained (MAE {metrics['mae']}, R2 {metrics['r2']})"
+                       + (' and activated' if activate else ''),
+            'version': metadata['version'],
+            'metrics': metrics
+        }
@@ -0,0 +1,153 @@
+"""
+Worker Lifecycle - Pre-fork warm-up, post-fork reset and graceful reloads
+Under gunicorn with preload_app (gunicorn.conf.py) the master process
+imports the app once, fills the in-memory tables the crossing path reads
+(toll rates, published tariffs, the active traffic model and its arrays,
+traffic baselines) and freezes them out of the garbage collector, then
+forks the workers. Workers start warm and share those pages copy-on-write
+instead of each loading its own copy. What must not be shared is reset
+after the fork: pooled database connections, thread pools and per-process
+counters. Reloads are signals to the gunicorn master.
+"""
+
+import gc
+import os
+import signal
+import time
+from datetime import datetime
+from app import db
+
+class WorkerLifecycle:
+    """
+    Service class for the pre-fork / post-fork hooks and server reloads
+    """
+    
+    @staticmethod
+    def warm(app):
+        """
+        Load the caches the request path reads, before workers are forked
+        
+        Each step is independent: a missing table or model is logged and the
+        worker loads it lazily on first use as before.
+        
+        Args:
+            app: Flask application
+        
+        Returns:
+            Dictionary of step name -> seconds taken (None when it failed)
+        """
+        from app.services.rate_cache import TollRateCache
+        from app.services.dynamic_pricing_service import DynamicPricingService
+        from app.services.model_registry import ModelRegistry
+        from app.services.baseline_service import TrafficBaselineService
+        from app.services import lane_metrics  # Imported once here, shared by all workers
+        
+        steps = [
+            ('toll_rates', TollRateCache.load),
+            ('tariffs', DynamicPricingService.load),
+            ('traffic_model', ModelRegistry.get_active),
+            ('baselines', TrafficBaselineService.ensure_loaded)
+        ]
+        timings = {}
+        with app.app_context():
+            for name, load in steps:
+                started = time.perf_counter()
+                try:
+                    load()
+                    timings[name] = round(time.perf_counter() - started, 4)
+                except Exception as e:
+                    db.session.rollback()
+                    timings[name] = None
+                    print(f"[{datetime.now()}] Warm-up step {name} failed: {str(e)}")
+            
+            # Connections opened here must not be inherited by the workers
+            db.session.remove()
+            db.engine.dispose()
+        
+        # Keep the collector from touching (and so copying) the shared objects
+        gc.collect()
+        gc.freeze()
+        print(f"[{datetime.now()}] Caches warmed before fork: {timings}")
+        return timings
+    
+    @staticmethod
+    def after_fork(app):
+        """
+        Reset per-process state in a freshly forked worker
+        
+        Args:
+            app: Flask application
+        """
+        from app.services.job_service import JobService
+        from app.services.request_metrics import RequestMetrics
+        
+        with app.app_context():
+            # Drop pooled connections inherited from the master without closing them
+            db.engine.dispose(close=False)
+        
+        # Threads do not survive a fork: pools and counters start afresh
+        JobService._executor = None
+        RequestMetrics._started_at = time.time()
+    
+    # ========================================================================
+    # Reloads (signals to the gunicorn master)
+    # ========================================================================
+    
+    @staticmethod
+    def read_pid(pidfile):
+        """
+        PID in a gunicorn pidfile, or None when missing or stale
+        """
+        try:
+            with open(pidfile) as f:
+                pid = int(f.read().strip())
+            os.kill(pid, 0)
+            return pid
+        except (OSError, ValueError):
+            return None
+    
+    @staticmethod
+    def reload(pidfile, upgrade=False, timeout=60):
+        """
+        Gracefully reload the gunicorn server
+        
+        Without upgrade the master re-reads its configuration and replaces
+        the workers one generation at a time (HUP); with preload_app the new
+        workers are forked from the already loaded application, so code
+        changes are not picked up. With upgrade a new master is started on
+        the new code (USR2) and, once it is serving, the old master finishes
+        its in-flight requests and exits (TERM).
+        
+        Args:
+            pidfile: Pidfile written by the gunicorn master
+            upgrade: Start a new master on the current code
+            timeout: Seconds to wait for the new master
+        
+        Returns:
+            Dictionary with success, message and the master PID(s)
+        """
+        pid = WorkerLifecycle.read_pid(pidfile)
+        if pid is None:
+            return {'success': False, 'message': f'No running gunicorn master found in {pidfile}'}
+        
+        if not upgrade:
+            os.kill(pid, signal.SIGHUP)
+            return {'success': True, 'message': f'Workers of master {pid} are being replaced', 'pid': pid}
+        
+        # The new master writes '<pidfile>.2' and takes over the pidfile once
+        # the old master has exited
+        os.kill(pid, signal.SIGUSR2)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            new_pid = WorkerLifecycle.read_pid(f'{pidfile}.2')
+            if new_pid is not None and new_pid != pid:
+                os.kill(pid, signal.SIGTERM)
+                return {
+                    'success': True,
+                    'message': f'Master {new_pid} is serving the new code, master {pid} is shutting down',
+                    'pid': new_pid,
+                    'old_pid': pid
+                }
+            time.sleep(0.5)
+        
+        return {'success': False, 'message': f'New master did not start within {timeout}s; master {pid} keeps serving'}
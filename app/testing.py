@@ -0,0 +1,63 @@
+"""
+Smart Toll Management System - pytest fixtures
+Load with `pytest -p app.testing` or `pytest_plugins = ['app.testing']` in a
+conftest.py.
+
+query_budget fails a test when a block issues more statements than allowed
+or repeats a statement template often enough to be a probable N+1 pattern:
+
+    def test_receipt_queries(client, query_budget):
+        with query_budget(4):
+            client.get('/toll/receipt/1')
+"""
+
+import tempfile
+from contextlib import contextmanager
+import pytest
+from app import create_app, db
+from app.services.query_inspector import QueryInspector
+
+@pytest.fixture
+def app():
+    """
+    Application on an in-memory SQLite database, background refreshers off
+    """
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'MODEL_REGISTRY_DIR': tempfile.mkdtemp(),
+        'PREDICTION_CACHE_REFRESH_SECONDS': 0
+    })
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def query_budget():
+    """
+    Context manager factory asserting a statement budget
+    
+    Args (of the returned factory):
+        max_queries: Most statements the block may execute
+        n_plus_one_threshold: Repeats of one template reported as N+1
+            (None: only the budget is checked)
+    
+    Yields:
+        QueryLog of the block, for further assertions
+    """
+    @contextmanager
+    def budget(max_queries, n_plus_one_threshold=5):
+        with QueryInspector.track() as log:
+            yield log
+        
+        report = log.report(n_plus_one_threshold)
+        assert log.count <= max_queries, f"Query budget of {max_queries} exceeded:\n{report}"
+        if n_plus_one_threshold:
+            assert not log.n_plus_one(n_plus_one_threshold), f"Probable N+1 queries:\n{report}"
+    
+    return budget
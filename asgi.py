@@ -0,0 +1,11 @@
+"""
+Smart Toll Management System - ASGI entry point for the ingestion API
+Lane controllers post crossing events here; one process holds thousands of
+open connections on its event loop:
+
+    uvicorn asgi:app --host 0.0.0.0 --port 8001 --timeout-keep-alive 75
+"""
+
+from app.ingest import create_ingest_app
+
+app = create_ingest_app()
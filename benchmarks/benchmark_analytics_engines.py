@@ -0,0 +1,132 @@
+"""
+Benchmark - Local (pandas/NumPy) vs Spark analytics engine
+
+Generates synthetic toll transactions at increasing sizes, runs both
+analytics backends over the same data, checks that their results are
+identical and prints timings to help choose the crossover point for
+ANALYTICS_BACKEND.
+
+Usage:
+    python benchmarks/benchmark_analytics_engines.py [--sizes 10000,100000,1000000] [--no-spark]
+"""
+
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.services.analytics_engine import (
+    LocalAnalyticsBackend, SparkAnalyticsBackend, FrameTransactionSource
+)
+
+VEHICLE_TYPES = np.array(['bike', 'car', 'truck', 'bus', 'heavy_vehicle'])
+
+def generate_transactions(num_records, num_plazas=4, seed=42):
+    """
+    Generate synthetic transactions with a realistic hourly profile
+    """
+    rng = np.random.default_rng(seed)
+    hour_weights = np.full(24, 1.0)
+    hour_weights[7:10] = 3.0
+    hour_weights[17:20] = 3.0
+    hour_weights[:6] = 0.3
+    hour_weights /= hour_weights.sum()
+    
+    days = rng.integers(0, 365, num_records)
+    hours = rng.choice(24, size=num_records, p=hour_weights)
+    minutes = rng.integers(0, 60, num_records)
+    timestamps = (
+        np.datetime64('2023-01-01T00:00')
+        + days.astype('timedelta64[D]')
+        + hours.astype('timedelta64[h]')
+        + minutes.astype('timedelta64[m]')
+    )
+    plaza_ids = rng.integers(1, num_plazas + 1, num_records)
+    
+    return pd.DataFrame({
+        'txn_id': np.arange(1, num_records + 1),
+        'plaza_id': plaza_ids,
+        'plaza_name': pd.Series(plaza_ids).map(lambda p: f'Plaza {p}'),
+        'vehicle_type': VEHICLE_TYPES[rng.integers(0, len(VEHICLE_TYPES), num_records)],
+        'amount': np.round(rng.uniform(20, 250, num_records), 2),
+        'timestamp': pd.to_datetime(timestamps)
+    })
+
+def time_backend(backend, source, repeats):
+    """
+    Run a backend several times and return (best seconds, last results)
+    """
+    best = None
+    results = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        results = backend.run(source)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    results.pop('backend', None)
+    results.pop('elapsed_seconds', None)
+    return best, results
+
+def create_spark_session():
+    """
+    Start a local SparkSession, or return None when Spark is unavailable
+    """
+    try:
+        from pyspark.sql import SparkSession
+        
+        spark = SparkSession.builder \
+            .appName("AnalyticsEngineBenchmark") \
+            .master("local[*]") \
+            .config("spark.sql.shuffle.partitions", "8") \
+            .getOrCreate()
+        spark.sparkContext.setLogLevel("ERROR")
+        return spark
+    except Exception as e:
+        print(f"[Benchmark] Spark unavailable, skipping Spark engine: {str(e)}")
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='10000,100000,1000000',
+                        help='Comma separated record counts')
+    parser.add_argument('--chunk-size', type=int, default=50000,
+                        help='Chunk size used when streaming into the local engine')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--no-spark', action='store_true', help='Only benchmark the local engine')
+    args = parser.parse_args()
+    
+    sizes = [int(s) for s in args.sizes.split(',')]
+    spark = None if args.no_spark else create_spark_session()
+    
+    print(f"{'records':>12} {'local (s)':>12} {'spark (s)':>12} {'speedup':>10} {'identical':>10}")
+    crossover = None
+    
+    for size in sizes:
+        frame = generate_transactions(size)
+        source = FrameTransactionSource(frame, chunk_size=args.chunk_size)
+        
+        local_time, local_results = time_backend(LocalAnalyticsBackend(), source, args.repeats)
+        
+        if spark is not None:
+            spark_time, spark_results = time_backend(SparkAnalyticsBackend(spark), source, args.repeats)
+            identical = local_results == spark_results
+            speedup = local_time / spark_time
+            if crossover is None and speedup > 1:
+                crossover = size
+            print(f"{size:>12,} {local_time:>12.3f} {spark_time:>12.3f} {speedup:>9.2f}x {str(identical):>10}")
+        else:
+            print(f"{size:>12,} {local_time:>12.3f} {'-':>12} {'-':>10} {'-':>10}")
+    
+    if spark is not None:
+        if crossover:
+            print(f"\n[Benchmark] Spark overtakes the local engine at ~{crossover:,} records")
+        else:
+            print("\n[Benchmark] Local engine was faster at every size tested")
+        spark.stop()
+
+if __name__ == '__main__':
+    main()
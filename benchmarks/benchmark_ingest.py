@@ -0,0 +1,167 @@
+"""
+Benchmark - Async crossing ingestion with many open lane connections
+
+Seeds a database (as benchmark_server_throughput.py), starts the ingestion
+API (asgi.py) in one uvicorn process and opens --connections keep-alive
+connections, each acting as a lane controller that posts one crossing every
+--interval seconds. Reports how many connections the single process held,
+offered versus committed events per second, latency percentiles and how
+often the queue pushed back with 503.
+
+Usage:
+    python benchmarks/benchmark_ingest.py [--connections 2000] [--interval 1.0] [--duration 20]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+from benchmark_server_throughput import ROOT, seed
+
+API_KEY = 'benchmark-lane-key'
+
+async def lane(host, port, plaza_id, vehicle_ids, interval, deadline, stats):
+    """
+    One lane controller on one keep-alive connection
+    """
+    rng = random.Random()
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError:
+        stats['connect_errors'] += 1
+        return
+    stats['open'] += 1
+    stats['max_open'] = max(stats['max_open'], stats['open'])
+    await asyncio.sleep(rng.random() * interval)  # Spread the lanes over the interval
+    
+    try:
+        while time.monotonic() < deadline:
+            body = json.dumps({
+                'event_id': uuid.uuid4().hex,
+                'vehicle_id': rng.choice(vehicle_ids),
+                'plaza_id': plaza_id,
+                'lane_no': rng.randint(1, 8),
+                'payment_mode': 'wallet'
+            }).encode()
+            started = time.perf_counter()
+            writer.write(b'POST /ingest/crossings HTTP/1.1\r\nHost: bench\r\nContent-Type: application/json\r\n'
+                         b'X-Api-Key: %s\r\nContent-Length: %d\r\n\r\n%s' % (API_KEY.encode(), len(body), body))
+            await writer.drain()
+            
+            status = int((await reader.readline()).split()[1])
+            length = 0
+            retry_after = interval
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b''):
+                    break
+                name, _, value = line.decode().partition(':')
+                if name.lower() == 'content-length':
+                    length = int(value)
+                elif name.lower() == 'retry-after':
+                    retry_after = float(value)
+            await reader.readexactly(length)
+            stats['sent'] += 1
+            
+            if status == 200:
+                stats['latencies'].append(time.perf_counter() - started)
+            elif status == 503:
+                stats['refused'] += 1
+                await asyncio.sleep(retry_after)  # Back off as a lane controller should
+                continue
+            else:
+                stats['errors'] += 1
+            await asyncio.sleep(interval)
+    except (OSError, asyncio.IncompleteReadError, IndexError, ValueError):
+        stats['errors'] += 1
+    finally:
+        stats['open'] -= 1
+        writer.close()
+
+async def drive(port, plaza_id, vehicle_ids, connections, interval, duration):
+    stats = {'open': 0, 'max_open': 0, 'sent': 0, 'refused': 0, 'errors': 0, 'connect_errors': 0, 'latencies': []}
+    deadline = time.monotonic() + duration
+    lanes = []
+    for i in range(connections):
+        lanes.append(asyncio.create_task(lane('127.0.0.1', port, plaza_id, vehicle_ids, interval, deadline, stats)))
+        if i % 200 == 199:
+            await asyncio.sleep(0.05)  # Open connections in waves, not one burst
+    await asyncio.gather(*lanes)
+    return stats
+
+def start_server(port, database_url):
+    env = dict(os.environ, DATABASE_URL=database_url, PREDICTION_CACHE_REFRESH_SECONDS='0', INGEST_API_KEY=API_KEY)
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'asgi:app', '--host', '127.0.0.1', '--port', str(port),
+         '--backlog', '4096', '--timeout-keep-alive', '75', '--log-level', 'warning'],
+        cwd=ROOT, env=env
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError('uvicorn exited during startup')
+        try:
+            import urllib.request
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/ingest/health', timeout=1)
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError('uvicorn did not start within 60s')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--connections', type=int, default=2000, help='Open lane connections')
+    parser.add_argument('--interval', type=float, default=1.0, help='Seconds between crossings per lane')
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--vehicles', type=int, default=500)
+    parser.add_argument('--database-url', default=None, help='Database to seed and serve (default: temporary SQLite file)')
+    parser.add_argument('--port', type=int, default=8766)
+    args = parser.parse_args()
+    
+    # Each connection is a file descriptor on both ends
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    
+    workdir = tempfile.mkdtemp(prefix='toll-ingest-')
+    database_url = args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    try:
+        plaza_id, vehicle_ids = seed(database_url, args.vehicles)
+        server = start_server(args.port, database_url)
+        try:
+            started = time.perf_counter()
+            stats = asyncio.run(drive(args.port, plaza_id, vehicle_ids, args.connections, args.interval,
+                                      args.duration))
+            elapsed = time.perf_counter() - started
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=30)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    
+    latencies = sorted(stats['latencies'])
+    
+    def percentile(q):
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else 0.0
+    
+    print(f"\n[Benchmark] Ingestion, one uvicorn process, {args.connections} lanes x 1 crossing / "
+          f"{args.interval:g}s for {args.duration:g}s")
+    print(f"  connections held:   {stats['max_open']} (connect errors {stats['connect_errors']})")
+    print(f"  offered:            {args.connections / args.interval:.0f} events/s")
+    print(f"  committed:          {len(latencies) / elapsed:.0f} events/s ({len(latencies)} events)")
+    print(f"  refused (503):      {stats['refused']}")
+    print(f"  errors:             {stats['errors']}")
+    print(f"  latency p50/p95/p99: {percentile(0.5):.1f} / {percentile(0.95):.1f} / {percentile(0.99):.1f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""
+Benchmark - Pickled vs memory-mapped traffic model across worker processes
+
+Trains a RandomForest shaped like the traffic predictor, stores it both as a
+pickle and as flat tree arrays, then starts N worker processes per format.
+Each worker loads the model, makes its first prediction and reports load
+time, first-prediction latency, RSS and PSS (proportional set size, which
+splits shared pages between the processes mapping them; Linux only).
+
+Usage:
+    python benchmarks/benchmark_model_memory.py [--workers 4] [--trees 200] [--samples 200000]
+"""
+
+import argparse
+import multiprocessing
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.services.flat_forest import FlatForest
+
+def read_memory_kb():
+    """
+    Return (rss_kb, pss_kb) of the current process, None where unavailable
+    """
+    rss = pss = None
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                if line.startswith('Rss:'):
+                    rss = int(line.split()[1])
+                elif line.startswith('Pss:'):
+                    pss = int(line.split()[1])
+    except OSError:
+        try:
+            import resource
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        except ImportError:
+            pass
+    return rss, pss
+
+def make_features(num_rows, seed):
+    """
+    Random [plaza_id, hour, day_of_week, is_peak] rows
+    """
+    rng = np.random.default_rng(seed)
+    hours = rng.integers(0, 24, num_rows)
+    is_peak = ((hours >= 7) & (hours < 10)) | ((hours >= 17) & (hours < 20))
+    return np.column_stack([
+        rng.integers(1, 51, num_rows),
+        hours,
+        rng.integers(0, 7, num_rows),
+        is_peak
+    ]).astype(np.float64)
+
+def worker(fmt, path, barrier, results):
+    """
+    Load the model in a fresh process and report timings and memory
+    """
+    baseline_rss, baseline_pss = read_memory_kb()
+    features = make_features(144, seed=os.getpid())
+    
+    started = time.perf_counter()
+    if fmt == 'pickle':
+        with open(path, 'rb') as f:
+            model = pickle.load(f)
+    else:
+        model = FlatForest.load(path, mmap_mode='r')
+    load_seconds = time.perf_counter() - started
+    
+    started = time.perf_counter()
+    model.predict(features)
+    first_predict_seconds = time.perf_counter() - started
+    
+    # Measure once every worker holds the model, so PSS reflects sharing
+    barrier.wait()
+    rss, pss = read_memory_kb()
+    results.put({
+        'format': fmt,
+        'load_ms': load_seconds * 1000,
+        'first_predict_ms': first_predict_seconds * 1000,
+        'rss_mb': (rss - baseline_rss) / 1024 if rss and baseline_rss else None,
+        'pss_mb': (pss - baseline_pss) / 1024 if pss and baseline_pss else None
+    })
+    barrier.wait()
+
+def run_workers(fmt, path, num_workers):
+    """
+    Start workers for one format and collect their reports
+    """
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(num_workers)
+    results = context.Queue()
+    processes = [
+        context.Process(target=worker, args=(fmt, path, barrier, results))
+        for _ in range(num_workers)
+    ]
+    for process in processes:
+        process.start()
+    reports = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return reports
+
+def summarize(reports, key):
+    values = [r[key] for r in reports if r[key] is not None]
+    return np.mean(values) if values else float('nan')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--trees', type=int, default=200)
+    parser.add_argument('--samples', type=int, default=200000)
+    args = parser.parse_args()
+    
+    from sklearn.ensemble import RandomForestRegressor
+    
+    print(f"[Benchmark] Training RandomForest ({args.trees} trees, {args.samples:,} samples)")
+    X = make_features(args.samples, seed=42)
+    rng = np.random.default_rng(7)
+    y = 40 + 60 * X[:, 3] + 2 * X[:, 0] + rng.normal(0, 15, len(X))
+    model = RandomForestRegressor(n_estimators=args.trees, min_samples_leaf=2, n_jobs=-1, random_state=42)
+    model.fit(X, y)
+    
+    workdir = tempfile.mkdtemp(prefix='model-memory-')
+    try:
+        pickle_path = os.path.join(workdir, 'model.pkl')
+        arrays_path = os.path.join(workdir, 'arrays')
+        with open(pickle_path, 'wb') as f:
+            pickle.dump(model, f, protocol=pickle.HIGHEST_PROTOCOL)
+        flat = FlatForest.from_model(model)
+        flat.save(arrays_path)
+        
+        check = make_features(1000, seed=1)
+        identical = np.allclose(model.predict(check), flat.predict(check))
+        arrays_mb = sum(
+            os.path.getsize(os.path.join(arrays_path, name)) for name in os.listdir(arrays_path)
+        ) / 1024 / 1024
+        print(f"[Benchmark] Pickle {os.path.getsize(pickle_path) / 1024 / 1024:.1f} MB, "
+              f"flat arrays {arrays_mb:.1f} MB, predictions identical: {identical}")
+        
+        print(f"\n{'format':>8} {'load (ms)':>10} {'1st pred (ms)':>14} "
+              f"{'RSS/worker (MB)':>16} {'PSS/worker (MB)':>16} {'total PSS (MB)':>15}")
+        for fmt, path in (('pickle', pickle_path), ('mmap', arrays_path)):
+            reports = run_workers(fmt, path, args.workers)
+            pss = summarize(reports, 'pss_mb')
+            print(f"{fmt:>8} {summarize(reports, 'load_ms'):>10.1f} "
+                  f"{summarize(reports, 'first_predict_ms'):>14.1f} "
+                  f"{summarize(reports, 'rss_mb'):>16.1f} {pss:>16.1f} "
+                  f"{pss * args.workers:>15.1f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
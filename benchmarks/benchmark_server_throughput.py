@@ -0,0 +1,227 @@
+"""
+Benchmark - Toll crossing throughput under gunicorn
+
+Seeds a database with one plaza, its toll rates and a fleet of vehicles with
+funded wallets, then starts the production server (gunicorn.conf.py:
+preloaded app, warm caches) with 1, 2, 4... workers and drives
+POST /toll/process from client processes for a fixed time at each size.
+Reports requests per second, latency percentiles and the speedup over one
+worker, showing how the crossing path scales with cores.
+
+The clients run on the same machine, so leave cores for them (or point
+--url at a server started elsewhere). SQLite serializes writes across
+processes; use --database-url postgresql://... for the scaling figures.
+
+Usage:
+    python benchmarks/benchmark_server_throughput.py [--workers 1,2,4] [--clients 8] [--duration 10]
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+ADMIN_EMAIL = 'bench-admin@toll.com'
+ADMIN_PASSWORD = 'bench-password'
+RATES = {'bike': 30.0, 'car': 65.0, 'truck': 190.0, 'bus': 185.0, 'heavy_vehicle': 300.0}
+
+def seed(database_url, vehicles):
+    """
+    Create the tables and the benchmark plaza, admin and vehicles (idempotent)
+    
+    Returns:
+        (plaza_id, vehicle ids)
+    """
+    from app import create_app, db
+    from app.models import User, UserRole, Vehicle, VehicleType, TollPlaza, TollRate, Wallet
+    
+    app = create_app({'SQLALCHEMY_DATABASE_URI': database_url, 'PREDICTION_CACHE_REFRESH_SECONDS': 0})
+    with app.app_context():
+        db.create_all()
+        
+        admin = User.query.filter_by(email=ADMIN_EMAIL).first()
+        if admin is None:
+            admin = User(name='Benchmark Admin', email=ADMIN_EMAIL, phone='9000000000', role=UserRole.ADMIN)
+            admin.set_password(ADMIN_PASSWORD)
+            db.session.add(admin)
+        
+        plaza = TollPlaza.query.filter_by(plaza_name='Benchmark Plaza').first()
+        if plaza is None:
+            plaza = TollPlaza(plaza_name='Benchmark Plaza', location='NH-0 km 0', num_lanes=8,
+                              city='Benchmark', state='Benchmark')
+            db.session.add(plaza)
+            db.session.flush()
+            for vehicle_type, amount in RATES.items():
+                db.session.add(TollRate(plaza_id=plaza.plaza_id, vehicle_type=VehicleType(vehicle_type),
+                                        from_time='00:00', to_time='23:59', time_slot='normal', amount=amount))
+        
+        existing = Vehicle.query.filter(Vehicle.vehicle_number.like('BENCH%')).count()
+        types = list(VehicleType)
+        for i in range(existing, vehicles):
+            owner = User(name=f'Benchmark Driver {i}', email=f'bench-{i}@toll.com', phone=f'8{i:09d}')
+            owner.set_password(ADMIN_PASSWORD)
+            db.session.add(owner)
+            db.session.flush()
+            db.session.add(Wallet(user_id=owner.user_id, balance=1e9))
+            db.session.add(Vehicle(vehicle_number=f'BENCH{i:05d}', vehicle_type=types[i % len(types)],
+                                   user_id=owner.user_id))
+        db.session.commit()
+        
+        vehicle_ids = [row.vehicle_id for row in
+                       db.session.query(Vehicle.vehicle_id).filter(Vehicle.vehicle_number.like('BENCH%')).all()]
+        return plaza.plaza_id, vehicle_ids
+
+def start_server(workers, port, database_url, pidfile):
+    """
+    Start gunicorn with the production configuration and wait until it serves
+    """
+    env = dict(
+        os.environ,
+        DATABASE_URL=database_url,
+        WEB_CONCURRENCY=str(workers),
+        GUNICORN_BIND=f'127.0.0.1:{port}',
+        GUNICORN_PIDFILE=pidfile,
+        GUNICORN_MAX_REQUESTS='0',
+        PREDICTION_CACHE_REFRESH_SECONDS='0'
+    )
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    import requests
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError('gunicorn exited during startup')
+        try:
+            requests.get(f'http://127.0.0.1:{port}/auth/login', timeout=1)
+            time.sleep(1)  # Let the remaining workers finish booting
+            return server
+        except requests.RequestException:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError('gunicorn did not start within 60s')
+
+def stop_server(server):
+    server.send_signal(signal.SIGTERM)
+    try:
+        server.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        server.kill()
+
+def run_client(url, plaza_id, vehicle_ids, payment_mode, duration, seed_value):
+    """
+    One client process: log in, then post crossings until the time is up
+    
+    Returns:
+        (latencies in seconds of successful crossings, error count)
+    """
+    import requests
+    rng = random.Random(seed_value)
+    session = requests.Session()
+    session.post(f'{url}/auth/admin-login', data={'email': ADMIN_EMAIL, 'password': ADMIN_PASSWORD})
+    
+    latencies = []
+    errors = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        payload = {
+            'vehicle_id': rng.choice(vehicle_ids),
+            'plaza_id': plaza_id,
+            'payment_mode': payment_mode,
+            'lane_no': rng.randint(1, 8)
+        }
+        started = time.perf_counter()
+        try:
+            response = session.post(f'{url}/toll/process', json=payload, timeout=30)
+            ok = response.status_code == 200 and response.json().get('success')
+        except (requests.RequestException, ValueError):
+            ok = False
+        if ok:
+            latencies.append(time.perf_counter() - started)
+        else:
+            errors += 1
+    return latencies, errors
+
+def drive(url, plaza_id, vehicle_ids, payment_mode, clients, duration):
+    """
+    Run the client processes against a server and summarize the results
+    """
+    with multiprocessing.Pool(clients) as pool:
+        results = pool.starmap(run_client, [
+            (url, plaza_id, vehicle_ids, payment_mode, duration, i) for i in range(clients)
+        ])
+    latencies = sorted(latency for client_latencies, _ in results for latency in client_latencies)
+    errors = sum(client_errors for _, client_errors in results)
+    
+    def percentile(q):
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else 0.0
+    
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput': len(latencies) / duration,
+        'p50_ms': percentile(0.50),
+        'p95_ms': percentile(0.95),
+        'p99_ms': percentile(0.99),
+        'mean_ms': statistics.mean(latencies) * 1000 if latencies else 0.0
+    }
+
+def main():
+    cores = multiprocessing.cpu_count()
+    default_workers = ','.join(str(n) for n in sorted({1, 2, 4, 8, cores}) if n <= cores) or '1'
+    
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', default=default_workers, help='Comma-separated worker counts')
+    parser.add_argument('--clients', type=int, default=8, help='Client processes')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds per worker count')
+    parser.add_argument('--vehicles', type=int, default=500)
+    parser.add_argument('--payment-mode', choices=['wallet', 'cash', 'upi'], default='wallet')
+    parser.add_argument('--database-url', default=None, help='Database to seed and serve (default: temporary SQLite file)')
+    parser.add_argument('--url', default=None, help='Drive an already running server instead (uses --database-url to seed)')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+    
+    workdir = tempfile.mkdtemp(prefix='toll-bench-')
+    database_url = args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    try:
+        plaza_id, vehicle_ids = seed(database_url, args.vehicles)
+        print(f"[Benchmark] /toll/process, {args.clients} clients x {args.duration:.0f}s, "
+              f"{len(vehicle_ids)} vehicles, {args.payment_mode} payments, {cores} cores")
+        print(f"[Benchmark] Database: {database_url.split('@')[-1]}\n")
+        
+        if args.url:
+            runs = [('-', drive(args.url.rstrip('/'), plaza_id, vehicle_ids, args.payment_mode,
+                                args.clients, args.duration))]
+        else:
+            runs = []
+            for workers in [int(n) for n in args.workers.split(',') if n.strip()]:
+                server = start_server(workers, args.port, database_url, os.path.join(workdir, 'gunicorn.pid'))
+                try:
+                    runs.append((workers, drive(f'http://127.0.0.1:{args.port}', plaza_id, vehicle_ids,
+                                                args.payment_mode, args.clients, args.duration)))
+                finally:
+                    stop_server(server)
+        
+        base = runs[0][1]['throughput'] or 1.0
+        print(f"{'workers':>7} {'req/s':>8} {'speedup':>7} {'p50 (ms)':>9} {'p95 (ms)':>9} "
+              f"{'p99 (ms)':>9} {'errors':>6}")
+        for workers, result in runs:
+            print(f"{workers:>7} {result['throughput']:>8.1f} {result['throughput'] / base:>6.2f}x "
+                  f"{result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f} {result['p99_ms']:>9.1f} "
+                  f"{result['errors']:>6}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Benchmark - Application startup time
+
+Starts fresh interpreters and times the phases a worker or CLI command goes
+through before it can do useful work: importing the app package, running
+create_app(), serving a first request, and a whole `import run` process (the
+path every `flask <command>` takes). Reports the median and best of N runs,
+whether heavy optional dependencies were imported on the way, and the
+slowest imports (python -X importtime, cumulative).
+
+Usage:
+    python benchmarks/benchmark_startup.py [--runs 5] [--top 10] [--json]
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+HEAVY_MODULES = ['numpy', 'pandas', 'sklearn', 'pyspark', 'requests']
+
+PHASES_SNIPPET = """
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+flask_app = app.create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://'})
+created = time.perf_counter()
+flask_app.test_client().get('/auth/login')
+served = time.perf_counter()
+print(json.dumps({
+    'import_app': imported - started,
+    'create_app': created - imported,
+    'first_request': served - created,
+    'heavy_modules': [name for name in %r if name in sys.modules]
+}))
+""" % (HEAVY_MODULES,)
+
+IMPORT_TIME = re.compile(r'import time:\s+\d+ \|\s+(\d+) \|(\s*)(\S+)')
+
+def run_phases(env):
+    """
+    One fresh interpreter: phase timings and -X importtime output
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PHASES_SNIPPET],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    phases = json.loads(result.stdout.strip().splitlines()[-1])
+    imports = {}
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME.match(line)
+        if match and len(match.group(2)) <= 3:  # Top-level and direct children
+            imports[match.group(3)] = int(match.group(1)) / 1e6
+    return phases, imports
+
+def run_cli_process(env):
+    """
+    Wall time of a fresh `import run` (what every flask CLI command pays)
+    """
+    started = time.perf_counter()
+    subprocess.run([sys.executable, '-c', 'import run'], cwd=ROOT, env=env, capture_output=True, check=True)
+    return time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10, help='Slowest imports listed')
+    parser.add_argument('--json', action='store_true', help='Print a JSON summary (for tracking in CI)')
+    args = parser.parse_args()
+    
+    # In-memory database: nothing is created on disk
+    env = dict(os.environ, DATABASE_URL='sqlite://', PYTHONDONTWRITEBYTECODE='0')
+    
+    samples = {'import_app': [], 'create_app': [], 'first_request': [], 'cli_process': []}
+    imports = {}
+    heavy = set()
+    for _ in range(args.runs):
+        phases, run_imports = run_phases(env)
+        for name in ('import_app', 'create_app', 'first_request'):
+            samples[name].append(phases[name])
+        heavy.update(phases['heavy_modules'])
+        for module, seconds in run_imports.items():
+            imports.setdefault(module, []).append(seconds)
+        samples['cli_process'].append(run_cli_process(env))
+    
+    summary = {
+        'runs': args.runs,
+        'phases': {
+            name: {'median_s': round(statistics.median(values), 4), 'best_s': round(min(values), 4)}
+            for name, values in samples.items()
+        },
+        'heavy_modules_imported': sorted(heavy),
+        'slowest_imports': [
+            {'module': module, 'median_s': round(statistics.median(values), 4)}
+            for module, values in sorted(imports.items(), key=lambda item: -statistics.median(item[1]))[:args.top]
+        ]
+    }
+    
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+    
+    print(f"[Benchmark] Startup over {args.runs} fresh interpreters\n")
+    print(f"{'phase':>14} {'median (ms)':>12} {'best (ms)':>10}")
+    for name, values in summary['phases'].items():
+        print(f"{name:>14} {values['median_s'] * 1000:>12.1f} {values['best_s'] * 1000:>10.1f}")
+    print(f"\nHeavy optional modules imported: {', '.join(summary['heavy_modules_imported']) or 'none'}")
+    print(f"\n{'slowest imports (cumulative)':<40} {'median (ms)':>12}")
+    for item in summary['slowest_imports']:
+        print(f"{item['module']:<40} {item['median_s'] * 1000:>12.1f}")
+
+if __name__ == '__main__':
+    main()
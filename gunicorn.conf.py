@@ -0,0 +1,48 @@
+"""
+Smart Toll Management System - gunicorn configuration (Linux/macOS)
+
+    gunicorn -c gunicorn.conf.py
+    flask reload-server [--upgrade]
+
+The app is loaded and its caches warmed once in the master, then forked into
+WEB_CONCURRENCY workers that share them copy-on-write. Settings are read
+from the environment like the app configuration.
+"""
+
+import multiprocessing
+import os
+
+wsgi_app = 'wsgi:app'
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+pidfile = os.environ.get('GUNICORN_PIDFILE', 'gunicorn.pid')
+
+# One worker per core for the CPU-bound crossing path; threads keep
+# long-lived responses (the admin event stream) from blocking a worker
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# Each open event stream holds one of those threads for its lifetime; cap the
+# streams per worker below the thread count so crossings are still served
+os.environ.setdefault('EVENT_MAX_CLIENTS', str(threads // 2))
+if int(os.environ['EVENT_MAX_CLIENTS']) >= threads:
+    raise RuntimeError(f"EVENT_MAX_CLIENTS ({os.environ['EVENT_MAX_CLIENTS']}) must be below "
+                       f"GUNICORN_THREADS ({threads})")
+
+# Load the app once in the master and fork warm workers
+preload_app = True
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+# Recycle workers periodically (jitter keeps them from restarting together)
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 1000))
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG')  # '-' for stdout
+errorlog = '-'
+
+def post_fork(server, worker):
+    from app.services.worker_lifecycle import WorkerLifecycle
+    WorkerLifecycle.after_fork(server.app.wsgi())
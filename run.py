@@ -8,6 +8,8 @@ from app.models import (
     UserRole, VehicleType, PaymentMode
 )
 from datetime import datetime
+import click
+import os
 
 app = create_app()
 
@@ -28,6 +30,12 @@ def make_shell_context():
         'PaymentMode': PaymentMode
     }
 
+@app.cli.command()
+def create_db():
+    """Create missing database tables (run after deploys that add models)"""
+    db.create_all()
+    print(f"[{datetime.now()}] Database tables created")
+
 @app.cli.command()
 def init_db():
     """Initialize database with sample data"""
@@ -134,6 +142,188 @@ def init_db():
     db.session.commit()
     print(f"[{datetime.now()}] Database initialized successfully with sample data!")
 
+@app.cli.command()
+@click.option('--source', type=click.Choice(['traffic_log', 'transactions']), default='traffic_log',
+              help='Train on hourly traffic logs or aggregate raw transactions')
+@click.option('--since-days', type=int, default=None, help='Only use the last N days of history')
+@click.option('--test-days', default=14, help='Most recent days held out for evaluation')
+@click.option('--chunk-size', default=50000, help='Rows fetched per database round trip')
+@click.option('--n-estimators', default=100, help='Number of trees')
+@click.option('--max-depth', default=20, help='Maximum tree depth')
+@click.option('--n-jobs', default=-1, help='Parallel training jobs (-1: all cores)')
+@click.option('--max-rows', type=int, default=None, help='Sample at most this many training rows')
+@click.option('--features', 'feature_set', type=click.Choice(['basic', 'extended']), default='basic',
+              help='Basic calendar features or extended with feature store lags')
+@click.option('--activate/--no-activate', default=True, help='Serve the new model version')
+def train_model(source, since_days, test_days, chunk_size, n_estimators, max_depth, n_jobs, max_rows, feature_set, activate):
+    """Train the traffic model from the database and register a new version"""
+    from app.services.training_service import TrainingService
+    
+    result = TrainingService.train(
+        source=source,
+        chunk_size=chunk_size,
+        since_days=since_days,
+        test_days=test_days,
+        n_estimators=n_estimators,
+        max_depth=max_depth,
+        n_jobs=n_jobs,
+        max_rows=max_rows,
+        feature_set=feature_set,
+        activate=activate,
+        progress=lambda percent, message: print(f"[{datetime.now()}] {message}")
+    )
+    print(f"[{datetime.now()}] {result['message']}")
+    if not result['success']:
+        raise SystemExit(1)
+
+@app.cli.command()
+@click.argument('path')
+@click.option('--chunk-size', default=50000, help='Rows fetched per database round trip')
+def export_transactions(path, chunk_size):
+    """Export toll transactions to a Parquet file for Spark jobs"""
+    from app.services.analytics_engine import DatabaseTransactionSource
+    
+    try:
+        rows = DatabaseTransactionSource(chunk_size=chunk_size).write_parquet(path)
+    except ImportError as exc:
+        raise click.ClickException(str(exc))
+    print(f"[{datetime.now()}] Exported {rows} transactions to {path}")
+
+@app.cli.command()
+@click.option('--source', type=click.Choice(['jdbc', 'files']), default='jdbc',
+              help='Read via partitioned JDBC or from exported files')
+@click.option('--path', default=None, help='Export path when --source=files')
+def spark_rollup(source, path):
+    """Run the Spark rollup and write results to traffic_log and analytics_summary"""
+    from app.services.job_service import Job
+    from app.services.spark_jobs import run_spark_rollup_job
+    
+    job = Job('spark_rollup')
+    result = run_spark_rollup_job(job, source=source, path=path)
+    print(f"[{datetime.now()}] {result['message']} (run {result['run_id']})")
+
+@app.cli.command()
+@click.option('--days', type=int, default=None, help='Only rebuild the last N days (default: full history)')
+def rebuild_features(days):
+    """Backfill the traffic feature store from traffic_log"""
+    from app.services.feature_store_service import FeatureStoreService
+    
+    written = FeatureStoreService.rebuild(days)
+    print(f"[{datetime.now()}] Feature store rebuilt: {written} rows written")
+
+@app.cli.command()
+@click.option('--days', type=int, default=None, help='Only score the last N days (default: full history)')
+def detect_anomalies(days):
+    """Score traffic_log hours against their seasonal baseline (backfill)"""
+    from app.services.anomaly_service import AnomalyDetectionService
+    
+    result = AnomalyDetectionService.backfill(days)
+    print(f"[{datetime.now()}] Anomaly detection: {result['hours_scored']} hours scored, "
+          f"{result['anomalies']} anomalies stored")
+
+@app.cli.command()
+def train_online():
+    """Update the online traffic model with new TrafficLog rows"""
+    from app.services.job_service import Job
+    from app.services.online_training_service import run_online_training_job
+    
+    result = run_online_training_job(Job('online_training'))
+    print(f"[{datetime.now()}] {result['message']}")
+
+@app.cli.command()
+@click.option('--version', default=None, help='Model version to export (default: active version)')
+def export_model(version):
+    """Export a traffic model as memory-mappable flat tree arrays"""
+    from app.services.model_registry import ModelRegistry
+    
+    result = ModelRegistry.export_arrays(version)
+    print(f"[{datetime.now()}] {result['message']}")
+    if not result['success']:
+        raise SystemExit(1)
+
+@app.cli.command()
+@click.option('--hours-ahead', default=24, help='Hours after the current one to price (1-24)')
+@click.option('--notes', default=None, help='Note stored with the schedule')
+def publish_tariffs(hours_ahead, notes):
+    """Publish dynamic tariff multipliers from traffic forecasts"""
+    from app.services.dynamic_pricing_service import DynamicPricingService
+    
+    result = DynamicPricingService.publish(hours_ahead, notes=notes)
+    print(f"[{datetime.now()}] {result['message']}")
+    if not result['success']:
+        raise SystemExit(1)
+
+@app.cli.command()
+@click.option('--pidfile', default=lambda: os.environ.get('GUNICORN_PIDFILE', 'gunicorn.pid'),
+              help='Pidfile of the gunicorn master (see gunicorn.conf.py)')
+@click.option('--upgrade', is_flag=True, help='Start a new master on the current code, then retire the old one')
+@click.option('--timeout', default=60, help='Seconds to wait for the new master with --upgrade')
+def reload_server(pidfile, upgrade, timeout):
+    """Gracefully reload the gunicorn production server"""
+    from app.services.worker_lifecycle import WorkerLifecycle
+    
+    result = WorkerLifecycle.reload(pidfile, upgrade=upgrade, timeout=timeout)
+    print(f"[{datetime.now()}] {result['message']}")
+    if not result['success']:
+        raise SystemExit(1)
+
+@app.cli.command()
+@click.option('--plaza-id', type=int, required=True, help='Plaza to simulate')
+@click.option('--source', type=click.Choice(['transactions', 'traffic_log', 'forecast']), default='transactions',
+              help='Replay recorded crossings, hourly volumes or the forecast')
+@click.option('--days', default=365, help='History replayed for transactions and traffic_log')
+@click.option('--hours-ahead', default=24, help='Hours simulated for the forecast source')
+@click.option('--lanes', default='2,3,4', help='Comma-separated open lane counts')
+@click.option('--heavy-lanes', default='0', help='Comma-separated dedicated heavy vehicle lane counts')
+@click.option('--arrival-scale', default='1.0', help='Comma-separated traffic growth factors')
+@click.option('--service-scale', default='1.0', help='Comma-separated service time factors')
+@click.option('--cash-share', default=None, help='Comma-separated cash payment shares (rest wallet)')
+@click.option('--workers', default=4, help='Scenario worker processes')
+def simulate_queues(plaza_id, source, days, hours_ahead, lanes, heavy_lanes, arrival_scale, service_scale,
+                    cash_share, workers):
+    """Simulate lane queues for a grid of plaza configurations"""
+    import time
+    from datetime import timedelta
+    from app.services.queue_simulator import QueueSimulatorService, run_scenarios, scenario_grid
+    
+    def values(text, cast):
+        return [cast(value) for value in text.split(',') if value.strip()]
+    
+    end = datetime.utcnow()
+    start = end - timedelta(days=days)
+    if source == 'transactions':
+        arrivals = QueueSimulatorService.load_transaction_arrivals(plaza_id, start, end)
+    elif source == 'traffic_log':
+        arrivals = QueueSimulatorService.load_traffic_log_arrivals(plaza_id, start, end)
+    else:
+        arrivals = QueueSimulatorService.load_forecast_arrivals(plaza_id, hours_ahead)
+    
+    options = {
+        'lanes': values(lanes, int),
+        'heavy_lanes': values(heavy_lanes, int),
+        'arrival_scale': values(arrival_scale, float),
+        'service_scale': values(service_scale, float)
+    }
+    if cash_share:
+        options['payment_mix'] = [{'cash': share, 'wallet': 1.0 - share} for share in values(cash_share, float)]
+    scenarios = scenario_grid(**options)
+    
+    started = time.perf_counter()
+    results = run_scenarios(arrivals, scenarios, workers)
+    elapsed = time.perf_counter() - started
+    print(f"[{datetime.now()}] Simulated {len(arrivals['time'])} arrivals x {len(scenarios)} scenarios "
+          f"in {elapsed:.2f}s")
+    
+    print(f"{'lanes':>5} {'heavy':>5} {'growth':>6} {'service':>7} {'cash':>5} "
+          f"{'mean_wait':>9} {'p95_wait':>9} {'max_queue':>9} {'over_target':>11}")
+    for result in results:
+        scenario = result['scenario']
+        cash = scenario['payment_mix']['cash'] if scenario['payment_mix'] else None
+        print(f"{scenario['lanes']:>5} {scenario['heavy_lanes']:>5} {scenario['arrival_scale']:>6.2f} "
+              f"{scenario['service_scale']:>7.2f} {cash if cash is not None else '-':>5} "
+              f"{result.get('mean_wait_seconds', 0):>9} {result.get('p95_wait_seconds', 0):>9} "
+              f"{result.get('max_queue_length', 0):>9} {result.get('over_target_share', 0):>11}")
+
 if __name__ == '__main__':
     # Initialize database on first run
     with app.app_context():
@@ -3,6 +3,8 @@ from app.models import User, UserRole
 
 app = create_app()
 with app.app_context():
+    db.create_all()
+    
     # Update admin user role
     admin = User.query.filter_by(email='admin@example.com').first()
     if admin:
@@ -0,0 +1,97 @@
+"""
+Shared fixtures: the app/client/query_budget fixtures of app.testing, users
+with a logged-in client, and a local stub HTTP server standing in for
+external services.
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from app import db
+from app.models import User, UserRole, Wallet
+
+pytest_plugins = ['app.testing']
+
+@pytest.fixture
+def make_user(app):
+    """
+    Factory creating a user (with a wallet) in the given role
+    """
+    created = []
+    
+    def make(role=UserRole.USER, balance=1000.0):
+        user = User(name=f'{role.value} {len(created)}', email=f'{role.value}{len(created)}@example.com', role=role)
+        user.set_password('secret')
+        user.wallet = Wallet(balance=balance)
+        db.session.add(user)
+        db.session.commit()
+        created.append(user)
+        return user
+    
+    return make
+
+def login(client, user):
+    """
+    Log a test client in as user without going through the login form
+    """
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.user_id)
+        session['_fresh'] = True
+    return client
+
+class StubServer:
+    """
+    Local HTTP server answering GETs from a route table
+    
+    routes maps a path to (status, body) or to 'drop' (close the connection
+    without answering); hits counts requests per path.
+    """
+    
+    def __init__(self):
+        self.routes = {}
+        self.delay = 0.0
+        self.hits = {}
+        self._lock = threading.Lock()
+        stub = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with stub._lock:
+                    stub.hits[self.path] = stub.hits.get(self.path, 0) + 1
+                if stub.delay:
+                    time.sleep(stub.delay)
+                route = stub.routes.get(self.path, (404, {'message': 'not found'}))
+                if route == 'drop':
+                    self.close_connection = True
+                    return
+                status, body = route
+                payload = body if isinstance(body, bytes) else json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+    
+    def start(self):
+        self._thread.start()
+    
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+@pytest.fixture
+def stub_server():
+    server = StubServer()
+    server.start()
+    yield server
+    server.stop()
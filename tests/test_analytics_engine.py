@@ -0,0 +1,21 @@
+"""
+Parquet exports and file sources without pyarrow installed.
+"""
+
+import sys
+import pytest
+from app.services.analytics_engine import ColumnarFileTransactionSource, DatabaseTransactionSource
+
+@pytest.fixture
+def no_pyarrow(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'pyarrow', None)
+    monkeypatch.setitem(sys.modules, 'pyarrow.parquet', None)
+
+def test_parquet_export_explains_the_missing_dependency(app, no_pyarrow, tmp_path):
+    with pytest.raises(ImportError, match='pip install pyarrow'):
+        DatabaseTransactionSource().write_parquet(str(tmp_path / 'transactions.parquet'))
+
+def test_parquet_source_explains_the_missing_dependency(no_pyarrow, tmp_path):
+    source = ColumnarFileTransactionSource(str(tmp_path / 'transactions.parquet'))
+    with pytest.raises(ImportError, match='pip install pyarrow'):
+        list(source.iter_chunks())
@@ -0,0 +1,60 @@
+"""
+Anomaly scoring of freshly aggregated hours.
+"""
+
+from datetime import datetime, timedelta
+import pytest
+from app import db
+from app.models import TollPlaza, TrafficAnomaly, TrafficLog
+from app.services.anomaly_service import AnomalyDetectionService
+from app.services.event_hub import EventHub
+
+WEEKS = 5
+
+@pytest.fixture
+def alerts(monkeypatch):
+    raised = []
+    monkeypatch.setattr(EventHub, 'record_alert', staticmethod(lambda level, message, **details: raised.append(message)))
+    return raised
+
+def log_hours(counts):
+    """
+    Five weeks of 100 vehicles at each of the last three hours, then the
+    given counts for this week's hours (keyed by hours before now)
+    """
+    plaza = TollPlaza(plaza_name='North', location='NH1', city='Delhi', state='Delhi')
+    db.session.add(plaza)
+    db.session.flush()
+    current = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    cells = []
+    for hours_ago, count in counts.items():
+        slot = current - timedelta(hours=hours_ago)
+        for week in range(1, WEEKS + 1):
+            past = slot - timedelta(weeks=week)
+            db.session.add(TrafficLog(plaza_id=plaza.plaza_id, date=past.date(), hour=past.hour, vehicle_count=100))
+        db.session.add(TrafficLog(plaza_id=plaza.plaza_id, date=slot.date(), hour=slot.hour, vehicle_count=count))
+        cells.append((plaza.plaza_id, slot.date(), slot.hour))
+    db.session.commit()
+    return cells
+
+def test_hour_in_progress_is_not_scored(app, alerts):
+    # Ten minutes into the hour: a tenth of the usual count
+    cells = log_hours({0: 10, 1: 100, 2: 100})
+    result = AnomalyDetectionService.score_cells(cells)
+    
+    assert result['hours_scored'] == 2
+    assert result['anomalies'] == 0
+    assert TrafficAnomaly.query.count() == 0
+    assert alerts == []
+
+def test_only_new_anomalies_alert(app, alerts):
+    cells = log_hours({0: 10, 1: 100, 2: 300})
+    first = AnomalyDetectionService.score_cells(cells)
+    assert (first['anomalies'], first['new_anomalies']) == (1, 1)
+    assert len(alerts) == 1
+    
+    # The next aggregation run re-scores the same days
+    second = AnomalyDetectionService.score_cells(cells)
+    assert (second['anomalies'], second['new_anomalies']) == (1, 0)
+    assert len(alerts) == 1
+    assert TrafficAnomaly.query.one().direction == 'spike'
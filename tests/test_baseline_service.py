@@ -0,0 +1,47 @@
+"""
+Baseline matrix lookups under concurrent invalidation.
+"""
+
+from datetime import datetime, timedelta
+from app import db
+from app.models import TollPlaza, TrafficLog
+from app.services.baseline_service import TrafficBaselineService
+
+def add_plaza_history(counts_by_hour, days=14):
+    plaza = TollPlaza(plaza_name='North', location='NH1', city='Delhi', state='Delhi')
+    db.session.add(plaza)
+    db.session.flush()
+    today = datetime.utcnow().date()
+    for offset in range(1, days + 1):
+        for hour, count in counts_by_hour.items():
+            db.session.add(TrafficLog(plaza_id=plaza.plaza_id, date=today - timedelta(days=offset),
+                                      hour=hour, vehicle_count=count))
+    db.session.commit()
+    return plaza
+
+def test_lookup_survives_invalidation_after_load(app, monkeypatch):
+    plaza = add_plaza_history({8: 120, 14: 40})
+    TrafficBaselineService.invalidate()
+    ensure_loaded = TrafficBaselineService.ensure_loaded
+    
+    def load_then_invalidate():
+        # Another request invalidates between the load and the read
+        ensure_loaded()
+        TrafficBaselineService.invalidate()
+    
+    monkeypatch.setattr(TrafficBaselineService, 'ensure_loaded', staticmethod(load_then_invalidate))
+    mean, std, counts, confidence = TrafficBaselineService.lookup([plaza.plaza_id], datetime.utcnow().date(), [8, 14])
+    
+    assert mean.tolist() == [[120.0, 40.0]]
+    assert counts.tolist() == [[2, 2]]
+
+def test_lookup_after_new_plaza_change(app):
+    first = add_plaza_history({8: 100})
+    TrafficBaselineService.rebuild()
+    
+    # A row for a plaza not in the matrix forces a rebuild on the next lookup
+    second = add_plaza_history({8: 60}, days=7)
+    TrafficBaselineService.apply_change(second.plaza_id, datetime.utcnow().date() - timedelta(days=1), 8, None, 60)
+    mean, _, _, _ = TrafficBaselineService.lookup([first.plaza_id, second.plaza_id], datetime.utcnow().date(), [8])
+    
+    assert mean.tolist() == [[100.0], [60.0]]
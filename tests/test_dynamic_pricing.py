@@ -0,0 +1,68 @@
+"""
+Tariff schedules whose forecast window crosses midnight.
+"""
+
+from datetime import datetime, timedelta
+import pytest
+from app import db
+from app.models import TollPlaza, TrafficLog
+from app.services import dynamic_pricing_service, prediction_service
+from app.services.baseline_service import TrafficBaselineService
+from app.services.dynamic_pricing_service import DynamicPricingService
+from app.services.prediction_cache import PredictionCache
+from app.services.prediction_service import PredictionService
+
+TODAY = datetime.utcnow().date()
+
+class LateEvening(datetime):
+    @classmethod
+    def utcnow(cls):
+        return cls.combine(TODAY, datetime.min.time()).replace(hour=22, minute=30)
+
+@pytest.fixture
+def plaza(app, monkeypatch):
+    """
+    A plaza that is quiet on today's weekday and busy on tomorrow's
+    """
+    plaza = TollPlaza(plaza_name='North', location='NH1', city='Delhi', state='Delhi')
+    db.session.add(plaza)
+    db.session.flush()
+    tomorrow = (TODAY + timedelta(days=1)).weekday()
+    db.session.add_all([
+        TrafficLog(plaza_id=plaza.plaza_id, date=date, hour=hour,
+                   vehicle_count=200 if date.weekday() == tomorrow else 50)
+        for date in (TODAY - timedelta(days=offset) for offset in range(1, 15))
+        for hour in range(24)
+    ])
+    db.session.commit()
+    
+    monkeypatch.setattr(prediction_service, 'datetime', LateEvening)
+    monkeypatch.setattr(dynamic_pricing_service, 'datetime', LateEvening)
+    PredictionCache.clear()
+    TrafficBaselineService.invalidate()
+    yield plaza.plaza_id
+    PredictionCache.clear()
+
+def test_slots_after_midnight_use_the_next_day(plaza):
+    schedule = DynamicPricingService.compute_schedule(hours_ahead=4, plaza_ids=[plaza])
+    
+    slots = [(entry['date'], entry['hour'], entry['predicted_vehicles']) for entry in schedule['entries']]
+    tomorrow = TODAY + timedelta(days=1)
+    assert slots == [(TODAY, 23, 50), (tomorrow, 0, 200), (tomorrow, 1, 200), (tomorrow, 2, 200)]
+    
+    # Tomorrow's hours are cached under tomorrow's date only
+    found, _ = PredictionCache.get_many([plaza], tomorrow, [0, 1, 2], None)
+    assert [p['predicted_vehicles'] for p in found[plaza]] == [200, 200, 200]
+    found, _ = PredictionCache.get_many([plaza], TODAY, [0, 1, 2], None)
+    assert found == {}
+
+def test_lookups_past_midnight_hit_the_warmed_entries(app, plaza, monkeypatch):
+    app.config['PREDICTION_CACHE_WARM_HOURS'] = 4
+    PredictionService.warm_cache()
+    
+    def recompute(*args, **kwargs):
+        raise AssertionError('warmed hours were predicted again')
+    
+    monkeypatch.setattr(PredictionService, 'get_historical_baseline_bulk', staticmethod(recompute))
+    predictions = PredictionService.get_predictions([plaza], TODAY, 4, None)[plaza]
+    assert [(p['hour'], p['predicted_vehicles']) for p in predictions] == [(23, 50), (0, 200), (1, 200), (2, 200)]
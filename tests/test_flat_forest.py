@@ -0,0 +1,44 @@
+"""
+Flat forest export: only estimators whose predictions it reproduces.
+"""
+
+import numpy as np
+import pytest
+from sklearn.ensemble import AdaBoostRegressor, BaggingRegressor, ExtraTreesRegressor, RandomForestRegressor
+from sklearn.tree import DecisionTreeRegressor, ExtraTreeRegressor
+from app.services import flat_forest
+from app.services.flat_forest import FlatForest
+from app.services.model_registry import ModelRegistry
+
+def training_data():
+    rng = np.random.RandomState(0)
+    X = rng.uniform(0, 24, size=(400, 4))
+    y = 100 + 40 * np.sin(X[:, 0] / 4) + 10 * X[:, 1] + rng.normal(0, 5, 400)
+    return X, y
+
+@pytest.mark.parametrize('model', [
+    RandomForestRegressor(n_estimators=20, max_depth=8, random_state=0),
+    ExtraTreesRegressor(n_estimators=20, max_depth=8, random_state=0),
+    DecisionTreeRegressor(max_depth=10, random_state=0),
+    ExtraTreeRegressor(random_state=0)
+], ids=lambda model: type(model).__name__)
+def test_flat_predictions_match_model(model):
+    X, y = training_data()
+    model.fit(X, y)
+    assert flat_forest.supports(model)
+    np.testing.assert_allclose(FlatForest.from_model(model).predict(X), model.predict(X), rtol=1e-9)
+
+@pytest.mark.parametrize('model', [
+    AdaBoostRegressor(DecisionTreeRegressor(max_depth=4), n_estimators=10, random_state=0),
+    BaggingRegressor(DecisionTreeRegressor(), n_estimators=10, max_features=2, random_state=0)
+], ids=lambda model: type(model).__name__)
+def test_other_tree_ensembles_are_not_exported(app, model):
+    X, y = training_data()
+    model.fit(X, y)
+    assert not flat_forest.supports(model)
+    
+    # Registered as a pickle only, so the registry serves model.predict
+    ModelRegistry.register(model, version='v1')
+    loaded = ModelRegistry.load_version('v1')
+    assert loaded.model.__class__ is model.__class__
+    np.testing.assert_allclose(loaded.model.predict(X), model.predict(X))
@@ -0,0 +1,300 @@
+"""
+Authentication, event checks and batch writes of the ingestion API
+"""
+
+import asyncio
+import contextlib
+import os
+from datetime import datetime, timedelta
+import pytest
+from starlette.testclient import TestClient
+from app import create_app, db
+from app.ingest import create_ingest_app
+from app.models import TollPlaza, TollRate, TollTransaction, User, Vehicle, VehicleType, Wallet
+from app.services.dynamic_pricing_service import DynamicPricingService
+from app.services.ingestion_service import IngestionPipeline, parse_event
+from app.services.rate_cache import TollRateCache
+from app.services.toll_service import (
+    TollService, VEHICLE_REJECTED, RATE_NOT_CONFIGURED, WALLET_NOT_FOUND, INSUFFICIENT_BALANCE
+)
+
+CONFIG = {
+    'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+    'PREDICTION_CACHE_REFRESH_SECONDS': 0
+}
+
+def test_refuses_to_start_without_api_key():
+    with pytest.raises(RuntimeError, match='INGEST_API_KEY'):
+        create_ingest_app(dict(CONFIG, INGEST_API_KEY=None))
+
+@pytest.fixture
+def ingest_client():
+    # Not entered as a context manager: the pipeline is not started, and
+    # requests rejected before the queue never need it
+    return TestClient(create_ingest_app(dict(CONFIG, INGEST_API_KEY='lane-secret')))
+
+@pytest.mark.parametrize('headers', [{}, {'X-Api-Key': 'wrong'}, {'X-Api-Key': ''}])
+def test_rejects_missing_or_wrong_key(ingest_client, headers):
+    response = ingest_client.post('/ingest/crossings', json={'vehicle_id': 1, 'plaza_id': 1}, headers=headers)
+    assert response.status_code == 401
+
+def test_accepts_matching_key(ingest_client):
+    # Authenticated, then refused as malformed: the request got past the key check
+    response = ingest_client.post('/ingest/crossings', json=[], headers={'X-Api-Key': 'lane-secret'})
+    assert response.status_code == 400
+
+def test_timestamp_defaults_to_server_time():
+    before = datetime.utcnow()
+    event = parse_event({'vehicle_id': 1, 'plaza_id': 1}, 300)
+    assert before <= event['timestamp'] <= datetime.utcnow()
+
+def test_timestamp_within_skew_is_kept():
+    sent = datetime.utcnow() - timedelta(seconds=60)
+    event = parse_event({'vehicle_id': 1, 'plaza_id': 1, 'timestamp': sent.isoformat() + 'Z'}, 300)
+    assert event['timestamp'] == sent
+
+@pytest.mark.parametrize('offset', [timedelta(hours=-6), timedelta(minutes=10), timedelta(days=-365)])
+def test_timestamp_beyond_skew_is_rejected(offset):
+    # A backdated off-peak time must not price a peak crossing
+    sent = datetime.utcnow() + offset
+    with pytest.raises(ValueError, match='server time'):
+        parse_event({'vehicle_id': 1, 'plaza_id': 1, 'timestamp': sent.isoformat()}, 300)
+
+def test_skewed_event_is_refused_before_the_queue(ingest_client):
+    response = ingest_client.post('/ingest/crossings', headers={'X-Api-Key': 'lane-secret'}, json={
+        'vehicle_id': 1, 'plaza_id': 1, 'timestamp': '2024-01-15T08:30:00Z'
+    })
+    assert response.status_code == 400
+    assert 'server time' in response.json()['message']
+
+# ============================================================================
+# Pipeline writes (a database file: the async engine opens its own connections)
+# ============================================================================
+
+RATE = 50.0
+
+@pytest.fixture
+def toll_db(tmp_path):
+    """
+    A plaza with a car rate and a car whose wallet holds 120
+    """
+    flask_app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp_path, 'toll.db')}",
+        'MODEL_REGISTRY_DIR': str(tmp_path),
+        'PREDICTION_CACHE_REFRESH_SECONDS': 0
+    })
+    TollRateCache.invalidate()
+    DynamicPricingService._checked_at = None
+    with flask_app.app_context():
+        db.create_all()
+        plaza = TollPlaza(plaza_name='North', location='NH1', city='Delhi', state='Delhi')
+        owner = User(name='Owner', email='owner@example.com')
+        owner.set_password('secret')
+        owner.wallet = Wallet(balance=120.0)
+        db.session.add_all([plaza, owner])
+        db.session.flush()
+        db.session.add(TollRate(plaza_id=plaza.plaza_id, vehicle_type=VehicleType.CAR, from_time='00:00',
+                                to_time='23:59', time_slot='normal', amount=RATE))
+        car = Vehicle(vehicle_number='DL01AB0001', vehicle_type=VehicleType.CAR, user_id=owner.user_id)
+        db.session.add(car)
+        db.session.commit()
+        ids = {'plaza_id': plaza.plaza_id, 'vehicle_id': car.vehicle_id, 'wallet_id': owner.wallet.wallet_id,
+               'owner_id': owner.user_id}
+        db.session.remove()
+    yield flask_app, ids
+    TollRateCache.invalidate()
+    DynamicPricingService._checked_at = None
+
+def run_pipeline(flask_app, body):
+    """
+    Start a pipeline, run body(pipeline) on its loop, stop it
+    """
+    async def main():
+        pipeline = IngestionPipeline(flask_app)
+        await pipeline.start()
+        try:
+            return await body(pipeline)
+        finally:
+            await pipeline.stop()
+    return asyncio.run(main())
+
+def crossing(ids, **fields):
+    return parse_event(dict({'vehicle_id': ids['vehicle_id'], 'plaza_id': ids['plaza_id']}, **fields), 300)
+
+def wallet_balance(flask_app, ids):
+    with flask_app.app_context():
+        try:
+            return db.session.get(Wallet, ids['wallet_id']).balance
+        finally:
+            db.session.remove()
+
+def test_retried_event_id_is_charged_once(toll_db):
+    flask_app, ids = toll_db
+    
+    async def post_twice(pipeline):
+        first = await pipeline.submit([crossing(ids, event_id='lane1-0001')])[0]
+        # The controller never saw the answer and sends the crossing again
+        second = await pipeline.submit([crossing(ids, event_id='lane1-0001')])[0]
+        return first, second
+    
+    first, second = run_pipeline(flask_app, post_twice)
+    assert first['success'] and second['success']
+    assert second['transaction_id'] == first['transaction_id']
+    assert second['message'] == 'Toll transaction already recorded'
+    assert wallet_balance(flask_app, ids) == 120.0 - RATE
+
+def test_repeat_of_a_queued_event_shares_its_result(toll_db):
+    flask_app, ids = toll_db
+    
+    async def post_together(pipeline):
+        futures = pipeline.submit([crossing(ids, event_id='lane1-0002'), crossing(ids, event_id='lane1-0002')])
+        return await asyncio.gather(*futures), pipeline.get_status()
+    
+    (first, second), status = run_pipeline(flask_app, post_together)
+    assert first['transaction_id'] == second['transaction_id']
+    assert (status['accepted'], status['duplicates']) == (1, 1)
+    assert wallet_balance(flask_app, ids) == 120.0 - RATE
+
+def test_duplicate_keys_in_one_batch_are_charged_once(toll_db):
+    flask_app, ids = toll_db
+    
+    async def write(pipeline):
+        return await pipeline.write_batch([crossing(ids, event_id='lane1-0003'), crossing(ids, event_id='lane1-0003')])
+    
+    first, second = run_pipeline(flask_app, write)
+    assert first['success'] and first is second
+    with flask_app.app_context():
+        assert TollTransaction.query.filter_by(event_id='lane1-0003').count() == 1
+        db.session.remove()
+
+def add_rows(flask_app, *rows):
+    with flask_app.app_context():
+        db.session.add_all(rows)
+        db.session.commit()
+        keys = [db.inspect(row).identity[0] for row in rows]
+        db.session.remove()
+    return keys
+
+def write(flask_app, events):
+    async def body(pipeline):
+        return await pipeline.write_batch(events), pipeline.get_status()
+    return run_pipeline(flask_app, body)
+
+def test_crossings_are_priced_from_the_rate_table(toll_db):
+    flask_app, ids = toll_db
+    add_rows(flask_app, TollRate(plaza_id=ids['plaza_id'], vehicle_type=VehicleType.CAR, from_time='07:00',
+                                 to_time='10:00', time_slot='peak', amount=80.0))
+    event = crossing(ids, lane_no=3)
+    expected = 80.0 if TollService.get_time_slot(event['timestamp']) == 'peak' else RATE
+    
+    (result,), status = write(flask_app, [event])
+    assert result['success'] and result['amount'] == expected
+    assert result['toll_details']['multiplier'] == 1.0
+    with flask_app.app_context():
+        txn = db.session.get(TollTransaction, result['transaction_id'])
+        assert (txn.amount, txn.lane_no, txn.plaza_id) == (expected, 3, ids['plaza_id'])
+        db.session.remove()
+    assert wallet_balance(flask_app, ids) == 120.0 - expected
+    assert (status['committed'], status['rejected']) == (1, 0)
+
+def test_crossings_in_one_batch_cannot_overspend_the_wallet(toll_db):
+    flask_app, ids = toll_db
+    # 120 covers two crossings at 50: the third in the same batch is declined
+    results, status = write(flask_app, [crossing(ids), crossing(ids), crossing(ids)])
+    
+    assert [result['success'] for result in results] == [True, True, False]
+    assert results[2]['message'] == INSUFFICIENT_BALANCE
+    assert wallet_balance(flask_app, ids) == 120.0 - 2 * RATE
+    assert status['declined_payments'] == 1
+
+class DrainingEngine:
+    """
+    Engine whose transactions drain a wallet just before the first UPDATE,
+    as a crossing committed elsewhere after the batch read the balance would
+    """
+    
+    def __init__(self, engine, wallet_id):
+        self.engine = engine
+        self.wallet_id = wallet_id
+    
+    def __getattr__(self, name):
+        return getattr(self.engine, name)
+    
+    @contextlib.asynccontextmanager
+    async def begin(self):
+        async with self.engine.begin() as conn:
+            yield DrainingConnection(conn, self.wallet_id)
+
+class DrainingConnection:
+    def __init__(self, conn, wallet_id):
+        self.conn = conn
+        self.wallet_id = wallet_id
+    
+    async def execute(self, statement, *args, **kwargs):
+        if getattr(statement, 'is_update', False) and self.wallet_id is not None:
+            await self.conn.execute(db.text('UPDATE wallet SET balance = 10 WHERE wallet_id = :id'),
+                                    {'id': self.wallet_id})
+            self.wallet_id = None
+        return await self.conn.execute(statement, *args, **kwargs)
+
+def test_debit_is_declined_when_the_balance_was_spent_meanwhile(toll_db):
+    flask_app, ids = toll_db
+    
+    async def body(pipeline):
+        pipeline.engine = DrainingEngine(pipeline.engine, ids['wallet_id'])
+        return await pipeline.write_batch([crossing(ids)])
+    
+    (result,) = run_pipeline(flask_app, body)
+    assert (result['success'], result['message']) == (False, INSUFFICIENT_BALANCE)
+    assert wallet_balance(flask_app, ids) == 10.0
+    with flask_app.app_context():
+        assert TollTransaction.query.count() == 0
+        db.session.remove()
+
+def test_rejections_carry_the_toll_service_messages(toll_db):
+    flask_app, ids = toll_db
+    no_wallet = User(name='No wallet', email='nowallet@example.com')
+    no_wallet.set_password('secret')
+    plaza_id, = add_rows(flask_app, TollPlaza(plaza_name='Unpriced', location='NH2', city='Delhi', state='Delhi'))
+    user_id, = add_rows(flask_app, no_wallet)
+    inactive_id, walletless_id = add_rows(
+        flask_app,
+        Vehicle(vehicle_number='DL01AB0002', vehicle_type=VehicleType.CAR, user_id=ids['owner_id'], status='inactive'),
+        Vehicle(vehicle_number='DL01AB0003', vehicle_type=VehicleType.CAR, user_id=user_id)
+    )
+    
+    results, status = write(flask_app, [
+        crossing(ids, vehicle_id=999999),
+        crossing(ids, vehicle_id=inactive_id),
+        crossing(ids, plaza_id=plaza_id),
+        crossing(ids, vehicle_id=walletless_id),
+        crossing(ids, vehicle_id=walletless_id, payment_mode='cash')
+    ])
+    assert [result['message'] for result in results[:4]] == [
+        VEHICLE_REJECTED, VEHICLE_REJECTED, RATE_NOT_CONFIGURED, WALLET_NOT_FOUND
+    ]
+    assert not any(result['success'] for result in results[:4])
+    assert results[4]['success'] and results[4]['payment_mode'] == 'cash'
+    assert (status['committed'], status['rejected'], status['declined_payments']) == (1, 4, 1)
+    assert wallet_balance(flask_app, ids) == 120.0
+
+def test_full_queue_answers_503(toll_db):
+    flask_app, ids = toll_db
+    app = create_ingest_app({
+        'SQLALCHEMY_DATABASE_URI': flask_app.config['SQLALCHEMY_DATABASE_URI'],
+        'PREDICTION_CACHE_REFRESH_SECONDS': 0,
+        'INGEST_API_KEY': 'lane-secret',
+        'INGEST_QUEUE_SIZE': 1
+    })
+    event = {'vehicle_id': ids['vehicle_id'], 'plaza_id': ids['plaza_id']}
+    with TestClient(app) as client:
+        # All or none: two events do not fit a queue of one
+        response = client.post('/ingest/crossings', json=[event, event], headers={'X-Api-Key': 'lane-secret'})
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '1'
+        assert client.get('/ingest/stats').json()['refused_queue_full'] == 2
+        
+        # Room again: the single event is written
+        response = client.post('/ingest/crossings', json=event, headers={'X-Api-Key': 'lane-secret'})
+        assert response.status_code == 200 and response.json()['success']
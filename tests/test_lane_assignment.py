@@ -0,0 +1,54 @@
+"""
+Lane plans around the turn of the hour and of the day.
+"""
+
+from datetime import datetime, timedelta
+import pytest
+from app import db
+from app.models import TollPlaza, TrafficLog
+from app.services import lane_assignment_service, prediction_service
+from app.services.baseline_service import TrafficBaselineService
+from app.services.lane_assignment_service import LaneAssignmentService
+from app.services.prediction_cache import PredictionCache
+
+TODAY = datetime.utcnow().date()
+
+class BeforeMidnight(datetime):
+    @classmethod
+    def utcnow(cls):
+        return cls.combine(TODAY, datetime.min.time()).replace(hour=23, minute=30)
+
+@pytest.fixture
+def plaza(app, monkeypatch):
+    """
+    A plaza whose last hour today is quiet and whose tomorrow is busy
+    """
+    plaza = TollPlaza(plaza_name='North', location='NH1', city='Delhi', state='Delhi', num_lanes=8)
+    db.session.add(plaza)
+    db.session.flush()
+    tomorrow = (TODAY + timedelta(days=1)).weekday()
+    db.session.add_all([
+        TrafficLog(plaza_id=plaza.plaza_id, date=date, hour=hour,
+                   vehicle_count=1200 if date.weekday() == tomorrow else 60)
+        for date in (TODAY - timedelta(days=offset) for offset in range(1, 15))
+        for hour in range(24)
+    ])
+    db.session.commit()
+    
+    monkeypatch.setattr(prediction_service, 'datetime', BeforeMidnight)
+    monkeypatch.setattr(lane_assignment_service, 'datetime', BeforeMidnight)
+    monkeypatch.setattr(LaneAssignmentService, '_plazas', None)
+    monkeypatch.setattr(LaneAssignmentService, '_mix_at', None)
+    PredictionCache.clear()
+    TrafficBaselineService.invalidate()
+    yield plaza.plaza_id
+    PredictionCache.clear()
+
+def test_plan_forecasts_the_current_hour_and_the_next(plaza):
+    plan = LaneAssignmentService.compute_plan()['plazas'][0]
+    
+    # 23:00 today is quiet; midnight is forecast with tomorrow's weekday
+    assert plan['forecast_per_minute'] == 1.0
+    assert plan['arrivals_per_minute'] == 1.0
+    assert plan['next_hour']['arrivals_per_minute'] == 20.0
+    assert plan['next_hour']['recommended_lanes'] > plan['recommended_lanes']
@@ -0,0 +1,79 @@
+"""
+Model registry hot swap: requests keep being served while a new version loads.
+"""
+
+import os
+import threading
+import time
+import pytest
+from app.services.model_registry import ModelRegistry
+
+class ConstantModel:
+    def __init__(self, value):
+        self.value = value
+    
+    def predict(self, features):
+        return [self.value for _ in features]
+
+@pytest.fixture
+def registry(app):
+    app.config['MODEL_REGISTRY_POLL_SECONDS'] = 0
+    ModelRegistry._active = None
+    ModelRegistry._checked_at = None
+    ModelRegistry._pointer_mtime = None
+    yield ModelRegistry
+    ModelRegistry._active = None
+    ModelRegistry._checked_at = None
+    ModelRegistry._pointer_mtime = None
+
+def point_active_at(version):
+    """
+    Switch the ACTIVE pointer as another process would
+    """
+    path = ModelRegistry._pointer_path()
+    with open(path, 'w') as f:
+        f.write(version)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000))
+
+def test_requests_are_served_while_a_new_version_loads(app, registry, monkeypatch):
+    registry.register(ConstantModel(1), version='v1', activate=True)
+    registry.register(ConstantModel(2), version='v2')
+    assert registry.get_active().version == 'v1'
+    
+    release = threading.Event()
+    load_version = registry.load_version
+    
+    def slow_load(version, use_arrays=True):
+        if version == 'v2':
+            release.wait(5)
+        return load_version(version, use_arrays)
+    
+    monkeypatch.setattr(ModelRegistry, 'load_version', staticmethod(slow_load))
+    point_active_at('v2')
+    
+    def poll():
+        with app.app_context():
+            registry.get_active()
+    
+    loader = threading.Thread(target=poll)
+    loader.start()
+    time.sleep(0.1)
+    
+    # The loader holds the load lock; a request is answered by v1 at once
+    started = time.perf_counter()
+    assert registry.get_active().version == 'v1'
+    assert time.perf_counter() - started < 0.5
+    
+    release.set()
+    loader.join(5)
+    assert registry.get_active().version == 'v2'
+
+def test_first_load_waits_for_the_model(app, registry):
+    registry.register(ConstantModel(3), version='v1', activate=True)
+    registry._active = None
+    registry._checked_at = None
+    
+    active = registry.get_active()
+    assert active.version == 'v1'
+    assert active.predict([[0, 8, 1, 1]]) == [3]
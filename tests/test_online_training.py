@@ -0,0 +1,63 @@
+"""
+Online training cursor: closed hours only, rewritten rows trained again.
+"""
+
+from datetime import datetime, timedelta
+import pytest
+from app import db
+from app.models import TollPlaza, TrafficLog
+from app.services.online_training_service import OnlineTrafficModel, OnlineTrainingService
+
+@pytest.fixture
+def learned(app, monkeypatch):
+    """
+    Targets passed to partial_fit, one list per batch
+    """
+    batches = []
+    partial_fit = OnlineTrafficModel.partial_fit
+    
+    def record(self, X, y):
+        batches.append(sorted(y.tolist()))
+        return partial_fit(self, X, y)
+    
+    monkeypatch.setattr(OnlineTrafficModel, 'partial_fit', record)
+    return batches
+
+def add_log(plaza, slot, count, written):
+    log = TrafficLog(plaza_id=plaza.plaza_id, date=slot.date(), hour=slot.hour, vehicle_count=count,
+                     updated_at=written)
+    db.session.add(log)
+    db.session.commit()
+    return log
+
+def test_trains_closed_hours_and_rewritten_rows(app, learned):
+    plaza = TollPlaza(plaza_name='North', location='NH1', city='Delhi', state='Delhi')
+    db.session.add(plaza)
+    db.session.commit()
+    now = datetime.utcnow()
+    current = now.replace(minute=0, second=0, microsecond=0)
+    
+    closed = add_log(plaza, current - timedelta(hours=3), 120, now - timedelta(minutes=3))
+    # Written while its hour was still filling up
+    add_log(plaza, current, 7, now - timedelta(minutes=2))
+    
+    assert OnlineTrainingService.update()['rows_trained'] == 1
+    assert learned == [[120.0]]
+    assert OnlineTrainingService.update()['rows_trained'] == 0
+    
+    # A later aggregation corrects the closed hour in place
+    closed.vehicle_count = 150
+    closed.updated_at = now - timedelta(seconds=90)
+    db.session.commit()
+    assert OnlineTrainingService.update()['rows_trained'] == 1
+    assert learned == [[120.0], [150.0]]
+
+def test_recent_writes_wait_for_the_next_pass(app, learned):
+    plaza = TollPlaza(plaza_name='North', location='NH1', city='Delhi', state='Delhi')
+    db.session.add(plaza)
+    db.session.commit()
+    now = datetime.utcnow()
+    add_log(plaza, now - timedelta(hours=5), 80, now)
+    
+    assert OnlineTrainingService.update()['rows_trained'] == 0
+    assert learned == []
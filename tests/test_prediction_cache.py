@@ -0,0 +1,65 @@
+"""
+Prediction cache invalidation when baselines or stored features change.
+"""
+
+from datetime import datetime, timedelta
+import pytest
+from app import db
+from app.models import TollPlaza, TrafficLog
+from app.services.baseline_service import TrafficBaselineService
+from app.services.feature_store_service import FeatureStoreService
+from app.services.prediction_cache import PredictionCache
+from app.services.prediction_service import PredictionService
+
+@pytest.fixture
+def plazas(app):
+    """
+    Two plazas with 14 days of flat hourly history (50 vehicles an hour)
+    """
+    plazas = [TollPlaza(plaza_name=name, location='NH1', city='Delhi', state='Delhi') for name in ('North', 'South')]
+    db.session.add_all(plazas)
+    db.session.flush()
+    today = datetime.utcnow().date()
+    db.session.add_all([
+        TrafficLog(plaza_id=plaza.plaza_id, date=today - timedelta(days=offset), hour=hour, vehicle_count=50)
+        for plaza in plazas
+        for offset in range(1, 15)
+        for hour in range(24)
+    ])
+    db.session.commit()
+    PredictionCache.clear()
+    TrafficBaselineService.invalidate()
+    yield [plaza.plaza_id for plaza in plazas]
+    PredictionCache.clear()
+
+def cached_plazas(plaza_ids, hours):
+    found, _ = PredictionCache.get_many(plaza_ids, datetime.utcnow().date(), hours, None)
+    return sorted(found)
+
+def test_baseline_change_drops_only_that_plaza(plazas):
+    today = datetime.utcnow().date()
+    first = PredictionService.get_predictions(plazas, today, 1, None)
+    hour = first[plazas[0]][0]['hour']
+    assert first[plazas[0]][0]['predicted_vehicles'] == 50
+    assert cached_plazas(plazas, [hour]) == plazas
+    
+    # Last week's count for the same weekday and hour is corrected to 450
+    TrafficBaselineService.apply_change(plazas[0], today - timedelta(days=7), hour, 50, 450)
+    assert cached_plazas(plazas, [hour]) == [plazas[1]]
+    
+    second = PredictionService.get_predictions(plazas, today, 1, None)
+    assert second[plazas[0]][0]['predicted_vehicles'] == 250
+    assert second[plazas[1]][0]['predicted_vehicles'] == 50
+
+def test_baseline_invalidation_clears_the_cache(plazas):
+    PredictionService.get_predictions(plazas, datetime.utcnow().date(), 2, None)
+    TrafficBaselineService.invalidate()
+    assert PredictionCache.get_stats()['entries'] == 0
+
+def test_feature_refresh_drops_refreshed_plazas(plazas):
+    today = datetime.utcnow().date()
+    predictions = PredictionService.get_predictions(plazas, today, 1, None)
+    hour = predictions[plazas[0]][0]['hour']
+    
+    FeatureStoreService.refresh_range([plazas[1]], today - timedelta(days=1), today)
+    assert cached_plazas(plazas, [hour]) == [plazas[0]]
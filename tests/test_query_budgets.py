@@ -0,0 +1,110 @@
+"""
+Statement budgets of the pages and APIs whose N+1 or load-everything paths
+were rewritten. Budgets are fixed for a fleet large enough that a query per
+row would blow them, so a regression fails here instead of in production.
+"""
+
+from datetime import datetime, timedelta
+import pytest
+from app import db
+from app.models import (
+    TollPlaza, TollRate, TollTransaction, Vehicle, VehicleType, PaymentMode, TransactionStatus, UserRole
+)
+from conftest import login
+
+PLAZAS = 4
+VEHICLES_PER_OWNER = 3
+CROSSINGS_PER_VEHICLE = 10
+
+@pytest.fixture
+def fleet(app, make_user):
+    """
+    Plazas with rates, an owner with several vehicles and their crossings
+    """
+    owner = make_user()
+    plazas = [TollPlaza(plaza_name=f'Plaza {i}', location=f'NH{i}', city='Delhi', state='Delhi')
+              for i in range(PLAZAS)]
+    db.session.add_all(plazas)
+    db.session.flush()
+    db.session.add_all([
+        TollRate(plaza_id=plaza.plaza_id, vehicle_type=vehicle_type, from_time='00:00', to_time='23:59',
+                 time_slot='normal', amount=50.0)
+        for plaza in plazas
+        for vehicle_type in VehicleType
+    ])
+    vehicles = [Vehicle(vehicle_number=f'DL01AB{i:04d}', vehicle_type=VehicleType.CAR, user_id=owner.user_id)
+                for i in range(VEHICLES_PER_OWNER)]
+    db.session.add_all(vehicles)
+    db.session.flush()
+    
+    now = datetime.utcnow()
+    transactions = [
+        TollTransaction(vehicle_id=vehicle.vehicle_id, plaza_id=plazas[i % PLAZAS].plaza_id, lane_no=1 + i % 4,
+                        amount=50.0, payment_mode=PaymentMode.WALLET, status=TransactionStatus.COMPLETED,
+                        timestamp=now - timedelta(hours=i))
+        for vehicle in vehicles
+        for i in range(CROSSINGS_PER_VEHICLE)
+    ]
+    db.session.add_all(transactions)
+    db.session.commit()
+    return {'owner': owner, 'vehicle': vehicles[0], 'transaction': transactions[0]}
+
+def fetch(client, query_budget, url, budget):
+    db.session.remove()  # Start cold: fixture rows must not be served from the identity map
+    with query_budget(budget):
+        response = client.get(url)
+    assert response.status_code == 200, response.data[:500]
+    return response
+
+# ============================================================================
+# Vehicle owner pages
+# ============================================================================
+
+def test_receipt(client, query_budget, fleet):
+    login(client, fleet['owner'])
+    # User loader, transaction with vehicle and plaza joined
+    response = fetch(client, query_budget, f"/toll/receipt/{fleet['transaction'].txn_id}", 2)
+    assert response.json['receipt']['plaza_name'].startswith('Plaza')
+
+def test_vehicle_history(client, query_budget, fleet):
+    login(client, fleet['owner'])
+    # User loader, vehicle, transactions with plazas joined
+    response = fetch(client, query_budget, f"/dashboard/api/vehicle/{fleet['vehicle'].vehicle_id}/history", 3)
+    assert len(response.json['transactions']) == CROSSINGS_PER_VEHICLE
+
+def test_toll_history(client, query_budget, fleet):
+    login(client, fleet['owner'])
+    # User loader, vehicles, page count, page with vehicles and plazas joined
+    fetch(client, query_budget, '/dashboard/toll-history', 4)
+
+# ============================================================================
+# Admin pages and APIs
+# ============================================================================
+
+@pytest.fixture
+def admin_client(client, make_user):
+    return login(client, make_user(UserRole.ADMIN))
+
+def test_admin_analytics(admin_client, query_budget, fleet):
+    # User loader, summary aggregate, revenue per plaza, plazas, peak hours of every plaza
+    fetch(admin_client, query_budget, '/admin/analytics', 5)
+
+def test_admin_rates(admin_client, query_budget, fleet):
+    # User loader, plazas, rates with plazas joined
+    fetch(admin_client, query_budget, '/admin/rates', 3)
+
+def test_transaction_summary(admin_client, query_budget, fleet):
+    # User loader, totals, then one grouped query per dimension
+    response = fetch(admin_client, query_budget, '/admin/api/transaction-summary', 5)
+    assert response.json['data']['total_transactions'] == VEHICLES_PER_OWNER * CROSSINGS_PER_VEHICLE
+
+def test_realtime_metrics(app, admin_client, query_budget, fleet):
+    app.config['SPARK_UI_URL'] = 'http://127.0.0.1:9'  # Nothing listens: Spark reported disconnected
+    # User loader, totals, distinct owners, plaza count, vehicle count, today's totals
+    response = fetch(admin_client, query_budget, '/admin/api/realtime-metrics', 6)
+    assert response.json['database']['unique_users'] == 1
+
+def test_export_data(admin_client, query_budget, fleet):
+    # User loader, one joined column query
+    response = fetch(admin_client, query_budget, '/admin/api/export-data/7', 2)
+    assert response.json['total_records'] == VEHICLES_PER_OWNER * CROSSINGS_PER_VEHICLE
@@ -0,0 +1,178 @@
+"""
+Spark REST polling against a local stub server: URL configuration, the
+response cache, per-application fan-out and the circuit breaker.
+"""
+
+import socket
+import time
+import pytest
+import requests
+from app import create_app
+from app.services.spark_integration_service import SparkIntegrationService, SparkCircuitOpenError
+
+APPS = '/api/v1/applications'
+
+@pytest.fixture
+def spark_app(stub_server):
+    """
+    Application pointed at the stub server, with fresh Spark client state
+    """
+    def make(**config):
+        settings = {
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+            'SPARK_UI_URL': stub_server.url + '/',
+            'SPARK_API_CACHE_TTL': 0,
+            'SPARK_CIRCUIT_FAILURE_THRESHOLD': 2,
+            'SPARK_CIRCUIT_RESET_TIMEOUT': 0.2
+        }
+        settings.update(config)
+        return create_app(settings)
+    
+    SparkIntegrationService._cache.clear()
+    SparkIntegrationService._breaker.reset()
+    yield make
+    SparkIntegrationService._cache.clear()
+    SparkIntegrationService._breaker.reset()
+
+def unused_url():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return f'http://127.0.0.1:{port}'
+
+def fetch(url):
+    return SparkIntegrationService._fetch_json(url, SparkIntegrationService._request_options())
+
+# ============================================================================
+# URL configuration
+# ============================================================================
+
+def test_urls_come_from_config(spark_app, stub_server):
+    stub_server.routes[APPS] = (200, [])
+    with spark_app().app_context():
+        assert SparkIntegrationService.get_spark_ui_url() == stub_server.url
+        assert SparkIntegrationService.get_spark_api_url() == stub_server.url + '/api'
+        status = SparkIntegrationService.get_spark_status()
+    assert status['status'] == 'connected'
+    assert status['url'] == stub_server.url
+    assert stub_server.hits[APPS] == 1
+
+def test_unreachable_spark_reports_disconnected(spark_app):
+    url = unused_url()
+    with spark_app(SPARK_UI_URL=url).app_context():
+        status = SparkIntegrationService.get_spark_status()
+    assert status['status'] == 'disconnected'
+    assert url in status['message']
+
+# ============================================================================
+# Response cache
+# ============================================================================
+
+def test_responses_are_cached_per_url(spark_app, stub_server):
+    stub_server.routes[APPS] = (200, [{'id': 'app-1', 'name': 'toll'}])
+    with spark_app(SPARK_API_CACHE_TTL=60).app_context():
+        first = SparkIntegrationService.get_spark_status()
+        second = SparkIntegrationService.get_spark_status()
+    assert first['applications'] == second['applications'] == [{'id': 'app-1', 'name': 'toll'}]
+    assert stub_server.hits[APPS] == 1
+
+def test_cache_expires_after_ttl(spark_app, stub_server):
+    stub_server.routes[APPS] = (200, [])
+    with spark_app(SPARK_API_CACHE_TTL=0.1).app_context():
+        SparkIntegrationService.get_spark_status()
+        time.sleep(0.15)
+        SparkIntegrationService.get_spark_status()
+    assert stub_server.hits[APPS] == 2
+
+# ============================================================================
+# Fan-out
+# ============================================================================
+
+def test_application_details_fan_out(spark_app, stub_server):
+    app_ids = [f'app-{i}' for i in range(4)]
+    stub_server.routes[APPS] = (200, [{'id': app_id, 'name': app_id} for app_id in app_ids])
+    for app_id in app_ids:
+        stub_server.routes[f'{APPS}/{app_id}/jobs'] = (200, [{'jobId': 1, 'status': 'SUCCEEDED'}])
+        # No storage route: every RDD request answers 404
+    
+    with spark_app(SPARK_API_MAX_WORKERS=8).app_context():
+        SparkIntegrationService._get_session()
+        stub_server.delay = 0.2
+        started = time.perf_counter()
+        result = SparkIntegrationService.get_spark_jobs()
+        elapsed = time.perf_counter() - started
+    
+    assert result['success']
+    assert sorted(job['app_id'] for job in result['jobs']) == app_ids
+    assert result['storage'] == []
+    # 1 + 2 x 4 requests of 0.2s each: sequential polling would take 1.8s
+    assert elapsed < 1.0
+    # 404s prove Spark is up and must not trip the breaker
+    assert not SparkIntegrationService._breaker.is_open
+
+# ============================================================================
+# Circuit breaker
+# ============================================================================
+
+def test_breaker_opens_after_threshold(spark_app, stub_server):
+    stub_server.routes[APPS] = 'drop'
+    with spark_app().app_context():
+        for _ in range(2):
+            with pytest.raises(requests.exceptions.ConnectionError):
+                fetch(stub_server.url + APPS)
+        assert SparkIntegrationService._breaker.is_open
+        
+        with pytest.raises(SparkCircuitOpenError):
+            fetch(stub_server.url + APPS)
+    assert stub_server.hits[APPS] == 2
+
+def test_half_open_trial_success_closes(spark_app, stub_server):
+    stub_server.routes[APPS] = 'drop'
+    with spark_app().app_context():
+        for _ in range(2):
+            with pytest.raises(requests.exceptions.ConnectionError):
+                fetch(stub_server.url + APPS)
+        
+        stub_server.routes[APPS] = (200, [])
+        time.sleep(0.25)
+        assert fetch(stub_server.url + APPS) == []
+        assert not SparkIntegrationService._breaker.is_open
+        assert fetch(stub_server.url + APPS) == []
+
+def test_half_open_trial_failure_reopens(spark_app, stub_server):
+    stub_server.routes[APPS] = 'drop'
+    with spark_app().app_context():
+        for _ in range(2):
+            with pytest.raises(requests.exceptions.ConnectionError):
+                fetch(stub_server.url + APPS)
+        
+        time.sleep(0.25)
+        with pytest.raises(requests.exceptions.ConnectionError):
+            fetch(stub_server.url + APPS)
+        # One failed trial re-opens immediately
+        with pytest.raises(SparkCircuitOpenError):
+            fetch(stub_server.url + APPS)
+    assert stub_server.hits[APPS] == 3
+
+@pytest.mark.parametrize('route', [(500, {'message': 'boom'}), (200, b'<html>not json</html>')])
+def test_failed_trial_of_any_kind_is_settled(spark_app, stub_server, route):
+    stub_server.routes[APPS] = 'drop'
+    with spark_app().app_context():
+        for _ in range(2):
+            with pytest.raises(requests.exceptions.ConnectionError):
+                fetch(stub_server.url + APPS)
+        
+        # A server error or a bad body during the trial re-opens the circuit...
+        stub_server.routes[APPS] = route
+        time.sleep(0.25)
+        with pytest.raises((requests.exceptions.RequestException, ValueError)):
+            fetch(stub_server.url + APPS)
+        assert SparkIntegrationService._breaker.is_open
+        
+        # ...and the next trial is still allowed once the timeout has passed
+        stub_server.routes[APPS] = (200, [])
+        time.sleep(0.25)
+        assert fetch(stub_server.url + APPS) == []
+        assert not SparkIntegrationService._breaker.is_open
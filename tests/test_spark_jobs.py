@@ -0,0 +1,54 @@
+"""
+Write-back of Spark rollups: merging the staging table into traffic_log.
+"""
+
+from datetime import date
+from sqlalchemy import text
+from app import db
+from app.models import TollPlaza, TrafficLog
+from app.services.spark_jobs import SparkRollupJob, TRAFFIC_LOG_STAGING_TABLE
+
+def stage(rows):
+    db.session.execute(text(f"DELETE FROM {TRAFFIC_LOG_STAGING_TABLE}"))
+    db.session.execute(
+        text(f"INSERT INTO {TRAFFIC_LOG_STAGING_TABLE} "
+             f"VALUES (:plaza_id, :date, :hour, :vehicle_count, :total_revenue, :traffic_level)"),
+        rows
+    )
+
+def test_merge_inserts_then_updates_cells(app):
+    plaza = TollPlaza(plaza_name='North', location='NH1', city='Delhi', state='Delhi')
+    db.session.add(plaza)
+    db.session.commit()
+    db.session.execute(text(
+        f"CREATE TABLE {TRAFFIC_LOG_STAGING_TABLE} (plaza_id INTEGER, date TEXT, hour INTEGER, "
+        f"vehicle_count INTEGER, total_revenue REAL, traffic_level TEXT)"
+    ))
+    
+    stage([
+        {'plaza_id': plaza.plaza_id, 'date': '2026-10-01', 'hour': 8, 'vehicle_count': 120,
+         'total_revenue': 9000.0, 'traffic_level': 'normal'},
+        {'plaza_id': plaza.plaza_id, 'date': '2026-10-01', 'hour': 9, 'vehicle_count': 40,
+         'total_revenue': 3000.0, 'traffic_level': 'low'}
+    ])
+    assert SparkRollupJob.merge_staging_into_traffic_log() == 2
+    
+    # A re-run updates the cells it covers instead of failing on the unique key
+    stage([{'plaza_id': plaza.plaza_id, 'date': '2026-10-01', 'hour': 8, 'vehicle_count': 200,
+            'total_revenue': 15000.0, 'traffic_level': 'high'}])
+    assert SparkRollupJob.merge_staging_into_traffic_log() == 1
+    
+    logs = {log.hour: log for log in TrafficLog.query.filter_by(date=date(2026, 10, 1))}
+    assert sorted(logs) == [8, 9]
+    assert (logs[8].vehicle_count, logs[8].traffic_level) == (200, 'high')
+    assert (logs[9].vehicle_count, logs[9].traffic_level) == (40, 'low')
+    
+    assert logs[8].updated_at > logs[9].updated_at
+    
+    # Re-merging unchanged counts keeps the online training watermark in place
+    written = logs[8].updated_at
+    stage([{'plaza_id': plaza.plaza_id, 'date': '2026-10-01', 'hour': 8, 'vehicle_count': 200,
+            'total_revenue': 15000.0, 'traffic_level': 'high'}])
+    SparkRollupJob.merge_staging_into_traffic_log()
+    db.session.expire_all()
+    assert TrafficLog.query.filter_by(date=date(2026, 10, 1), hour=8).one().updated_at == written
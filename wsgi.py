@@ -0,0 +1,13 @@
+"""
+Smart Toll Management System - WSGI entry point for production servers
+Loaded once by the gunicorn master (preload_app in gunicorn.conf.py), which
+warms the in-memory caches before forking the workers:
+
+    gunicorn -c gunicorn.conf.py
+"""
+
+from app import create_app
+from app.services.worker_lifecycle import WorkerLifecycle
+
+app = create_app()
+WorkerLifecycle.warm(app)